@@ -2,6 +2,9 @@
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 from datetime import datetime
+from typing import List
+
+import numpy as np
 
 RINEX_VERSION_TYPE_LABEL = "RINEX VERSION / TYPE"
 MARKER_NAME_LABEL = "MARKER NAME"
@@ -14,6 +17,8 @@ END_OF_HEADER_LABEL = "END OF HEADER"
 PGM_RUNBY_DATE_LABEL = "PGM / RUN BY / DATE"
 IONOSPHERIC_CORR_LABEL = "IONOSPHERIC CORR"
 INTERVAL_LABEL = "INTERVAL"
+TIME_SYSTEM_CORR_LABEL = "TIME SYSTEM CORR"
+LEAP_SECONDS_LABEL = "LEAP SECONDS"
 
 
 def parse_number_with_exception(parse_function, arg, exception_msg: str):
@@ -49,10 +54,39 @@ def str2int(string: str, exception_msg: str):
 def str2date(timestamp_str: str):
     """
     Converts string to datetime using ISO format: "%Y-%m-%dT%H:%M:%S".
+    Fraction of seconds (up to microseconds) is supported as well: "%Y-%m-%dT%H:%M:%S.%f".
     """
+    if "." in timestamp_str:
+        return datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S.%f")
     return datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S")
 
 
+def fields2datetime64(year, month, day, hour, minute, seconds) -> np.ndarray:
+    """
+    Converts arrays of calendar fields into numpy datetime64 array with resolution of nanoseconds.
+    Fraction of seconds is rounded to full nanoseconds, so the 7 decimals of RINEX epochs are kept exactly.
+    """
+    dates = (np.asarray(year, dtype=np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[M]') + \
+        (np.asarray(month, dtype=np.int64) - 1).astype('timedelta64[M]')
+    dates = dates.astype('datetime64[D]') + (np.asarray(day, dtype=np.int64) - 1).astype('timedelta64[D]')
+    minutes = np.asarray(hour, dtype=np.int64) * 60 + np.asarray(minute, dtype=np.int64)
+    nanoseconds = minutes * 60_000_000_000 + np.round(np.asarray(seconds, dtype=np.float64) * 1e9).astype(np.int64)
+    return dates.astype('datetime64[ns]') + nanoseconds.astype('timedelta64[ns]')
+
+
+def datetime64_to_str(epochs: np.ndarray) -> List[str]:
+    """
+    Formats datetime64 values as ISO8601 timestamps, e.g. '2022-01-01T00:00:00'.
+    Fraction of seconds is added only to timestamps that have it, without trailing zeros, e.g. '2022-01-01T00:00:00.1'.
+    """
+    epochs = np.asarray(epochs, dtype='datetime64[ns]').reshape(-1)
+    result = np.datetime_as_string(epochs, unit='s').astype(object)
+    fractional = epochs.astype(np.int64) % 1_000_000_000 != 0
+    if fractional.any():
+        result[fractional] = [value.rstrip('0') for value in np.datetime_as_string(epochs[fractional], unit='ns')]
+    return [str(value) for value in result]
+
+
 def normalize_data_string(string: str) -> str:
     """
     Formats incoming Rinex data string to have length of 80 chars and removes first 4 spaces.
@@ -0,0 +1,255 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+from typing import BinaryIO, Iterator, Optional, TextIO
+
+# leading bytes of the supported compressed formats
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\x1f\x9d", "lzw"),  # Unix compress (.Z)
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"PK\x03\x04", "zip"),
+)
+BUFFER_SIZE = 1 << 20  # read-ahead of the decompressed stream
+__LZW_INIT_BITS = 9
+__LZW_CLEAR = 256
+__LZW_READ_SIZE = 1 << 16
+
+
+def detect_compression(rinex_file_path: str) -> Optional[str]:
+    """
+    Detects compression of the file by its leading bytes, independent of the file extension.
+
+    :param rinex_file_path: str. Path to the file
+    :return: 'gzip', 'lzw', 'bz2', 'xz', 'zip' or None for uncompressed files
+    """
+    with io.open(file=rinex_file_path, mode='rb') as file:
+        head = file.read(6)
+    return next((name for magic, name in COMPRESSION_MAGIC if head.startswith(magic)), None)
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Read-only stream of the decompressed content of a compressed RINEX file.
+
+    Data is decompressed on the fly, so neither the compressed nor the decompressed file is held in memory
+    or written to disk. Positions are offsets in the decompressed content, as in an uncompressed file.
+    Seeking forward decompresses and skips the data, seeking backward restarts the decompression,
+    so sequential reads (and seeks to increasing offsets, e.g. with an epoch index) stay cheap.
+    Zip archives are expected to hold the RINEX file as their first member.
+
+    Examples
+    --------
+
+    >>> with open_rinex_binary('path/to/file.22o.gz') as file:
+    ...     first_line = file.readline()
+    """
+    def __init__(self, rinex_file_path: str, compression: str):
+        super().__init__()
+        self.compression: str = compression
+        self.__path = rinex_file_path
+        self.__source: Optional[BinaryIO] = None
+        self.__position = 0
+        self.__restart()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = self.__source.readinto(buffer)
+        self.__position += size
+        return size
+
+    def tell(self) -> int:
+        return self.__position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.__position
+        elif whence == io.SEEK_END:
+            while self.__skip(BUFFER_SIZE):
+                pass
+            offset += self.__position
+        elif whence != io.SEEK_SET:
+            raise ValueError("Invalid whence: {w:d}".format(w=whence))
+        if offset < 0:
+            raise ValueError("Negative seek position {o:d}".format(o=offset))
+        if offset < self.__position:
+            self.__restart()
+        while self.__position < offset and self.__skip(offset - self.__position):
+            pass
+        return self.__position
+
+    def close(self) -> None:
+        if self.__source is not None:
+            self.__source.close()
+            self.__source = None
+        super().close()
+
+    def __skip(self, size: int) -> int:
+        skipped = len(self.__source.read(min(size, BUFFER_SIZE)))
+        self.__position += skipped
+        return skipped
+
+    def __restart(self) -> None:
+        if self.__source is not None:
+            self.__source.close()
+        self.__source = open_decompressor(self.__path, self.compression)
+        self.__position = 0
+
+
+def open_decompressor(rinex_file_path: str, compression: str) -> BinaryIO:
+    """
+    Opens a decompressing binary reader of the file with the given compression, see detect_compression.
+    """
+    if compression == "gzip":
+        return gzip.open(rinex_file_path, 'rb')
+    if compression == "bz2":
+        return bz2.open(rinex_file_path, 'rb')
+    if compression == "xz":
+        return lzma.open(rinex_file_path, 'rb')
+    if compression == "zip":
+        with zipfile.ZipFile(rinex_file_path) as archive:
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            if not members:
+                raise ValueError("Zip archive %s is empty" % rinex_file_path)
+            return archive.open(members[0])  # the member keeps the file open after the archive is closed
+    if compression == "lzw":
+        return io.BufferedReader(_ChunkStream(__lzw_chunks(io.open(file=rinex_file_path, mode='rb'))),
+                                 buffer_size=BUFFER_SIZE)
+    raise ValueError("Unknown compression: {c:s}".format(c=compression))
+
+
+def open_rinex_binary(rinex_file_path: str) -> BinaryIO:
+    """
+    Opens the RINEX file for binary reading. Compressed files are decompressed on the fly, see DecompressedStream.
+    """
+    compression = detect_compression(rinex_file_path)
+    if compression is None:
+        return io.open(file=rinex_file_path, mode='rb')
+    return io.BufferedReader(DecompressedStream(rinex_file_path, compression), buffer_size=BUFFER_SIZE)
+
+
+def open_rinex_text(rinex_file_path: str) -> TextIO:
+    """
+    Opens the RINEX file for reading text lines. Compressed files are decompressed on the fly, see DecompressedStream.
+    """
+    compression = detect_compression(rinex_file_path)
+    if compression is None:
+        return io.open(file=rinex_file_path, mode='r')
+    return io.TextIOWrapper(open_rinex_binary(rinex_file_path))
+
+
+class _ChunkStream(io.RawIOBase):
+    """
+    Readable stream over an iterator of byte chunks.
+    """
+    def __init__(self, chunks: Iterator[bytes]):
+        super().__init__()
+        self.__chunks = chunks
+        self.__pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not len(self.__pending):
+            chunk = next(self.__chunks, None)
+            if chunk is None:
+                return 0
+            self.__pending = memoryview(chunk)
+        size = min(len(buffer), len(self.__pending))
+        buffer[:size] = self.__pending[:size]
+        self.__pending = self.__pending[size:]
+        return size
+
+    def close(self) -> None:
+        close = getattr(self.__chunks, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+
+def __lzw_chunks(file: BinaryIO) -> Iterator[bytes]:
+    """
+    Decompresses Unix compress (.Z) data, compatible with ncompress and gzip -d.
+
+    Codes are packed least significant bit first in groups of 8 codes (n_bits bytes).
+    When the code width grows or the table is cleared, the rest of the current group is skipped.
+
+    :param file: binary file positioned at the start of the compressed file
+    :return: Iterator of decompressed chunks
+    """
+    try:
+        header = file.read(3)
+        if len(header) < 3 or header[:2] != b"\x1f\x9d":
+            raise ValueError("Invalid header of compressed (.Z) data")
+        max_bits, block_mode = header[2] & 0x1f, bool(header[2] & 0x80)
+        if not __LZW_INIT_BITS <= max_bits <= 16:
+            raise ValueError("Unsupported code width of compressed (.Z) data: {b:d}".format(b=max_bits))
+        max_max_code = 1 << max_bits
+        table = [bytes((code,)) for code in range(256)] + [b""] * (max_max_code - 256)
+        n_bits = __LZW_INIT_BITS
+        max_code = (1 << n_bits) - 1
+        free_entry = __LZW_CLEAR + 1 if block_mode else __LZW_CLEAR
+        previous = None
+        pending, offset, finished = b"", 0, False
+        output = []
+        output_size = 0
+        while True:
+            if free_entry > max_code:
+                n_bits += 1
+                max_code = max_max_code if n_bits == max_bits else (1 << n_bits) - 1
+            while len(pending) - offset < n_bits and not finished:
+                chunk = file.read(__LZW_READ_SIZE)
+                finished = not chunk
+                pending, offset = pending[offset:] + chunk, 0
+            group = pending[offset:offset + n_bits]
+            offset += len(group)
+            if not group:
+                break
+            value = int.from_bytes(group, 'little')
+            mask = (1 << n_bits) - 1
+            for position in range(len(group) * 8 // n_bits):
+                if position and free_entry > max_code:
+                    break  # the code width grows with the next group
+                code = (value >> (position * n_bits)) & mask
+                if previous is None:
+                    if code >= 256:
+                        raise ValueError("Invalid first code of compressed (.Z) data")
+                    previous = table[code]
+                    output.append(previous)
+                    continue
+                if code == __LZW_CLEAR and block_mode:
+                    free_entry = __LZW_CLEAR  # the next code adds an unused entry, as in ncompress
+                    n_bits = __LZW_INIT_BITS
+                    max_code = (1 << n_bits) - 1
+                    break
+                if code < free_entry:
+                    entry = table[code]
+                elif code == free_entry:
+                    entry = previous + previous[:1]
+                else:
+                    raise ValueError("Corrupt compressed (.Z) data")
+                output.append(entry)
+                output_size += len(entry)
+                if free_entry < max_max_code:
+                    table[free_entry] = previous + entry[:1]
+                    free_entry += 1
+                previous = entry
+            if output_size >= __LZW_READ_SIZE:
+                yield b"".join(output)
+                output, output_size = [], 0
+        if output:
+            yield b"".join(output)
+    finally:
+        file.close()
@@ -0,0 +1,281 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import io
+from datetime import datetime
+from typing import IO, BinaryIO, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from nmbu.rinex.common import END_OF_HEADER_LABEL, datetime64_to_str, fields2datetime64
+from nmbu.rinex.common.compression import open_rinex_binary
+from nmbu.rinex.common.fixed_width import decode_decimal_fields, gather_lines, split_lines
+from nmbu.rinex.common.observation_bulk import EPOCH_LINE_WIDTH, decode_epoch_lines
+
+__EPOCH_MARK = ord('>')
+__SV_WIDTH = 3
+__NAV_LINE_HEAD_WIDTH = 23  # satellite name and epoch of a navigation record: 'G01 2022 09 29 10 00 00'
+__CHUNK_SIZE = 1 << 24  # amount of bytes scanned at once
+__RECORD_FLAGS = (0, 1, 6)  # epoch flags of blocks that consist of satellite lines
+
+
+class EpochIndex:
+    """
+    Class that holds byte offsets of all epochs (or navigation records) of a RINEX file.
+    The index is built once and can be reused for any amount of epoch time filter queries against the same file.
+    Contains following fields:
+
+    - file_size: int. Size of the indexed file in bytes, after decompression for compressed files
+    - data_offset: int. Byte offset of the first line after the 'END OF HEADER' line
+    - offsets: numpy int64 array. Byte offset of every epoch line
+    - epochs: numpy datetime64[ns] array. Timestamp of every epoch
+    - flags: numpy int64 array. Epoch flag of every epoch. Always 0 for navigation records
+    - sizes: numpy int64 array. Amount of lines that follow the epoch line in every epoch
+    - sv_names: numpy array of all satellite names met in the file, sorted
+    - sv_pointers: numpy int64 array of shape (n_epochs + 1,).
+      Satellites of the epoch i are sv_names[sv_indices[sv_pointers[i]:sv_pointers[i + 1]]]
+    - sv_indices: numpy int64 array. Positions in sv_names for satellites of all epochs
+
+    Examples
+    --------
+
+    >>> index = build_epoch_index('path/to/rinex/file')
+    >>> index.satellites(0)  # satellites observed in the first epoch
+    >>> reader.read_rinex_file('path/to/rinex/file', start_epoch="2022-09-29T11:00:00",
+    ... end_epoch="2022-09-29T11:05:00", epoch_index=index)
+    """
+    def __init__(self, file_size: int, data_offset: int, offsets: np.ndarray,
+                 epochs: np.ndarray, flags: np.ndarray, sizes: np.ndarray,
+                 sv_names: np.ndarray, sv_pointers: np.ndarray, sv_indices: np.ndarray):
+        self.file_size: int = file_size
+        self.data_offset: int = data_offset
+        self.offsets: np.ndarray = offsets
+        self.epochs: np.ndarray = epochs
+        self.flags: np.ndarray = flags
+        self.sizes: np.ndarray = sizes
+        self.sv_names: np.ndarray = sv_names
+        self.sv_pointers: np.ndarray = sv_pointers
+        self.sv_indices: np.ndarray = sv_indices
+
+    def __repr__(self):
+        return "Epoch index: {n:d} epochs, {s:d} bytes".format(n=len(self.epochs), s=self.file_size)
+
+    def satellites(self, position: int) -> List[str]:
+        """
+        Returns names of all satellites in the epoch at the given position.
+        """
+        indices = self.sv_indices[self.sv_pointers[position]:self.sv_pointers[position + 1]]
+        return [str(name) for name in self.sv_names[indices]]
+
+    def byte_range(self, start_epoch: datetime, end_epoch: Optional[datetime]) -> (int, int):
+        """
+        Finds the part of the file that contains all epochs selected by the epoch time filter.
+        Range is found by binary search if epochs are in chronological order, as required for observation files.
+        Otherwise (e.g. navigation files, that are ordered by satellite), range spans
+        from the first to the last selected record.
+
+        :param start_epoch: datetime.
+            Required. Start of the period. If used alone, only the epoch that matches it exactly is selected.
+        :param end_epoch: datetime.
+            Optional. End of the period, inclusive.
+        :return: Tuple of (start offset, end offset) of the range. The range is empty if no epoch is selected.
+        """
+        start = np.datetime64(start_epoch, 'ns')
+        end = start if end_epoch is None else np.datetime64(end_epoch, 'ns')
+        if np.all(self.epochs[1:] >= self.epochs[:-1]):
+            first = int(np.searchsorted(self.epochs, start, side='left'))
+            last = int(np.searchsorted(self.epochs, end, side='right'))
+        else:
+            selected = np.flatnonzero((self.epochs >= start) & (self.epochs <= end))
+            first, last = (int(selected[0]), int(selected[-1]) + 1) if len(selected) else (0, 0)
+        if first >= last:
+            return self.data_offset, self.data_offset
+        end_offset = self.file_size if last == len(self.offsets) else int(self.offsets[last])
+        return int(self.offsets[first]), end_offset
+
+    def byte_ranges(self, start_epoch: datetime, end_epoch: Optional[datetime]) -> List[Tuple[int, int]]:
+        """
+        Finds all parts of the file that contain exactly the epochs selected by the epoch time filter.
+        Unlike byte_range, records of other epochs between the selected ones are excluded,
+        which is needed for navigation files ordered by satellite. Neighbouring records are merged into one part.
+
+        :param start_epoch: datetime.
+            Required. Start of the period. If used alone, only the epoch that matches it exactly is selected.
+        :param end_epoch: datetime.
+            Optional. End of the period, inclusive.
+        :return: List of tuples (start offset, end offset) in file order
+        """
+        start = np.datetime64(start_epoch, 'ns')
+        end = start if end_epoch is None else np.datetime64(end_epoch, 'ns')
+        selected = np.flatnonzero((self.epochs >= start) & (self.epochs <= end))
+        if len(selected) == 0:
+            return []
+        gaps = np.diff(selected) != 1
+        firsts = selected[np.concatenate(([True], gaps))]
+        lasts = selected[np.concatenate((gaps, [True]))]
+        ends = np.append(self.offsets[1:], self.file_size)
+        return [(int(self.offsets[first]), int(ends[last])) for first, last in zip(firsts, lasts)]
+
+
+def __find_data_offset(file: BinaryIO) -> int:
+    """
+    Skips all header lines and returns offset of the first line after the 'END OF HEADER' line.
+    """
+    while True:
+        line = file.readline()
+        if not line:
+            raise ValueError("Label '{label:s}' was not found".format(label=END_OF_HEADER_LABEL))
+        if line[60:].decode("latin-1").startswith(END_OF_HEADER_LABEL):
+            return file.tell()
+
+
+def iter_range_lines(file: IO, ranges: List[Tuple[int, int]]) -> Iterator[str]:
+    """
+    Reads lines of the given byte ranges of an open RINEX file, e.g. the ranges returned by EpochIndex.byte_ranges.
+    Line endings are translated as in a file opened in text mode.
+
+    :param file: IO. Text or binary file, offsets are byte offsets of the underlying binary file
+    :param ranges: List of tuples (start offset, end offset). Every range is expected to consist of complete lines
+    :return: Iterator of lines
+    """
+    binary_file = getattr(file, "buffer", file)
+    for begin, end in ranges:
+        binary_file.seek(begin)
+        data = binary_file.read(end - begin)
+        if isinstance(data, bytes):
+            data = data.decode("latin-1")
+        yield from io.StringIO(data, newline=None)
+
+
+def find_data_offset(rinex_file_path: str) -> int:
+    """
+    Returns byte offset of the first line after the 'END OF HEADER' line of the given RINEX file.
+    """
+    with open_rinex_binary(rinex_file_path) as file:
+        return __find_data_offset(file)
+
+
+def __iter_line_chunks(file: BinaryIO, position: int) -> Iterator[tuple]:
+    """
+    Reads the rest of the file in large chunks, that contain only complete lines.
+
+    :return: Iterator of tuples (chunk as numpy uint8 array, line starts, line lengths, offset of the chunk)
+    """
+    carry = b""
+    while True:
+        chunk = file.read(__CHUNK_SIZE)
+        buffer = carry + chunk
+        # only complete lines are scanned, the rest is carried over to the next chunk
+        cut = buffer.rfind(b"\n") + 1 if chunk else len(buffer)
+        if cut > 0:
+            data = np.frombuffer(buffer, dtype=np.uint8, count=cut)
+            starts, lengths = split_lines(data)
+            yield data, starts, lengths, position
+        position += cut
+        carry = buffer[cut:]
+        if not chunk:
+            break
+
+
+def __index_satellites(heads: np.ndarray, first_lines: np.ndarray, counts: np.ndarray):
+    """
+    Collects satellite names of the given ranges of lines into (sv_names, sv_pointers, sv_indices).
+    """
+    sv_pointers = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    lines = np.repeat(first_lines - sv_pointers[:-1], counts) + np.arange(sv_pointers[-1])
+    names = heads[lines].view('S{w:d}'.format(w=__SV_WIDTH)).ravel()
+    sv_names, sv_indices = np.unique(names, return_inverse=True)
+    return np.char.strip(sv_names.astype('U')), sv_pointers, sv_indices.astype(np.int64)
+
+
+def build_epoch_index(rinex_file_path: str) -> EpochIndex:
+    """
+    Builds epoch index of the given observation file in one pass.
+    The file is scanned in large chunks and only epoch lines and satellite names are decoded.
+
+    ValueError is raised if a block contains fewer lines than declared in its epoch line.
+
+    :param rinex_file_path: str.
+        Required. Path to the RINEX observation file
+    :return: EpochIndex.
+    """
+    offsets, epoch_lines, epoch_chars, heads = [], [], [], []
+    line_count = 0
+    with open_rinex_binary(rinex_file_path) as file:
+        data_offset = __find_data_offset(file)
+        for data, starts, lengths, position in __iter_line_chunks(file, data_offset):
+            is_epoch_line = (lengths > 0) & (data[starts] == __EPOCH_MARK)
+            offsets.append(starts[is_epoch_line] + position)
+            epoch_lines.append(np.flatnonzero(is_epoch_line) + line_count)
+            epoch_chars.append(gather_lines(data, starts[is_epoch_line], lengths[is_epoch_line], EPOCH_LINE_WIDTH))
+            heads.append(gather_lines(data, starts, lengths, __SV_WIDTH))
+            line_count += len(starts)
+        file_size = file.tell()
+
+    epochs, flags, sizes = decode_epoch_lines(np.concatenate(epoch_chars) if epoch_chars
+                                              else np.empty((0, EPOCH_LINE_WIDTH), dtype=np.uint8))
+    epoch_lines = np.concatenate(epoch_lines) if epoch_lines else np.empty(0, dtype=np.int64)
+    invalid_size = epoch_lines + sizes >= np.append(epoch_lines[1:], line_count)
+    if invalid_size.any():
+        raise ValueError("Block {name:s} has invalid size.".format(
+            name=datetime64_to_str(epochs[np.argmax(invalid_size)])[0]))
+
+    counts = np.where(np.isin(flags, __RECORD_FLAGS), sizes, 0)
+    sv_names, sv_pointers, sv_indices = __index_satellites(
+        np.concatenate(heads) if heads else np.empty((0, __SV_WIDTH), dtype=np.uint8), epoch_lines + 1, counts)
+    offsets = np.concatenate(offsets).astype(np.int64) if offsets else np.empty(0, dtype=np.int64)
+    return EpochIndex(file_size, data_offset, offsets, epochs, flags, sizes,
+                      sv_names, sv_pointers, sv_indices)
+
+
+def build_navigation_index(rinex_file_path: str, version: float) -> EpochIndex:
+    """
+    Builds index of all records of the given navigation file in one pass.
+    Every record is treated as an epoch with a single satellite.
+    For correction records of version 4 (STO/EOP/ION), the satellite name is the name given in the record start line.
+
+    :param rinex_file_path: str.
+        Required. Path to the RINEX navigation file
+    :param version: float.
+        Required. RINEX version of the file
+    :return: EpochIndex.
+    """
+    offsets, record_lines, sv_chars, heads = [], [], [], []
+    line_count = 0
+    with open_rinex_binary(rinex_file_path) as file:
+        data_offset = __find_data_offset(file)
+        for data, starts, lengths, position in __iter_line_chunks(file, data_offset):
+            first_chars = np.where(lengths > 0, data[starts], ord(' '))
+            if version >= 4:
+                is_record_line = first_chars == __EPOCH_MARK
+                names = gather_lines(data, starts[is_record_line] + 6, np.maximum(lengths[is_record_line] - 6, 0),
+                                     __SV_WIDTH)
+            else:
+                is_record_line = (first_chars >= ord('A')) & (first_chars <= ord('Z'))
+                names = gather_lines(data, starts[is_record_line], lengths[is_record_line], __SV_WIDTH)
+            offsets.append(starts[is_record_line] + position)
+            record_lines.append(np.flatnonzero(is_record_line) + line_count)
+            sv_chars.append(names)
+            heads.append(gather_lines(data, starts, lengths, __NAV_LINE_HEAD_WIDTH))
+            line_count += len(starts)
+        file_size = file.tell()
+
+    record_lines = np.concatenate(record_lines) if record_lines else np.empty(0, dtype=np.int64)
+    heads = np.concatenate(heads) if heads else np.empty((0, __NAV_LINE_HEAD_WIDTH), dtype=np.uint8)
+    if version >= 4 and len(record_lines) and record_lines[-1] + 1 >= line_count:
+        raise ValueError("Navigation file seems to be invalid. Last record has no epoch line")
+    # in version 4 the epoch is given in the line after the record start line
+    epoch_chars = heads[record_lines + 1 if version >= 4 else record_lines]
+    fields = [decode_decimal_fields(epoch_chars[:, start:start + width])
+              for start, width in ((4, 4), (9, 2), (12, 2), (15, 2), (18, 2), (21, 2))]
+    if any(np.isnan(field).any() for field in fields):
+        raise ValueError("Invalid epoch in navigation record")
+    epochs = fields2datetime64(*fields)
+    sizes = np.append(record_lines[1:], line_count) - record_lines - 1
+
+    names = np.concatenate(sv_chars) if sv_chars else np.empty((0, __SV_WIDTH), dtype=np.uint8)
+    sv_names, sv_pointers, sv_indices = __index_satellites(names, np.arange(len(names)),
+                                                           np.ones(len(names), dtype=np.int64))
+    offsets = np.concatenate(offsets).astype(np.int64) if offsets else np.empty(0, dtype=np.int64)
+    return EpochIndex(file_size, data_offset, offsets, epochs,
+                      np.zeros(len(epochs), dtype=np.int64), sizes, sv_names, sv_pointers, sv_indices)
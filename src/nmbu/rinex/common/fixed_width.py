@@ -0,0 +1,191 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from itertools import islice
+from typing import List, Optional
+
+import numpy as np
+
+__NEWLINE = ord('\n')
+__CARRIAGE_RETURN = ord('\r')
+__SPACE = ord(' ')
+__ZERO = ord('0')
+__DOT = ord('.')
+__MINUS = ord('-')
+__PLUS = ord('+')
+__EXPONENT = ord('E')
+__FORTRAN_EXPONENTS = np.array([ord(c) for c in 'Dd'], dtype=np.uint8)
+__POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+__POWERS_OF_TEN_FLOAT = 10.0 ** np.arange(19)
+__CHUNK_SIZE = 1 << 16  # amount of fields decoded at once, limits size of temporary arrays
+
+
+def lines_to_char_matrix(lines: List[str], width: int, count: Optional[int] = None) -> np.ndarray:
+    """
+    Converts text lines into a (n_lines, width) matrix of ASCII codes.
+    Lines are stripped of line endings, padded with spaces or truncated to the given width.
+
+    :param lines: List[str]. Lines to convert
+    :param width: int. Width of the resulting matrix
+    :param count: int. Amount of lines from the start of the list to convert. None to convert all lines
+    :return: numpy uint8 array of shape (n_lines, width)
+    """
+    count = len(lines) if count is None else count
+    buffer = "".join(line.rstrip("\r\n")[:width].ljust(width) for line in islice(lines, count)).encode("ascii")
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(count, width)
+
+
+def __decode_any_decimals(chars: np.ndarray) -> np.ndarray:
+    """
+    Decodes (n_fields, field_width) decimal fields with arbitrary position of the decimal point.
+    Sign and blank fields are handled by the caller.
+    """
+    digit = chars.astype(np.int64) - __ZERO
+    is_digit = (digit >= 0) & (digit <= 9)
+    # amount of digits to the right of every position gives the power of ten of that digit
+    digits_to_the_right = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - is_digit
+    mantissa = np.sum(np.where(is_digit, digit * __POWERS_OF_TEN[digits_to_the_right], 0), axis=1)
+    decimals = np.count_nonzero(is_digit & (np.cumsum(chars == __DOT, axis=1) > 0), axis=1)
+    return mantissa / __POWERS_OF_TEN_FLOAT[decimals]
+
+
+def __is_valid_decimal(chars: np.ndarray, is_digit: np.ndarray) -> np.ndarray:
+    """
+    Checks that every field holds a single [sign]digits[.digits] token surrounded by blanks.
+    """
+    width = chars.shape[1]
+    non_blank = chars != __SPACE
+    first = np.argmax(non_blank, axis=1)
+    last = width - 1 - np.argmax(non_blank[:, ::-1], axis=1)
+    signs = (chars == __MINUS) | (chars == __PLUS)
+    dots = chars == __DOT
+    rows = np.arange(chars.shape[0])
+    return (np.count_nonzero(non_blank, axis=1) == last - first + 1) & \
+        np.all(is_digit | dots | signs | ~non_blank, axis=1) & \
+        (np.count_nonzero(dots, axis=1) <= 1) & \
+        (np.count_nonzero(signs, axis=1) <= signs[rows, first])
+
+
+def __decode_decimal_chunk(chars: np.ndarray) -> np.ndarray:
+    width = chars.shape[1]
+    digit = chars - np.uint8(__ZERO)  # wraps around for all characters that are not digits
+    is_digit = digit < 10
+    has_digits = is_digit.any(axis=1) & __is_valid_decimal(chars, is_digit)
+    result = np.full(chars.shape[0], np.nan)
+    if not has_digits.any():
+        return result
+
+    # Fast path: all fields have the decimal point in the same column as the first non-blank field,
+    # so every column has a fixed power of ten and the mantissa is a single matrix product.
+    # Sums of integer digit weights are exact in float64, so the result is identical to float() of the text.
+    dots = chars == __DOT
+    dot_position = int(np.argmax(dots[np.argmax(has_digits)]))
+    fixed = has_digits & dots[:, dot_position] & (np.count_nonzero(dots, axis=1) == 1)
+    fraction_digits = width - 1 - dot_position
+    columns = np.arange(width)
+    exponents = np.where(columns < dot_position, dot_position - 1 - columns + fraction_digits, width - 1 - columns)
+    weights = np.where(columns == dot_position, 0.0, __POWERS_OF_TEN_FLOAT[exponents])
+    result[fixed] = ((digit * is_digit) @ weights)[fixed] / __POWERS_OF_TEN_FLOAT[fraction_digits]
+
+    other = has_digits & ~fixed
+    if other.any():
+        result[other] = __decode_any_decimals(chars[other])
+
+    np.negative(result, out=result, where=(chars == __MINUS).any(axis=1))
+    return result
+
+
+def split_lines(data: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Finds all lines in a buffer in one vectorized scan.
+
+    :param data: numpy uint8 array with the content of the buffer
+    :return: Tuple of (start offset of every line, length of every line without line ending)
+    """
+    newlines = np.flatnonzero(data == __NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+    if starts[-1] == len(data):  # buffer ends with a line break
+        starts, ends = starts[:-1], ends[:-1]
+    carriage_returns = (ends > starts) & (data[np.maximum(ends - 1, 0)] == __CARRIAGE_RETURN)
+    return starts, ends - starts - carriage_returns
+
+
+def gather_lines(data: np.ndarray, starts: np.ndarray, lengths: np.ndarray, width: int) -> np.ndarray:
+    """
+    Copies the given lines of a buffer into a (n_lines, width) matrix of ASCII codes.
+    Lines are padded with spaces or truncated to the given width.
+
+    :param data: numpy uint8 array with the content of the buffer
+    :param starts: numpy array with start offsets of the lines, as returned by split_lines
+    :param lengths: numpy array with lengths of the lines, as returned by split_lines
+    :param width: int. Width of the resulting matrix
+    :return: numpy uint8 array of shape (n_lines, width)
+    """
+    columns = np.arange(width)
+    chars = data[np.minimum(starts[:, None] + columns, len(data) - 1)]
+    chars[columns >= lengths[:, None]] = __SPACE
+    return chars
+
+
+def decode_decimal_fields(chars: np.ndarray) -> np.ndarray:
+    """
+    Decodes fixed-width decimal fields (e.g. F14.3) without going through Python strings.
+
+    The last axis of the input holds the characters of one field.
+    Blank fields and malformed fields, i.e. anything but an optional leading sign, digits
+    and a single decimal point surrounded by blanks, are decoded as NaN.
+    Result of a valid field is identical to float() of the field text, since the mantissa is accumulated
+    as an exact integer and divided by an exact power of ten only once.
+
+    :param chars: numpy uint8 array of shape (..., field_width)
+    :return: numpy float64 array of shape (...)
+    """
+    shape = chars.shape[:-1]
+    chars = chars.reshape(-1, chars.shape[-1])
+    result = np.empty(chars.shape[0], dtype=np.float64)
+    for start in range(0, chars.shape[0], __CHUNK_SIZE):
+        result[start:start + __CHUNK_SIZE] = __decode_decimal_chunk(chars[start:start + __CHUNK_SIZE])
+    return result.reshape(shape)
+
+
+def decode_digit_fields(chars: np.ndarray) -> np.ndarray:
+    """
+    Decodes single-character integer fields (e.g. LLI or SSI flags).
+    Blank or non-digit characters are decoded as -1.
+
+    :param chars: numpy uint8 array of any shape
+    :return: numpy int8 array of the same shape
+    """
+    digit = chars.astype(np.int16) - __ZERO
+    return np.where((digit >= 0) & (digit <= 9), digit, -1).astype(np.int8)
+
+
+def decode_exponent_fields(chars: np.ndarray) -> np.ndarray:
+    """
+    Decodes fixed-width floating point fields with exponent (e.g. D19.12 of navigation records)
+    in one vectorized call instead of parsing every field separately.
+
+    The last axis of the input holds the characters of one field.
+    Both E and Fortran D exponents are accepted, e.g. '-3.808789188042D-04'.
+    Blank fields are decoded as NaN, as well as fields that are not valid numbers.
+    Result is identical to float() of the field text.
+
+    :param chars: numpy uint8 array of shape (..., field_width)
+    :return: numpy float64 array of shape (...)
+    """
+    shape, width = chars.shape[:-1], chars.shape[-1]
+    chars = chars.reshape(-1, width)
+    chars = np.where(np.isin(chars, __FORTRAN_EXPONENTS), np.uint8(__EXPONENT), chars)
+    fields = chars.view('S{w:d}'.format(w=width)).reshape(-1)
+    result = np.full(len(fields), np.nan)
+    filled = fields != b' ' * width
+    try:
+        result[filled] = fields[filled].astype(np.float64)
+    except ValueError:
+        for position in np.flatnonzero(filled):
+            try:
+                result[position] = float(fields[position])
+            except ValueError:
+                pass  # not a number, stays NaN
+    return result.reshape(shape)
@@ -0,0 +1,148 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from nmbu.rinex.common import datetime64_to_str
+from nmbu.rinex.common.fixed_width import decode_decimal_fields, decode_exponent_fields, lines_to_char_matrix
+
+FIELD_WIDTH = 19  # D19.12 fields of navigation records
+FIELDS_PER_LINE = 4
+DATA_LINE_INDENT = 4  # data lines start with 4 spaces, e.g. '     7.506459951401E-07 4.497775575146E-03 ...'
+EPOCH_VALUES = 3  # amount of values after the epoch in the epoch line
+
+# 'G01 2022 09 29 10 00 00' for ephemerides, '    2022 09 29 10 00 00' for STO/EOP/ION records
+__EPOCH_COLUMNS = ((4, 8), (8, 11), (11, 14), (14, 17), (17, 20), (20, 23))
+__EPOCH_WIDTH = 23
+__EPOCH_LINE_WIDTH = __EPOCH_WIDTH + EPOCH_VALUES * FIELD_WIDTH
+__EPOCH_KEY_FORMAT = "%Y %m %d %H %M %S"
+
+
+def __decode_epochs(chars: np.ndarray) -> np.ndarray:
+    """
+    Decodes epochs of navigation epoch lines.
+
+    ValueError is raised if any epoch is not a valid date and time.
+
+    :param chars: numpy uint8 array of shape (n_lines, >=23) with epoch lines
+    :return: numpy datetime64[ns] array
+    """
+    fields = np.stack([decode_decimal_fields(chars[:, begin:end]) for begin, end in __EPOCH_COLUMNS], axis=1)
+    if np.isnan(fields).any():
+        raise ValueError("Invalid epoch in navigation record: " + str(chars[np.isnan(fields).any(axis=1)][0].tobytes()))
+    year, month, day, hour, minute, second = fields.astype(np.int64).T
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    invalid = (month < 1) | (month > 12) | (day < 1) | (days.astype('datetime64[M]') != months) | \
+              (hour > 23) | (minute > 59) | (second > 60)
+    if invalid.any():
+        raise ValueError("Invalid epoch in navigation record: " + str(chars[invalid][0].tobytes()))
+    return days.astype('datetime64[ns]') + ((hour * 60 + minute) * 60 + second) * np.timedelta64(1_000_000_000, 'ns')
+
+
+def read_epoch_lines(lines: List[str], count: Optional[int] = None) -> (np.ndarray, np.ndarray):
+    """
+    Decodes epoch lines of many navigation records at once.
+
+    :param lines: List[str]. Epoch lines, e.g. 'C11 2022 09 29 10 00 00-3.808789188042E-04 2.210320815266E-11...'
+    :param count: int. Amount of lines from the start of the list to decode. None to decode all lines
+    :return: Tuple of (datetime64[ns] epochs, float64 array of shape (n_lines, 3) with values after the epoch)
+    """
+    chars = lines_to_char_matrix(lines, __EPOCH_LINE_WIDTH, count)
+    values = chars[:, __EPOCH_WIDTH:].reshape(-1, EPOCH_VALUES, FIELD_WIDTH)
+    return __decode_epochs(chars), decode_exponent_fields(values)
+
+
+def read_epoch_lines_text(lines: List[str], count: Optional[int] = None) -> (np.ndarray, np.ndarray):
+    """
+    Decodes epoch lines of many navigation records at once, keeping the values after the epoch as text,
+    e.g. time system identifiers of STO records.
+
+    :param lines: List[str]. Epoch lines, e.g. '    2022 09 29 10 00 00 GAUT  ...'
+    :param count: int. Amount of lines from the start of the list to decode. None to decode all lines
+    :return: Tuple of (datetime64[ns] epochs, str array of shape (n_lines, 3) with stripped values after the epoch)
+    """
+    chars = lines_to_char_matrix(lines, __EPOCH_LINE_WIDTH, count)
+    values = np.ascontiguousarray(chars[:, __EPOCH_WIDTH:]).view('S{w:d}'.format(w=FIELD_WIDTH))
+    return __decode_epochs(chars), np.char.strip(values).astype(str)
+
+
+def read_data_lines(lines: List[str], block_size: int, indent: int = DATA_LINE_INDENT) -> np.ndarray:
+    """
+    Decodes data lines of many navigation records with the same amount of lines at once.
+
+    :param lines: List[str]. Data lines of all records one after another
+    :param block_size: int. Amount of data lines of every record
+    :param indent: int. Amount of leading characters to skip in every line.
+        0 for lines that are already normalized, see common.normalize_data_string
+    :return: float64 array of shape (n_records, block_size * 4) with all fields of the data lines
+    """
+    chars = lines_to_char_matrix(lines, indent + FIELDS_PER_LINE * FIELD_WIDTH)[:, indent:]
+    return decode_exponent_fields(chars.reshape(-1, block_size * FIELDS_PER_LINE, FIELD_WIDTH))
+
+
+def read_epoch_line(line: str) -> (str, List[float]):
+    """
+    Decodes epoch line of a single navigation record.
+
+    :param line: str. Epoch line, e.g. 'C11 2022 09 29 10 00 00-3.808789188042E-04 2.210320815266E-11...'
+    :return: Tuple of (timestamp in ISO format, list with 3 values after the epoch)
+    """
+    epochs, values = read_epoch_lines([line])
+    return datetime64_to_str(epochs)[0], values[0].tolist()
+
+
+def read_epoch_line_text(line: str) -> (str, List[str]):
+    """
+    Decodes epoch line of a single navigation record, keeping the values after the epoch as text.
+
+    :param line: str. Epoch line, e.g. '    2022 09 29 10 00 00 GAUT  ...'
+    :return: Tuple of (timestamp in ISO format, list with 3 stripped values after the epoch)
+    """
+    epochs, values = read_epoch_lines_text([line])
+    return datetime64_to_str(epochs)[0], values[0].tolist()
+
+
+def epoch_line_key(line: str) -> str:
+    """
+    Returns the epoch of a navigation epoch line as text that sorts in chronological order,
+    so records can be filtered by time without decoding any numbers.
+
+    :param line: str. Epoch line, e.g. 'C11 2022 09 29 10 00 00-3.808789188042E-04...'
+    :return: str. Epoch fields with blanks replaced by zeros, e.g. '2022009029010000000'
+    """
+    return line[4:__EPOCH_WIDTH].replace(' ', '0')
+
+
+def epoch_period_keys(start_epoch: Optional[datetime], end_epoch: Optional[datetime]) -> Optional[Tuple[str, str]]:
+    """
+    Converts epoch time filter to the first and the last accepted epoch line key, see epoch_line_key.
+    Navigation epochs are full seconds, so fractions of seconds are rounded into the period.
+
+    :param start_epoch: datetime. Start of the period. If used alone, only records of exactly this epoch are accepted
+    :param end_epoch: datetime. End of the period
+    :return: Tuple of (first key, last key) or None if no time filter is given.
+        No key matches if the first key is later than the last one
+    """
+    if start_epoch is None:
+        return None
+    first = start_epoch.replace(microsecond=0)
+    if first < start_epoch:
+        first += timedelta(seconds=1)
+    last = (start_epoch if end_epoch is None else end_epoch).replace(microsecond=0)
+    return (first.strftime(__EPOCH_KEY_FORMAT).replace(' ', '0'),
+            last.strftime(__EPOCH_KEY_FORMAT).replace(' ', '0'))
+
+
+def epoch_line_in_period(line: str, period: Optional[Tuple[str, str]]) -> bool:
+    """
+    Checks that the epoch of a navigation epoch line is within the period.
+
+    :param line: str. Epoch line, e.g. 'C11 2022 09 29 10 00 00-3.808789188042E-04...'
+    :param period: Tuple of (first key, last key), see epoch_period_keys. None if there is no time filter
+    :return: True if the record should be read
+    """
+    return period is None or period[0] <= epoch_line_key(line) <= period[1]
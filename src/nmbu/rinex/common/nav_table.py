@@ -0,0 +1,226 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from nmbu.rinex.common import datetime64_to_str
+from nmbu.rinex.common.nav_decoder import FIELD_WIDTH, read_data_lines, read_epoch_lines, read_epoch_lines_text
+
+SATELLITES = "satellites"  # target of ephemeris tables, all other tables hold corrections
+
+
+class NavTable:
+    """
+    Columnar storage for navigation records of a single message type, e.g. GPS LNAV ephemerides.
+
+    All records are stored in one numpy structured array with fields:
+
+    - sv: satellite name, e.g. 'G01'
+    - epoch: datetime64[ns] epoch of the record
+    - values from the epoch line, e.g. clock_bias, clock_drift, clock_drift_rate
+    - values from the data lines, e.g. IODE, Crs, Delta_n, ... as defined by the data class
+
+    Single records are still available as objects of the data class (e.g. GPSNavRecordOrbitData),
+    which are built on access, see row.
+
+    Examples
+    --------
+
+    >>> table = nav.tables['GPS_LNAV']
+    >>> table.records['sqrt_A']  # sqrt_A of all GPS LNAV ephemerides
+    >>> table.records[table.records['sv'] == 'G01']['epoch']  # epochs of all ephemerides of G01
+    >>> table.row(0).Crs
+    """
+    def __init__(self, name: str, target: str, data_class, epoch_attributes: Tuple[str, ...], records: np.ndarray):
+        self.name: str = name
+        self.target: str = target
+        self.data_class = data_class
+        self.epoch_attributes: Tuple[str, ...] = tuple(epoch_attributes)
+        self.records: np.ndarray = records
+        self.__sv_rows: Optional[Dict[str, np.ndarray]] = None
+
+    @property
+    def fields(self) -> List[str]:
+        """
+        Names of the fields of the data class, i.e. values from the data lines.
+        """
+        return list(self.records.dtype.names[2 + len(self.epoch_attributes):])
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self):
+        return "{n:s}: {r:d} records of {s:d} satellites".format(
+            n=self.name, r=len(self.records), s=len(self.sv_rows_by_name()))
+
+    def sv_rows_by_name(self) -> Dict[str, np.ndarray]:
+        """
+        Returns row indices of every satellite, sorted by epoch.
+        Satellites are listed in the order of their first record in the file.
+        The result is computed once and cached.
+        """
+        if self.__sv_rows is None:
+            order = np.lexsort((self.records['epoch'], self.records['sv']))
+            names, first_rows, counts = np.unique(self.records['sv'][order], return_index=True, return_counts=True)
+            rows = np.split(order, np.cumsum(counts)[:-1]) if len(order) else []
+            by_name = {str(name): sv_rows for name, sv_rows in zip(names, rows)}
+            self.__sv_rows = {name: by_name[name] for name in
+                              sorted(by_name, key=lambda name: int(by_name[name].min()))}
+        return self.__sv_rows
+
+    def sv_rows(self, sv: str) -> np.ndarray:
+        """
+        Returns row indices of the given satellite, sorted by epoch. Empty if the satellite has no records.
+        """
+        return self.sv_rows_by_name().get(sv, np.empty(0, dtype=np.intp))
+
+    def row(self, index: int):
+        """
+        Builds the data object of a single record, in the same form as it was stored
+        before the columnar tables were introduced: data class with values of the data lines,
+        the timestamp in ISO format and the values from the epoch line.
+        """
+        values = self.records[index].item()
+        data = self.data_class.__new__(self.data_class)
+        n_epoch = len(self.epoch_attributes)
+        data.__dict__.update(zip(self.fields, values[2 + n_epoch:]))
+        data.timestamp = datetime64_to_str(self.records['epoch'][index])[0]
+        data.__dict__.update(zip(self.epoch_attributes, values[2:2 + n_epoch]))
+        return data
+
+
+class NavTableBuilder:
+    """
+    Collects lines of navigation records of a single message type
+    and decodes all of them into a NavTable in one go, see common.nav_decoder.
+
+    Layout of the records is defined by the record class (e.g. GPSLNAVRecord):
+
+    - block_size: amount of data lines after the epoch line
+    - epoch_line_format: values after the epoch are decoded as text if they are declared as strings (STO records)
+    - derive_columns: optional static method that computes additional columns from the decoded ones,
+      e.g. TGD of Galileo records. Receives and returns a dict {field name: numpy array}
+    """
+    def __init__(self, name: str, target: str, record_class, data_class, epoch_attributes: Tuple[str, ...]):
+        """
+        :param name: str. Name of the table, e.g. 'GPS_LNAV'
+        :param target: str. 'satellites' for ephemeris tables, otherwise the correction type, e.g. 'STO'
+        :param record_class: class that describes the layout of the records, e.g. GPSLNAVRecord
+        :param data_class: class of the data objects, e.g. GPSLNAVRecordOrbitData
+        :param epoch_attributes: Tuple[str]. Names of the values after the epoch in the epoch line,
+            e.g. ('clock_bias', 'clock_drift', 'clock_drift_rate')
+        """
+        self.name: str = name
+        self.__target = target
+        self.__record_class = record_class
+        self.__data_class = data_class
+        self.__epoch_attributes = tuple(epoch_attributes)
+        self.__svs: List[str] = []
+        self.__epoch_lines: List[str] = []
+        self.__data_lines: List[str] = []
+
+    def add_block(self, sv: str, epoch_line: str, data_lines: List[str]) -> None:
+        """
+        Adds lines of a single record. Lines are decoded only in build.
+
+        :param sv: str. Satellite name
+        :param epoch_line: str. Epoch line of the record
+        :param data_lines: List[str]. Data lines of the record as they are in the file, i.e. with 4 leading spaces
+        """
+        self.__svs.append(sv)
+        self.__epoch_lines.append(epoch_line)
+        self.__data_lines.extend(data_lines)
+
+    def build(self) -> NavTable:
+        fields = list(self.__data_class().__dict__.keys())
+        epoch_format = self.__record_class.epoch_line_format
+        text_values = epoch_format[len(epoch_format) - 1].kind == 'S'
+        if text_values:
+            epochs, epoch_values = read_epoch_lines_text(self.__epoch_lines)
+        else:
+            epochs, epoch_values = read_epoch_lines(self.__epoch_lines)
+        data_values = read_data_lines(self.__data_lines, self.__record_class.block_size)[:, :len(fields)]
+
+        columns = {name: data_values[:, position] for position, name in enumerate(fields)}
+        if hasattr(self.__record_class, "derive_columns") and len(epochs):
+            columns.update(self.__record_class.derive_columns(columns))
+
+        record_format = np.dtype(
+            [('sv', 'U3'), ('epoch', 'datetime64[ns]')] +
+            [(name, 'U{w:d}'.format(w=FIELD_WIDTH) if text_values else np.float64)
+             for name in self.__epoch_attributes] +
+            [(name, np.float64) for name in columns])
+        records = np.empty(len(epochs), dtype=record_format)
+        records['sv'] = self.__svs
+        records['epoch'] = epochs
+        for position, name in enumerate(self.__epoch_attributes):
+            records[name] = epoch_values[:, position]
+        for name, values in columns.items():
+            records[name] = values
+        return NavTable(self.name, self.__target, self.__data_class, self.__epoch_attributes, records)
+
+
+class NavEpochsView(Mapping):
+    """
+    Read-only view of all records of a single satellite: {timestamp: data object}.
+    Records may come from several tables, e.g. LNAV and CNAV ephemerides of the same GPS satellite.
+    If several records share the timestamp, the one read last is returned.
+    """
+    def __init__(self, parts: List[Tuple[NavTable, np.ndarray]]):
+        self._parts = parts
+
+    def __getitem__(self, timestamp) -> object:
+        try:
+            key = np.datetime64(timestamp, 'ns')
+        except (ValueError, TypeError):
+            raise KeyError(timestamp)
+        for table, rows in reversed(self._parts):
+            position = np.searchsorted(table.records['epoch'][rows], key, side='right') - 1
+            if position >= 0 and table.records['epoch'][rows[position]] == key:
+                return table.row(rows[position])
+        raise KeyError(timestamp)
+
+    def epochs(self) -> np.ndarray:
+        """
+        Returns sorted unique epochs of all records as datetime64[ns].
+        """
+        return np.unique(np.concatenate([table.records['epoch'][rows] for table, rows in self._parts]))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(datetime64_to_str(self.epochs()))
+
+    def __len__(self) -> int:
+        return len(self.epochs())
+
+    def __repr__(self):
+        return str(dict(self.items()))
+
+
+class NavSatellitesView(Mapping):
+    """
+    Read-only view of navigation tables in the form {sv: {timestamp: data object}}.
+    """
+    def __init__(self, tables: List[NavTable]):
+        self._tables = tables
+
+    def __getitem__(self, sv: str) -> NavEpochsView:
+        parts = [(table, table.sv_rows(sv)) for table in self._tables]
+        parts = [(table, rows) for table, rows in parts if len(rows)]
+        if not parts:
+            raise KeyError(sv)
+        return NavEpochsView(parts)
+
+    def __contains__(self, sv) -> bool:
+        return isinstance(sv, str) and any(sv in table.sv_rows_by_name() for table in self._tables)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(dict.fromkeys(sv for table in self._tables for sv in table.sv_rows_by_name()))
+
+    def __len__(self) -> int:
+        return len(dict.fromkeys(sv for table in self._tables for sv in table.sv_rows_by_name()))
+
+    def __repr__(self):
+        return str({sv: dict(records) for sv, records in self.items()})
@@ -0,0 +1,201 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from datetime import datetime
+from typing import Dict, IO, List, Optional
+
+import numpy as np
+
+from nmbu.rinex.common import datetime64_to_str, fields2datetime64
+from nmbu.rinex.common.fixed_width import decode_decimal_fields, gather_lines, split_lines
+from nmbu.rinex.common.observation_decoder import SV_WIDTH, ObservationDecoder
+from nmbu.rinex.common.observation_store import ObservationStoreBuilder
+
+EPOCH_LINE_WIDTH = 35
+__EPOCH_MARK = ord('>')
+__CHUNK_CHARS = 1 << 22  # amount of characters gathered and decoded at once, limits size of temporary arrays
+__STREAM_CHUNK_SIZE = 1 << 24  # amount of characters read from a file at once in read_observation_stream
+
+
+def decode_epoch_lines(chars: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Decodes all epoch lines at once.
+
+    Expects lines to be in format:
+
+    >>> > 2022 09 29 11 00  0.0000000  0 25
+
+    ValueError is raised if any of the lines contains invalid values.
+
+    :param chars: numpy uint8 array of shape (n_lines, EPOCH_LINE_WIDTH) with ASCII codes of epoch lines
+    :return: Tuple of (epochs as datetime64[ns], epoch flags, amount of lines in every block)
+    """
+    fields = {
+        "year": decode_decimal_fields(chars[:, 2:6]),
+        "month": decode_decimal_fields(chars[:, 7:9]),
+        "day": decode_decimal_fields(chars[:, 10:12]),
+        "hour": decode_decimal_fields(chars[:, 13:15]),
+        "minute": decode_decimal_fields(chars[:, 16:18]),
+        "seconds": decode_decimal_fields(chars[:, 19:29]),
+        "epoch flag": decode_decimal_fields(chars[:, 31:32]),
+        "block size": decode_decimal_fields(chars[:, 32:35]),
+    }
+    for name, values in fields.items():
+        invalid = np.isnan(values)
+        if invalid.any():
+            line = chars[np.argmax(invalid)].tobytes().decode("ascii").rstrip()
+            raise ValueError("Invalid {name:s} value in epoch line: {line:s}".format(name=name, line=line))
+
+    epochs = fields2datetime64(fields["year"], fields["month"], fields["day"],
+                               fields["hour"], fields["minute"], fields["seconds"])
+    return epochs, fields["epoch flag"].astype(np.int64), fields["block size"].astype(np.int64)
+
+
+def read_observation_buffer(
+        buffer: bytes,
+        decoders: Dict[str, ObservationDecoder],
+        observations: ObservationStoreBuilder,
+        start_epoch: Optional[datetime],
+        end_epoch: Optional[datetime],
+        sv: Optional[List[str]] = None,
+        verbose: bool = False
+) -> None:
+    """
+    Reads all observation records from the data section of an observation file at once.
+
+    All epoch lines and satellite lines are found in a single vectorized scan of the buffer,
+    then all satellite lines of a GNSS are decoded in batches, independent of the epoch they belong to.
+    Same rules as for reading line by line apply: blocks with epoch flag other than 0
+    and blocks outside the epoch time filter are skipped.
+    Satellite lines that do not match the satellite filter are dropped before any decoding.
+
+    ValueError is raised if a block contains fewer lines than declared in its epoch line.
+
+    :param buffer: bytes.
+        Required. Data section of the observation file, i.e. everything after the 'END OF HEADER' line.
+        Buffer is expected to start at the beginning of a line.
+    :param decoders: Dict[str, ObservationDecoder].
+        Required. Column plan as created by common.observation_decoder.build_decoders.
+        Record lines of GNSS without a decoder are skipped, only selected obs types are decoded.
+    :param observations: ObservationStoreBuilder.
+        Required. Builder that will be updated with all observations from the buffer.
+    :param start_epoch: datetime.
+        Optional. Epoch time filter. Specifies start of the period that should be included in the result.
+        If used together with end_epoch, all blocks within the given timeframe will be read.
+        If used alone, the result will contain at most one block - the one that matches provided timestamp exactly.
+    :param end_epoch: datetime.
+        Optional. Epoch time filter. Specifies start of the period that should be included in the result.
+        When used, must be a date after the start_epoch date.
+    :param sv: List[str].
+        Optional. Satellite filter. Specifies satellites (e.g. 'G05' or 'E11') that will be included into the result.
+        All other satellites will be ignored.
+    :param verbose: bool.
+        Optional. Flag to control debug output from the script.
+        Set to True if debug output should be printed to console.
+    :return: Nothing
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if len(data) == 0:
+        return
+    starts, lengths = split_lines(data)
+    epoch_lines = np.flatnonzero((lengths > 0) & (data[starts] == __EPOCH_MARK))
+    epochs, flags, block_sizes = decode_epoch_lines(
+        gather_lines(data, starts[epoch_lines], lengths[epoch_lines], EPOCH_LINE_WIDTH))
+
+    next_epoch_lines = np.append(epoch_lines[1:], len(starts))
+    invalid_size = epoch_lines + block_sizes >= next_epoch_lines
+    if invalid_size.any():
+        raise ValueError("Block {name:s} has invalid size.".format(
+            name=datetime64_to_str(epochs[np.argmax(invalid_size)])[0]))
+
+    selected = flags == 0
+    if start_epoch is not None:
+        if end_epoch is None:
+            selected &= epochs == np.datetime64(start_epoch, 'ns')
+        else:
+            selected &= (epochs >= np.datetime64(start_epoch, 'ns')) & (epochs <= np.datetime64(end_epoch, 'ns'))
+    if verbose:
+        print("Found {n:d} blocks, {s:d} of them will be read".format(n=len(epochs), s=np.count_nonzero(selected)))
+
+    epoch_indices = observations.add_epochs(epochs[selected])
+    counts = block_sizes[selected]
+    block_starts = np.cumsum(counts) - counts
+    line_epoch_indices = np.repeat(epoch_indices, counts)
+    line_positions = np.arange(counts.sum()) - np.repeat(block_starts, counts)  # position in the block
+    satellite_lines = np.repeat(epoch_lines[selected] + 1, counts) + line_positions
+    if sv is not None:
+        names = gather_lines(data, starts[satellite_lines], lengths[satellite_lines], SV_WIDTH)
+        included = np.isin(names.view('S%d' % SV_WIDTH).reshape(-1), np.array(sv, dtype='S%d' % SV_WIDTH))
+        satellite_lines = satellite_lines[included]
+        line_epoch_indices = line_epoch_indices[included]
+        line_positions = line_positions[included]
+    line_systems = data[starts[satellite_lines]]
+
+    for system_code in np.unique(line_systems):
+        system = chr(system_code)
+        decoder = decoders.get(system)
+        if decoder is None:
+            if verbose:
+                print("Skipped GNSS {g:s}, since it is excluded by filters or has no obs types in header".format(g=system))
+            continue
+
+        system_lines = np.flatnonzero(line_systems == system_code)
+        chunk_size = max(1, __CHUNK_CHARS // decoder.width)
+        for chunk_start in range(0, len(system_lines), chunk_size):
+            chunk = system_lines[chunk_start:chunk_start + chunk_size]
+            lines = satellite_lines[chunk]
+            names, values, lli, ssi = decoder.decode(gather_lines(data, starts[lines], lengths[lines], decoder.width))
+            observations.add_rows(
+                gnss=system,
+                obs_types=decoder.selected_obs_types,
+                epoch_index=line_epoch_indices[chunk],
+                sv=names,
+                values=values,
+                lli=lli,
+                ssi=ssi,
+                order=line_positions[chunk]
+            )
+
+
+def read_observation_stream(
+        file: IO,
+        decoders: Dict[str, ObservationDecoder],
+        observations: ObservationStoreBuilder,
+        start_epoch: Optional[datetime],
+        end_epoch: Optional[datetime],
+        sv: Optional[List[str]] = None,
+        verbose: bool = False,
+        chunk_size: int = __STREAM_CHUNK_SIZE
+) -> None:
+    """
+    Reads all observation records from the rest of the file in chunks of complete blocks.
+
+    Every chunk is cut before its last epoch line and decoded with read_observation_buffer,
+    the incomplete block is carried over to the next chunk. Result is the same as decoding the whole data section
+    at once, but the file (e.g. a decompressed stream, see common.compression) is never held in memory as a whole.
+
+    :param file: IO. Text or binary file positioned at the beginning of a line in the data section
+    :param decoders: Dict[str, ObservationDecoder]. See read_observation_buffer
+    :param observations: ObservationStoreBuilder. See read_observation_buffer
+    :param start_epoch: datetime. Optional. See read_observation_buffer
+    :param end_epoch: datetime. Optional. See read_observation_buffer
+    :param sv: List[str]. Optional. See read_observation_buffer
+    :param verbose: bool. Optional. See read_observation_buffer
+    :param chunk_size: int. Optional. Amount of characters read from the file at once
+    :return: Nothing
+    """
+    carry = b""
+    while True:
+        data = file.read(chunk_size)
+        if isinstance(data, str):
+            data = data.encode("latin-1")
+        if not data:
+            break
+        buffer = carry + data
+        cut = buffer.rfind(b"\n>") + 1
+        if cut == 0:
+            carry = buffer
+            continue
+        carry = buffer[cut:]
+        read_observation_buffer(buffer[:cut], decoders, observations, start_epoch, end_epoch, sv, verbose)
+    read_observation_buffer(carry, decoders, observations, start_epoch, end_epoch, sv, verbose)
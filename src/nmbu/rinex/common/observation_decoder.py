@@ -0,0 +1,197 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import re
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from nmbu.rinex.common.fixed_width import decode_decimal_fields, decode_digit_fields, lines_to_char_matrix
+
+SV_WIDTH = 3  # satellite name, e.g. G01
+OBSERVATION_WIDTH = 16  # F14.3 value + LLI + SSI
+VALUE_WIDTH = 14
+
+
+class ObservationDecoder:
+    """
+    Fixed-width decoder for observation record lines of a single GNSS.
+
+    Column layout is compiled once from the obs types listed in the header (SYS / # / OBS TYPES).
+    Each record line is expected to be in format:
+
+    >>> G01  21419831.220 7 112561957.965 8 ...
+
+    i.e. 3 characters for the satellite name, followed by 16 characters per obs type:
+    14 characters for the value, 1 character for LLI and 1 character for SSI.
+    Blank values are decoded as NaN, blank LLI and SSI are decoded as -1.
+
+    Only the columns of the selected obs types are decoded, all other fields are skipped.
+    Lines are read only up to the last selected column.
+
+    Examples
+    --------
+
+    >>> decoder = ObservationDecoder(header.obs_types['G'])
+    >>> sv, values, lli, ssi = decoder.decode_lines(lines)
+
+    >>> decoder = ObservationDecoder(header.obs_types['G'], ['C1C', 'L1C'])
+    >>> sv, values, lli, ssi = decoder.decode_lines(lines)  # values has shape (n_lines, 2)
+    """
+    def __init__(self, obs_types: List[str], selected_obs_types: Optional[List[str]] = None):
+        self.obs_types: List[str] = list(obs_types)
+        self.selected_obs_types: List[str] = list(obs_types) if selected_obs_types is None \
+            else [name for name in self.obs_types if name in selected_obs_types]
+        self.columns: np.ndarray = np.array([self.obs_types.index(name) for name in self.selected_obs_types],
+                                            dtype=np.intp)
+        self.__n_columns: int = int(self.columns.max()) + 1 if len(self.columns) else 0
+        self.__contiguous: bool = np.array_equal(self.columns, np.arange(self.__n_columns))
+        self.width: int = SV_WIDTH + OBSERVATION_WIDTH * self.__n_columns
+
+    def decode(self, chars: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        Decodes padded record lines.
+
+        :param chars: numpy uint8 array of shape (n_lines, width) with ASCII codes of the record lines
+        :return: Tuple of
+            * satellite names, shape (n_lines,)
+            * values, float64 array of shape (n_lines, n_selected_obs_types)
+            * LLI, int8 array of shape (n_lines, n_selected_obs_types)
+            * SSI, int8 array of shape (n_lines, n_selected_obs_types)
+        """
+        n_lines = chars.shape[0]
+        sv = np.ascontiguousarray(chars[:, :SV_WIDTH]).view('S%d' % SV_WIDTH).reshape(n_lines).astype('U3')
+        fields = chars[:, SV_WIDTH:self.width].reshape(n_lines, self.__n_columns, OBSERVATION_WIDTH)
+        if not self.__contiguous:
+            fields = fields[:, self.columns]
+        values = decode_decimal_fields(fields[:, :, :VALUE_WIDTH])
+        lli = decode_digit_fields(fields[:, :, VALUE_WIDTH])
+        ssi = decode_digit_fields(fields[:, :, VALUE_WIDTH + 1])
+        return sv, values, lli, ssi
+
+    def decode_lines(self, lines: List[str], count: Optional[int] = None) \
+            -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        Decodes record lines given as strings. See decode.
+        If count is given, only the first count lines of the list are decoded.
+        """
+        return self.decode(lines_to_char_matrix(lines, self.width, count))
+
+
+class LineBuckets:
+    """
+    Per-GNSS buffers for the record lines of a single observation block.
+
+    Lines are distributed by their first character in one pass, so no sorting of the block is needed.
+    Position of every line in the block is kept, i.e. the order in which the receiver listed the satellites.
+    Buffers are reused from block to block: lines are written over the entries of the previous block
+    and lists only grow when a block has more lines of a GNSS than any block before.
+
+    Examples
+    --------
+
+    >>> buckets = LineBuckets()
+    >>> buckets.clear()
+    >>> for position, line in enumerate(block_lines):
+    ...     buckets.add(line, position)
+    >>> for system, lines, positions, count in buckets.items():
+    ...     sv, values, lli, ssi = decoders[system].decode_lines(lines, count)
+    """
+    def __init__(self):
+        self.__lines: Dict[str, List[str]] = {}
+        self.__positions: Dict[str, List[int]] = {}
+        self.__counts: Dict[str, int] = {}
+
+    def clear(self) -> None:
+        """
+        Empties all buckets, keeping the allocated buffers.
+        """
+        for system in self.__counts:
+            self.__counts[system] = 0
+
+    def add(self, line: str, position: int) -> None:
+        """
+        Adds a record line to the bucket of its GNSS.
+        """
+        system = line[0]
+        count = self.__counts.get(system)
+        if count is None:
+            self.__lines[system], self.__positions[system], count = [], [], 0
+        lines = self.__lines[system]
+        if count < len(lines):
+            lines[count] = line
+            self.__positions[system][count] = position
+        else:
+            lines.append(line)
+            self.__positions[system].append(position)
+        self.__counts[system] = count + 1
+
+    def items(self) -> Iterator[Tuple[str, List[str], np.ndarray, int]]:
+        """
+        Iterates through non-empty buckets.
+        Only the first `count` entries of the lines list belong to the current block.
+
+        :return: Iterator of tuples (GNSS, lines, positions of the lines in the block, count)
+        """
+        for system, count in self.__counts.items():
+            if count > 0:
+                yield system, self.__lines[system], np.array(self.__positions[system][:count], dtype=np.int16), count
+
+
+def select_obs_types(system_obs_types: List[str], obs_types: Union[str, List[str], None]) -> List[str]:
+    """
+    Applies obs types filter to the obs types of a single GNSS, preserving header order.
+
+    :param system_obs_types: List[str]. Obs types of the GNSS as listed in the header
+    :param obs_types: str or List[str]. Regex or list of obs types to include. None to include all
+    :return: List[str]. Selected obs types
+    """
+    if obs_types is None:
+        return list(system_obs_types)
+    if isinstance(obs_types, str):
+        return list(filter(re.compile(obs_types).match, system_obs_types))
+    return [name for name in system_obs_types if name in obs_types]
+
+
+def build_decoders(
+        header_obs_types: Dict[str, List[str]],
+        gnss: Optional[List[str]],
+        obs_types: Union[str, List[str], None],
+        verbose: bool = False
+) -> Dict[str, ObservationDecoder]:
+    """
+    Resolves GNSS and obs types filters once per file into a column plan:
+    a decoder for every GNSS that should be read, that decodes only the selected obs types.
+    GNSS excluded by the filters have no decoder, so their record lines are skipped.
+
+    :param header_obs_types: Dict[str, List[str]].
+        Required. Obs types per GNSS as read from the header.
+    :param gnss: List[str].
+        Optional. GNSS filter. Specifies GNSS types (e.g. 'G' or 'E') that will be included into the result.
+    :param obs_types: str or List[str].
+        Optional. Observation types filter.
+        If a single string is provided, it is treated as regex and used to filter obs types for all satellites.
+        If a list of strings is provided, then only that list is used to filter obs types.
+        If a GNSS does not have any obs types from that list, then that GNSS is not included in the result.
+    :param verbose: bool.
+        Optional. Flag to control debug output from the script.
+        Set to True if debug output should be printed to console.
+    :return: Dict[str, ObservationDecoder]. Decoders for every GNSS that should be read
+    """
+    decoders = {}
+    for system, system_obs_types in header_obs_types.items():
+        if gnss is not None and system not in gnss:
+            if verbose:
+                print("Skipped GNSS {g:s} due to GNSS limitation".format(g=system))
+            continue
+        selected_obs_types = select_obs_types(system_obs_types, obs_types)
+        if len(selected_obs_types) == 0:
+            if verbose:
+                print("Skipped GNSS {g:s} due to OBS TYPES limitation".format(g=system))
+            continue
+        if verbose:
+            print("For GNSS '{gnss:s}' only following obs types are included: {types:s}".format(
+                gnss=system,
+                types=str(selected_obs_types)))
+        decoders[system] = ObservationDecoder(system_obs_types, selected_obs_types)
+    return decoders
@@ -0,0 +1,140 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional
+
+from nmbu.rinex.common.compression import open_rinex_binary
+from nmbu.rinex.common.observation_bulk import read_observation_buffer
+from nmbu.rinex.common.observation_decoder import ObservationDecoder
+from nmbu.rinex.common.observation_store import ObservationStoreBuilder
+
+MIN_BYTES_PER_WORKER = 1 << 22  # smaller parts are not worth the cost of starting a process
+__SEARCH_WINDOW = 1 << 16
+
+
+def __find_next_epoch(file: BinaryIO, position: int, end: int) -> int:
+    """
+    Finds the start of the first epoch line at or after the given position.
+
+    :return: offset of the epoch line or end, if there are no more epoch lines in the range
+    """
+    file.seek(max(position - 1, 0))
+    previous = file.read(1) if position > 0 else b"\n"
+    while position < end:
+        window = file.read(min(__SEARCH_WINDOW, end - position))
+        if not window:
+            break
+        lookup = previous + window
+        found = lookup.find(b"\n>")
+        if found >= 0:
+            return position - 1 + found + 1
+        position += len(window)
+        previous = window[-1:]
+    return end
+
+
+def split_at_epochs(rinex_file_path: str, begin: int, end: int, parts: int) -> List[int]:
+    """
+    Splits the byte range of the data section into parts of similar size, that start at epoch lines.
+
+    :param rinex_file_path: str. Path to the RINEX observation file
+    :param begin: int. Start of the range, expected to be at the start of an epoch line
+    :param end: int. End of the range
+    :param parts: int. Desired amount of parts
+    :return: List of boundaries [begin, ..., end]. Contains fewer parts if the range has too few epochs
+    """
+    boundaries = [begin]
+    with open_rinex_binary(rinex_file_path) as file:
+        for part in range(1, parts):
+            boundary = __find_next_epoch(file, begin + (end - begin) * part // parts, end)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < end:
+        boundaries.append(end)
+    return boundaries
+
+
+def __read_part(
+        rinex_file_path: str,
+        begin: int,
+        end: int,
+        decoders: Dict[str, ObservationDecoder],
+        start_epoch: Optional[datetime],
+        end_epoch: Optional[datetime],
+        sv: Optional[List[str]]
+) -> ObservationStoreBuilder:
+    """
+    Reads a single part of the data section. Executed in a worker process.
+    """
+    with open_rinex_binary(rinex_file_path) as file:
+        file.seek(begin)
+        data = file.read(end - begin)
+    observations = ObservationStoreBuilder()
+    read_observation_buffer(data, decoders, observations, start_epoch, end_epoch, sv)
+    return observations
+
+
+def read_observation_file_parallel(
+        rinex_file_path: str,
+        begin: int,
+        end: int,
+        decoders: Dict[str, ObservationDecoder],
+        observations: ObservationStoreBuilder,
+        start_epoch: Optional[datetime],
+        end_epoch: Optional[datetime],
+        workers: int,
+        verbose: bool = False,
+        min_bytes_per_worker: int = MIN_BYTES_PER_WORKER,
+        sv: Optional[List[str]] = None
+) -> None:
+    """
+    Reads the given byte range of the data section of an observation file in a pool of processes.
+
+    The range is split at epoch lines into parts, that are decoded independently
+    with common.observation_bulk.read_observation_buffer.
+    Partial results are merged in file order, so the result is identical to reading the range at once.
+    If the range is too small to be split, it is read in the current process.
+
+    :param rinex_file_path: str.
+        Required. Path to the RINEX observation file
+    :param begin: int.
+        Required. Start of the range, expected to be at the start of the data section or of an epoch line
+    :param end: int.
+        Required. End of the range
+    :param decoders: Dict[str, ObservationDecoder].
+        Required. Column plan as created by common.observation_decoder.build_decoders.
+    :param observations: ObservationStoreBuilder.
+        Required. Builder that will be updated with all observations from the range.
+    :param start_epoch: datetime.
+        Optional. Epoch time filter. See read_observation_buffer
+    :param end_epoch: datetime.
+        Optional. Epoch time filter. See read_observation_buffer
+    :param workers: int.
+        Required. Maximal amount of worker processes
+    :param verbose: bool.
+        Optional. Flag to control debug output from the script.
+        Set to True if debug output should be printed to console.
+    :param min_bytes_per_worker: int.
+        Optional. Minimal size of a part that is given to a separate process
+    :param sv: List[str].
+        Optional. Satellite filter. See read_observation_buffer
+    :return: Nothing
+    """
+    parts = max(1, min(workers, (end - begin) // max(min_bytes_per_worker, 1)))
+    boundaries = split_at_epochs(rinex_file_path, begin, end, parts) if parts > 1 else [begin, end]
+    if len(boundaries) <= 2:
+        if verbose:
+            print("Reading {n:d} bytes in a single process".format(n=end - begin))
+        observations.merge(__read_part(rinex_file_path, begin, end, decoders, start_epoch, end_epoch, sv))
+        return
+
+    if verbose:
+        print("Reading {n:d} bytes in {p:d} parts".format(n=end - begin, p=len(boundaries) - 1))
+    with ProcessPoolExecutor(max_workers=len(boundaries) - 1) as executor:
+        futures = [executor.submit(__read_part, rinex_file_path, part_begin, part_end, decoders,
+                                   start_epoch, end_epoch, sv)
+                   for part_begin, part_end in zip(boundaries[:-1], boundaries[1:])]
+        for future in futures:
+            observations.merge(future.result())
@@ -0,0 +1,297 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from nmbu.rinex.common import datetime64_to_str
+
+single_observation_format = np.dtype([('value', np.float64), ('lli', np.int32), ('ssi', np.int32)])
+
+
+class SystemObservations:
+    """
+    Class that holds dense observation arrays for a single GNSS.
+    All arrays share the epoch axis of the parent ObservationStore.
+    Contains following fields:
+
+    - gnss: str
+    - obs_types: [str]
+    - sv: numpy array of satellite names, shape (n_sv,)
+    - values: numpy float64 array, shape (n_epochs, n_sv, n_obs_types). Missing values are NaN
+    - lli: numpy int8 array, shape (n_epochs, n_sv, n_obs_types). Missing values are -1
+    - ssi: numpy int8 array, shape (n_epochs, n_sv, n_obs_types). Missing values are -1
+    - present: numpy bool array, shape (n_epochs, n_sv). True if the satellite was observed in the epoch
+    - order: numpy int16 array, shape (n_epochs, n_sv). Position of the satellite line in its epoch block,
+      i.e. receiver channel order. Missing values are -1
+
+    Examples
+    --------
+
+    >>> gps = obs.systems['G']
+    >>> c1c = gps.values[:, :, gps.obs_types.index('C1C')]  # C1C for all epochs and all GPS satellites
+    >>> mean_c1c = np.nanmean(c1c, axis=0)  # mean C1C per satellite
+    """
+    def __init__(self, gnss: str, obs_types: List[str], sv: np.ndarray,
+                 values: np.ndarray, lli: np.ndarray, ssi: np.ndarray, present: np.ndarray,
+                 order: Optional[np.ndarray] = None):
+        self.gnss: str = gnss
+        self.obs_types: List[str] = obs_types
+        self.sv: np.ndarray = sv
+        self.values: np.ndarray = values
+        self.lli: np.ndarray = lli
+        self.ssi: np.ndarray = ssi
+        self.present: np.ndarray = present
+        self.order: np.ndarray = np.full(present.shape, -1, dtype=np.int16) if order is None else order
+
+    def __repr__(self):
+        return "{g:s}: {e:d} epochs x {s:d} satellites x {o:d} obs types".format(
+            g=self.gnss, e=self.values.shape[0], s=self.values.shape[1], o=self.values.shape[2])
+
+    def record(self, epoch_index: int, sv_index: int) -> np.void:
+        """
+        Builds a single structured record with (value, lli, ssi) for every obs type,
+        in the same format as it was stored before the columnar backend was introduced.
+        """
+        record_format = np.dtype([(name, single_observation_format) for name in self.obs_types])
+        result = np.zeros((), dtype=record_format)
+        for i, name in enumerate(self.obs_types):
+            result[name] = (self.values[epoch_index, sv_index, i],
+                            self.lli[epoch_index, sv_index, i],
+                            self.ssi[epoch_index, sv_index, i])
+        return result[()]
+
+
+class SatelliteEpochsView(Mapping):
+    """
+    Read-only view of all epochs for a single satellite: {timestamp: record}.
+    Records are built on access from the dense arrays of the corresponding SystemObservations.
+    """
+    def __init__(self, store: 'ObservationStore', system: SystemObservations, sv_index: int):
+        self._store = store
+        self._system = system
+        self._sv_index = sv_index
+
+    def __getitem__(self, timestamp: str) -> np.void:
+        epoch_index = self._store.epoch_index(timestamp)
+        if epoch_index is None or not self._system.present[epoch_index, self._sv_index]:
+            raise KeyError(timestamp)
+        return self._system.record(epoch_index, self._sv_index)
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self._store.epoch_keys
+        for epoch_index in np.flatnonzero(self._system.present[:, self._sv_index]):
+            yield keys[epoch_index]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._system.present[:, self._sv_index]))
+
+    def __repr__(self):
+        return str(dict(self.items()))
+
+
+class SatellitesView(Mapping):
+    """
+    Read-only view of the ObservationStore in the form {sv: {timestamp: record}}.
+    Only satellites that were observed in at least one epoch are included.
+    """
+    def __init__(self, store: 'ObservationStore'):
+        self._store = store
+
+    def __locate(self, sv: str):
+        system = self._store.systems.get(sv[:1])
+        if system is None:
+            return None, None
+        sv_index = np.searchsorted(system.sv, sv)
+        if sv_index >= len(system.sv) or system.sv[sv_index] != sv or not system.present[:, sv_index].any():
+            return None, None
+        return system, int(sv_index)
+
+    def __getitem__(self, sv: str) -> SatelliteEpochsView:
+        system, sv_index = self.__locate(sv)
+        if system is None:
+            raise KeyError(sv)
+        return SatelliteEpochsView(self._store, system, sv_index)
+
+    def __contains__(self, sv) -> bool:
+        return isinstance(sv, str) and self.__locate(sv)[0] is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for system in self._store.systems.values():
+            for sv_index in np.flatnonzero(system.present.any(axis=0)):
+                yield str(system.sv[sv_index])
+
+    def __len__(self) -> int:
+        return sum(int(np.count_nonzero(system.present.any(axis=0))) for system in self._store.systems.values())
+
+    def __repr__(self):
+        return str({sv: dict(epochs) for sv, epochs in self.items()})
+
+
+class ObservationStore:
+    """
+    Columnar storage for observation records.
+
+    Observations of each GNSS are stored as dense arrays in SystemObservations,
+    all sharing the same epoch axis. The dict-style access {sv: {timestamp: record}}
+    is still available through the `satellites` view.
+
+    Examples
+    --------
+
+    >>> obs.epochs  # all epochs that were read
+    >>> obs.systems['E'].values  # (n_epochs, n_sv, n_obs_types) array of Galileo observations
+    >>> obs.satellites['C01']['2022-01-01T01:00:00']['C2I']['value']
+    """
+    def __init__(self):
+        self.epochs: np.ndarray = np.empty(0, dtype='datetime64[ns]')
+        self.systems: Dict[str, SystemObservations] = {}
+        self.__indexed_epochs: Optional[np.ndarray] = None
+        self.__epoch_keys: List[str] = []
+        self.__epoch_lookup: Dict[int, int] = {}
+
+    @property
+    def satellites(self) -> SatellitesView:
+        return SatellitesView(self)
+
+    def __refresh_epoch_lookup(self) -> None:
+        if self.__indexed_epochs is not self.epochs:
+            self.__indexed_epochs = self.epochs
+            self.__epoch_keys = []
+            self.__epoch_lookup = {int(epoch): i for i, epoch in enumerate(self.epochs.astype(np.int64))}
+
+    @property
+    def epoch_keys(self) -> List[str]:
+        """
+        Epochs formatted as ISO8601 timestamps, which are used as keys in the `satellites` view.
+        Fraction of seconds is included only for epochs that have it, e.g. '2022-01-01T00:00:00.1'.
+        """
+        self.__refresh_epoch_lookup()
+        if len(self.__epoch_keys) != len(self.epochs):
+            self.__epoch_keys = datetime64_to_str(self.epochs)
+        return self.__epoch_keys
+
+    def epoch_index(self, timestamp):
+        """
+        Returns position of the given epoch on the epoch axis or None if the epoch is not present.
+        Epoch can be given as ISO8601 timestamp, datetime or numpy datetime64.
+        Lookup is done on the integer nanosecond axis, so no strings are built.
+        """
+        self.__refresh_epoch_lookup()
+        try:
+            key = np.datetime64(timestamp, 'ns').astype(np.int64)
+        except (ValueError, TypeError):
+            return None
+        return self.__epoch_lookup.get(int(key))
+
+    def receiver_order(self, epoch_index: int) -> List[str]:
+        """
+        Returns satellites of the given epoch in the order they were listed in the file,
+        i.e. in receiver channel order.
+        """
+        positions, names = [], []
+        for system in self.systems.values():
+            observed = np.flatnonzero(system.order[epoch_index] >= 0)
+            positions.append(system.order[epoch_index, observed])
+            names.append(system.sv[observed])
+        if not positions:
+            return []
+        names = np.concatenate(names)
+        return names[np.argsort(np.concatenate(positions), kind='stable')].tolist()
+
+    def __str__(self):
+        return str(self.satellites)
+
+
+class ObservationStoreBuilder:
+    """
+    Collects decoded observation rows epoch by epoch
+    and converts them into dense arrays of an ObservationStore in one go.
+    """
+    def __init__(self):
+        self.__epochs: List[np.datetime64] = []
+        self.__obs_types: Dict[str, List[str]] = {}
+        self.__rows: Dict[str, List[tuple]] = {}
+
+    def add_epoch(self, epoch) -> int:
+        """
+        Appends an epoch to the epoch axis and returns its index.
+        """
+        self.__epochs.append(np.datetime64(epoch, 'ns'))
+        return len(self.__epochs) - 1
+
+    def add_epochs(self, epochs: np.ndarray) -> np.ndarray:
+        """
+        Appends several epochs to the epoch axis and returns their indices.
+        """
+        first_index = len(self.__epochs)
+        self.__epochs.extend(np.asarray(epochs, dtype='datetime64[ns]'))
+        return np.arange(first_index, len(self.__epochs), dtype=np.int64)
+
+    def add_rows(self, gnss: str, obs_types: List[str], epoch_index, sv: np.ndarray,
+                 values: np.ndarray, lli: np.ndarray, ssi: np.ndarray, order=None) -> None:
+        """
+        Adds decoded satellite rows for the given GNSS.
+
+        :param gnss: str. GNSS symbol, e.g. 'G'
+        :param obs_types: List[str]. Obs types that correspond to the last axis of values/lli/ssi
+        :param epoch_index: int or numpy array. Index (or indices per row) on the epoch axis
+        :param sv: numpy array of satellite names, shape (n_rows,)
+        :param values: numpy array of shape (n_rows, n_obs_types)
+        :param lli: numpy array of shape (n_rows, n_obs_types)
+        :param ssi: numpy array of shape (n_rows, n_obs_types)
+        :param order: numpy array of shape (n_rows,). Position of every row in its epoch block. None if unknown
+        """
+        if gnss not in self.__obs_types:
+            self.__obs_types[gnss] = list(obs_types)
+            self.__rows[gnss] = []
+        epoch_indices = np.broadcast_to(np.asarray(epoch_index, dtype=np.int64), (len(sv),))
+        order = np.full(len(sv), -1, dtype=np.int16) if order is None else np.asarray(order, dtype=np.int16)
+        self.__rows[gnss].append((epoch_indices, np.asarray(sv, dtype='U3'), values, lli, ssi, order))
+
+    def merge(self, other: 'ObservationStoreBuilder') -> None:
+        """
+        Appends all epochs and rows collected by another builder, e.g. for the next part of the same file.
+        Epochs of the other builder are placed after the epochs of this builder.
+        """
+        first_index = len(self.__epochs)
+        self.__epochs.extend(other.__epochs)
+        for gnss, chunks in other.__rows.items():
+            if gnss not in self.__obs_types:
+                self.__obs_types[gnss] = other.__obs_types[gnss]
+                self.__rows[gnss] = []
+            elif self.__obs_types[gnss] != other.__obs_types[gnss]:
+                raise ValueError("Obs types of GNSS {g:s} do not match".format(g=gnss))
+            self.__rows[gnss].extend((epoch_indices + first_index, sv, values, lli, ssi, order)
+                                     for epoch_indices, sv, values, lli, ssi, order in chunks)
+
+    def build(self, store: ObservationStore) -> ObservationStore:
+        """
+        Fills the given store with dense arrays created from all added rows.
+        """
+        store.epochs = np.array(self.__epochs, dtype='datetime64[ns]')
+        n_epochs = len(store.epochs)
+        for gnss, chunks in self.__rows.items():
+            epoch_indices = np.concatenate([chunk[0] for chunk in chunks])
+            sv_names = np.concatenate([chunk[1] for chunk in chunks])
+            sv_axis = np.unique(sv_names)
+            sv_indices = np.searchsorted(sv_axis, sv_names)
+            n_obs = len(self.__obs_types[gnss])
+
+            values = np.full((n_epochs, len(sv_axis), n_obs), np.nan, dtype=np.float64)
+            lli = np.full((n_epochs, len(sv_axis), n_obs), -1, dtype=np.int8)
+            ssi = np.full((n_epochs, len(sv_axis), n_obs), -1, dtype=np.int8)
+            present = np.zeros((n_epochs, len(sv_axis)), dtype=bool)
+            order = np.full((n_epochs, len(sv_axis)), -1, dtype=np.int16)
+
+            values[epoch_indices, sv_indices] = np.concatenate([chunk[2] for chunk in chunks])
+            lli[epoch_indices, sv_indices] = np.concatenate([chunk[3] for chunk in chunks])
+            ssi[epoch_indices, sv_indices] = np.concatenate([chunk[4] for chunk in chunks])
+            present[epoch_indices, sv_indices] = True
+            order[epoch_indices, sv_indices] = np.concatenate([chunk[5] for chunk in chunks])
+
+            store.systems[gnss] = SystemObservations(gnss, self.__obs_types[gnss], sv_axis,
+                                                     values, lli, ssi, present, order)
+        return store
@@ -1,9 +1,17 @@
 #  Copyright: (c) 2023, Liudmila Sherstnyakova
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from datetime import datetime
-from typing import Union
+from typing import Dict, Optional, Tuple, Union
 
+import numpy as np
+
+from nmbu.rinex.common.nav_table import SATELLITES
+from nmbu.rinex.common.time_index import NOT_FOUND, TimeIndex, mapping_time_index, nav_time_index, time_to_ns
+from nmbu.rinex.common.validity_index import ValidityIndex, nav_validity_index
+from nmbu.rinex.navigation.earth_orientation import EarthOrientationTable, eci_to_ecef, ecef_to_eci, eop_table
+from nmbu.rinex.navigation.ionosphere import BDS_B1C, BDS_B1I, GPS_L1, bdgim_broadcast_delay, \
+    bds_klobuchar_delay, klobuchar_delay
+from nmbu.rinex.navigation.time_scales import TimeScaleCorrections
 from nmbu.rinex.navigation.v3.header import NavigationHeaderV3
 from nmbu.rinex.navigation.v3.navigation import NavigationV3
 from nmbu.rinex.navigation.v4.header import NavigationHeaderV4
@@ -58,6 +66,11 @@ class RinexData:
                  data: Union[ObservationV3, ObservationV4, NavigationV3, NavigationV4]):
         self.header = header
         self.data = data
+        self.__time_indexes: Dict[Tuple[str, str], TimeIndex] = {}  # see find_closest_match
+        self.__table_indexes: Dict[Tuple[str, str], TimeIndex] = {}  # see find_closest_match_rows
+        self.__validity_indexes: Dict[Tuple[str, str, bool], ValidityIndex] = {}  # see find_valid_ephemeris_rows
+        self.__time_scales: Optional[TimeScaleCorrections] = None  # see time_scale_corrections
+        self.__eop_tables: Dict[str, EarthOrientationTable] = {}  # see earth_orientation
 
     def __str__(self):
         return "Type: {t:s} (ver. {v:.2f}). Contains {s_no:d} satellites".format(
@@ -66,9 +79,26 @@ class RinexData:
             s_no=len(self.data.satellites)
         )
 
-    def find_closest_match(self, sv: str, timestamp: str):
+    def __time_index(self, target: str, sv: str) -> TimeIndex:
+        """
+        Returns time index of navigation records of the given satellite. Index is built on first use and cached.
+
+        :param target: 'satellites' for ephemerides, otherwise correction type, e.g. 'ION'
+        :param sv: name of the satellite as used in the data, e.g. 'E05' or 'G' for STO records
+        """
+        key = (target, sv)
+        if key not in self.__time_indexes:
+            if isinstance(self.data, NavigationV3) and target != SATELLITES:
+                self.__time_indexes[key] = mapping_time_index(self.header.corrections[target][sv])
+            else:
+                self.__time_indexes[key] = nav_time_index(
+                    [table for table in self.data.tables.values() if table.target == target], sv)
+        return self.__time_indexes[key]
+
+    def find_closest_match(self, sv: str, timestamp: str, latest: bool = False, max_age: Optional[float] = None):
         """
         Finds the closest navigation data block for the given satellite and timestamp.
+        Epochs of every satellite are indexed once, so a lookup is a binary search, see common.time_index.
 
         Examples
         --------
@@ -81,27 +111,28 @@ class RinexData:
         >>> crs = result.Crs
         >>> delta_n = result.Delta_n
 
+        To find the latest block broadcast before the given time, that is not older than 2 hours, use
+
+        >>> result = rinex.find_closest_match(sv='E01', timestamp='2020-01-01T00:00:00', latest=True, max_age=7200)
+
         :param sv: name of the satellite, e.g. 'E05'
         :param timestamp: timestamp in ISO format, e.g. '2020-01-01T00:00:00'
+        :param latest: False to find the closest block (the earlier one if two blocks are equally close),
+            True to find the latest block at or before the given timestamp
+        :param max_age: maximal distance in seconds between the timestamp and the block. None for no limit
         :return: block of navigation data (if found) or None
         """
-        iso_format = '%Y-%m-%dT%H:%M:%S'  # '2020-01-01T00:00:00'
         if isinstance(self.data, NavigationV3) or isinstance(self.data, NavigationV4):
-            if sv in self.data.satellites.keys():
-                block = self.data.satellites[sv]
-                timestamp = datetime.strptime(timestamp, iso_format)
-                result = min(map(lambda x: datetime.strptime(x, iso_format), block.keys()),
-                             key=lambda x: abs(x - timestamp))
-                return self.data.satellites[sv][result.isoformat()]
-            else:
-                return None
+            return self.__find(SATELLITES, sv, timestamp, latest, max_age)
         else:
             return None
 
-    def find_closest_correction_match(self, correction_type: str, sv: str, timestamp: str):
+    def find_closest_correction_match(self, correction_type: str, sv: str, timestamp: str,
+                                      latest: bool = False, max_age: Optional[float] = None):
         """
         Finds the closest corrections data block of the desired type
-        for the given satellite and timestamp
+        for the given satellite and timestamp.
+        If there are no corrections for the satellite, corrections of its GNSS are used, e.g. 'G' for 'G01'.
 
         Examples
         --------
@@ -111,47 +142,476 @@ class RinexData:
 
         To query result, use dot-notation
 
-        >>> crs = result.Crs
-        >>> delta_n = result.Delta_n
+        >>> alpha0 = result.Alpha0
+        >>> beta0 = result.Beta0
 
         :param correction_type: str. Correction type to search. Supported values are 'ION', 'EOP' or 'STO' as per RINEX specification
         :param sv: str. name of the satellite, e.g. 'G01'
         :param timestamp: timestamp in ISO format, e.g. '2020-01-01T00:00:00'
+        :param latest: False to find the closest block (the earlier one if two blocks are equally close),
+            True to find the latest block at or before the given timestamp
+        :param max_age: maximal distance in seconds between the timestamp and the block. None for no limit
         :return: block of navigation data (if found) or None
         """
-        iso_format = '%Y-%m-%dT%H:%M:%S'  # '2020-01-01T00:00:00'
         if isinstance(self.data, NavigationV3):
-            if sv in self.header.corrections[correction_type].keys():
-                block = self.header.corrections[correction_type][sv]
-                timestamp = datetime.strptime(timestamp, iso_format)
-                result = min(map(lambda x: datetime.strptime(x, iso_format), block.keys()),
-                             key=lambda x: abs(x - timestamp))
-                return self.header.corrections[correction_type][sv][result.isoformat()]
-            elif sv[0] in self.header.corrections[correction_type].keys():
-                block = self.header.corrections[correction_type][sv[0]]
+            corrections = self.header.corrections.get(correction_type, {})
+            if sv not in corrections.keys() and sv[0] in corrections.keys():
+                block = corrections[sv[0]]
                 if len(block) == 1 and "NO_TIME" in block.keys():
-                    return self.header.corrections[correction_type][sv[0]]["NO_TIME"]
-                else:
-                    timestamp = datetime.strptime(timestamp, iso_format)
-                    result = min(map(lambda x: datetime.strptime(x, iso_format), block.keys()),
-                                 key=lambda x: abs(x - timestamp))
-                    return self.header.corrections[correction_type][sv[0]][result.isoformat()]
-            else:
-                return None
+                    return block["NO_TIME"]
+                sv = sv[0]
         elif isinstance(self.data, NavigationV4):
-            if sv in self.data.corrections[correction_type].keys():
-                block = self.data.corrections[correction_type][sv]
-                timestamp = datetime.strptime(timestamp, iso_format)
-                result = min(map(lambda x: datetime.strptime(x, iso_format), block.keys()),
-                             key=lambda x: abs(x - timestamp))
-                return self.data.corrections[correction_type][sv][result.isoformat()]
-            elif sv[0] in self.data.corrections[correction_type].keys():
-                block = self.data.corrections[correction_type][sv[0]]
-                timestamp = datetime.strptime(timestamp, iso_format)
-                result = min(map(lambda x: datetime.strptime(x, iso_format), block.keys()),
-                             key=lambda x: abs(x - timestamp))
-                return self.data.corrections[correction_type][sv[0]][result.isoformat()]
-            else:
-                return None
+            corrections = self.data.corrections.get(correction_type, {})
+            if sv not in corrections.keys():
+                sv = sv[0]
         else:
             return None
+        if sv not in corrections.keys():
+            return None
+        return self.__find(correction_type, sv, timestamp, latest, max_age)
+
+    def __find(self, target: str, sv: str, timestamp: str, latest: bool, max_age: Optional[float]):
+        index = self.__time_index(target, sv)
+        position = index.find(time_to_ns(timestamp), latest, max_age)
+        return None if position == NOT_FOUND else index.record(position)
+
+    def find_closest_match_rows(self, table: str, sv, timestamps, latest: bool = False,
+                                max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Finds the closest navigation records of a single table for many (satellite, timestamp) pairs at once.
+        Pairs are grouped by satellite and every group is matched with one np.searchsorted
+        on the time index of the satellite, see common.time_index.
+
+        Examples
+        --------
+
+        >>> rinex = reader.read_rinex_file('path/to/navigation/file')
+        >>> rows = rinex.find_closest_match_rows('GPS_LNAV', ['G01', 'G05'], ['2022-09-29T10:00:00', '2022-09-29T10:00:00'])
+        >>> rinex.data.tables['GPS_LNAV'].records[rows[rows >= 0]]
+
+        :param table: name of the navigation table, e.g. 'GPS_LNAV' (v4) or 'GPS' (v3), see NavigationV4.tables
+        :param sv: array of satellite names, e.g. ['G01', 'G05']
+        :param timestamps: array of timestamps of the same length as sv, as datetime64 or strings in ISO format
+        :param latest: False to find the closest records, True to find the latest records at or before the timestamps
+        :param max_age: maximal distance in seconds between the timestamp and the record. None for no limit
+        :return: numpy intp array with row of the matched record in the table or -1 if there is no match
+        """
+        if not (isinstance(self.data, NavigationV3) or isinstance(self.data, NavigationV4)):
+            raise ValueError("Closest match is supported only for navigation files.")
+        nav_table = self.data.tables[table]
+
+        def find(name: str, times: np.ndarray) -> np.ndarray:
+            key = (table, name)
+            if key not in self.__table_indexes:
+                self.__table_indexes[key] = nav_time_index([nav_table], name)
+            index = self.__table_indexes[key]
+            if len(index) == 0:
+                return np.full(times.shape, NOT_FOUND, dtype=np.intp)
+            positions = index.find_all(times, latest, max_age)
+            return np.where(positions == NOT_FOUND, NOT_FOUND, index.rows[positions])
+
+        return self.__find_rows_by_sv(sv, timestamps, find)
+
+    @staticmethod
+    def __find_rows_by_sv(sv, timestamps, find) -> np.ndarray:
+        """
+        Groups (satellite, timestamp) pairs by satellite and calls find(sv, times in ns) -> rows once per group.
+        """
+        sv = np.asarray(sv, dtype=str)
+        times = np.asarray(timestamps, dtype='datetime64[ns]').astype(np.int64)
+        if sv.shape != times.shape:
+            raise ValueError("Satellites and timestamps must have the same shape.")
+        result = np.full(sv.shape, NOT_FOUND, dtype=np.intp)
+        names, inverse = np.unique(sv, return_inverse=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        groups = np.split(order, np.cumsum(np.bincount(inverse.ravel(), minlength=len(names)))[:-1])
+        flat_times, flat_result = times.ravel(), result.ravel()
+        for name, group in zip(names, groups):
+            flat_result[group] = find(str(name), flat_times[group])
+        return flat_result.reshape(sv.shape)
+
+    def find_closest_match_records(self, table: str, sv, timestamps, latest: bool = False,
+                                   max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Finds the closest navigation records of a single table for many (satellite, timestamp) pairs at once,
+        see find_closest_match_rows, and returns whole records, so every parameter is available as an array.
+        Records of pairs without a match have epoch NaT and NaN parameters.
+
+        Examples
+        --------
+
+        Join all GPS observations with broadcast ephemerides
+
+        >>> gps = observations.data.systems['G']
+        >>> sv = np.broadcast_to(gps.sv, gps.present.shape)[gps.present]
+        >>> epochs = np.broadcast_to(observations.data.epochs[:, None], gps.present.shape)[gps.present]
+        >>> ephemerides = navigation.find_closest_match_records('GPS_LNAV', sv, epochs, latest=True, max_age=7200)
+        >>> ephemerides['sqrt_A']  # sqrt_A for every observed (sv, epoch) pair
+
+        :param table: name of the navigation table, e.g. 'GPS_LNAV' (v4) or 'GPS' (v3), see NavigationV4.tables
+        :param sv: array of satellite names, e.g. ['G01', 'G05']
+        :param timestamps: array of timestamps of the same length as sv, as datetime64 or strings in ISO format
+        :param latest: False to find the closest records, True to find the latest records at or before the timestamps
+        :param max_age: maximal distance in seconds between the timestamp and the record. None for no limit
+        :return: numpy structured array with the same fields as the records of the table
+        """
+        rows = self.find_closest_match_rows(table, sv, timestamps, latest, max_age)
+        return self.__table_records(table, rows)
+
+    def find_valid_ephemeris_rows(self, table: str, sv, timestamps, healthy: bool = True) -> np.ndarray:
+        """
+        Finds the ephemerides valid at many (satellite, timestamp) pairs at once.
+        Unlike find_closest_match_rows, a record is used only from its transmission time to the end
+        of its fit interval around Toe, only if the issue of data is consistent and,
+        by default, only if the satellite is healthy. Where records overlap, the most recent one is used.
+        The validity intervals are flattened once per satellite, so every lookup is a binary search,
+        see common.validity_index.
+
+        Examples
+        --------
+
+        >>> rinex = reader.read_rinex_file('path/to/navigation/file')
+        >>> rows = rinex.find_valid_ephemeris_rows('GPS_LNAV', ['G01', 'G05'], ['2022-09-29T10:00:00', '2022-09-29T10:00:00'])
+        >>> rinex.data.tables['GPS_LNAV'].records[rows[rows >= 0]]
+
+        :param table: name of the navigation table, e.g. 'GPS_LNAV' (v4) or 'GPS' (v3), see NavigationV4.tables
+        :param sv: array of satellite names, e.g. ['G01', 'G05']
+        :param timestamps: array of timestamps of the same length as sv, as datetime64 or strings in ISO format
+        :param healthy: True to use only records of healthy satellites, False to ignore the health
+        :return: numpy intp array with row of the valid record in the table or -1 if there is none
+        """
+        if not (isinstance(self.data, NavigationV3) or isinstance(self.data, NavigationV4)):
+            raise ValueError("Ephemeris selection is supported only for navigation files.")
+        nav_table = self.data.tables[table]
+
+        def find(name: str, times: np.ndarray) -> np.ndarray:
+            key = (table, name, healthy)
+            if key not in self.__validity_indexes:
+                self.__validity_indexes[key] = nav_validity_index(nav_table, name, healthy)
+            return self.__validity_indexes[key].find_all(times)
+
+        return self.__find_rows_by_sv(sv, timestamps, find)
+
+    def find_valid_ephemeris_records(self, table: str, sv, timestamps, healthy: bool = True) -> np.ndarray:
+        """
+        Finds the ephemerides valid at many (satellite, timestamp) pairs at once, see find_valid_ephemeris_rows,
+        and returns whole records. Records of pairs without a valid ephemeris have epoch NaT and NaN parameters.
+
+        :param table: name of the navigation table, e.g. 'GPS_LNAV' (v4) or 'GPS' (v3), see NavigationV4.tables
+        :param sv: array of satellite names, e.g. ['G01', 'G05']
+        :param timestamps: array of timestamps of the same length as sv, as datetime64 or strings in ISO format
+        :param healthy: True to use only records of healthy satellites, False to ignore the health
+        :return: numpy structured array with the same fields as the records of the table
+        """
+        rows = self.find_valid_ephemeris_rows(table, sv, timestamps, healthy)
+        return self.__table_records(table, rows)
+
+    def __table_records(self, table: str, rows: np.ndarray) -> np.ndarray:
+        records = self.data.tables[table].records
+        missing = rows == NOT_FOUND
+        if len(records) == 0:
+            result = np.zeros(rows.shape, dtype=records.dtype)
+        else:
+            result = records[np.where(missing, 0, rows)]
+        if missing.any():
+            for name in records.dtype.names:
+                kind = records.dtype[name].kind
+                result[name][missing] = np.datetime64('NaT') if kind == 'M' else (np.nan if kind == 'f' else '')
+        return result
+
+    def klobuchar_coefficients(self, source: str, timestamps, latest: bool = True,
+                               max_age: Optional[float] = None) -> (np.ndarray, np.ndarray):
+        """
+        Selects Klobuchar coefficients for many timestamps at once, see navigation.ionosphere.klobuchar_delay.
+
+        In RINEX 4 files the coefficients are taken from ION records through the time index of the source,
+        i.e. by default the latest record broadcast at or before every timestamp.
+        In RINEX 3 files the coefficients are taken from the header. If the header holds several sets
+        with hour time marks (e.g. BDS 'A' for 00h ... 'X' for 23h), the set of the hour of the timestamp is used,
+        or the latest set before that hour.
+
+        ValueError is raised if the file has no Klobuchar coefficients of the source.
+
+        Examples
+        --------
+
+        >>> alpha, beta = rinex.klobuchar_coefficients('G', ['2022-09-29T10:00:00', '2022-09-29T11:00:00'])
+
+        :param source: satellite that broadcast the coefficients (e.g. 'G01', 'C13') or GNSS (e.g. 'G' or 'C')
+        :param timestamps: array of timestamps, as datetime64 or strings in ISO format
+        :param latest: True to use the latest record at or before the timestamp, False for the closest record.
+            Used only for RINEX 4 files
+        :param max_age: maximal distance in seconds between the timestamp and the record. None for no limit.
+            Used only for RINEX 4 files
+        :return: Tuple of numpy float64 arrays (..., 4) with Alpha0..Alpha3 and Beta0..Beta3,
+            NaN where no record matches
+        """
+        names = ['Alpha' + str(n) for n in range(4)] + ['Beta' + str(n) for n in range(4)]
+        coefficients = self.__ion_coefficients('ION_Klobuchar', "Klobuchar", names, source, timestamps,
+                                               latest, max_age)
+        return coefficients[..., :4], coefficients[..., 4:]
+
+    def nequick_coefficients(self, source: str, timestamps, latest: bool = True,
+                             max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Selects NeQuick G coefficients for many timestamps at once, see navigation.nequick.NeQuickG.
+        Coefficients are taken from ION records of Galileo (RINEX 4) or from the header (RINEX 3),
+        see klobuchar_coefficients.
+
+        ValueError is raised if the file has no NeQuick G coefficients of the source.
+
+        Examples
+        --------
+
+        >>> ai = rinex.nequick_coefficients('E', ['2022-09-29T10:00:00', '2022-09-29T11:00:00'])
+
+        :param source: satellite that broadcast the coefficients (e.g. 'E01') or GNSS ('E')
+        :param timestamps: array of timestamps, as datetime64 or strings in ISO format
+        :param latest: see klobuchar_coefficients
+        :param max_age: see klobuchar_coefficients
+        :return: numpy float64 array (..., 3) with ai0, ai1, ai2, NaN where no record matches
+        """
+        return self.__ion_coefficients('ION_Nequick', "NeQuick G", ['ai0', 'ai1', 'ai2'], source, timestamps,
+                                       latest, max_age)
+
+    def bdgim_coefficients(self, source: str, timestamps, latest: bool = True,
+                           max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Selects BDGIM coefficients for many timestamps at once, see navigation.ionosphere.bdgim_broadcast_tec.
+        Coefficients are taken from ION records of BDS CNAV messages, which exist only in RINEX 4 files.
+
+        ValueError is raised if the file has no BDGIM coefficients of the source.
+
+        Examples
+        --------
+
+        >>> alpha = rinex.bdgim_coefficients('C', ['2022-09-29T10:00:00', '2022-09-29T11:00:00'])
+
+        :param source: satellite that broadcast the coefficients (e.g. 'C19') or GNSS ('C')
+        :param timestamps: array of timestamps, as datetime64 or strings in ISO format
+        :param latest: see klobuchar_coefficients
+        :param max_age: see klobuchar_coefficients
+        :return: numpy float64 array (..., 9) with Alpha1..Alpha9, NaN where no record matches
+        """
+        return self.__ion_coefficients('ION_BDGIM', "BDGIM", ['Alpha' + str(n) for n in range(1, 10)], source,
+                                       timestamps, latest, max_age)
+
+    def __ion_coefficients(self, table: str, model: str, names, source: str, timestamps, latest: bool,
+                           max_age: Optional[float]) -> np.ndarray:
+        """
+        Selects coefficients of an ionospheric model for every timestamp,
+        from the ION table of a RINEX 4 file or from the header of a RINEX 3 file.
+
+        :param table: name of the ION table in NavigationV4.tables, e.g. 'ION_Klobuchar'
+        :param model: name of the model for error messages
+        :param names: names of the coefficients in the records and in the header corrections
+        :return: numpy float64 array (..., len(names))
+        """
+        times = np.asarray(timestamps, dtype='datetime64[ns]')
+        if isinstance(self.data, NavigationV4):
+            nav_table = self.data.tables.get(table)
+            if nav_table is None or not np.char.startswith(nav_table.records['sv'], source).any():
+                raise ValueError("No {m:s} coefficients of {s:s}".format(m=model, s=source))
+            records = self.find_closest_match_records(table, np.full(times.shape, source), times, latest, max_age)
+            return np.stack([records[name] for name in names], axis=-1)
+        if isinstance(self.data, NavigationV3):
+            corrections = self.header.corrections.get('ION', {})
+            svs = [sv for sv in corrections if sv == source or (len(source) == 1 and sv[0] == source)]
+            if not svs and source[0] in corrections:
+                svs = [source[0]]  # coefficients of the GNSS are used for its satellites
+            # sets of one GNSS are spread over the satellites that broadcast them, e.g. 'A' in C13 and 'D' in C5
+            sets = {}
+            for sv in svs:
+                for mark, values in corrections[sv].items():
+                    if hasattr(values, names[-1]):
+                        sets.setdefault(mark, values)
+            if not sets:
+                raise ValueError("No {m:s} coefficients of {s:s}".format(m=model, s=source))
+            marks = sorted(sets, key=lambda mark: -1 if mark == 'NO_TIME' else ord(mark) - ord('A'))
+            mark_hours = np.array([-1 if mark == 'NO_TIME' else ord(mark) - ord('A') for mark in marks])
+            hours = (times - times.astype('datetime64[D]')).astype('timedelta64[h]').astype(np.int64)
+            positions = np.maximum(np.searchsorted(mark_hours, hours, side='right') - 1, 0)
+            values = np.array([[getattr(sets[mark], name) for name in names] for mark in marks], dtype=np.float64)
+            return values[positions]
+        raise ValueError("{m:s} coefficients are available only in navigation files.".format(m=model))
+
+    def klobuchar_delay(self, source: str, timestamps, latitude, longitude, azimuth, elevation,
+                        frequency=None, latest: bool = True, max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Computes slant ionospheric delays with the Klobuchar coefficients of the source for many timestamps at once.
+        BDS coefficients (source 'C...') are evaluated with the BDS model, all others with the GPS model,
+        see navigation.ionosphere.
+
+        Examples
+        --------
+
+        >>> delay = rinex.klobuchar_delay('G', epochs, latitude, longitude, azimuth, elevation)
+
+        :param source: satellite that broadcast the coefficients (e.g. 'G01', 'C13') or GNSS (e.g. 'G' or 'C')
+        :param timestamps: array of timestamps, as datetime64 or strings in ISO format
+        :param latitude: Geodetic latitude of the receiver in radians
+        :param longitude: Geodetic longitude of the receiver in radians
+        :param azimuth: Azimuth of the satellite in radians
+        :param elevation: Elevation of the satellite in radians
+        :param frequency: Frequency of the signal in Hz. None for the reference frequency of the model
+        :param latest: see klobuchar_coefficients
+        :param max_age: see klobuchar_coefficients
+        :return: numpy float64 array. Slant ionospheric delays in meters, NaN if no coefficients match
+        """
+        times = np.asarray(timestamps, dtype='datetime64[ns]')
+        alpha, beta = self.klobuchar_coefficients(source, times, latest, max_age)
+        if source[0] == 'C':
+            return bds_klobuchar_delay(alpha, beta, latitude, longitude, azimuth, elevation, times,
+                                       BDS_B1I if frequency is None else frequency)
+        return klobuchar_delay(alpha, beta, latitude, longitude, azimuth, elevation, times,
+                               GPS_L1 if frequency is None else frequency)
+
+    def bdgim_broadcast_delay(self, source: str, timestamps, latitude, longitude, azimuth, elevation, table=None,
+                              a0=None, frequency=BDS_B1C, latest: bool = True,
+                              max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Computes slant ionospheric delays of BDGIM with the coefficients broadcast by the source
+        for many timestamps at once, see navigation.ionosphere.bdgim_broadcast_tec.
+        The non-broadcast part of the model is computed from the table of the ICD unless it is given as a0.
+
+        Examples
+        --------
+
+        >>> table = read_bdgim_table('path/to/bdgim_non_broadcast.txt')
+        >>> delay = rinex.bdgim_broadcast_delay('C', epochs, latitude, longitude, azimuth, elevation, table)
+
+        :param source: satellite that broadcast the coefficients (e.g. 'C19') or GNSS ('C')
+        :param timestamps: array of timestamps, as datetime64 or strings in ISO format
+        :param latitude: Geodetic latitude of the receiver in radians
+        :param longitude: Geodetic longitude of the receiver in radians
+        :param azimuth: Azimuth of the satellite in radians
+        :param elevation: Elevation of the satellite in radians
+        :param table: Table of the non-broadcast coefficients, see navigation.ionosphere.read_bdgim_table
+        :param a0: Optional. Non-broadcast vertical TEC in TECU, overrides the value computed from the table
+        :param frequency: Frequency of the signal in Hz
+        :param latest: see klobuchar_coefficients
+        :param max_age: see klobuchar_coefficients
+        :return: numpy float64 array. Slant ionospheric delays in meters, NaN if no coefficients match
+        """
+        times = np.asarray(timestamps, dtype='datetime64[ns]')
+        alpha = self.bdgim_coefficients(source, times, latest, max_age)
+        return bdgim_broadcast_delay(alpha, latitude, longitude, azimuth, elevation, times, table, a0, frequency)
+
+    def time_scale_corrections(self) -> TimeScaleCorrections:
+        """
+        Collects the broadcast offsets between time scales: STO records of RINEX 4 files
+        or TIME SYSTEM CORR lines of RINEX 3 headers, with leap seconds from the LEAP SECONDS line of the header.
+        The result is built once and cached.
+
+        Examples
+        --------
+
+        >>> corrections = rinex.time_scale_corrections()
+        >>> corrections.codes  # e.g. ['GLGP', 'GPUT']
+        >>> utc = corrections.convert(gps_epochs, 'GPS', 'UTC')
+
+        :return: TimeScaleCorrections, see navigation.time_scales
+        """
+        if self.__time_scales is not None:
+            return self.__time_scales
+        if isinstance(self.data, NavigationV4):
+            records = self.data.tables['STO'].records if 'STO' in self.data.tables else None
+            if records is None or len(records) == 0:
+                codes, references, coefficients = [], np.empty(0, dtype='datetime64[ns]'), np.empty((0, 3))
+            else:
+                codes, references = records['time_offset'], records['epoch']
+                coefficients = np.column_stack([records['A0'], records['A1'], records['A2']])
+        elif isinstance(self.data, NavigationV3):
+            sets = [(code, timestamp, values) for code, by_time in self.header.corrections.get('STO', {}).items()
+                    for timestamp, values in by_time.items()]
+            codes = [code for code, _, _ in sets]
+            references = np.array(['NaT' if timestamp == 'NO_TIME' else timestamp for _, timestamp, _ in sets],
+                                  dtype='datetime64[ns]')
+            coefficients = np.array([[values.A0, values.A1, values.A2] for _, _, values in sets],
+                                    dtype=np.float64).reshape(-1, 3)
+        else:
+            raise ValueError("Time scale corrections are available only in navigation files.")
+        self.__time_scales = TimeScaleCorrections(codes, references, coefficients, self.header.leap_seconds)
+        return self.__time_scales
+
+    def convert_time_scale(self, timestamps, source: str, target: str, latest: bool = True,
+                           max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Converts many epochs between time scales at once, see time_scale_corrections.
+
+        Examples
+        --------
+
+        >>> utc = rinex.convert_time_scale(observations.data.epochs, 'GPS', 'UTC')
+
+        :param timestamps: array of timestamps in the source time scale, as datetime64 or strings in ISO format
+        :param source: time scale of the timestamps: 'GPS', 'GAL', 'GLO', 'BDS', 'QZS', 'IRN', 'SBAS' or 'UTC'
+        :param target: requested time scale
+        :param latest: True to use the latest parameter sets at or before the timestamps, False to use the closest sets
+        :param max_age: maximal distance in seconds between the timestamp and the reference time. None for no limit
+        :return: numpy datetime64[ns] array, NaT where no parameter set matches
+        """
+        return self.time_scale_corrections().convert(timestamps, source, target, latest, max_age)
+
+    def earth_orientation(self, source: str = '') -> EarthOrientationTable:
+        """
+        Collects EOP records of a RINEX 4 navigation file into a table evaluated for many epochs at once,
+        see navigation.earth_orientation. The table is built once per source and cached.
+
+        Examples
+        --------
+
+        >>> eop = rinex.earth_orientation().evaluate(epochs)
+        >>> eop.xp, eop.yp, eop.ut1_utc  # polar motion in radians and UT1 - UTC in seconds at every epoch
+
+        :param source: satellite (e.g. 'G01') or GNSS (e.g. 'G') that broadcast the records. '' for all records
+        :return: EarthOrientationTable
+        """
+        if not isinstance(self.data, NavigationV4):
+            raise ValueError("EOP records are available only in navigation files of version 4.")
+        if source not in self.__eop_tables:
+            if 'EOP' not in self.data.tables:
+                raise ValueError("No EOP records in the file.")
+            self.__eop_tables[source] = eop_table(self.data.tables['EOP'], source)
+        return self.__eop_tables[source]
+
+    def ecef_to_eci(self, positions, timestamps, velocities=None, celestial=None, source: str = '',
+                    latest: bool = True, max_age: Optional[float] = None):
+        """
+        Rotates many ECEF positions (and velocities) into the celestial frame with the broadcast EOP,
+        see navigation.earth_orientation.terrestrial_to_celestial.
+        Timestamps are in GPS time, UTC is obtained with the leap seconds of the header.
+
+        Examples
+        --------
+
+        >>> states = keplerian_states(navigation.find_valid_ephemeris_records('GPS_LNAV', sv, epochs), epochs)
+        >>> positions, velocities = navigation.ecef_to_eci(states.position, epochs, states.velocity)
+
+        :param positions: numpy float64 array (..., 3). ECEF positions in meters
+        :param timestamps: array of timestamps in GPS time of the shape of positions without the last axis
+        :param velocities: numpy float64 array (..., 3). Optional ECEF velocities in m/s
+        :param celestial: numpy float64 array (..., 3, 3). Optional precession-nutation matrices, CIRS if not given
+        :param source: see earth_orientation
+        :param latest: True to use the latest EOP records at or before the timestamps, False to use the closest ones
+        :param max_age: maximal distance in seconds between the timestamp and the record. None for no limit
+        :return: numpy float64 array (..., 3) with positions, or a tuple of positions and velocities.
+            NaN where no EOP record matches
+        """
+        times = np.asarray(timestamps, dtype='datetime64[ns]')
+        eop = self.earth_orientation(source).evaluate(times, latest, max_age)
+        return ecef_to_eci(positions, self.__gps_to_utc(times), eop, velocities, celestial)
+
+    def eci_to_ecef(self, positions, timestamps, velocities=None, celestial=None, source: str = '',
+                    latest: bool = True, max_age: Optional[float] = None):
+        """
+        Rotates many celestial positions (and velocities) into ECEF, the inverse of ecef_to_eci.
+        """
+        times = np.asarray(timestamps, dtype='datetime64[ns]')
+        eop = self.earth_orientation(source).evaluate(times, latest, max_age)
+        return eci_to_ecef(positions, self.__gps_to_utc(times), eop, velocities, celestial)
+
+    def __gps_to_utc(self, times: np.ndarray) -> np.ndarray:
+        if self.header.leap_seconds is None:
+            raise ValueError("Leap seconds are missing in the header.")
+        return times - self.header.leap_seconds.at(times).astype('timedelta64[s]')
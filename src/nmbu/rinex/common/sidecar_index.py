@@ -0,0 +1,154 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import hashlib
+import io
+import os
+import zipfile
+from typing import Optional
+
+import numpy as np
+
+from nmbu.rinex.common.epoch_index import EpochIndex
+
+SIDECAR_SUFFIX = ".idx"
+SIDECAR_FORMAT_VERSION = 3
+__HASH_CHUNK_SIZE = 1 << 20
+__EPOCH_INDEX_FIELDS = ("offsets", "epochs", "flags", "sizes", "sv_names", "sv_pointers", "sv_indices")
+
+
+class SidecarIndex:
+    """
+    Class that holds everything needed to read a RINEX file without scanning its header or its data section.
+    It is stored in a sidecar file next to the RINEX file, see sidecar_path.
+    The stored index is valid only as long as size, modification time (or content hash) of the file match.
+    Contains following fields:
+
+    - format_version: int. Version of the sidecar format
+    - file_size: int. Size of the indexed file in bytes
+    - mtime_ns: int. Modification time of the indexed file in nanoseconds
+    - content_hash: str. BLAKE2b hash of the file content
+    - version: float. RINEX version of the file
+    - file_type: str. 'O' or 'N'
+    - gnss: str. GNSS of the file
+    - header_text: str. Header lines of the file after the first line, decoded by the header readers on use
+    - epoch_index: EpochIndex. Epochs (or navigation records) of the file with their offsets and satellites
+
+    Sidecar files are stored as numpy .npz archives of plain arrays and are loaded without pickle,
+    so a sidecar file can not execute code when it is read.
+    """
+    def __init__(self, file_size: int, mtime_ns: int, content_hash: str, version: float, file_type: str,
+                 gnss: str, header_text: str, epoch_index: EpochIndex):
+        self.format_version: int = SIDECAR_FORMAT_VERSION
+        self.file_size: int = file_size
+        self.mtime_ns: int = mtime_ns
+        self.content_hash: str = content_hash
+        self.version: float = version
+        self.file_type: str = file_type
+        self.gnss: str = gnss
+        self.header_text: str = header_text
+        self.epoch_index: EpochIndex = epoch_index
+
+    def __repr__(self):
+        return "Sidecar index: {t:s} (ver. {v:.2f}), {i!r}".format(t=self.file_type, v=self.version, i=self.epoch_index)
+
+
+def sidecar_path(rinex_file_path: str) -> str:
+    """
+    Returns path of the sidecar index file for the given RINEX file.
+    """
+    return str(rinex_file_path) + SIDECAR_SUFFIX
+
+
+def file_content_hash(rinex_file_path: str) -> str:
+    """
+    Calculates BLAKE2b hash of the file content.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with io.open(file=rinex_file_path, mode='rb') as file:
+        for chunk in iter(lambda: file.read(__HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_sidecar_index(rinex_file_path: str, index: SidecarIndex) -> None:
+    """
+    Writes the sidecar index file next to the given RINEX file.
+    The file is replaced atomically, so concurrent readers never see a partially written index.
+    """
+    path = sidecar_path(rinex_file_path)
+    temporary_path = "{p:s}.{pid:d}.tmp".format(p=path, pid=os.getpid())
+    epoch_index = index.epoch_index
+    with io.open(file=temporary_path, mode='wb') as file:
+        np.savez(file, format_version=index.format_version, file_size=index.file_size, mtime_ns=index.mtime_ns,
+                 content_hash=index.content_hash, version=index.version, file_type=index.file_type,
+                 gnss=index.gnss, header_text=index.header_text,
+                 index_file_size=epoch_index.file_size, data_offset=epoch_index.data_offset,
+                 **{name: getattr(epoch_index, name) for name in __EPOCH_INDEX_FIELDS})
+    os.replace(temporary_path, path)
+
+
+def __read_sidecar_file(path: str) -> Optional[SidecarIndex]:
+    """
+    Reads the sidecar file without executing any code from it.
+
+    :return: SidecarIndex or None if the file is not a sidecar file of the current format
+    """
+    try:
+        with np.load(path, allow_pickle=False) as archive:
+            if int(archive["format_version"]) != SIDECAR_FORMAT_VERSION:
+                return None
+            epoch_index = EpochIndex(int(archive["index_file_size"]), int(archive["data_offset"]),
+                                     *(archive[name] for name in __EPOCH_INDEX_FIELDS))
+            return SidecarIndex(int(archive["file_size"]), int(archive["mtime_ns"]), str(archive["content_hash"]),
+                                float(archive["version"]), str(archive["file_type"]), str(archive["gnss"]),
+                                str(archive["header_text"]), epoch_index)
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None
+
+
+def load_sidecar_index(rinex_file_path: str, verify_content: bool = False) -> Optional[SidecarIndex]:
+    """
+    Reads the sidecar index of the given RINEX file and validates it against the file.
+
+    The index is valid if the file size matches and either the modification time matches
+    or the content hash matches. In the latter case (e.g. file was copied or touched),
+    the sidecar file is updated with the new modification time.
+
+    :param rinex_file_path: str.
+        Required. Path to the RINEX file
+    :param verify_content: bool.
+        Optional. Set to True to always verify the content hash, even if the modification time matches.
+    :return: SidecarIndex or None if there is no valid sidecar index for the file.
+    """
+    path = sidecar_path(rinex_file_path)
+    if not os.path.exists(path):
+        return None
+    index = __read_sidecar_file(path)
+    if index is None:
+        return None
+
+    stat = os.stat(rinex_file_path)
+    if stat.st_size != index.file_size:
+        return None
+    if stat.st_mtime_ns == index.mtime_ns and not verify_content:
+        return index
+    if file_content_hash(rinex_file_path) != index.content_hash:
+        return None
+    if stat.st_mtime_ns != index.mtime_ns:
+        index.mtime_ns = stat.st_mtime_ns
+        try:
+            save_sidecar_index(rinex_file_path, index)
+        except OSError:
+            pass  # index is still valid, it will be validated by content again next time
+    return index
+
+
+def invalidate_sidecar_index(rinex_file_path: str) -> None:
+    """
+    Removes the sidecar index of the given RINEX file, if it exists.
+    """
+    try:
+        os.remove(sidecar_path(rinex_file_path))
+    except FileNotFoundError:
+        pass
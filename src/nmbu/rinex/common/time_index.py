@@ -0,0 +1,160 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from nmbu.rinex.common.nav_table import NavTable
+
+NS_PER_SECOND = 1_000_000_000
+NOT_FOUND = -1  # position returned by TimeIndex.find if no record matches
+
+
+class TimeIndex:
+    """
+    Sorted epochs of the records of a single satellite (or correction source) for fast time lookups.
+
+    Epochs are stored as int64 nanoseconds since 1970-01-01, so a lookup is a binary search.
+    If several records share the epoch, only the one read last is kept, the same way as in common.nav_table.
+
+    Examples
+    --------
+
+    >>> index = nav_time_index(list(nav.tables.values()), 'G01')
+    >>> position = index.find(time_to_ns('2022-09-29T10:00:00'))
+    >>> index.record(position).sqrt_A
+    """
+    def __init__(self, epochs: np.ndarray, fetch: Callable[[int], object], rows: Optional[np.ndarray] = None):
+        """
+        :param epochs: numpy int64 array with sorted unique epochs in nanoseconds
+        :param fetch: function that builds the record object of the given position in epochs
+        :param rows: numpy array with row of every epoch in its table, if the records come from a single NavTable
+        """
+        self.epochs: np.ndarray = epochs
+        self.rows: Optional[np.ndarray] = rows
+        self.__fetch = fetch
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def find(self, time: int, latest: bool = False, max_age: Optional[float] = None) -> int:
+        """
+        Finds position of the record that matches the given time.
+
+        :param time: int. Time in nanoseconds since 1970-01-01
+        :param latest: bool. False to find the closest record (the earlier one if two are equally close),
+            True to find the latest record at or before the given time
+        :param max_age: float. Maximal distance in seconds between the given time and the epoch of the record.
+            None for no limit
+        :return: int. Position of the record or NOT_FOUND
+        """
+        after = int(np.searchsorted(self.epochs, time, side='right'))
+        position = after - 1
+        if not latest and after < len(self.epochs) and \
+                (position < 0 or self.epochs[after] - time < time - self.epochs[position]):
+            position = after
+        if position < 0:
+            return NOT_FOUND
+        if max_age is not None and abs(int(self.epochs[position]) - time) > max_age * NS_PER_SECOND:
+            return NOT_FOUND
+        return position
+
+    def find_all(self, times: np.ndarray, latest: bool = False, max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Finds positions of the records that match the given times in one vectorized operation, see find.
+
+        :param times: numpy int64 array. Times in nanoseconds since 1970-01-01
+        :param latest: bool. False to find the closest records, True to find the latest records at or before the times
+        :param max_age: float. Maximal distance in seconds between the time and the epoch of the record.
+            None for no limit
+        :return: numpy intp array of the same shape as times with positions of the records, NOT_FOUND if no match
+        """
+        times = np.asarray(times, dtype=np.int64)
+        if len(self.epochs) == 0:
+            return np.full(times.shape, NOT_FOUND, dtype=np.intp)
+        after = np.searchsorted(self.epochs, times, side='right')
+        positions = after - 1
+        if not latest:
+            next_epochs = self.epochs[np.minimum(after, len(self.epochs) - 1)]
+            previous_epochs = self.epochs[np.maximum(positions, 0)]
+            use_next = (after < len(self.epochs)) & \
+                ((positions < 0) | (next_epochs - times < times - previous_epochs))
+            positions = np.where(use_next, after, positions)
+        found = positions >= 0
+        if max_age is not None:
+            distance = np.abs(self.epochs[np.maximum(positions, 0)] - times)
+            found &= distance <= max_age * NS_PER_SECOND
+        return np.where(found, positions, NOT_FOUND).astype(np.intp)
+
+    def record(self, position: int):
+        """
+        Builds the record object of the given position, see find.
+        """
+        return self.__fetch(position)
+
+
+def nav_time_index(tables: List[NavTable], sv: str) -> TimeIndex:
+    """
+    Builds time index of all records of the satellite in the given navigation tables,
+    e.g. LNAV and CNAV ephemerides of a GPS satellite.
+
+    :param tables: List[NavTable]. Tables to search, in the order they were read
+    :param sv: str. Satellite name, e.g. 'G01'. STO/EOP/ION records use the name from the record start line, e.g. 'G'.
+        A single GNSS letter, e.g. 'G', selects records of all satellites of that GNSS
+    :return: TimeIndex, empty if the satellite has no records
+    """
+    parts = [(table, table.sv_rows(sv) if len(sv) > 1 else __gnss_rows(table, sv)) for table in tables]
+    parts = [(table, rows) for table, rows in parts if len(rows)]
+    if not parts:
+        return TimeIndex(np.empty(0, dtype=np.int64), lambda position: None, np.empty(0, dtype=np.intp))
+    epochs = np.concatenate([table.records['epoch'][rows].astype(np.int64) for table, rows in parts])
+    part_ids = np.concatenate([np.full(len(rows), part, dtype=np.intp) for part, (_, rows) in enumerate(parts)])
+    rows = np.concatenate([rows for _, rows in parts])
+
+    order = np.argsort(epochs, kind='stable')
+    epochs, part_ids, rows = epochs[order], part_ids[order], rows[order]
+    last = np.append(epochs[1:] != epochs[:-1], True)  # the record read last wins
+    epochs, part_ids, rows = epochs[last], part_ids[last], rows[last]
+    return TimeIndex(epochs, lambda position: parts[part_ids[position]][0].row(rows[position]),
+                     rows if len(parts) == 1 else None)
+
+
+def __gnss_rows(table: NavTable, gnss: str) -> np.ndarray:
+    """
+    Returns row indices of all records of the GNSS, sorted by epoch.
+    """
+    rows = np.flatnonzero(np.char.startswith(table.records['sv'], gnss)) if len(gnss) else np.empty(0, dtype=np.intp)
+    return rows[np.argsort(table.records['epoch'][rows], kind='stable')]
+
+
+def mapping_time_index(blocks: Dict[str, object]) -> TimeIndex:
+    """
+    Builds time index of records stored in a dictionary {timestamp: record}, e.g. corrections of NavigationHeaderV3.
+    Keys that are not ISO timestamps (e.g. 'NO_TIME') are not indexed.
+
+    :param blocks: Dict[str, object]. Records by timestamp in ISO format, e.g. '2022-09-29T10:00:00'
+    :return: TimeIndex
+    """
+    timestamps, epochs = [], []
+    for timestamp in blocks:
+        try:
+            epochs.append(np.datetime64(timestamp, 'ns').astype(np.int64))
+        except ValueError:
+            continue
+        timestamps.append(timestamp)
+    order = np.argsort(np.array(epochs, dtype=np.int64), kind='stable')
+    return TimeIndex(np.array(epochs, dtype=np.int64)[order],
+                     lambda position: blocks[timestamps[order[position]]])
+
+
+def time_to_ns(timestamp) -> int:
+    """
+    Converts timestamp to nanoseconds since 1970-01-01.
+
+    ValueError is raised if the timestamp is not valid.
+
+    :param timestamp: timestamp in ISO format (e.g. '2020-01-01T00:00:00'), datetime or numpy datetime64
+    :return: int
+    """
+    return int(np.datetime64(timestamp, 'ns').astype(np.int64))
@@ -0,0 +1,172 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import heapq
+from typing import Dict
+
+import numpy as np
+
+from nmbu.rinex.common.nav_table import NavTable
+from nmbu.rinex.common.time_index import NOT_FOUND, NS_PER_SECOND
+from nmbu.rinex.navigation.keplerian import SECONDS_IN_WEEK, seconds_of_week, wrap_week
+
+# half of the validity interval around the reference time of ephemeris in seconds,
+# used if the record holds no fit interval
+DEFAULT_VALIDITY: Dict[str, float] = {
+    'G': 7200.0, 'J': 7200.0, 'I': 7200.0,
+    'E': 14400.0,
+    'C': 21600.0,
+    'R': 1800.0,
+    'S': 360.0,
+}
+__HEALTH_FIELDS = ('SV_health', 'satH1', 'health')  # the first available field is used
+
+
+class ValidityIndex:
+    """
+    Non-overlapping validity segments of the ephemerides of a single satellite.
+
+    Every usable record is valid from its transmission time (or from the start of its fit interval,
+    if the transmission time is unknown) to the end of its fit interval.
+    Where validity intervals overlap, the most recent record, i.e. the one with the latest start, is used,
+    so the overlaps are resolved once when the index is built and a lookup is a binary search.
+
+    Examples
+    --------
+
+    >>> index = nav_validity_index(nav.tables['GPS_LNAV'], 'G01')
+    >>> rows = index.find_all(times)  # rows of the valid records in the table, NOT_FOUND if there is none
+    """
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, rows: np.ndarray):
+        """
+        :param starts: numpy int64 array with sorted starts of the segments in nanoseconds
+        :param ends: numpy int64 array with ends of the segments in nanoseconds (inclusive)
+        :param rows: numpy intp array with row of the record of every segment in its table
+        """
+        self.starts: np.ndarray = starts
+        self.ends: np.ndarray = ends
+        self.rows: np.ndarray = rows
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def find_all(self, times: np.ndarray) -> np.ndarray:
+        """
+        Finds the records valid at the given times in one vectorized operation.
+
+        :param times: numpy int64 array. Times in nanoseconds since 1970-01-01
+        :return: numpy intp array of the same shape as times with rows of the records, NOT_FOUND if there is none
+        """
+        times = np.asarray(times, dtype=np.int64)
+        positions = np.searchsorted(self.starts, times, side='right') - 1
+        found = positions >= 0
+        found[found] = times[found] <= self.ends[positions[found]]
+        if len(self.rows) == 0:
+            return np.full(times.shape, NOT_FOUND, dtype=np.intp)
+        return np.where(found, self.rows[np.maximum(positions, 0)], NOT_FOUND).astype(np.intp)
+
+
+def validity_intervals(records: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+    """
+    Computes validity intervals of navigation records.
+
+    - Reference time: Toe, or the epoch of the record if there is no Toe (CNAV, GLONASS, SBAS)
+    - End: reference time + half of the fit interval. Fit interval is given in hours in GPS records
+      and as a flag in QZSS records (0 for 2 hours), otherwise DEFAULT_VALIDITY is used
+    - Start: transmission time t_tm, or reference time - half of the fit interval if it is unknown
+    - Healthy: health field is 0
+    - Consistent: IODE equals the 8 least significant bits of IODC, if the records hold both,
+      otherwise the record was read during a data set cutover
+
+    :param records: numpy structured array with navigation records of a single table
+    :return: Tuple of numpy arrays: start and end in nanoseconds (int64), healthy and consistent flags (bool)
+    """
+    names = records.dtype.names
+    epochs = records['epoch']
+    gnss = records['sv'].astype('U1')
+    half = np.array([DEFAULT_VALIDITY.get(name, 0.0) for name in gnss.tolist()], dtype=np.float64)
+
+    toc = seconds_of_week(epochs)
+    if 'Toe' in names:
+        toe = records['Toe'].astype(np.float64)
+        reference = epochs.astype(np.int64) + np.round(wrap_week(toe - toc) * NS_PER_SECOND).astype(np.int64)
+    else:
+        toe = toc
+        reference = epochs.astype(np.int64)
+    if 'fit_interval' in names:
+        fit = records['fit_interval'].astype(np.float64)
+        hours = np.where(fit > 1.0, fit, np.where((gnss == 'J') & (fit == 0.0), 2.0, 4.0))
+        half = np.where(np.isnan(fit), half, hours * 1800.0)
+
+    start = reference - np.round(half * NS_PER_SECOND).astype(np.int64)
+    if 't_tm' in names:
+        transmission = records['t_tm'].astype(np.float64)
+        known = np.abs(transmission) < SECONDS_IN_WEEK  # unknown transmission times are 0.999999999E+09
+        offset = np.where(known, wrap_week(np.where(known, transmission, 0.0) - toe), 0.0)
+        start = np.where(known, reference + np.round(offset * NS_PER_SECOND).astype(np.int64), start)
+    end = reference + np.round(half * NS_PER_SECOND).astype(np.int64)
+
+    health = next((records[name].astype(np.float64) for name in __HEALTH_FIELDS if name in names),
+                  np.zeros(len(records)))
+    healthy = (health == 0.0) | np.isnan(health)
+    consistent = ~np.isnat(epochs)
+    if 'IODE' in names and 'IODC' in names:
+        iode, iodc = records['IODE'].astype(np.float64), records['IODC'].astype(np.float64)
+        consistent &= (iode == np.mod(iodc, 256.0)) | np.isnan(iode) | np.isnan(iodc)
+    return start, end, healthy, consistent
+
+
+def __sweep_owners(bounds: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """
+    Finds the owner of every elementary segment in one sweep over the sorted segment starts.
+    Records are expected to be sorted by priority, the active record with the highest position wins.
+    Active records are kept in a heap, records that have ended are dropped when they reach the top.
+
+    :return: numpy intp array with position of the owner of the segment starting at every bound, -1 if there is none
+    """
+    owner = np.full(len(bounds), -1, dtype=np.intp)
+    order = np.argsort(start, kind='stable')
+    active = []
+    next_record = 0
+    for position, bound in enumerate(bounds.tolist()):
+        while next_record < len(order) and start[order[next_record]] <= bound:
+            heapq.heappush(active, -int(order[next_record]))
+            next_record += 1
+        while active and end[-active[0]] < bound:
+            heapq.heappop(active)
+        if active:
+            owner[position] = -active[0]
+    return owner
+
+
+def nav_validity_index(table: NavTable, sv: str, healthy: bool = True) -> ValidityIndex:
+    """
+    Builds validity index of the ephemerides of the satellite in the given navigation table.
+    Records with inconsistent issue of data are never used.
+
+    :param table: NavTable with ephemerides, e.g. nav.tables['GPS_LNAV']
+    :param sv: str. Satellite name, e.g. 'G01'
+    :param healthy: bool. True to use only records of a healthy satellite
+    :return: ValidityIndex, empty if the satellite has no usable records
+    """
+    rows = table.sv_rows(sv)
+    start, end, is_healthy, consistent = validity_intervals(table.records[rows])
+    usable = consistent & (is_healthy | (not healthy)) & (end >= start)
+    rows, start, end = rows[usable], start[usable], end[usable]
+    reference = table.records['epoch'][rows].astype(np.int64)
+    order = np.lexsort((reference, start))  # the latest start wins, then the latest record
+    rows, start, end = rows[order], start[order], end[order]
+    if len(rows) == 0:
+        return ValidityIndex(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), rows)
+
+    # elementary segments between all starts and ends, every segment belongs to the latest started active record
+    bounds = np.unique(np.concatenate([start, end + 1]))
+    owner = __sweep_owners(bounds, start, end)
+    has_owner = owner >= 0
+    bounds, owner = bounds[has_owner], owner[has_owner]
+    segment_ends = np.minimum(np.append(bounds[1:] - 1, end[owner[-1]]), end[owner])
+    # merge neighbouring segments of the same record
+    first = np.ones(len(owner), dtype=bool)
+    first[1:] = (owner[1:] != owner[:-1]) | (bounds[1:] != segment_ends[:-1] + 1)
+    last = np.append(first[1:], True)
+    return ValidityIndex(bounds[first], segment_ends[last], rows[owner[first]])
@@ -0,0 +1,230 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Optional
+
+import numpy as np
+
+from nmbu.rinex.common.nav_table import NavTable
+from nmbu.rinex.common.time_index import NOT_FOUND, NS_PER_SECOND, TimeIndex
+
+ARCSECOND = np.pi / 648000.0  # radians
+SECONDS_IN_DAY = 86400.0
+J2000 = np.datetime64('2000-01-01T12:00:00', 'ns')
+# Earth rotation angle of the IERS Conventions 2010: 2 pi (ERA_0 + ERA_RATE * days since J2000 UT1)
+ERA_0 = 0.7790572732640
+ERA_RATE = 1.00273781191135448
+EARTH_ROTATION_RATE = 2.0 * np.pi * ERA_RATE / SECONDS_IN_DAY  # rad/s
+__TIO_LOCATOR_RATE = -47e-6 * ARCSECOND  # s' per Julian century
+__NS_PER_DAY = 86400 * NS_PER_SECOND
+
+
+class EarthOrientationParameters:
+    """
+    Class that holds Earth orientation parameters evaluated at many epochs, see EarthOrientationTable.evaluate.
+    All arrays have the shape of the given times. Values of epochs without EOP record are NaN.
+    Contains following fields:
+
+    - xp: numpy float64 array. Polar motion x in radians
+    - yp: numpy float64 array. Polar motion y in radians
+    - ut1_utc: numpy float64 array. UT1 - UTC in seconds
+    """
+    def __init__(self, xp: np.ndarray, yp: np.ndarray, ut1_utc: np.ndarray):
+        self.xp: np.ndarray = xp
+        self.yp: np.ndarray = yp
+        self.ut1_utc: np.ndarray = ut1_utc
+
+    def __repr__(self):
+        return "Earth orientation at {n:d} epochs".format(n=self.ut1_utc.size)
+
+
+class EarthOrientationTable:
+    """
+    Broadcast Earth orientation parameters sorted by their reference time, evaluated for many epochs at once.
+
+    Every parameter p is given by its value, rate and second derivative at the reference time t_EOP
+    (arcseconds, arcseconds/day and arcseconds/day^2 for polar motion, seconds, seconds/day and seconds/day^2
+    for UT1 - UTC, as in RINEX 4 EOP records) and is evaluated as p + rate * dt + second derivative * dt^2 / 2,
+    where dt is the time since t_EOP in days.
+    The record of every epoch is found with a binary search, the same way as in common.time_index.
+
+    Examples
+    --------
+
+    >>> table = eop_table(nav.tables['EOP'])
+    >>> eop = table.evaluate(epochs)
+    >>> eop.ut1_utc  # UT1 - UTC in seconds at every epoch
+    """
+    def __init__(self, epochs: np.ndarray, xp: np.ndarray, yp: np.ndarray, ut1_utc: np.ndarray):
+        """
+        :param epochs: numpy datetime64 array with reference times of the records
+        :param xp: numpy float64 array (n, 3). Polar motion x, its rate and second derivative
+        :param yp: numpy float64 array (n, 3). Polar motion y, its rate and second derivative
+        :param ut1_utc: numpy float64 array (n, 3). UT1 - UTC, its rate and second derivative
+        """
+        epochs = np.asarray(epochs, dtype='datetime64[ns]')
+        valid = ~np.isnat(epochs)
+        nanoseconds = epochs[valid].astype(np.int64)
+        coefficients = np.stack([np.asarray(values, dtype=np.float64).reshape(-1, 3)[valid]
+                                 for values in (xp, yp, ut1_utc)], axis=1)
+        order = np.argsort(nanoseconds, kind='stable')
+        nanoseconds, coefficients = nanoseconds[order], coefficients[order]
+        if len(nanoseconds):
+            last = np.append(nanoseconds[1:] != nanoseconds[:-1], True)  # the record read last wins
+            nanoseconds, coefficients = nanoseconds[last], coefficients[last]
+        self.index: TimeIndex = TimeIndex(nanoseconds, lambda position: coefficients[position])
+        self.coefficients: np.ndarray = coefficients  # (n, parameter, order)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def evaluate(self, times, latest: bool = True, max_age: Optional[float] = None) -> EarthOrientationParameters:
+        """
+        Evaluates the parameters at the given epochs.
+
+        :param times: numpy datetime64 array or ISO strings. Epochs in GPS time
+        :param latest: True to use the latest records at or before the epochs, False to use the closest records
+        :param max_age: maximal distance in seconds between the epoch and the reference time. None for no limit
+        :return: EarthOrientationParameters
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        positions = self.index.find_all(times.astype(np.int64), latest, max_age)
+        found = (positions != NOT_FOUND) & ~np.isnat(times)
+        if len(self) == 0:
+            nan = np.full(times.shape, np.nan)
+            return EarthOrientationParameters(nan, nan.copy(), nan.copy())
+        selected = np.maximum(positions, 0)
+        days = (times.astype(np.int64) - self.index.epochs[selected]) / (SECONDS_IN_DAY * NS_PER_SECOND)
+        coefficients = self.coefficients[selected]  # (..., parameter, order)
+        values = coefficients[..., 0] + (coefficients[..., 1] + 0.5 * coefficients[..., 2] * days[..., None]) * \
+            days[..., None]
+        values = np.where(found[..., None], values, np.nan)
+        return EarthOrientationParameters(values[..., 0] * ARCSECOND, values[..., 1] * ARCSECOND, values[..., 2])
+
+
+def eop_table(table: NavTable, source: str = '') -> EarthOrientationTable:
+    """
+    Builds EarthOrientationTable from EOP records of a RINEX 4 navigation file.
+
+    :param table: NavTable with EOP records, e.g. nav.tables['EOP']
+    :param source: satellite (e.g. 'G01') or GNSS (e.g. 'G') that broadcast the records. '' for all records
+    :return: EarthOrientationTable
+    """
+    records = table.records[np.char.startswith(table.records['sv'], source)] if source else table.records
+    return EarthOrientationTable(
+        records['epoch'],
+        np.column_stack([records['xp'], records['dxp_dt'], records['dxp_dt2']]),
+        np.column_stack([records['Yp'], records['dYpdt'], records['dYpdt2']]),
+        np.column_stack([records['deltaUT1'], records['ddeltaUT1dt'], records['ddeltaUT1dt2']]))
+
+
+def earth_rotation_angle(ut1: np.ndarray) -> np.ndarray:
+    """
+    Computes Earth rotation angle, IERS Conventions 2010 eq. 5.15.
+
+    :param ut1: numpy datetime64 array. Epochs in UT1
+    :return: numpy float64 array in radians, in [0, 2 pi)
+    """
+    nanoseconds = np.asarray(ut1, dtype='datetime64[ns]').astype(np.int64) - J2000.astype(np.int64)
+    days, fraction = np.divmod(nanoseconds, __NS_PER_DAY)
+    turns = fraction / __NS_PER_DAY + ERA_0 + (ERA_RATE - 1.0) * (days + fraction / __NS_PER_DAY)
+    return 2.0 * np.pi * np.mod(turns, 1.0)
+
+
+def terrestrial_to_celestial(utc, eop: EarthOrientationParameters, celestial: Optional[np.ndarray] = None) \
+        -> np.ndarray:
+    """
+    Computes rotation matrices from ITRS (ECEF) to the celestial frame at many epochs,
+    IERS Conventions 2010 eq. 5.1: celestial = Q R W ITRS.
+
+    W is the polar motion with TIO locator s', R is the rotation by Earth rotation angle.
+    Q is the precession-nutation matrix, which is not broadcast. Without it the celestial frame is
+    the Celestial Intermediate Reference System (CIRS). To rotate into GCRS, pass Q as celestial,
+    e.g. from IAU 2006/2000A precession-nutation.
+
+    :param utc: numpy datetime64 array. Epochs in UTC
+    :param eop: EarthOrientationParameters at the epochs
+    :param celestial: numpy float64 array (..., 3, 3). Optional Q matrices, from CIRS to GCRS
+    :return: numpy float64 array (..., 3, 3)
+    """
+    utc = np.asarray(utc, dtype='datetime64[ns]')
+    ut1 = utc + np.round(np.nan_to_num(eop.ut1_utc) * NS_PER_SECOND).astype(np.int64).astype('timedelta64[ns]')
+    matrix = __rotation(2, -earth_rotation_angle(ut1)) @ __polar_motion(utc, eop)
+    matrix = np.where(np.isnan(eop.ut1_utc)[..., None, None] | np.isnat(utc)[..., None, None], np.nan, matrix)
+    if celestial is not None:
+        matrix = np.asarray(celestial, dtype=np.float64) @ matrix
+    return matrix
+
+
+def ecef_to_eci(positions: np.ndarray, utc, eop: EarthOrientationParameters, velocities: Optional[np.ndarray] = None,
+                celestial: Optional[np.ndarray] = None):
+    """
+    Rotates ECEF positions (and velocities) into the celestial frame, see terrestrial_to_celestial.
+    Velocities include the rotation of the Earth.
+
+    :param positions: numpy float64 array (..., 3). ECEF positions in meters
+    :param utc: numpy datetime64 array of the shape of positions without the last axis. Epochs in UTC
+    :param eop: EarthOrientationParameters at the epochs
+    :param velocities: numpy float64 array (..., 3). Optional ECEF velocities in m/s
+    :param celestial: numpy float64 array (..., 3, 3). Optional precession-nutation matrices
+    :return: numpy float64 array (..., 3) with positions, or a tuple of positions and velocities
+    """
+    matrix = terrestrial_to_celestial(utc, eop, celestial)
+    positions = np.asarray(positions, dtype=np.float64)
+    result = np.einsum('...ij,...j->...i', matrix, positions)
+    if velocities is None:
+        return result
+    # the Earth rotates around the CIP, i.e. the z axis of the terrestrial intermediate frame W ITRS
+    polar_motion = __polar_motion(utc, eop)
+    intermediate = np.einsum('...ij,...j->...i', polar_motion, positions)
+    rotation = np.einsum('...ji,...j->...i', polar_motion,
+                         np.cross(np.array([0.0, 0.0, EARTH_ROTATION_RATE]), intermediate))
+    return result, np.einsum('...ij,...j->...i', matrix, np.asarray(velocities, dtype=np.float64) + rotation)
+
+
+def eci_to_ecef(positions: np.ndarray, utc, eop: EarthOrientationParameters, velocities: Optional[np.ndarray] = None,
+                celestial: Optional[np.ndarray] = None):
+    """
+    Rotates celestial positions (and velocities) into ECEF, the inverse of ecef_to_eci.
+
+    :param positions: numpy float64 array (..., 3). Celestial positions in meters
+    :param utc: numpy datetime64 array of the shape of positions without the last axis. Epochs in UTC
+    :param eop: EarthOrientationParameters at the epochs
+    :param velocities: numpy float64 array (..., 3). Optional celestial velocities in m/s
+    :param celestial: numpy float64 array (..., 3, 3). Optional precession-nutation matrices
+    :return: numpy float64 array (..., 3) with positions, or a tuple of positions and velocities
+    """
+    matrix = np.swapaxes(terrestrial_to_celestial(utc, eop, celestial), -1, -2)
+    result = np.einsum('...ij,...j->...i', matrix, np.asarray(positions, dtype=np.float64))
+    if velocities is None:
+        return result
+    rotated = np.einsum('...ij,...j->...i', matrix, np.asarray(velocities, dtype=np.float64))
+    polar_motion = __polar_motion(utc, eop)
+    intermediate = np.einsum('...ij,...j->...i', polar_motion, result)
+    rotation = np.einsum('...ji,...j->...i', polar_motion,
+                         np.cross(np.array([0.0, 0.0, EARTH_ROTATION_RATE]), intermediate))
+    return result, rotated - rotation
+
+
+def __polar_motion(utc: np.ndarray, eop: EarthOrientationParameters) -> np.ndarray:
+    """
+    Polar motion matrices W = R3(-s') R2(xp) R1(yp), IERS Conventions 2010 eq. 5.3.
+    """
+    centuries = (np.asarray(utc, dtype='datetime64[ns]') - J2000).astype(np.int64) / (36525.0 * __NS_PER_DAY)
+    return __rotation(2, -__TIO_LOCATOR_RATE * centuries) @ __rotation(1, eop.xp) @ __rotation(0, eop.yp)
+
+
+def __rotation(axis: int, angle) -> np.ndarray:
+    """
+    Rotation matrices R1, R2, R3 (axis 0, 1, 2) of the IERS Conventions for arrays of angles.
+    """
+    angle = np.asarray(angle, dtype=np.float64)
+    cos, sin = np.cos(angle), np.sin(angle)
+    matrix = np.zeros(angle.shape + (3, 3))
+    first, second = [index for index in range(3) if index != axis]
+    matrix[..., axis, axis] = 1.0
+    matrix[..., first, first] = cos
+    matrix[..., second, second] = cos
+    matrix[..., first, second] = sin if axis != 1 else -sin
+    matrix[..., second, first] = -sin if axis != 1 else sin
+    return matrix
@@ -0,0 +1,317 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import math
+
+import numpy as np
+
+from nmbu.rinex.navigation.keplerian import SPEED_OF_LIGHT
+
+GPS_L1 = 1575.42e6  # Hz, reference frequency of the GPS/QZSS/NavIC Klobuchar model
+BDS_B1I = 1561.098e6  # Hz, reference frequency of the BDS Klobuchar model
+GAL_E1 = 1575.42e6  # Hz, reference frequency of NeQuick G
+BDS_B1C = 1575.42e6  # Hz, reference frequency of BDGIM
+TEC_UNIT = 1e16  # electrons/m^2
+
+__SECONDS_IN_DAY = 86400.0
+__NIGHT_DELAY = 5e-9  # s, constant vertical delay of the night time
+__BDS_EARTH_RADIUS = 6378.0  # km
+__BDS_IONOSPHERE_HEIGHT = 375.0  # km
+__BDGIM_IONOSPHERE_HEIGHT = 400.0  # km
+__BDGIM_POLE_LATITUDE = np.deg2rad(80.27)  # geomagnetic north pole of BDGIM
+__BDGIM_POLE_LONGITUDE = np.deg2rad(-72.58)
+# degree and order (n, m) of the spherical harmonics of the broadcast coefficients Alpha1..Alpha9
+__BDGIM_TERMS = ((0, 0), (1, 0), (1, 1), (1, -1), (2, 0), (2, 1), (2, -1), (2, 2), (2, -2))
+# degree and order (n, m) of the spherical harmonics of the non-broadcast coefficients Beta1..Beta17
+__BDGIM_NON_BROADCAST_TERMS = ((3, 0), (3, 1), (3, -1), (3, 2), (3, -2), (3, 3), (3, -3),
+                               (4, 0), (4, 1), (4, -1), (4, 2), (4, -2), (5, 0), (5, 1), (5, -1), (5, 2), (5, -2))
+BDGIM_NON_BROADCAST_SIZE = len(__BDGIM_NON_BROADCAST_TERMS)
+__MJD_ORIGIN = np.datetime64('1858-11-17T00:00:00', 'ns')
+__IONOSPHERE_CONSTANT = 40.3  # m^3/s^2, group delay is 40.3 * TEC / f^2
+
+
+def __seconds_of_day(times) -> np.ndarray:
+    nanoseconds = np.asarray(times, dtype='datetime64[ns]')
+    return (nanoseconds - nanoseconds.astype('datetime64[D]')).astype(np.int64) / 1e9
+
+
+def __polynomial(coefficients: np.ndarray, value: np.ndarray) -> np.ndarray:
+    """
+    Evaluates sum(coefficients[..., n] * value ** n) for the 4 coefficients of the Klobuchar model.
+    """
+    return coefficients[..., 0] + value * (coefficients[..., 1] + value * (coefficients[..., 2] +
+                                                                           value * coefficients[..., 3]))
+
+
+def __to_frequency(delay: np.ndarray, reference: float, frequency) -> np.ndarray:
+    """
+    Converts delay in seconds at the reference frequency into meters at the given frequency.
+    """
+    return delay * SPEED_OF_LIGHT * (reference / np.asarray(frequency, dtype=np.float64)) ** 2
+
+
+def __pierce_point(latitude: np.ndarray, longitude: np.ndarray, azimuth: np.ndarray, elevation: np.ndarray,
+                   height: float) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Computes the ionospheric pierce point of a thin shell at the given height above the sphere of radius 6378 km.
+
+    :return: Tuple of latitude and longitude of the pierce point in radians
+        and the sine of the zenith angle of the ray at the pierce point
+    """
+    ratio_cos = __BDS_EARTH_RADIUS / (__BDS_EARTH_RADIUS + height) * np.cos(elevation)
+    earth_angle = np.pi / 2.0 - elevation - np.arcsin(ratio_cos)
+    pierce_latitude = np.arcsin(np.sin(latitude) * np.cos(earth_angle) +
+                                np.cos(latitude) * np.sin(earth_angle) * np.cos(azimuth))
+    pierce_longitude = longitude + np.arcsin(np.sin(earth_angle) * np.sin(azimuth) / np.cos(pierce_latitude))
+    return pierce_latitude, pierce_longitude, ratio_cos
+
+
+def tec_delay(tec, frequency) -> np.ndarray:
+    """
+    Converts total electron content along the ray into ionospheric group delay.
+
+    :param tec: Total electron content in TEC units (1e16 electrons/m^2)
+    :param frequency: Frequency of the signal in Hz
+    :return: numpy float64 array. Group delays in meters
+    """
+    return __IONOSPHERE_CONSTANT * TEC_UNIT * np.asarray(tec, dtype=np.float64) / \
+        np.asarray(frequency, dtype=np.float64) ** 2
+
+
+def klobuchar_delay(alpha: np.ndarray, beta: np.ndarray, latitude, longitude, azimuth, elevation, times,
+                    frequency=GPS_L1) -> np.ndarray:
+    """
+    Computes slant ionospheric delays with the Klobuchar model of GPS, QZSS and NavIC (IS-GPS-200, 20.3.3.5.2.5)
+    for whole arrays of receivers, satellites and times at once. All inputs are broadcast against each other.
+
+    Examples
+    --------
+
+    >>> alpha, beta = rinex.klobuchar_coefficients('G', times)
+    >>> delay = klobuchar_delay(alpha, beta, latitude, longitude, azimuth, elevation, times)
+
+    Delays of several frequencies at once
+
+    >>> delay = klobuchar_delay(alpha[:, None], beta[:, None], latitude[:, None], longitude[:, None],
+    >>>                         azimuth[:, None], elevation[:, None], times[:, None], frequency=[GPS_L1, 1227.60e6])
+
+    :param alpha: numpy float64 array (..., 4). Amplitude coefficients Alpha0..Alpha3
+    :param beta: numpy float64 array (..., 4). Period coefficients Beta0..Beta3
+    :param latitude: Geodetic latitude of the receiver in radians
+    :param longitude: Geodetic longitude of the receiver in radians
+    :param azimuth: Azimuth of the satellite in radians
+    :param elevation: Elevation of the satellite in radians
+    :param times: numpy datetime64 array. Times in GPS time
+    :param frequency: Frequency of the signal in Hz
+    :return: numpy float64 array. Slant ionospheric delays in meters, NaN if coefficients are missing
+    """
+    alpha = np.asarray(alpha, dtype=np.float64)
+    beta = np.asarray(beta, dtype=np.float64)
+    # the model works in semicircles
+    latitude = np.asarray(latitude, dtype=np.float64) / np.pi
+    longitude = np.asarray(longitude, dtype=np.float64) / np.pi
+    azimuth = np.asarray(azimuth, dtype=np.float64)
+    elevation = np.asarray(elevation, dtype=np.float64) / np.pi
+
+    earth_angle = 0.0137 / (elevation + 0.11) - 0.022
+    pierce_latitude = np.clip(latitude + earth_angle * np.cos(azimuth), -0.416, 0.416)
+    pierce_longitude = longitude + earth_angle * np.sin(azimuth) / np.cos(pierce_latitude * np.pi)
+    magnetic_latitude = pierce_latitude + 0.064 * np.cos((pierce_longitude - 1.617) * np.pi)
+    local_time = np.mod(4.32e4 * pierce_longitude + __seconds_of_day(times), __SECONDS_IN_DAY)
+    slant_factor = 1.0 + 16.0 * (0.53 - elevation) ** 3
+
+    amplitude = np.maximum(__polynomial(alpha, magnetic_latitude), 0.0)
+    period = np.maximum(__polynomial(beta, magnetic_latitude), 72000.0)
+    phase = 2.0 * np.pi * (local_time - 50400.0) / period
+    day_delay = amplitude * (1.0 - phase ** 2 / 2.0 + phase ** 4 / 24.0)
+    delay = slant_factor * (__NIGHT_DELAY + np.where(np.abs(phase) < 1.57, day_delay, 0.0))
+    delay = np.where(np.isnan(phase), np.nan, delay)
+    return __to_frequency(delay, GPS_L1, frequency)
+
+
+def bds_klobuchar_delay(alpha: np.ndarray, beta: np.ndarray, latitude, longitude, azimuth, elevation, times,
+                        frequency=BDS_B1I) -> np.ndarray:
+    """
+    Computes slant ionospheric delays with the Klobuchar model of BDS (BDS SIS ICD, 5.2.4.7),
+    which uses the geographic latitude of the pierce point at 375 km and a limited period.
+    All inputs are broadcast against each other, see klobuchar_delay.
+
+    :param alpha: numpy float64 array (..., 4). Amplitude coefficients Alpha0..Alpha3
+    :param beta: numpy float64 array (..., 4). Period coefficients Beta0..Beta3
+    :param latitude: Geodetic latitude of the receiver in radians
+    :param longitude: Geodetic longitude of the receiver in radians
+    :param azimuth: Azimuth of the satellite in radians
+    :param elevation: Elevation of the satellite in radians
+    :param times: numpy datetime64 array. Times in BDS time
+    :param frequency: Frequency of the signal in Hz
+    :return: numpy float64 array. Slant ionospheric delays in meters, NaN if coefficients are missing
+    """
+    alpha = np.asarray(alpha, dtype=np.float64)
+    beta = np.asarray(beta, dtype=np.float64)
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    azimuth = np.asarray(azimuth, dtype=np.float64)
+    elevation = np.asarray(elevation, dtype=np.float64)
+
+    pierce_latitude, pierce_longitude, ratio_cos = __pierce_point(latitude, longitude, azimuth, elevation,
+                                                                  __BDS_IONOSPHERE_HEIGHT)
+    local_time = np.mod(__seconds_of_day(times) + pierce_longitude * 43200.0 / np.pi, __SECONDS_IN_DAY)
+
+    semicircles = np.abs(pierce_latitude / np.pi)
+    amplitude = np.maximum(__polynomial(alpha, semicircles), 0.0)
+    period = np.clip(__polynomial(beta, semicircles), 72000.0, 172800.0)
+    vertical = __NIGHT_DELAY + np.where(np.abs(local_time - 50400.0) < period / 4.0,
+                                        amplitude * np.cos(2.0 * np.pi * (local_time - 50400.0) / period), 0.0)
+    vertical = np.where(np.isnan(amplitude) | np.isnan(period), np.nan, vertical)
+    return __to_frequency(vertical / np.sqrt(1.0 - ratio_cos ** 2), BDS_B1I, frequency)
+
+
+def __geomagnetic(latitude: np.ndarray, longitude: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Converts geographic coordinates into the geomagnetic coordinates of BDGIM, all in radians.
+    """
+    delta = longitude - __BDGIM_POLE_LONGITUDE
+    sin_latitude = np.sin(__BDGIM_POLE_LATITUDE) * np.sin(latitude) + \
+        np.cos(__BDGIM_POLE_LATITUDE) * np.cos(latitude) * np.cos(delta)
+    magnetic_longitude = np.arctan2(np.cos(latitude) * np.sin(delta),
+                                    np.sin(__BDGIM_POLE_LATITUDE) * np.cos(latitude) * np.cos(delta) -
+                                    np.cos(__BDGIM_POLE_LATITUDE) * np.sin(latitude))
+    return np.arcsin(np.clip(sin_latitude, -1.0, 1.0)), magnetic_longitude
+
+
+def __bdgim_harmonics(latitude: np.ndarray, longitude: np.ndarray, terms) -> np.ndarray:
+    """
+    Evaluates normalized spherical harmonics of BDGIM, cos(m * longitude) for m >= 0 and sin(|m| * longitude) else.
+
+    :param latitude: geomagnetic latitude in radians
+    :param longitude: sun-fixed geomagnetic longitude in radians
+    :param terms: degree and order (n, m) of the harmonics
+    :return: numpy float64 array (..., len(terms))
+    """
+    x, c = np.sin(latitude), np.cos(latitude)
+    degree = max(n for n, _ in terms)
+    legendre = {}
+    for m in range(degree + 1):
+        legendre[(m, m)] = math.prod(range(1, 2 * m, 2)) * c ** m
+        if m < degree:
+            legendre[(m + 1, m)] = (2 * m + 1) * x * legendre[(m, m)]
+        for n in range(m + 2, degree + 1):
+            legendre[(n, m)] = ((2 * n - 1) * x * legendre[(n - 1, m)] - (n + m - 1) * legendre[(n - 2, m)]) / (n - m)
+    harmonics = []
+    for n, m in terms:
+        order = abs(m)
+        norm = np.sqrt((2.0 if order else 1.0) * (2 * n + 1) * math.factorial(n - order) / math.factorial(n + order))
+        harmonics.append(norm * legendre[(n, order)] * (np.cos(m * longitude) if m >= 0 else np.sin(order * longitude)))
+    return np.stack(harmonics, axis=-1)
+
+
+def read_bdgim_table(path: str) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Reads the table of the non-broadcast coefficients of BDGIM (BDS SIS ICD B1C, 7.12.3).
+    Every line holds the period Tk of a term in days (0 for the constant term), the 17 cosine coefficients
+    ak1..ak17 and the 17 sine coefficients bk1..bk17, so that Beta_j = sum(akj * cos(wk * t) + bkj * sin(wk * t))
+    with wk = 2 * pi / Tk and t in days of the modified Julian date. Empty lines and lines starting with # are skipped.
+
+    ValueError is raised if a line does not hold the expected amount of values.
+
+    :param path: str. Path to the text file with the table of the ICD
+    :return: Tuple of numpy float64 arrays: periods (k,), cosine coefficients (k, 17) and sine coefficients (k, 17)
+    """
+    size = 1 + 2 * BDGIM_NON_BROADCAST_SIZE
+    rows = []
+    with open(path, 'r') as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            row = np.array(line.replace('D', 'E').split(), dtype=np.float64)
+            if row.size != size:
+                raise ValueError("Line {n:d} of {p:s} holds {a:d} values instead of {s:d}".format(
+                    n=number, p=path, a=row.size, s=size))
+            rows.append(row)
+    if not rows:
+        raise ValueError("{p:s} holds no coefficients".format(p=path))
+    table = np.stack(rows)
+    return table[:, 0], table[:, 1:1 + BDGIM_NON_BROADCAST_SIZE], table[:, 1 + BDGIM_NON_BROADCAST_SIZE:]
+
+
+def bdgim_non_broadcast_coefficients(table, times) -> np.ndarray:
+    """
+    Predicts the non-broadcast coefficients Beta1..Beta17 of BDGIM from the table of the ICD, see read_bdgim_table.
+
+    :param table: Tuple of periods, cosine and sine coefficients, see read_bdgim_table
+    :param times: numpy datetime64 array. Times in BDS time
+    :return: numpy float64 array (..., 17)
+    """
+    periods, cosines, sines = (np.asarray(values, dtype=np.float64) for values in table)
+    days = (np.asarray(times, dtype='datetime64[ns]') - __MJD_ORIGIN).astype(np.int64) / (__SECONDS_IN_DAY * 1e9)
+    frequencies = np.divide(2.0 * np.pi, periods, out=np.zeros_like(periods), where=periods != 0.0)
+    phases = days[..., None] * frequencies
+    return np.cos(phases) @ cosines + np.sin(phases) @ sines
+
+
+def bdgim_broadcast_tec(alpha: np.ndarray, latitude, longitude, azimuth, elevation, times, table=None,
+                        a0=None) -> np.ndarray:
+    """
+    Computes slant total electron content of the BDS global ionospheric model BDGIM with the broadcast coefficients
+    (BDS SIS ICD B1C, 7.12) for whole arrays of receivers, satellites and times at once.
+    All inputs are broadcast against each other, see klobuchar_delay.
+
+    The vertical TEC at the pierce point at 400 km is the sum of the non-broadcast part A0
+    and the 9 broadcast coefficients multiplied with spherical harmonics in the sun-fixed geomagnetic frame.
+    A0 is the sum of 17 harmonics of degree 3 to 5 multiplied with the coefficients predicted from the table
+    of the ICD, see read_bdgim_table. The table is not part of the navigation message and is not bundled,
+    so either the table or a0 must be given. ValueError is raised otherwise.
+
+    Examples
+    --------
+
+    >>> table = read_bdgim_table('path/to/bdgim_non_broadcast.txt')
+    >>> alpha = rinex.bdgim_coefficients('C', times)
+    >>> tec = bdgim_broadcast_tec(alpha, latitude, longitude, azimuth, elevation, times, table)
+
+    :param alpha: numpy float64 array (..., 9). Broadcast coefficients Alpha1..Alpha9 in TECU
+    :param latitude: Geodetic latitude of the receiver in radians
+    :param longitude: Geodetic longitude of the receiver in radians
+    :param azimuth: Azimuth of the satellite in radians
+    :param elevation: Elevation of the satellite in radians
+    :param times: numpy datetime64 array. Times in BDS time
+    :param table: Tuple of periods, cosine and sine coefficients of the non-broadcast part, see read_bdgim_table
+    :param a0: Optional. Non-broadcast vertical TEC in TECU, overrides the value computed from the table
+    :return: numpy float64 array. Slant TEC in TECU, NaN if coefficients are missing
+    """
+    if table is None and a0 is None:
+        raise ValueError("Table of the non-broadcast coefficients of BDGIM is needed, see read_bdgim_table")
+    alpha = np.asarray(alpha, dtype=np.float64)
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    azimuth = np.asarray(azimuth, dtype=np.float64)
+    elevation = np.asarray(elevation, dtype=np.float64)
+
+    pierce_latitude, pierce_longitude, ratio_cos = __pierce_point(latitude, longitude, azimuth, elevation,
+                                                                  __BDGIM_IONOSPHERE_HEIGHT)
+    magnetic_latitude, magnetic_longitude = __geomagnetic(pierce_latitude, pierce_longitude)
+    # longitude of the sun, which is above the meridian 0 at 12:00
+    sun_longitude = np.pi * (1.0 - 2.0 * __seconds_of_day(times) / __SECONDS_IN_DAY)
+    _, sun_magnetic_longitude = __geomagnetic(np.zeros_like(sun_longitude), sun_longitude)
+    sun_fixed_longitude = magnetic_longitude - sun_magnetic_longitude
+
+    if a0 is None:
+        beta = bdgim_non_broadcast_coefficients(table, times)
+        harmonics = __bdgim_harmonics(magnetic_latitude, sun_fixed_longitude, __BDGIM_NON_BROADCAST_TERMS)
+        a0 = np.sum(beta * harmonics, axis=-1)
+    harmonics = __bdgim_harmonics(magnetic_latitude, sun_fixed_longitude, __BDGIM_TERMS)
+    vertical = np.maximum(np.asarray(a0, dtype=np.float64) + np.sum(alpha * harmonics, axis=-1), 0.0)
+    vertical = np.where(np.isnan(alpha).any(axis=-1), np.nan, vertical)
+    return vertical / np.sqrt(1.0 - ratio_cos ** 2)
+
+
+def bdgim_broadcast_delay(alpha: np.ndarray, latitude, longitude, azimuth, elevation, times, table=None, a0=None,
+                          frequency=BDS_B1C) -> np.ndarray:
+    """
+    Computes slant ionospheric delays of BDGIM with the broadcast coefficients, see bdgim_broadcast_tec.
+
+    :param frequency: Frequency of the signal in Hz
+    :return: numpy float64 array. Slant ionospheric delays in meters, NaN if coefficients are missing
+    """
+    return tec_delay(bdgim_broadcast_tec(alpha, latitude, longitude, azimuth, elevation, times, table, a0),
+                     frequency)
@@ -0,0 +1,294 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+SPEED_OF_LIGHT = 299792458.0  # m/s
+SECONDS_IN_WEEK = 604800.0
+# All GNSS weeks start on Sunday 00:00 of their own time scale, so seconds of week can be counted from any Sunday
+__WEEK_ORIGIN = np.datetime64('1980-01-06T00:00:00', 'ns')
+
+# (gravitational constant GM in m^3/s^2, Earth rotation rate in rad/s) as defined by the interface documents
+EARTH_CONSTANTS: Dict[str, Tuple[float, float]] = {
+    'G': (3.986005e14, 7.2921151467e-5),  # IS-GPS-200
+    'J': (3.986005e14, 7.2921151467e-5),  # IS-QZSS-PNT
+    'I': (3.986005e14, 7.2921151467e-5),  # IRNSS SIS ICD
+    'E': (3.986004418e14, 7.2921151467e-5),  # Galileo OS SIS ICD
+    'C': (3.986004418e14, 7.292115e-5),  # BDS SIS ICD
+}
+KEPLERIAN_GNSS = tuple(EARTH_CONSTANTS.keys())
+
+__BDS_GEO_INCLINATION = np.deg2rad(-5.0)  # rotation of the BDS GEO orbital frame, see BDS SIS ICD
+__KEPLER_ITERATIONS = 10
+__KEPLER_TOLERANCE = 1e-14
+
+# names of the same parameter in different message types, e.g. OMEGA in QZSS records is OMEGA0 in all others
+__ALIASES = {
+    'OMEGA0': ('OMEGA0', 'OMEGA'),
+    'Cis': ('Cis', 'CIS'),
+    'Cic': ('Cic', 'C_ic'),
+}
+# group delay of the reference signal of the clock parameters, the first available field is used
+__TGD_FIELDS = ('TGD', 'TGD1', 'TGD_B1Cp', 'TGD_B2bI')
+
+
+class SatelliteStates:
+    """
+    Class that holds satellite states computed from broadcast ephemerides,
+    see keplerian_states and state_vector.StateVectorPropagator.
+    All arrays have the shape of the given times, with one extra axis of size 3 for vectors.
+    Contains following fields:
+
+    - position: numpy float64 array (..., 3). ECEF position of the satellite antenna phase center in meters
+    - velocity: numpy float64 array (..., 3). ECEF velocity in m/s
+    - clock_bias: numpy float64 array. Satellite clock offset in seconds,
+      including the relativistic correction, but without the group delay
+    - clock_drift: numpy float64 array. Satellite clock drift in s/s, including the relativistic correction
+    - relativistic: numpy float64 array. Relativistic clock correction in seconds, already included into clock_bias
+    - tgd: numpy float64 array. Group delay of the reference signal in seconds (TGD of GPS, BGD E5a/E1 of Galileo,
+      TGD1 or TGD of B1Cp/B2bI of BDS, 0 for GLONASS and SBAS).
+      Single-frequency users on the reference signal use clock_bias - tgd
+
+    Values of pairs without ephemeris (e.g. epoch is NaT) are NaN.
+    """
+    def __init__(self, position: np.ndarray, velocity: np.ndarray, clock_bias: np.ndarray, clock_drift: np.ndarray,
+                 relativistic: np.ndarray, tgd: np.ndarray):
+        self.position: np.ndarray = position
+        self.velocity: np.ndarray = velocity
+        self.clock_bias: np.ndarray = clock_bias
+        self.clock_drift: np.ndarray = clock_drift
+        self.relativistic: np.ndarray = relativistic
+        self.tgd: np.ndarray = tgd
+
+    def __repr__(self):
+        return "States of {n:d} satellite epochs".format(n=self.clock_bias.size)
+
+
+def __field(records: np.ndarray, name: str) -> np.ndarray:
+    for alias in __ALIASES.get(name, (name,)):
+        if alias in records.dtype.names:
+            return records[alias].astype(np.float64)
+    raise ValueError("Navigation records do not contain Keplerian parameter " + name)
+
+
+def __optional_field(records: np.ndarray, names: Tuple[str, ...]) -> np.ndarray:
+    for name in names:
+        if name in records.dtype.names:
+            return records[name].astype(np.float64)
+    return np.zeros(records.shape)
+
+
+def __sv_codes(sv) -> (np.ndarray, np.ndarray):
+    """
+    Splits satellite names into GNSS letters and satellite numbers, e.g. 'C11' into 'C' and 11.
+    Empty names give GNSS ' ' and number 0.
+    """
+    sv = np.asarray(sv, dtype='U3')
+    codes = np.ascontiguousarray(sv).view(np.uint32).reshape(sv.shape + (3,))
+    digits = codes[..., 1:].astype(np.int64) - ord('0')
+    numbers = np.where(((digits >= 0) & (digits <= 9)).all(axis=-1), digits[..., 0] * 10 + digits[..., 1], 0)
+    gnss = np.where(codes[..., 0] == 0, ord(' '), codes[..., 0]).astype(np.uint32).view('U1').reshape(sv.shape)
+    return gnss, numbers
+
+
+def __constants(gnss: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Returns GM and Earth rotation rate for every satellite. ValueError is raised for non-Keplerian GNSS.
+    """
+    gnss = np.where(gnss == ' ', 'G', gnss)  # records without a match, their values are NaN anyway
+    unsupported = ~np.isin(gnss, KEPLERIAN_GNSS)
+    if unsupported.any():
+        raise ValueError("Keplerian ephemerides are not defined for GNSS: " + str(gnss[unsupported][0]))
+    mu = np.zeros(gnss.shape)
+    omega_e = np.zeros(gnss.shape)
+    for name, (gm, rate) in EARTH_CONSTANTS.items():
+        mu[gnss == name] = gm
+        omega_e[gnss == name] = rate
+    return mu, omega_e
+
+
+def is_bds_geo(sv) -> np.ndarray:
+    """
+    Checks which satellites are BDS geostationary satellites (C01-C05 and C59-C63),
+    whose orbits are computed in a frame rotated by -5 degrees.
+
+    :param sv: array of satellite names, e.g. ['C01', 'C11']
+    :return: numpy bool array
+    """
+    return __is_bds_geo(*__sv_codes(sv))
+
+
+def __is_bds_geo(gnss: np.ndarray, numbers: np.ndarray) -> np.ndarray:
+    return (gnss == 'C') & (((numbers >= 1) & (numbers <= 5)) | (numbers >= 59))
+
+
+def seconds_of_week(times: np.ndarray) -> np.ndarray:
+    """
+    Returns seconds of week of the given times in the time scale of the times.
+
+    :param times: numpy datetime64 array
+    :return: numpy float64 array
+    """
+    nanoseconds = (np.asarray(times, dtype='datetime64[ns]') - __WEEK_ORIGIN).astype(np.int64)
+    return np.mod(nanoseconds, int(SECONDS_IN_WEEK) * 1_000_000_000) / 1e9
+
+
+def wrap_week(seconds: np.ndarray) -> np.ndarray:
+    """
+    Wraps time differences in seconds into +-half a week, to account for the beginning or end of week crossovers.
+    """
+    return seconds - np.round(seconds / SECONDS_IN_WEEK) * SECONDS_IN_WEEK
+
+
+def solve_kepler(mean_anomaly: np.ndarray, eccentricity: np.ndarray) -> np.ndarray:
+    """
+    Solves Kepler's equation E - e*sin(E) = M for whole arrays with Newton iterations.
+
+    :param mean_anomaly: numpy float64 array. Mean anomaly in radians
+    :param eccentricity: numpy float64 array. Eccentricity
+    :return: numpy float64 array. Eccentric anomaly in radians
+    """
+    eccentric_anomaly = np.array(mean_anomaly, dtype=np.float64, copy=True)
+    for _ in range(__KEPLER_ITERATIONS):
+        step = (eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly) - mean_anomaly) / \
+               (1.0 - eccentricity * np.cos(eccentric_anomaly))
+        eccentric_anomaly -= step
+        if not np.nanmax(np.abs(step), initial=0.0) > __KEPLER_TOLERANCE:
+            break
+    return eccentric_anomaly
+
+
+def keplerian_states(records: np.ndarray, times) -> SatelliteStates:
+    """
+    Computes positions, velocities and clock corrections of GPS, Galileo, BDS, QZSS and NavIC satellites
+    from broadcast ephemerides, for whole arrays of records and times at once.
+
+    Records are rows of a navigation table (see common.nav_table.NavTable) of any Keplerian message type,
+    e.g. GPS_LNAV, GAL_INAV_FNAV or BDS_D1_D2 in v4 and GPS, GAL or BDS in v3,
+    usually selected with RinexData.find_closest_match_records.
+    Times must be given in the time scale of the GNSS, e.g. GPS time for GPS satellites,
+    and are usually the signal transmission times. Rotation of the Earth during signal travel is not applied.
+
+    BDS GEO satellites are computed in their own orbital frame, as specified by the BDS SIS ICD.
+    For CNAV/CNAV2 records, the rate of the semi-major axis and of the mean motion difference are applied
+    and the reference time of ephemeris is the epoch of the record.
+
+    ValueError is raised if the records do not belong to a Keplerian GNSS.
+
+    Examples
+    --------
+
+    >>> records = rinex.find_closest_match_records('GPS_LNAV', sv, times, latest=True, max_age=7200)
+    >>> states = keplerian_states(records, times)
+    >>> states.position  # (n, 3) ECEF positions in meters
+
+    :param records: numpy structured array with navigation records
+    :param times: numpy datetime64 array (or ISO timestamps) of the same shape as records
+    :return: SatelliteStates
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    if times.shape != records.shape:
+        raise ValueError("Records and times must have the same shape.")
+    gnss, numbers = __sv_codes(records['sv'])
+    mu, omega_e = __constants(gnss)
+
+    # time from the epoch of clock and from the reference time of ephemeris
+    dt_clock = (times - records['epoch']).astype('timedelta64[ns]').astype(np.float64) / 1e9
+    dt_clock[np.isnat(times) | np.isnat(records['epoch'])] = np.nan
+    toc = seconds_of_week(records['epoch'])
+    if 'Toe' in records.dtype.names:
+        toe = records['Toe'].astype(np.float64)
+        dt = dt_clock + wrap_week(toc - toe)
+    else:  # CNAV records, the reference time of ephemeris equals the epoch of the record
+        toe = toc
+        dt = dt_clock
+
+    sqrt_a = __field(records, 'sqrt_A')
+    e = __field(records, 'e')
+    a_dot = __optional_field(records, ('A_DOT',))
+    delta_n_dot = __optional_field(records, ('Delta_n_dot',))
+    a0 = sqrt_a ** 2
+    a = a0 + a_dot * dt
+    n0 = np.sqrt(mu / a0 ** 3)
+    n = n0 + __field(records, 'Delta_n') + 0.5 * delta_n_dot * dt
+    mean_anomaly = __field(records, 'M0') + n * dt
+    eccentric_anomaly = solve_kepler(mean_anomaly, e)
+    sin_e, cos_e = np.sin(eccentric_anomaly), np.cos(eccentric_anomaly)
+    one_minus_e_cos = 1.0 - e * cos_e
+    e_dot = n / one_minus_e_cos
+
+    true_anomaly = np.arctan2(np.sqrt(1.0 - e ** 2) * sin_e, cos_e - e)
+    true_anomaly_dot = e_dot * np.sqrt(1.0 - e ** 2) / one_minus_e_cos
+    phi = true_anomaly + __field(records, 'omega')
+    sin_2phi, cos_2phi = np.sin(2.0 * phi), np.cos(2.0 * phi)
+
+    cus, cuc = __field(records, 'Cus'), __field(records, 'Cuc')
+    crs, crc = __field(records, 'Crs'), __field(records, 'Crc')
+    cis, cic = __field(records, 'Cis'), __field(records, 'Cic')
+    idot = __field(records, 'IDOT')
+    u = phi + cus * sin_2phi + cuc * cos_2phi
+    r = a * one_minus_e_cos + crs * sin_2phi + crc * cos_2phi
+    i = __field(records, 'i0') + idot * dt + cis * sin_2phi + cic * cos_2phi
+    u_dot = true_anomaly_dot * (1.0 + 2.0 * (cus * cos_2phi - cuc * sin_2phi))
+    r_dot = a * e * sin_e * e_dot + a_dot * one_minus_e_cos + \
+        2.0 * true_anomaly_dot * (crs * cos_2phi - crc * sin_2phi)
+    i_dot = idot + 2.0 * true_anomaly_dot * (cis * cos_2phi - cic * sin_2phi)
+
+    # position and velocity in the orbital plane
+    sin_u, cos_u = np.sin(u), np.cos(u)
+    x_orbit, y_orbit = r * cos_u, r * sin_u
+    x_orbit_dot = r_dot * cos_u - r * u_dot * sin_u
+    y_orbit_dot = r_dot * sin_u + r * u_dot * cos_u
+
+    geo = __is_bds_geo(gnss, numbers)
+    omega_dot = __field(records, 'OMEGA_DOT')
+    # GEO orbits are computed in an inertial frame and rotated into ECEF afterwards
+    node_rate = np.where(geo, omega_dot, omega_dot - omega_e)
+    node = __field(records, 'OMEGA0') + node_rate * dt - omega_e * toe
+    sin_node, cos_node = np.sin(node), np.cos(node)
+    sin_i, cos_i = np.sin(i), np.cos(i)
+
+    x = x_orbit * cos_node - y_orbit * cos_i * sin_node
+    y = x_orbit * sin_node + y_orbit * cos_i * cos_node
+    z = y_orbit * sin_i
+    x_dot = x_orbit_dot * cos_node - y_orbit_dot * cos_i * sin_node + y_orbit * sin_i * sin_node * i_dot - y * node_rate
+    y_dot = x_orbit_dot * sin_node + y_orbit_dot * cos_i * cos_node - y_orbit * sin_i * cos_node * i_dot + x * node_rate
+    z_dot = y_orbit_dot * sin_i + y_orbit * cos_i * i_dot
+    position = np.stack([x, y, z], axis=-1)
+    velocity = np.stack([x_dot, y_dot, z_dot], axis=-1)
+    if geo.any():
+        position[geo], velocity[geo] = __rotate_bds_geo(position[geo], velocity[geo], omega_e[geo] * dt[geo],
+                                                         omega_e[geo])
+
+    relativistic = -2.0 * np.sqrt(mu) / SPEED_OF_LIGHT ** 2 * e * sqrt_a * sin_e
+    relativistic_drift = -2.0 * np.sqrt(mu) / SPEED_OF_LIGHT ** 2 * e * sqrt_a * cos_e * e_dot
+    clock_bias = records['clock_bias'] + records['clock_drift'] * dt_clock + \
+        records['clock_drift_rate'] * dt_clock ** 2 + relativistic
+    clock_drift = records['clock_drift'] + 2.0 * records['clock_drift_rate'] * dt_clock + relativistic_drift
+    return SatelliteStates(position, velocity, clock_bias, clock_drift, relativistic,
+                           __optional_field(records, __TGD_FIELDS))
+
+
+def __rotate_bds_geo(position: np.ndarray, velocity: np.ndarray, angle: np.ndarray,
+                     rate: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Rotates positions and velocities of BDS GEO satellites from their orbital frame into ECEF:
+    Rz(angle) * Rx(-5 deg) * position.
+    """
+    sin_x, cos_x = np.sin(__BDS_GEO_INCLINATION), np.cos(__BDS_GEO_INCLINATION)
+    # Rx(-5 deg)
+    x_p, x_v = position[:, 0], velocity[:, 0]
+    y_p = cos_x * position[:, 1] + sin_x * position[:, 2]
+    z_p = -sin_x * position[:, 1] + cos_x * position[:, 2]
+    y_v = cos_x * velocity[:, 1] + sin_x * velocity[:, 2]
+    z_v = -sin_x * velocity[:, 1] + cos_x * velocity[:, 2]
+    # Rz(angle), angle grows with the Earth rotation rate
+    sin_z, cos_z = np.sin(angle), np.cos(angle)
+    rotated_position = np.stack([cos_z * x_p + sin_z * y_p, -sin_z * x_p + cos_z * y_p, z_p], axis=-1)
+    rotated_velocity = np.stack([
+        cos_z * x_v + sin_z * y_v + rate * (-sin_z * x_p + cos_z * y_p),
+        -sin_z * x_v + cos_z * y_v + rate * (-cos_z * x_p - sin_z * y_p),
+        z_v], axis=-1)
+    return rotated_position, rotated_velocity
@@ -0,0 +1,531 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+from nmbu.rinex.navigation.ionosphere import GAL_E1, TEC_UNIT, tec_delay
+
+NEQUICK_EARTH_RADIUS = 6371.2  # km
+F2_SHAPE = (2, 76, 13)  # solar activity levels, foF2 coefficients, Fourier coefficients in UT
+FM3_SHAPE = (2, 49, 9)  # solar activity levels, M(3000)F2 coefficients, Fourier coefficients in UT
+MODIP_SHAPE = (39, 39)  # wrapped grid: row k is latitude -95 + 5k, column l is longitude -190 + 10l
+SEGMENT_BOUNDS = (1000.0, 2000.0)  # km, heights that split the integration along a ray
+
+__F2_ORDERS = (12, 12, 9, 5, 2, 1, 1, 1, 1)  # powers of sin(modip) for every order of cos(latitude)
+__FM3_ORDERS = (7, 8, 6, 3, 2, 1, 1)
+__SEASONS = np.array([-1, -1, 0, 0, 1, 1, 1, 1, 0, 0, -1, -1])  # by month, northern hemisphere
+__CHI0 = 86.23292796211615  # degrees, solar zenith angle of the day-night transition
+__MAX_EXPONENT = 50.0
+
+
+class NeQuickProfile:
+    """
+    Parameters of the NeQuick G electron density profile at a set of points.
+    Peak densities are in 1e11 electrons/m^3, heights and thicknesses in km.
+
+    - foE, foF1, foF2: critical frequencies in MHz
+    - m3000: M(3000)F2 transmission factor
+    - hmE, hmF1, hmF2: peak heights of the layers
+    - NmE, NmF1, NmF2: peak densities of the layers
+    - A1, A2, A3: amplitudes of the F2, F1 and E Epstein layers
+    - B2bot, B1top, B1bot, BEtop, BEbot: thicknesses of the layers
+    - H0: topside thickness parameter
+    """
+    def __init__(self, **parameters: np.ndarray):
+        self.foE: np.ndarray = parameters['foE']
+        self.foF1: np.ndarray = parameters['foF1']
+        self.foF2: np.ndarray = parameters['foF2']
+        self.m3000: np.ndarray = parameters['m3000']
+        self.hmE: np.ndarray = parameters['hmE']
+        self.hmF1: np.ndarray = parameters['hmF1']
+        self.hmF2: np.ndarray = parameters['hmF2']
+        self.NmE: np.ndarray = parameters['NmE']
+        self.NmF1: np.ndarray = parameters['NmF1']
+        self.NmF2: np.ndarray = parameters['NmF2']
+        self.A1: np.ndarray = parameters['A1']
+        self.A2: np.ndarray = parameters['A2']
+        self.A3: np.ndarray = parameters['A3']
+        self.B2bot: np.ndarray = parameters['B2bot']
+        self.B1top: np.ndarray = parameters['B1top']
+        self.B1bot: np.ndarray = parameters['B1bot']
+        self.BEtop: np.ndarray = parameters['BEtop']
+        self.BEbot: np.ndarray = parameters['BEbot']
+        self.H0: np.ndarray = parameters['H0']
+
+
+def __join(f1: np.ndarray, f2: np.ndarray, alpha: float, x: np.ndarray) -> np.ndarray:
+    """
+    Joins f1 (for x >> 0) and f2 (for x << 0) with a smooth transition of the given steepness.
+    """
+    exponent = np.exp(np.clip(alpha * x, -__MAX_EXPONENT, __MAX_EXPONENT))
+    return (f1 * exponent + f2) / (exponent + 1.0)
+
+
+def __epstein(amplitude: np.ndarray, peak: np.ndarray, thickness: np.ndarray, height) -> np.ndarray:
+    exponent = np.exp(np.clip((height - peak) / thickness, -__MAX_EXPONENT, __MAX_EXPONENT))
+    return amplitude * exponent / (1.0 + exponent) ** 2
+
+
+def __cubic(z0: np.ndarray, z1: np.ndarray, z2: np.ndarray, z3: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Third order interpolation between z1 (x = 0) and z2 (x = 1) of 4 equally spaced values.
+    """
+    delta = 2.0 * x - 1.0
+    g1, g2, g3, g4 = z2 + z1, z2 - z1, z3 + z0, (z3 - z0) / 3.0
+    return (9.0 * g1 - g3 + delta * (9.0 * g2 - g4 + delta * (g3 - g1 + delta * (g4 - g2)))) / 16.0
+
+
+def nequick_modip(grid: np.ndarray, latitude, longitude) -> np.ndarray:
+    """
+    Interpolates the modified dip latitude (modip) from the wrapped grid of NeQuick G.
+
+    :param grid: numpy float64 array (39, 39), see MODIP_SHAPE
+    :param latitude: Latitude in degrees
+    :param longitude: Longitude in degrees
+    :return: numpy float64 array. Modip in degrees
+    """
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.mod(np.asarray(longitude, dtype=np.float64) + 180.0, 360.0)
+    a = (latitude + 90.0) / 5.0
+    rows = np.clip(np.floor(a), 0, 35).astype(np.intp)
+    x = np.where(np.isfinite(a), a - rows, 0.0)
+    b = longitude / 10.0
+    columns = np.mod(np.floor(np.nan_to_num(b)), 36).astype(np.intp)
+    y = np.where(np.isfinite(b), b - np.floor(np.nan_to_num(b)), 0.0)
+
+    neighbours = np.arange(4)
+    values = grid[(rows[..., None] + neighbours)[..., :, None], (columns[..., None] + neighbours)[..., None, :]]
+    by_column = __cubic(values[..., 0, :], values[..., 1, :], values[..., 2, :], values[..., 3, :], x[..., None])
+    result = __cubic(by_column[..., 0], by_column[..., 1], by_column[..., 2], by_column[..., 3], y)
+    result = np.where(latitude >= 90.0, 90.0, np.where(latitude <= -90.0, -90.0, result))
+    return np.where(np.isnan(latitude) | np.isnan(b), np.nan, result)
+
+
+def effective_ionisation(ai: np.ndarray, modip) -> np.ndarray:
+    """
+    Computes the effective ionisation level Az from the broadcast coefficients ai0..ai2.
+    If all coefficients are zero, the default level 63.7 is used.
+
+    :param ai: numpy float64 array (..., 3). Coefficients ai0, ai1, ai2
+    :param modip: Modip of the receiver in degrees
+    :return: numpy float64 array. Az in solar flux units
+    """
+    ai = np.asarray(ai, dtype=np.float64)
+    modip = np.asarray(modip, dtype=np.float64)
+    az = ai[..., 0] + modip * (ai[..., 1] + modip * ai[..., 2])
+    az = np.where((ai == 0.0).all(axis=-1), 63.7, az)
+    return np.clip(az, 0.0, 400.0)
+
+
+def solar_declination(months: np.ndarray, ut: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Computes sine and cosine of the solar declination in the middle of the month at the given UT.
+
+    :param months: numpy int array. Months 1..12
+    :param ut: numpy float64 array. Universal time in hours
+    """
+    day = 30.5 * months - 15.0 + (18.0 - ut) / 24.0
+    mean_anomaly = np.deg2rad(0.9856 * day - 3.289)
+    longitude = mean_anomaly + np.deg2rad(1.916 * np.sin(mean_anomaly) + 0.020 * np.sin(2.0 * mean_anomaly) + 282.634)
+    sin_declination = 0.39782 * np.sin(longitude)
+    return sin_declination, np.sqrt(1.0 - sin_declination ** 2)
+
+
+def __fourier_basis(ut: np.ndarray, size: int) -> np.ndarray:
+    """
+    Returns [1, sin(T), cos(T), sin(2T), cos(2T), ...] of the UT angle T, numpy float64 array (..., size).
+    """
+    angle = np.deg2rad(15.0 * ut - 180.0)[..., None] * np.arange(1, (size - 1) // 2 + 1)
+    basis = np.empty(angle.shape[:-1] + (size,))
+    basis[..., 0] = 1.0
+    basis[..., 1::2] = np.sin(angle)
+    basis[..., 2::2] = np.cos(angle)
+    return basis
+
+
+def ccir_coefficients(f2: np.ndarray, fm3: np.ndarray, ut: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Evaluates the Fourier series in UT of the CCIR maps of a single month for both solar activity levels.
+
+    :param f2: numpy float64 array (2, 76, 13), see F2_SHAPE
+    :param fm3: numpy float64 array (2, 49, 9), see FM3_SHAPE
+    :param ut: numpy float64 array (n,). Universal time in hours
+    :return: Tuple of numpy float64 arrays (n, 2, 76) and (n, 2, 49)
+    """
+    return np.einsum('nc,slc->nsl', __fourier_basis(ut, F2_SHAPE[2]), f2), \
+        np.einsum('nc,slc->nsl', __fourier_basis(ut, FM3_SHAPE[2]), fm3)
+
+
+def __expansion(coefficients: np.ndarray, modip: np.ndarray, latitude: np.ndarray, longitude: np.ndarray,
+                orders: Tuple[int, ...]) -> np.ndarray:
+    """
+    Evaluates the geographic expansion of the CCIR maps: polynomial in sin(modip),
+    followed by pairs of polynomials multiplied by cos(n*longitude), sin(n*longitude) and cos(latitude)^n.
+    Polynomials are evaluated with the Horner scheme, so no table of all terms is built.
+
+    :param coefficients: numpy float64 array (..., K), coefficients of all terms
+    :param orders: amount of powers of sin(modip) for every power of cos(latitude)
+    """
+    sin_modip = np.sin(np.deg2rad(modip))
+    cos_latitude = np.cos(np.deg2rad(latitude))
+    longitude = np.deg2rad(longitude)
+
+    def polynomial(indices: range) -> np.ndarray:
+        result = coefficients[..., indices[-1]]
+        for index in reversed(indices[:-1]):
+            result = result * sin_modip + coefficients[..., index]
+        return result
+
+    value = polynomial(range(orders[0]))
+    first, scale = orders[0], 1.0
+    for n, order in enumerate(orders[1:], start=1):
+        scale = scale * cos_latitude
+        value = value + scale * (np.cos(n * longitude) * polynomial(range(first, first + 2 * order, 2)) +
+                                 np.sin(n * longitude) * polynomial(range(first + 1, first + 2 * order, 2)))
+        first += 2 * order
+    return value
+
+
+def profile_parameters(modip: np.ndarray, latitude: np.ndarray, longitude: np.ndarray, ut: np.ndarray,
+                       month: np.ndarray, az: np.ndarray, cf2: np.ndarray, cm3: np.ndarray,
+                       sin_declination: np.ndarray, cos_declination: np.ndarray) -> NeQuickProfile:
+    """
+    Computes parameters of the NeQuick G profile at the given points.
+    Per-epoch values (ut, month, az, cf2, cm3, declination) are broadcast against the points.
+
+    :param modip: Modip of the points in degrees
+    :param latitude: Latitude of the points in degrees
+    :param longitude: Longitude of the points in degrees
+    :param ut: Universal time in hours
+    :param month: Month 1..12
+    :param az: Effective ionisation level
+    :param cf2: numpy float64 array (..., 76). foF2 coefficients at the solar activity and time of the points
+    :param cm3: numpy float64 array (..., 49). M(3000)F2 coefficients at the solar activity and time of the points
+    :param sin_declination: Sine of the solar declination
+    :param cos_declination: Cosine of the solar declination
+    :return: NeQuickProfile
+    """
+    latitude_rad = np.deg2rad(latitude)
+    local_time = np.mod(ut + longitude / 15.0, 24.0)
+    cos_chi = np.sin(latitude_rad) * sin_declination + \
+        np.cos(latitude_rad) * cos_declination * np.cos(np.pi / 12.0 * (12.0 - local_time))
+    chi = np.rad2deg(np.arctan2(np.sqrt(np.maximum(1.0 - cos_chi ** 2, 0.0)), cos_chi))
+    chi_eff = __join(90.0 - 0.24 * np.exp(np.minimum(20.0 - 0.2 * chi, __MAX_EXPONENT)), chi, 12.0, chi - __CHI0)
+
+    seasons = __SEASONS[np.asarray(month, dtype=np.intp) - 1] * np.where(latitude < 0.0, -1, 1)
+    season = seasons * np.tanh(0.15 * latitude)
+    foE = np.sqrt((1.112 - 0.019 * season) ** 2 * np.sqrt(az) *
+                  np.maximum(np.cos(np.deg2rad(chi_eff)), 0.0) ** 0.6 + 0.49)
+    NmE = 0.124 * foE ** 2
+
+    foF2 = __expansion(cf2, modip, latitude, longitude, __F2_ORDERS)
+    m3000 = __expansion(cm3, modip, latitude, longitude, __FM3_ORDERS)
+    NmF2 = 0.124 * foF2 ** 2
+
+    foF1 = __join(1.4 * foE, 0.0, 1000.0, foE - 2.0)
+    foF1 = __join(0.0, foF1, 1000.0, foE - foF1)
+    foF1 = __join(foF1, 0.85 * foF1, 60.0, 0.85 * foF2 - foF1)
+    foF1 = np.where(foF1 < 1e-6, 0.0, foF1)
+    NmF1 = np.where((foF1 <= 0.0) & (foE > 2.0), 0.124 * (foE + 0.5) ** 2, 0.124 * foF1 ** 2)
+
+    ratio = foF2 / foE
+    ratio = __join(ratio, 1.75, 20.0, ratio - 1.75)
+    delta_m = 0.253 / (ratio - 1.215) - 0.012
+    hmF2 = 1490.0 * m3000 * np.sqrt((0.0196 * m3000 ** 2 + 1.0) / (1.2967 * m3000 ** 2 - 1.0)) / \
+        (m3000 + delta_m) - 176.0
+    hmE = np.full_like(hmF2, 120.0)
+    hmF1 = (hmF2 + hmE) / 2.0
+
+    B2bot = 0.385 * NmF2 / (0.01 * np.exp(-3.467 + 0.857 * np.log(foF2 ** 2) + 2.02 * np.log(m3000)))
+    B1top = 0.3 * (hmF2 - hmF1)
+    B1bot = 0.5 * (hmF1 - hmE)
+    BEtop = np.maximum(B1bot, 7.0)
+    BEbot = np.full_like(hmF2, 5.0)
+
+    A1 = 4.0 * NmF2
+    A3a = 4.0 * NmE
+    A2a = np.zeros_like(A1)
+    for _ in range(5):
+        A2a = 4.0 * (NmF1 - __epstein(A1, hmF2, B2bot, hmF1) - __epstein(A3a, hmE, BEtop, hmF1))
+        A2a = __join(A2a, 0.8 * NmF1, 1.0, A2a - 0.8 * NmF1)
+        A3a = 4.0 * (NmE - __epstein(A2a, hmF1, B1bot, hmE) - __epstein(A1, hmF2, B2bot, hmE))
+    without_f1 = foF1 < 0.5
+    A2 = np.where(without_f1, 0.0, A2a)
+    A3 = np.where(without_f1, 4.0 * (NmE - __epstein(A1, hmF2, B2bot, hmE)),
+                  __join(A3a, 0.05, 60.0, A3a - 0.005))
+
+    summer = (month >= 4) & (month <= 9)
+    az_r = np.sqrt(167273.0 + (az - 63.7) * 1123.6) - 408.99
+    k = np.where(summer, 6.705 - 0.014 * az_r - 0.008 * hmF2, -7.77 + 0.097 * (hmF2 / B2bot) ** 2 + 0.153 * NmF2)
+    k = __join(k, 2.0, 1.0, k - 2.0)
+    k = __join(8.0, k, 1.0, k - 8.0)
+    thickness = k * B2bot
+    x = (thickness - 150.0) / 100.0
+    H0 = thickness / ((0.041163 * x - 0.183981) * x + 1.424472)
+
+    return NeQuickProfile(foE=foE, foF1=foF1, foF2=foF2, m3000=m3000, hmE=hmE, hmF1=hmF1, hmF2=hmF2,
+                          NmE=NmE, NmF1=NmF1, NmF2=NmF2, A1=A1, A2=A2, A3=A3, B2bot=B2bot, B1top=B1top,
+                          B1bot=B1bot, BEtop=BEtop, BEbot=BEbot, H0=H0)
+
+
+def electron_density(profile: NeQuickProfile, height) -> np.ndarray:
+    """
+    Computes the NeQuick G electron density at the given heights:
+    sum of the E, F1 and F2 Epstein layers below the F2 peak (with a Chapman decay below 100 km)
+    and a semi-Epstein layer with height dependent thickness above the F2 peak.
+
+    :param profile: NeQuickProfile of the points
+    :param height: Height of the points in km
+    :return: numpy float64 array. Electron density in electrons/m^3
+    """
+    height = np.asarray(height, dtype=np.float64)
+    bottom = np.maximum(height, 100.0)
+    sharpening = np.exp(10.0 / (1.0 + np.abs(bottom - profile.hmF2)))
+    thicknesses = (profile.B2bot,
+                   np.where(bottom > profile.hmF1, profile.B1top, profile.B1bot),
+                   np.where(bottom > profile.hmE, profile.BEtop, profile.BEbot))
+    exponents = ((bottom - profile.hmF2) / thicknesses[0],
+                 (bottom - profile.hmF1) / thicknesses[1] * sharpening,
+                 (bottom - profile.hmE) / thicknesses[2] * sharpening)
+    layers, slopes = [], []
+    for amplitude, exponent, thickness in zip((profile.A1, profile.A2, profile.A3), exponents, thicknesses):
+        e = np.exp(np.clip(exponent, -25.0, 25.0))
+        layers.append(np.where(np.abs(exponent) > 25.0, 0.0, amplitude * e / (1.0 + e) ** 2))
+        slopes.append((1.0 - e) / (1.0 + e) / thickness)
+    bottomside = layers[0] + layers[1] + layers[2]
+    # Chapman layer below 100 km, fitted to the value and the slope at 100 km
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shape = 1.0 - 10.0 * (layers[0] * slopes[0] + layers[1] * slopes[1] + layers[2] * slopes[2]) / bottomside
+    z = (height - 100.0) / 10.0
+    chapman = bottomside * np.exp(np.clip(1.0 - shape * z - np.exp(np.minimum(-z, __MAX_EXPONENT)), -700.0, 0.0))
+    bottomside = np.where(height < 100.0, chapman, bottomside)
+
+    above = np.maximum(height - profile.hmF2, 0.0)
+    z = above / (profile.H0 * (1.0 + 100.0 * 0.125 * above / (100.0 * profile.H0 + 0.125 * above)))
+    e = np.exp(np.minimum(z, 700.0))
+    topside = np.where(e > 1e11, 4.0 * profile.NmF2 / e, 4.0 * profile.NmF2 * e / (1.0 + e) ** 2)
+    return np.where(height > profile.hmF2, topside, bottomside) * 1e11
+
+
+def read_nequick_maps(directory: str) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Reads the maps of NeQuick G from the ASCII files distributed with the reference implementation:
+    ccir11.asc ... ccir22.asc for January ... December and modipNeQG_wrapped.asc.
+
+    ValueError is raised if a file does not hold the expected amount of values.
+
+    :param directory: str. Directory with the files
+    :return: Tuple of numpy float64 arrays: F2 (12, 2, 76, 13), FM3 (12, 2, 49, 9) and modip grid (39, 39)
+    """
+    def values(name: str, size: int) -> np.ndarray:
+        with open(os.path.join(directory, name), 'r') as file:
+            result = np.array(file.read().replace('D', 'E').split(), dtype=np.float64)
+        if result.size != size:
+            raise ValueError("{n:s} holds {a:d} values instead of {s:d}".format(n=name, a=result.size, s=size))
+        return result
+
+    f2_size, fm3_size = int(np.prod(F2_SHAPE)), int(np.prod(FM3_SHAPE))
+    months = [values("ccir{m:d}.asc".format(m=month + 10), f2_size + fm3_size) for month in range(1, 13)]
+    f2 = np.stack([month[:f2_size].reshape(F2_SHAPE) for month in months])
+    fm3 = np.stack([month[f2_size:].reshape(FM3_SHAPE) for month in months])
+    return f2, fm3, values("modipNeQG_wrapped.asc", int(np.prod(MODIP_SHAPE))).reshape(MODIP_SHAPE)
+
+
+class NeQuickG:
+    """
+    Computes slant total electron content and ionospheric delays with the NeQuick G model of Galileo
+    (European GNSS (Galileo) Open Service, Ionospheric Correction Algorithm for Galileo Single Frequency Users)
+    for whole arrays of rays at once.
+
+    The electron density is integrated along all rays together with fixed Gauss-Legendre rules
+    on the segments below 1000 km, between 1000 and 2000 km and above 2000 km,
+    instead of the adaptive per-ray integration of the reference implementation.
+    Terms that depend only on the month and UT (Fourier series of the CCIR maps and solar declination)
+    and the modip of the receivers are cached, so repeated epochs and static receivers are computed once.
+    Rays are processed in chunks of chunk_size to limit memory.
+
+    Examples
+    --------
+
+    >>> model = NeQuickG(*read_nequick_maps('path/to/nequick/data'))
+    >>> ai = rinex.nequick_coefficients('E', epochs)
+    >>> receiver = np.array([np.deg2rad(40.0), np.deg2rad(-3.0), 600.0])  # latitude, longitude, height
+    >>> tec = model.stec(ai, receiver, satellites, epochs)  # satellites (n, 3) in the same form
+    >>> delay = model.delay(ai, receiver, satellites, epochs)
+    """
+    def __init__(self, f2: np.ndarray, fm3: np.ndarray, modip: np.ndarray,
+                 intervals: Tuple[int, int, int] = (32, 4, 4), order: int = 8, chunk_size: int = 256):
+        """
+        :param f2: numpy float64 array (12, 2, 76, 13). foF2 maps of every month, see read_nequick_maps
+        :param fm3: numpy float64 array (12, 2, 49, 9). M(3000)F2 maps of every month
+        :param modip: numpy float64 array (39, 39). Wrapped modip grid, see MODIP_SHAPE
+        :param intervals: amount of integration intervals below 1000 km, between 1000 and 2000 km and above 2000 km
+        :param order: order of the Gauss-Legendre rule of every interval
+        :param chunk_size: amount of rays integrated at once
+        """
+        self.f2: np.ndarray = np.asarray(f2, dtype=np.float64).reshape((12,) + F2_SHAPE)
+        self.fm3: np.ndarray = np.asarray(fm3, dtype=np.float64).reshape((12,) + FM3_SHAPE)
+        self.modip_grid: np.ndarray = np.asarray(modip, dtype=np.float64).reshape(MODIP_SHAPE)
+        self.intervals: Tuple[int, int, int] = tuple(intervals)
+        self.chunk_size: int = chunk_size
+        self.__nodes, self.__weights = np.polynomial.legendre.leggauss(order)
+        # (month, UT in ns of day): (foF2 coefficients (2, 76), M(3000)F2 coefficients (2, 49), sin and cos of
+        # solar declination)
+        self.__epochs: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, float, float]] = {}
+        # (latitude, longitude) of the receiver in degrees: modip in degrees
+        self.__receivers: Dict[Tuple[float, float], float] = {}
+
+    def __len__(self) -> int:
+        return len(self.__epochs)
+
+    def clear(self) -> None:
+        """
+        Forgets all cached epoch and receiver terms.
+        """
+        self.__epochs = {}
+        self.__receivers = {}
+
+    def modip(self, latitude, longitude) -> np.ndarray:
+        """
+        :param latitude: Latitude in radians
+        :param longitude: Longitude in radians
+        :return: numpy float64 array. Modified dip latitude in degrees
+        """
+        return nequick_modip(self.modip_grid, np.rad2deg(latitude), np.rad2deg(longitude))
+
+    def stec(self, ai: np.ndarray, receiver: np.ndarray, satellite: np.ndarray, times) -> np.ndarray:
+        """
+        Computes slant total electron content between receivers and satellites.
+        All inputs are broadcast against each other.
+
+        :param ai: numpy float64 array (..., 3). Broadcast coefficients ai0, ai1, ai2
+        :param receiver: numpy float64 array (..., 3). Latitude (rad), longitude (rad) and height (m) of the receivers
+        :param satellite: numpy float64 array (..., 3). Latitude (rad), longitude (rad) and height (m)
+            of the satellites
+        :param times: numpy datetime64 array. Times in UTC
+        :return: numpy float64 array. Slant TEC in TECU, NaN if coefficients are missing
+        """
+        ai = np.asarray(ai, dtype=np.float64)
+        receiver = np.asarray(receiver, dtype=np.float64)
+        satellite = np.asarray(satellite, dtype=np.float64)
+        times = np.asarray(times, dtype='datetime64[ns]')
+        shape = np.broadcast_shapes(ai.shape[:-1], receiver.shape[:-1], satellite.shape[:-1], times.shape)
+        ai = np.broadcast_to(ai, shape + (3,)).reshape(-1, 3)
+        receiver = np.broadcast_to(receiver, shape + (3,)).reshape(-1, 3)
+        satellite = np.broadcast_to(satellite, shape + (3,)).reshape(-1, 3)
+        times = np.broadcast_to(times, shape).ravel()
+
+        result = np.full(len(times), np.nan)
+        valid = np.flatnonzero(np.isfinite(ai).all(axis=1) & np.isfinite(receiver).all(axis=1) &
+                               np.isfinite(satellite).all(axis=1) & ~np.isnat(times))
+        if len(valid) == 0:
+            return result.reshape(shape)
+        ai, receiver, satellite, times = ai[valid], receiver[valid], satellite[valid], times[valid]
+
+        az = effective_ionisation(ai, self.__receiver_modip(receiver))
+        months = times.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        day_ns = (times - times.astype('datetime64[D]')).astype(np.int64)
+        cf2, cm3, sin_declination, cos_declination = self.__epoch_terms(months, day_ns)
+        solar = (np.sqrt(167273.0 + (az - 63.7) * 1123.6) - 408.99) / 100.0  # effective sunspot number / 100
+        cf2 = cf2[:, 0] + (cf2[:, 1] - cf2[:, 0]) * solar[:, None]
+        cm3 = cm3[:, 0] + (cm3[:, 1] - cm3[:, 0]) * solar[:, None]
+        ut = day_ns / 3.6e12
+
+        for start in range(0, len(valid), self.chunk_size):
+            rays = slice(start, start + self.chunk_size)
+            result[valid[rays]] = self.__integrate(receiver[rays], satellite[rays], ut[rays], months[rays], az[rays],
+                                                   cf2[rays], cm3[rays], sin_declination[rays], cos_declination[rays])
+        return result.reshape(shape)
+
+    def delay(self, ai: np.ndarray, receiver: np.ndarray, satellite: np.ndarray, times,
+              frequency=GAL_E1) -> np.ndarray:
+        """
+        Computes slant ionospheric delays, see stec.
+
+        :param frequency: Frequency of the signal in Hz
+        :return: numpy float64 array. Slant ionospheric delays in meters, NaN if coefficients are missing
+        """
+        return tec_delay(self.stec(ai, receiver, satellite, times), frequency)
+
+    def __receiver_modip(self, receiver: np.ndarray) -> np.ndarray:
+        """
+        Returns modip of every receiver, computing it only for receivers that are not cached yet.
+        """
+        coordinates = np.rad2deg(receiver[:, :2])
+        unique, inverse = np.unique(coordinates, axis=0, return_inverse=True)
+        keys = [tuple(row) for row in unique.tolist()]
+        missing = [position for position, key in enumerate(keys) if key not in self.__receivers]
+        if missing:
+            values = nequick_modip(self.modip_grid, unique[missing, 0], unique[missing, 1])
+            self.__receivers.update(zip([keys[position] for position in missing], values.tolist()))
+        return np.array([self.__receivers[key] for key in keys], dtype=np.float64)[inverse.ravel()]
+
+    def __epoch_terms(self, months: np.ndarray, day_ns: np.ndarray):
+        """
+        Returns Fourier series of the CCIR maps and solar declination of every (month, UT) pair,
+        computing them only for pairs that are not cached yet.
+        """
+        pairs, inverse = np.unique(np.stack([months, day_ns], axis=1), axis=0, return_inverse=True)
+        keys = [tuple(row) for row in pairs.tolist()]
+        missing = np.array([position for position, key in enumerate(keys) if key not in self.__epochs], dtype=np.intp)
+        for month in np.unique(pairs[missing, 0]):
+            rows = missing[pairs[missing, 0] == month]
+            ut = pairs[rows, 1] / 3.6e12
+            cf2, cm3 = ccir_coefficients(self.f2[month - 1], self.fm3[month - 1], ut)
+            sin_declination, cos_declination = solar_declination(np.full(len(rows), month), ut)
+            for position, row in enumerate(rows):
+                self.__epochs[keys[row]] = (cf2[position], cm3[position],
+                                            float(sin_declination[position]), float(cos_declination[position]))
+        terms = [self.__epochs[key] for key in keys]
+        inverse = inverse.ravel()
+        return np.stack([term[0] for term in terms])[inverse], np.stack([term[1] for term in terms])[inverse], \
+            np.array([term[2] for term in terms])[inverse], np.array([term[3] for term in terms])[inverse]
+
+    def __integrate(self, receiver: np.ndarray, satellite: np.ndarray, ut: np.ndarray, months: np.ndarray,
+                    az: np.ndarray, cf2: np.ndarray, cm3: np.ndarray, sin_declination: np.ndarray,
+                    cos_declination: np.ndarray) -> np.ndarray:
+        """
+        Integrates the electron density along straight rays from the receivers to the satellites
+        on a sphere of radius NEQUICK_EARTH_RADIUS. All points of all rays are evaluated at once.
+
+        :return: numpy float64 array. Slant TEC in TECU
+        """
+        def cartesian(position: np.ndarray) -> np.ndarray:
+            radius = NEQUICK_EARTH_RADIUS + position[:, 2] / 1000.0
+            return radius[:, None] * np.stack([np.cos(position[:, 0]) * np.cos(position[:, 1]),
+                                               np.cos(position[:, 0]) * np.sin(position[:, 1]),
+                                               np.sin(position[:, 0])], axis=1)
+
+        start, end = cartesian(receiver), cartesian(satellite)
+        length = np.linalg.norm(end - start, axis=1)
+        direction = (end - start) / np.where(length > 0.0, length, 1.0)[:, None]
+        # distances along the ray where it crosses the segment bounds
+        along = np.sum(start * direction, axis=1)
+        start_radius2 = np.sum(start * start, axis=1)
+        bounds = [np.zeros_like(length)]
+        for height in SEGMENT_BOUNDS:
+            radius = NEQUICK_EARTH_RADIUS + height
+            crossing = -along + np.sqrt(np.maximum(along ** 2 - start_radius2 + radius ** 2, 0.0))
+            bounds.append(np.clip(crossing, bounds[-1], length))
+        bounds.append(length)
+
+        distances, weights = [], []
+        for segment, intervals in enumerate(self.intervals):
+            step = (bounds[segment + 1] - bounds[segment]) / intervals
+            centers = bounds[segment][:, None] + step[:, None] * (np.arange(intervals) + 0.5)
+            distances.append((centers[:, :, None] + 0.5 * step[:, None, None] * self.__nodes).reshape(len(step), -1))
+            weights.append(np.tile(0.5 * step[:, None] * self.__weights, intervals))
+        distances, weights = np.concatenate(distances, axis=1), np.concatenate(weights, axis=1)
+
+        points = start[:, None, :] + distances[:, :, None] * direction[:, None, :]
+        radius = np.linalg.norm(points, axis=2)
+        latitude = np.rad2deg(np.arcsin(points[:, :, 2] / radius))
+        longitude = np.rad2deg(np.arctan2(points[:, :, 1], points[:, :, 0]))
+        profile = profile_parameters(nequick_modip(self.modip_grid, latitude, longitude), latitude, longitude,
+                                     ut[:, None], months[:, None], az[:, None], cf2[:, None, :], cm3[:, None, :],
+                                     sin_declination[:, None], cos_declination[:, None])
+        density = electron_density(profile, radius - NEQUICK_EARTH_RADIUS)
+        return np.sum(density * weights, axis=1) * 1000.0 / TEC_UNIT  # km -> m
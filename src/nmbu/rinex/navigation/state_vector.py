@@ -0,0 +1,206 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from nmbu.rinex.navigation.keplerian import SatelliteStates
+
+# PZ-90.11 constants, see GLONASS ICD
+GLONASS_GM = 398600.4418e9  # m^3/s^2
+GLONASS_EARTH_RADIUS = 6378136.0  # m
+GLONASS_J2 = 1082.62575e-6
+GLONASS_EARTH_ROTATION = 7.2921151467e-5  # rad/s
+
+STATE_VECTOR_GNSS = ('R', 'S')
+__KM = 1000.0  # state vectors are given in km, km/s and km/s^2
+__POSITION = ('SV_pos_X', 'SV_pos_Y', 'SV_pos_Z')
+__VELOCITY = ('velocity_X', 'velocity_Y', 'velocity_Z')
+__ACCELERATION = ('acceleration_X', 'acceleration_Y', 'acceleration_Z')
+
+
+def glonass_derivatives(state: np.ndarray, acceleration: np.ndarray) -> np.ndarray:
+    """
+    Right-hand side of the GLONASS equations of motion in the rotating PZ-90 frame, see GLONASS ICD, appendix J.
+
+    :param state: numpy float64 array (n, 6) with positions (m) and velocities (m/s)
+    :param acceleration: numpy float64 array (n, 3) with luni-solar accelerations (m/s^2) from the ephemerides
+    :return: numpy float64 array (n, 6) with velocities and accelerations
+    """
+    x, y, z = state[:, 0], state[:, 1], state[:, 2]
+    vx, vy = state[:, 3], state[:, 4]
+    r2 = x * x + y * y + z * z
+    r = np.sqrt(r2)
+    gm_r3 = GLONASS_GM / (r2 * r)
+    j2_term = 1.5 * GLONASS_J2 * GLONASS_GM * GLONASS_EARTH_RADIUS ** 2 / (r2 * r2 * r)
+    z2_r2 = z * z / r2
+    w2 = GLONASS_EARTH_ROTATION ** 2
+    result = np.empty_like(state)
+    result[:, :3] = state[:, 3:]
+    result[:, 3] = -gm_r3 * x - j2_term * x * (1.0 - 5.0 * z2_r2) + w2 * x + 2.0 * GLONASS_EARTH_ROTATION * vy + \
+        acceleration[:, 0]
+    result[:, 4] = -gm_r3 * y - j2_term * y * (1.0 - 5.0 * z2_r2) + w2 * y - 2.0 * GLONASS_EARTH_ROTATION * vx + \
+        acceleration[:, 1]
+    result[:, 5] = -gm_r3 * z - j2_term * z * (3.0 - 5.0 * z2_r2) + acceleration[:, 2]
+    return result
+
+
+def rk4(state: np.ndarray, acceleration: np.ndarray, seconds: np.ndarray, steps: int) -> np.ndarray:
+    """
+    Integrates GLONASS equations of motion with the Runge-Kutta 4th order method for all satellites at once.
+    Every satellite is integrated over its own time span in the same amount of equal steps.
+
+    :param state: numpy float64 array (n, 6) with initial positions (m) and velocities (m/s)
+    :param acceleration: numpy float64 array (n, 3) with luni-solar accelerations (m/s^2)
+    :param seconds: numpy float64 array (n,). Time span of every satellite in seconds, may be negative
+    :param steps: int. Amount of steps
+    :return: numpy float64 array (n, 6) with the final states
+    """
+    h = (seconds / steps)[:, None]
+    for _ in range(steps):
+        k1 = glonass_derivatives(state, acceleration)
+        k2 = glonass_derivatives(state + 0.5 * h * k1, acceleration)
+        k3 = glonass_derivatives(state + 0.5 * h * k2, acceleration)
+        k4 = glonass_derivatives(state + h * k3, acceleration)
+        state = state + h / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+    return state
+
+
+def polynomial(state: np.ndarray, acceleration: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    """
+    Propagates SBAS state vectors with the second order polynomial, see RTCA DO-229, appendix A.
+
+    :param state: numpy float64 array (n, 6) with initial positions (m) and velocities (m/s)
+    :param acceleration: numpy float64 array (n, 3) with accelerations (m/s^2)
+    :param seconds: numpy float64 array (n,). Time from the reference time in seconds
+    :return: numpy float64 array (n, 6) with the final states
+    """
+    dt = seconds[:, None]
+    return np.concatenate([state[:, :3] + state[:, 3:] * dt + 0.5 * acceleration * dt * dt,
+                           state[:, 3:] + acceleration * dt], axis=1)
+
+
+def __vectors(records: np.ndarray, names: Tuple[str, str, str]) -> np.ndarray:
+    return np.stack([records[name].astype(np.float64) for name in names], axis=-1) * __KM
+
+
+def state_vectors(records: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Reads state vectors of GLONASS or SBAS navigation records and converts them into meters.
+
+    :param records: numpy structured array with GLONASS or SBAS navigation records
+    :return: Tuple of (numpy float64 array (n, 6) with positions (m) and velocities (m/s),
+        numpy float64 array (n, 3) with accelerations (m/s^2))
+    """
+    state = np.concatenate([__vectors(records, __POSITION), __vectors(records, __VELOCITY)], axis=-1)
+    return state, __vectors(records, __ACCELERATION)
+
+
+class StateVectorPropagator:
+    """
+    Computes positions, velocities and clock corrections of GLONASS and SBAS satellites
+    from their broadcast state vectors, for whole arrays of records and times at once.
+
+    GLONASS orbits are integrated with array-wide RK4 steps (see rk4) of at most max_step seconds.
+    The propagator keeps the last integrated state of every record, so the next request of the same record
+    continues from that state instead of from the reference time of the record,
+    e.g. when satellites are processed epoch by epoch at 1 Hz, every request costs a single RK4 step.
+
+    SBAS orbits are propagated with the second order polynomial of the state vector, as specified by RTCA DO-229.
+
+    Times must be given in the time scale of the records, i.e. UTC for GLONASS and GPS time for SBAS.
+
+    Examples
+    --------
+
+    >>> propagator = StateVectorPropagator()
+    >>> for epoch in epochs:
+    >>>     records = rinex.find_closest_match_records('GLO_FDMA', sv, np.full(len(sv), epoch))
+    >>>     states = propagator.propagate(records, np.full(len(sv), epoch))
+    >>>     states.position  # (n, 3) PZ-90 positions in meters
+    """
+    def __init__(self, max_step: float = 60.0):
+        """
+        :param max_step: float. Maximal RK4 step in seconds
+        """
+        self.max_step: float = max_step
+        # (sv, epoch of the record in ns): (time of the state in ns, state with position and velocity)
+        self.__states: Dict[Tuple[str, int], Tuple[int, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__states)
+
+    def clear(self) -> None:
+        """
+        Forgets all integrated states.
+        """
+        self.__states = {}
+
+    def propagate(self, records: np.ndarray, times) -> SatelliteStates:
+        """
+        Computes states of the satellites of the records at the given times.
+
+        ValueError is raised if the records do not belong to GLONASS or SBAS.
+
+        :param records: numpy structured array with GLONASS or SBAS navigation records,
+            e.g. result of RinexData.find_closest_match_records
+        :param times: numpy datetime64 array (or ISO timestamps) of the same shape as records
+        :return: SatelliteStates
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        if times.shape != records.shape:
+            raise ValueError("Records and times must have the same shape.")
+        shape = records.shape
+        records, times = records.ravel(), times.ravel()
+        gnss = records['sv'].astype('U1')
+        unsupported = ~np.isin(gnss, STATE_VECTOR_GNSS + ('',))
+        if unsupported.any():
+            raise ValueError("State vector ephemerides are not defined for GNSS: " + str(gnss[unsupported][0]))
+
+        dt_clock = (times - records['epoch']).astype(np.int64) / 1e9
+        dt_clock[np.isnat(times) | np.isnat(records['epoch'])] = np.nan
+        state = np.full((len(records), 6), np.nan)
+        glonass, sbas = gnss == 'R', gnss == 'S'
+        if sbas.any():
+            sbas_state, sbas_acceleration = state_vectors(records[sbas])
+            state[sbas] = polynomial(sbas_state, sbas_acceleration, dt_clock[sbas])
+        if glonass.any():
+            state[glonass] = self.__integrate(records[glonass], times[glonass])
+
+        # GLONASS: clock_bias is -TauN, relative_frequency_bias is +GammaN. SBAS: aGf0 and aGf1
+        clock_bias = records['clock_bias'] + records['relative_frequency_bias'] * dt_clock
+        clock_drift = np.where(np.isnan(dt_clock), np.nan, records['relative_frequency_bias'])
+        return SatelliteStates(state[:, :3].reshape(shape + (3,)), state[:, 3:].reshape(shape + (3,)),
+                               clock_bias.reshape(shape), clock_drift.reshape(shape), np.zeros(shape), np.zeros(shape))
+
+    def __integrate(self, records: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """
+        Integrates GLONASS records up to the given times,
+        starting from the last integrated state of the record, if it is closer than the reference time.
+        """
+        epochs = records['epoch'].astype(np.int64)
+        targets = times.astype(np.int64)
+        start_times = epochs.copy()
+        start, acceleration = state_vectors(records)
+
+        keys = list(zip(records['sv'].tolist(), epochs.tolist()))
+        for position, key in enumerate(keys):
+            if key in self.__states:
+                state_time, state = self.__states[key]
+                if abs(targets[position] - state_time) < abs(targets[position] - start_times[position]):
+                    start_times[position] = state_time
+                    start[position] = state
+
+        seconds = (targets - start_times) / 1e9
+        valid = ~(np.isnat(times) | np.isnat(records['epoch']) | np.isnan(start).any(axis=1))
+        seconds[~valid] = 0.0
+        start[~valid] = (GLONASS_EARTH_RADIUS * 4, 0.0, 0.0, 0.0, 0.0, 0.0)  # any valid orbit, result is dropped
+        acceleration[~valid] = 0.0
+        steps = max(1, int(np.ceil(np.max(np.abs(seconds), initial=0.0) / self.max_step)))
+        result = rk4(start, acceleration, seconds, steps)
+        result[~valid] = np.nan
+
+        for position in np.flatnonzero(valid):
+            self.__states[keys[position]] = (int(targets[position]), result[position])
+        return result
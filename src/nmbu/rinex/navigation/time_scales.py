@@ -0,0 +1,261 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from nmbu.rinex.common.time_index import NOT_FOUND, NS_PER_SECOND, TimeIndex
+
+GPS_ORIGIN = np.datetime64('1980-01-06T00:00:00', 'ns')
+BDS_ORIGIN = np.datetime64('2006-01-01T00:00:00', 'ns')
+BDS_GPS_OFFSET = 14  # GPS - BDT in seconds
+
+# two letter codes of the time scales, as used in time offset identifiers, e.g. GPUT is GPS - UTC
+TIME_SCALES: Dict[str, str] = {
+    'GPS': 'GP', 'GAL': 'GA', 'GLO': 'GL', 'BDS': 'BD', 'QZS': 'QZ', 'IRN': 'IR', 'SBAS': 'SB', 'UTC': 'UT',
+}
+
+
+class LeapSeconds:
+    """
+    Leap seconds, as given in LEAP SECONDS line of the header, always stored as GPS - UTC in seconds.
+
+    Examples
+    --------
+
+    >>> leap = rinex.header.leap_seconds
+    >>> leap.at(np.array(['2022-09-29T10:00:00'], dtype='datetime64[ns]'))  # [18]
+    """
+    def __init__(self, current: int, future: Optional[int] = None, week: Optional[int] = None,
+                 day: Optional[int] = None, system: str = 'GPS'):
+        """
+        :param current: current number of leap seconds in the given time system
+        :param future: future or past number of leap seconds, None if unknown
+        :param week: week number of the change of leap seconds in the given time system
+        :param day: day number of the change (1-7 for GPS, 0-6 for BDS), the change is effective at the end of the day
+            in UTC, i.e. current leap seconds after the end of the day in the given time system
+        :param system: 'GPS' or 'BDS'
+        """
+        shift = BDS_GPS_OFFSET if system == 'BDS' else 0
+        self.system: str = system
+        self.current: int = current + shift
+        self.future: Optional[int] = None if future is None else future + shift
+        self.change: Optional[np.datetime64] = None  # epoch of the change in GPS time
+        if future is not None and week is not None and day is not None:
+            if system == 'BDS':
+                midnight = BDS_ORIGIN + np.timedelta64(week * 7 + day + 1, 'D')
+            else:
+                midnight = GPS_ORIGIN + np.timedelta64(week * 7 + day, 'D')
+            # leap second is inserted at midnight UTC, i.e. midnight of the time system + its current offset from UTC,
+            # which is midnight + GPS - UTC in GPS time for both systems (BDT midnight + BDT - UTC + GPS - BDT)
+            self.change = (midnight + np.timedelta64(self.current, 's')).astype('datetime64[ns]')
+
+    def __repr__(self):
+        return "LeapSeconds(GPS - UTC = {c:d}, future {f})".format(c=self.current, f=self.future)
+
+    def at(self, times) -> np.ndarray:
+        """
+        Returns GPS - UTC in seconds at the given times in GPS time.
+
+        :param times: numpy datetime64 array
+        :return: numpy int64 array of the same shape as times
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        if self.change is None or self.future == self.current:
+            return np.full(times.shape, self.current, dtype=np.int64)
+        return np.where(times >= self.change, self.future, self.current).astype(np.int64)
+
+
+def read_leap_seconds(line: str) -> LeapSeconds:
+    """
+    Parses LEAP SECONDS line of the header: current leap seconds, future leap seconds,
+    week and day of the change and the time system. Only the current leap seconds are mandatory.
+
+    :param line: header line
+    :return: LeapSeconds
+    """
+    fields = [line[start:start + 6].strip() for start in range(0, 24, 6)]
+    current, future, week, day = [int(field) if field else None for field in fields]
+    if current is None:
+        raise ValueError("Current leap seconds are missing in '{l:s}'".format(l=line.rstrip()))
+    return LeapSeconds(current, future, week, day, line[24:27].strip() or 'GPS')
+
+
+def nominal_offset(scale: str, leap_seconds) -> np.ndarray:
+    """
+    Returns integer offset of the time scale from GPS time in seconds, i.e. time scale - GPS without corrections.
+    GLONASS time is counted in UTC(SU), as in RINEX files.
+
+    :param scale: name of the time scale, see TIME_SCALES
+    :param leap_seconds: GPS - UTC in seconds, see LeapSeconds.at. None if not known
+    :return: numpy array (or scalar) with the offsets in seconds
+    """
+    if scale not in TIME_SCALES:
+        raise ValueError("Unknown time scale: {s:s}".format(s=scale))
+    if scale in ('GLO', 'UTC'):
+        if leap_seconds is None:
+            raise ValueError("Leap seconds are needed to convert to or from {s:s}".format(s=scale))
+        return -np.asarray(leap_seconds)
+    return np.asarray(-BDS_GPS_OFFSET if scale == 'BDS' else 0)
+
+
+class TimeScaleCorrections:
+    """
+    Broadcast polynomial offsets between GNSS time scales, e.g. from STO records of RINEX 4 navigation files
+    or TIME SYSTEM CORR lines of RINEX 3 navigation headers, with vectorized conversion of epochs.
+
+    The offset given by time offset identifier XXYY (e.g. GPUT) is
+    XX - YY = nominal offset + A0 + A1 * (t - tref) + A2 * (t - tref)^2,
+    where the nominal offset is the integer number of seconds between the time scales, see nominal_offset.
+    Parameter sets of every identifier are sorted by reference time, so the set of every epoch is found
+    with a binary search, the same way as in common.time_index.
+
+    Examples
+    --------
+
+    >>> corrections = rinex.time_scale_corrections()
+    >>> utc = corrections.convert(gps_epochs, 'GPS', 'UTC')
+    >>> gal_minus_gps = corrections.difference(gps_epochs, 'GAL', 'GPS')
+    """
+    def __init__(self, codes: np.ndarray, references: np.ndarray, coefficients: np.ndarray,
+                 leap_seconds: Optional[LeapSeconds] = None):
+        """
+        :param codes: array of time offset identifiers, e.g. ['GPUT', 'GAGP']
+        :param references: numpy datetime64 array with reference times of the parameter sets.
+            NaT for sets without reference time, these are used at every epoch
+        :param coefficients: numpy float64 array (n, 3) with A0, A1, A2 of every set
+        :param leap_seconds: LeapSeconds, needed to convert to or from UTC and GLONASS time
+        """
+        codes = np.asarray(codes, dtype=str)
+        references = np.asarray(references, dtype='datetime64[ns]')
+        coefficients = np.asarray(coefficients, dtype=np.float64).reshape(-1, 3)
+        self.leap_seconds: Optional[LeapSeconds] = leap_seconds
+        self.__sets: Dict[str, Tuple[TimeIndex, np.ndarray, Optional[np.ndarray]]] = {}
+        for code in np.unique(codes):
+            selected = np.flatnonzero(codes == code)
+            undated = selected[np.isnat(references[selected])]
+            selected = selected[~np.isnat(references[selected])]
+            epochs = references[selected].astype(np.int64)
+            order = np.argsort(epochs, kind='stable')
+            epochs, selected = epochs[order], selected[order]
+            if len(epochs):
+                last = np.append(epochs[1:] != epochs[:-1], True)  # the set read last wins
+                epochs, selected = epochs[last], selected[last]
+            self.__sets[str(code)] = (TimeIndex(epochs, lambda position: None),
+                                      coefficients[selected],
+                                      coefficients[undated[-1]] if len(undated) else None)
+
+    @property
+    def codes(self):
+        """
+        Time offset identifiers with at least one parameter set, e.g. ['GPUT', 'GLGP'].
+        """
+        return list(self.__sets)
+
+    def offset(self, times, code: str, latest: bool = True, max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Evaluates the broadcast polynomial of the time offset identifier at the given epochs,
+        i.e. the fractional part of the offset without the nominal offset.
+
+        :param times: numpy datetime64 array or ISO strings
+        :param code: time offset identifier, e.g. 'GPUT'
+        :param latest: True to use the latest parameter sets at or before the epochs, False to use the closest sets
+        :param max_age: maximal distance in seconds between the epoch and the reference time. None for no limit
+        :return: numpy float64 array in seconds, NaN where no parameter set matches
+        """
+        if code not in self.__sets:
+            raise ValueError("No time offset parameters of {c:s}".format(c=code))
+        index, values, undated = self.__sets[code]
+        times = np.asarray(times, dtype='datetime64[ns]')
+        nanoseconds = times.astype(np.int64)
+        positions = index.find_all(nanoseconds, latest, max_age)
+        found = positions != NOT_FOUND
+        if len(index) == 0:
+            a0, a1, a2 = (np.full(times.shape, np.nan) for _ in range(3))
+            elapsed = np.zeros(times.shape)
+        else:
+            a0, a1, a2 = np.moveaxis(values[np.maximum(positions, 0)], -1, 0)
+            elapsed = (nanoseconds - index.epochs[np.maximum(positions, 0)]) / NS_PER_SECOND
+        if undated is not None:  # sets without reference time are constant offsets
+            a0, a1, a2 = (np.where(found, value, fallback) for value, fallback in zip((a0, a1, a2), undated))
+            elapsed = np.where(found, elapsed, 0.0)
+            found = np.ones(times.shape, dtype=bool)
+        result = a0 + (a1 + a2 * elapsed) * elapsed
+        return np.where(found & ~np.isnat(times), result, np.nan)
+
+    def difference(self, times, source: str, target: str, latest: bool = True,
+                   max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Computes source - target in seconds at the given epochs, including the nominal offset.
+        If no identifier relates the time scales directly, the offset is chained through GPS time or UTC.
+
+        :param times: numpy datetime64 array or ISO strings, epochs in the source time scale
+        :param source: name of the time scale of the epochs, see TIME_SCALES, e.g. 'GAL'
+        :param target: name of the requested time scale, e.g. 'GPS'
+        :param latest: True to use the latest parameter sets at or before the epochs, False to use the closest sets
+        :param max_age: maximal distance in seconds between the epoch and the reference time. None for no limit
+        :return: numpy float64 array in seconds, NaN where no parameter set matches
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        for scale in (source, target):
+            if scale not in TIME_SCALES:
+                raise ValueError("Unknown time scale: {s:s}".format(s=scale))
+        if source == target:
+            return np.where(np.isnat(times), np.nan, 0.0)
+        path = self.__path(source, target)
+        if path is None:
+            raise ValueError("No time offset parameters between {s:s} and {t:s}".format(s=source, t=target))
+        leap = None
+        if self.leap_seconds is not None:
+            # leap seconds are selected at epochs in GPS time, the corrections are far below a second
+            gps_times = times - (nominal_offset(source, self.leap_seconds.at(times)) * NS_PER_SECOND) \
+                .astype('timedelta64[ns]')
+            leap = self.leap_seconds.at(gps_times)
+        result = np.asarray(nominal_offset(source, leap) - nominal_offset(target, leap), dtype=np.float64)
+        result = np.broadcast_to(result, times.shape).copy()
+        for code, sign in path:
+            result += sign * self.offset(times, code, latest, max_age)
+        return result
+
+    def convert(self, times, source: str, target: str, latest: bool = True,
+                max_age: Optional[float] = None) -> np.ndarray:
+        """
+        Converts epochs between time scales, i.e. target time = source time - (source - target).
+
+        :param times: numpy datetime64 array or ISO strings, epochs in the source time scale
+        :param source: name of the time scale of the epochs, see TIME_SCALES, e.g. 'GPS'
+        :param target: name of the requested time scale, e.g. 'UTC'
+        :param latest: True to use the latest parameter sets at or before the epochs, False to use the closest sets
+        :param max_age: maximal distance in seconds between the epoch and the reference time. None for no limit
+        :return: numpy datetime64[ns] array, NaT where no parameter set matches
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        difference = self.difference(times, source, target, latest, max_age)
+        unknown = np.isnan(difference)
+        shift = np.round(np.where(unknown, 0.0, difference) * NS_PER_SECOND).astype(np.int64)
+        return np.where(unknown, np.datetime64('NaT'), times - shift.astype('timedelta64[ns]'))
+
+    def __path(self, source: str, target: str):
+        """
+        Returns identifiers with signs (+1 for XXYY, -1 for YYXX) relating source to target, None if there are none.
+        """
+        direct = self.__link(source, target)
+        if direct is not None:
+            return [direct]
+        for middle in ('GPS', 'UTC'):
+            if middle in (source, target):
+                continue
+            first, second = self.__link(source, middle), self.__link(middle, target)
+            if first is not None and second is not None:
+                return [first, second]
+        return None
+
+    def __link(self, source: str, target: str):
+        forward = TIME_SCALES[source] + TIME_SCALES[target]
+        backward = TIME_SCALES[target] + TIME_SCALES[source]
+        if forward in self.__sets:
+            return forward, 1.0
+        if backward in self.__sets:
+            return backward, -1.0
+        return None
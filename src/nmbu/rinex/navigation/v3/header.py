@@ -3,7 +3,7 @@
 
 import datetime
 import io
-from typing import IO, Dict
+from typing import IO, Dict, Optional
 
 import numpy as np
 
@@ -13,11 +13,20 @@ from nmbu.rinex.navigation.v3.nav_message_type.GAL import GALNavRecord
 from nmbu.rinex.navigation.v3.nav_message_type.GPS import GPSNavRecord
 from nmbu.rinex.navigation.v3.nav_message_type.IRN import IRNNavRecord
 from nmbu.rinex.navigation.v3.nav_message_type.QZS import QZSNavRecord
+from nmbu.rinex.navigation.time_scales import BDS_ORIGIN, GPS_ORIGIN, LeapSeconds, read_leap_seconds
 
 
 class IONCorrections:
     pass
 
+
+class TimeSystemCorrections:
+    def __init__(self, a0: float, a1: float):
+        self.A0: float = a0
+        self.A1: float = a1
+        self.A2: float = 0.0
+
+
 class NavigationHeaderV3:
     """
     Class that holds the result of parsing header from Navigation file in version 3.
@@ -29,6 +38,9 @@ class NavigationHeaderV3:
     - version: float
     - file_type: str
     - gnss: str
+    - corrections: {'ION': {sv: {time mark: IONCorrections}},
+      'STO': {time offset identifier, e.g. 'GPUT': {reference time: TimeSystemCorrections}}}
+    - leap_seconds: LeapSeconds or None
     - other: {str: str}
     """
     def __init__(self, version: float, file_type: str, gnss: str):
@@ -38,9 +50,11 @@ class NavigationHeaderV3:
         self.version: float = version
         self.file_type: str = file_type
         self.gnss: str = gnss
-        self.corrections: Dict[str, Dict[str, Dict[str, IONCorrections]]] = {
-            'ION': {}
+        self.corrections: Dict[str, Dict[str, Dict[str, object]]] = {
+            'ION': {},
+            'STO': {}
         }
+        self.leap_seconds: Optional[LeapSeconds] = None
         self.other: Dict[str, str] = {}
 
 
@@ -148,6 +162,31 @@ def read_navigation_header_v3(
                 result.other[label] += " | " + line[:60].strip()
             else:
                 result.other[label] = line[:60].strip()
+            if label == TIME_SYSTEM_CORR_LABEL:
+                code, timestamp, corrections = __read_time_system_corr(line)
+                result.corrections['STO'].setdefault(code, {})[timestamp] = corrections
+            elif label == LEAP_SECONDS_LABEL:
+                result.leap_seconds = read_leap_seconds(line)
         # end of for loop
 
     return result
+
+
+def __read_time_system_corr(line: str) -> (str, str, TimeSystemCorrections):
+    """
+    Parses TIME SYSTEM CORR line: time offset identifier, a0, a1, reference time T (seconds of week)
+    and reference week W. Week of BDS identifiers counts from the BDS origin.
+
+    :return: Tuple: identifier, reference time in ISO format or 'NO_TIME' if not given, TimeSystemCorrections
+    """
+    code = line[:4].strip()
+    a0 = str2float(line[5:22].replace('D', 'E'), "Invalid a0 in '{l:s}'".format(l=line.rstrip()))
+    a1 = str2float(line[22:38].replace('D', 'E'), "Invalid a1 in '{l:s}'".format(l=line.rstrip()))
+    seconds = int(line[38:45]) if line[38:45].strip() else 0
+    week = int(line[45:50]) if line[45:50].strip() else 0
+    if seconds == 0 and week == 0:
+        timestamp = 'NO_TIME'
+    else:
+        origin = BDS_ORIGIN if code.startswith('BD') else GPS_ORIGIN
+        timestamp = datetime64_to_str(origin + np.timedelta64(week * 7, 'D') + np.timedelta64(seconds, 's'))[0]
+    return code, timestamp, TimeSystemCorrections(a0, a1)
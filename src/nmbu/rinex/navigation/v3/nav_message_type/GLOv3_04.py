@@ -1,7 +1,7 @@
-import io
-
 import numpy as np
 
+from nmbu.rinex.common.nav_decoder import read_data_lines
+
 
 class GLONavRecordOrbitData:
     def __init__(self):
@@ -45,11 +45,6 @@ class GLONavRecord:
         self.orbit_data = GLONavRecordOrbitData()
 
     def read_lines(self, lines: [str]):
-        whole_block = "".join(lines)
-        result = np.genfromtxt(io.BytesIO(whole_block.encode("ascii")),
-                               delimiter=(19,) * len(self.orbit_data.__dict__),
-                               dtype=np.dtype([(param, np.float64) for param in self.orbit_data.__dict__.keys()]),
-                               autostrip=True
-                               )
-        for p in self.orbit_data.__dict__.keys():
-            self.orbit_data.__dict__[p] = result[p] * 1  # convert to float
+        values = read_data_lines(lines, len(lines), indent=0)[0]
+        for p, value in zip(list(self.orbit_data.__dict__.keys()), values.tolist()):
+            self.orbit_data.__dict__[p] = value
@@ -1,13 +1,13 @@
 #  Copyright: (c) 2023, Liudmila Sherstnyakova
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-import io
 from datetime import datetime
-from typing import Dict, IO
-
-import numpy as np
+from typing import Dict, IO, List, Optional
 
 from nmbu.rinex.common import normalize_data_string
+from nmbu.rinex.common.epoch_index import EpochIndex, iter_range_lines
+from nmbu.rinex.common.nav_decoder import epoch_line_in_period, epoch_period_keys, read_epoch_line
+from nmbu.rinex.common.nav_table import SATELLITES, NavSatellitesView, NavTable, NavTableBuilder
 from nmbu.rinex.navigation.v3.nav_message_type.BDS import BDSNavRecord
 from nmbu.rinex.navigation.v3.nav_message_type.GAL import GALNavRecord
 from nmbu.rinex.navigation.v3.nav_message_type.GLOv3_04 import GLONavRecord as GLO3_04NavRecord
@@ -32,220 +32,136 @@ class NavigationV3:
     - QZS. See navigation.v3.nav_message_type.QZS.QZSNavRecord
     - SBAS. See navigation.v3.nav_message_type.SBAS.SBASNavRecord
 
+    Records are stored in one table per GNSS, see common.nav_table.NavTable.
+    satellites is a read-only view over these tables, which builds the data object of a record on access.
+
     Examples
     --------
 
     >>> nav.satellites['C01']['2022-01-01T01:00:00'].clock_bias
     >>> nav.satellites['C01']['2022-01-01T01:00:00'].AODC
+    >>> nav.tables['BDS'].records['AODC']  # AODC of all BDS ephemerides
     """
     def __init__(self):
-        self.satellites: Dict[str, Dict[str, np.void]] = {}
+        self.tables: Dict[str, NavTable] = {}
+
+    @property
+    def satellites(self) -> NavSatellitesView:
+        return NavSatellitesView(list(self.tables.values()))
+
+
+__RECORD_CLASSES = {
+    record.gnss_symbol: record
+    for record in (GPSNavRecord, GALNavRecord, QZSNavRecord, BDSNavRecord, IRNNavRecord, SBASNavRecord)
+}
+__CLOCK = ("clock_bias", "clock_drift", "clock_drift_rate")
+__EPOCH_ATTRIBUTES = {
+    GLO3_04NavRecord.gnss_symbol: ("clock_bias", "relative_frequency_bias", "msg_frame_time"),
+    SBASNavRecord.gnss_symbol: ("clock_bias", "relative_frequency_bias", "msg_transmission_time"),
+}
 
 
-def __read_epoch_line(
-        line: str,
-        version: float
-) -> (object, bool, int):
+def __record_class(gnss: str, version: float):
+    """
+    Returns the record class of the given GNSS. It defines the amount of orbit lines that follow the epoch line.
+
+    ValueError is raised if an unsupported GNSS is met.
+    """
+    if gnss == GLO3_04NavRecord.gnss_symbol:
+        return GLO3_04NavRecord if version == 3.04 else GLO3_05NavRecord
+    if gnss not in __RECORD_CLASSES:
+        raise ValueError("Unsupported GNSS: " + gnss)
+    return __RECORD_CLASSES[gnss]
+
+
+def __read_epoch_line(line: str, version: float) -> (object, bool, int):
     """
     Reads epoch line for the given block.
 
     ValueError is raised if an unsupported GNSS is met.
 
     :param line: epoch line, e.g. 'C11 2022 09 29 10 00 00-3.808789188042E-04 2.210320815266E-11-3.252606517457E-19'
+    :param version: RINEX version. Used to differentiate GLONASS V3.04 from GLONASS V3.05
     :return: tuple with nav block of correct type, valid block flag and size of the given block
     """
-    gnss = line[0]
-
-    if gnss == GPSNavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=GPSNavRecord.delimiter,
-                              dtype=GPSNavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = GPSNavRecord.block_size
-        block = GPSNavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.clock_drift = epoch["clock_drift"] * 1
-        block.clock_drift_rate = epoch["clock_drift_rate"] * 1
-        should_read_block = True
-    elif version == 3.04 and gnss == GLO3_04NavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=GLO3_04NavRecord.delimiter,
-                              dtype=GLO3_04NavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = GLO3_04NavRecord.block_size
-        block = GLO3_04NavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.msg_frame_time = epoch["msg_frame_time"] * 1
-        block.relative_frequency_bias = epoch["relative_frequency_bias"] * 1
-        should_read_block = True
-    elif version == 3.05 and gnss == GLO3_05NavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=GLO3_05NavRecord.delimiter,
-                              dtype=GLO3_05NavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = GLO3_05NavRecord.block_size
-        block = GLO3_05NavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.msg_frame_time = epoch["msg_frame_time"] * 1
-        block.relative_frequency_bias = epoch["relative_frequency_bias"] * 1
-        should_read_block = True
-    elif gnss == GALNavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=GALNavRecord.delimiter,
-                              dtype=GALNavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = GALNavRecord.block_size
-        block = GALNavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.clock_drift = epoch["clock_drift"] * 1
-        block.clock_drift_rate = epoch["clock_drift_rate"] * 1
-        should_read_block = True
-    elif gnss == QZSNavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=QZSNavRecord.delimiter,
-                              dtype=QZSNavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = QZSNavRecord.block_size
-        block = QZSNavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.clock_drift = epoch["clock_drift"] * 1
-        block.clock_drift_rate = epoch["clock_drift_rate"] * 1
-        should_read_block = True
-    elif gnss == BDSNavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=BDSNavRecord.delimiter,
-                              dtype=BDSNavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = BDSNavRecord.block_size
-        block = BDSNavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.clock_drift = epoch["clock_drift"] * 1
-        block.clock_drift_rate = epoch["clock_drift_rate"] * 1
-        should_read_block = True
-    elif gnss == IRNNavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=IRNNavRecord.delimiter,
-                              dtype=IRNNavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = IRNNavRecord.block_size
-        block = IRNNavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.clock_drift = epoch["clock_drift"] * 1
-        block.clock_drift_rate = epoch["clock_drift_rate"] * 1
-        should_read_block = True
-    elif gnss == SBASNavRecord.gnss_symbol:
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=SBASNavRecord.delimiter,
-                              dtype=SBASNavRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        block_size = SBASNavRecord.block_size
-        block = SBASNavRecord(
-            sv=str(np.char.decode(epoch["SV"])),
-            timestamp=datetime(
-                epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-            ).isoformat()
-        )
-        block.clock_bias = epoch["clock_bias"] * 1
-        block.relative_frequency_bias = epoch["relative_frequency_bias"] * 1
-        block.msg_transmission_time = epoch["msg_transmission_time"] * 1
-        should_read_block = True
-    else:
-        raise ValueError("Unsupported GNSS: " + gnss)
+    record_class = __record_class(line[0], version)
+    timestamp, values = read_epoch_line(line)
+    block = record_class(sv=line[0:3], timestamp=timestamp)
+    for attribute, value in zip(__EPOCH_ATTRIBUTES.get(record_class.gnss_symbol, __CLOCK), values):
+        setattr(block, attribute, value)
+    return block, True, record_class.block_size
+
 
-    return block, should_read_block, block_size
+def __is_data_line(line: str) -> bool:
+    """
+    Checks that the line is an orbit line, i.e. starts with 4 spaces followed by the first value.
+    """
+    return normalize_data_string(line)[0] in (' ', '-')
 
 
 def read_navigation_blocks_v3(
         file: IO,
         version: float,
-        verbose: bool = False
+        verbose: bool = False,
+        sv: Optional[List[str]] = None,
+        start_epoch: Optional[datetime] = None,
+        end_epoch: Optional[datetime] = None,
+        gnss: Optional[List[str]] = None,
+        epoch_index: Optional[EpochIndex] = None
 ) -> NavigationV3:
     """
     Parses input file and reads all navigation blocks one by one.
+    Lines of all blocks are collected first and decoded in one batch per GNSS,
+    see common.nav_table.NavTableBuilder.
+    Blocks that do not match the satellite, GNSS or epoch time filter are skipped without parsing.
 
     ValueError is raised if any error occurs.
 
     :param file: file iterator. Supposed to start at 'END OF HEADER' line
     :param version: RINEX version. Used to differentiate GLONASS V3.04 from GLONASS V3.05
     :param verbose: boolean flag to control debug output to console
+    :param sv: satellite filter, e.g. ['G05', 'E11']. None to read all satellites
+    :param start_epoch: epoch time filter, start of the period. If used alone, only blocks of exactly this epoch are read
+    :param end_epoch: epoch time filter, end of the period (inclusive)
+    :param gnss: GNSS filter, e.g. ['G', 'E']. None to read all GNSS
+    :param epoch_index: index of the navigation records, see common.epoch_index.build_navigation_index.
+        Used together with the epoch time filter to read only the records of the selected epochs
     :return: NavigationV3 object containing read data
     """
     result = NavigationV3()
+    builders: Dict[type, NavTableBuilder] = {}
+    sv = None if sv is None else set(sv)
+    gnss = None if gnss is None else set(gnss)
+    period = epoch_period_keys(start_epoch, end_epoch)
+    if epoch_index is not None and start_epoch is not None:
+        file = iter_range_lines(file, epoch_index.byte_ranges(start_epoch, end_epoch))
     for line in file:
         if line[0] != ' ':
-            current_block, valid_block, block_size = __read_epoch_line(line, version)
+            record_class = __record_class(line[0], version)
+            if (sv is not None and line[0:3] not in sv) or (gnss is not None and line[0] not in gnss) or \
+                    not epoch_line_in_period(line, period):
+                if verbose:
+                    print("Skipped block {name:s} due to filter limitation".format(name=line[0:23]))
+                for _ in range(record_class.block_size):
+                    next(file, None)
+                continue
             if verbose:
-                print("Working with block", current_block)
-            block_lines = [normalize_data_string(next(file)) for _ in range(block_size)]
-            if any(block_line[0] not in (' ', '-') for block_line in block_lines):
+                print("Working with block", line[0:23])
+            block_lines = [next(file) for _ in range(record_class.block_size)]
+            if not all(__is_data_line(block_line) for block_line in block_lines):
+                current_block, _, _ = __read_epoch_line(line, version)
                 raise ValueError("Block {name:s} has invalid size.".format(
                     name=current_block.sv + current_block.timestamp))
-            if valid_block:
-                current_block.read_lines(block_lines)
-                if current_block.sv not in result.satellites:
-                    result.satellites[current_block.sv] = {current_block.timestamp: current_block.orbit_data}
-                else:
-                    result.satellites[current_block.sv][current_block.timestamp] = current_block.orbit_data
-
-                result.satellites[current_block.sv][current_block.timestamp].timestamp = current_block.timestamp
-
-                if current_block.gnss_symbol in ('G', 'C', 'E'):
-                    result.satellites[current_block.sv][current_block.timestamp].clock_bias = current_block.clock_bias
-                    result.satellites[current_block.sv][current_block.timestamp].clock_drift = current_block.clock_drift
-                    result.satellites[current_block.sv][current_block.timestamp].clock_drift_rate = current_block.clock_drift_rate
-                elif current_block.gnss_symbol in ('R', 'S'):
-                    result.satellites[current_block.sv][current_block.timestamp].clock_bias = current_block.clock_bias
-                    result.satellites[current_block.sv][current_block.timestamp].relative_frequency_bias = current_block.relative_frequency_bias
-                    result.satellites[current_block.sv][current_block.timestamp].msg_frame_time = current_block.msg_frame_time
-                # elif current_block.gnss_symbol in ('S',):
-                #     result.satellites[current_block.sv][current_block.timestamp].clock_bias = current_block.clock_bias
-                #     result.satellites[current_block.sv][current_block.timestamp].relative_frequency_bias = current_block.relative_frequency_bias
-                #     result.satellites[current_block.sv][current_block.timestamp].msg_transmission_time = current_block.msg_transmission_time
+            if record_class not in builders:
+                # one table per record class, e.g. 'GPS' or 'GLOv3_05'
+                builders[record_class] = NavTableBuilder(
+                    record_class.__module__.rsplit('.', 1)[-1], SATELLITES, record_class,
+                    type(record_class("", "").orbit_data),
+                    __EPOCH_ATTRIBUTES.get(record_class.gnss_symbol, __CLOCK))
+            builders[record_class].add_block(line[0:3], line, block_lines)
         else:
             raise ValueError("Navigation file seems to be invalid. Stopped reading at line\n", line)
         # end of for loop
 
+    result.tables = {builder.name: builder.build() for builder in builders.values()}
     return result
@@ -2,9 +2,10 @@
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import datetime
-from typing import IO, Dict
+from typing import IO, Dict, Optional
 
 from nmbu.rinex.common import *
+from nmbu.rinex.navigation.time_scales import LeapSeconds, read_leap_seconds
 
 
 class NavigationHeaderV4:
@@ -18,6 +19,7 @@ class NavigationHeaderV4:
     - version: float
     - file_type: str
     - gnss: str
+    - leap_seconds: LeapSeconds or None
     - other: {str: str}
     """
     def __init__(self, version: float, file_type: str, gnss: str):
@@ -27,6 +29,7 @@ class NavigationHeaderV4:
         self.version: float = version
         self.file_type: str = file_type
         self.gnss: str = gnss
+        self.leap_seconds: Optional[LeapSeconds] = None
         self.other: Dict[str, str] = {}
 
 
@@ -62,6 +65,8 @@ def read_navigation_header_v4(
                 result.other[label] += " | " + line[:60].strip()
             else:
                 result.other[label] = line[:60].strip()
+            if label == LEAP_SECONDS_LABEL:
+                result.leap_seconds = read_leap_seconds(line)
         # end of for loop
 
     return result
@@ -1,8 +1,7 @@
-import io
-from datetime import datetime
-
 import numpy as np
 
+from nmbu.rinex.common.nav_decoder import read_data_lines, read_epoch_line
+
 
 class BDSNavRecordOrbitData:
     def __init__(self):
@@ -68,26 +67,11 @@ class BDSCNAV3Record:
         self.orbit_data = BDSNavRecordOrbitData()
 
     def read_epoch_line(self, line: str):
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=BDSCNAV3Record.delimiter,
-                              dtype=BDSCNAV3Record.epoch_line_format,
-                              autostrip=True
-                              )
-        self.timestamp = datetime(
-            epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-        ).isoformat()
-        self.clock_bias = epoch["clock_bias"] * 1
-        self.clock_drift = epoch["clock_drift"] * 1
-        self.clock_drift_rate = epoch["clock_drift_rate"] * 1
+        self.timestamp, (self.clock_bias, self.clock_drift, self.clock_drift_rate) = read_epoch_line(line)
 
     def read_lines(self, lines: [str]):
-        whole_block = "".join(lines)
-        result = np.genfromtxt(io.BytesIO(whole_block.encode("ascii")),
-                               delimiter=(19,) * len(self.orbit_data.__dict__),
-                               dtype=np.dtype([(param, np.float64) for param in self.orbit_data.__dict__.keys()]),
-                               autostrip=True
-                               )
-        for p in self.orbit_data.__dict__.keys():
-            self.orbit_data.__dict__[p] = result[p] * 1  # convert to float
+        values = read_data_lines(lines, len(lines), indent=0)[0]
+        for p, value in zip(list(self.orbit_data.__dict__.keys()), values.tolist()):
+            self.orbit_data.__dict__[p] = value
 
         # TODO decide what to do with TGD and set self.orbit_data.TGD here. See e.g. GAL_INAV_FNAV.py
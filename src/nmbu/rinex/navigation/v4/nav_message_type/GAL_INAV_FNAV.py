@@ -1,8 +1,9 @@
-import io
-from datetime import datetime
+from typing import Dict
 
 import numpy as np
 
+from nmbu.rinex.common.nav_decoder import read_data_lines, read_epoch_line
+
 
 class GALNavRecordOrbitData:
     def __init__(self):
@@ -62,27 +63,12 @@ class GALINAVFNAVRecord:
         self.orbit_data = GALNavRecordOrbitData()
 
     def read_epoch_line(self, line: str):
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=GALINAVFNAVRecord.delimiter,
-                              dtype=GALINAVFNAVRecord.epoch_line_format,
-                              autostrip=True
-                              )
-        self.timestamp = datetime(
-            epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-        ).isoformat()
-        self.clock_bias = epoch["clock_bias"] * 1
-        self.clock_drift = epoch["clock_drift"] * 1
-        self.clock_drift_rate = epoch["clock_drift_rate"] * 1
+        self.timestamp, (self.clock_bias, self.clock_drift, self.clock_drift_rate) = read_epoch_line(line)
 
     def read_lines(self, lines: [str]):
-        whole_block = "".join(lines)
-        result = np.genfromtxt(io.BytesIO(whole_block.encode("ascii")),
-                               delimiter=(19,) * len(self.orbit_data.__dict__),
-                               dtype=np.dtype([(param, np.float64) for param in self.orbit_data.__dict__.keys()]),
-                               autostrip=True
-                               )
-        for p in self.orbit_data.__dict__.keys():
-            self.orbit_data.__dict__[p] = result[p] * 1  # convert to float
+        values = read_data_lines(lines, len(lines), indent=0)[0]
+        for p, value in zip(list(self.orbit_data.__dict__.keys()), values.tolist()):
+            self.orbit_data.__dict__[p] = value
 
         self.orbit_data.TGD = self.__get_correct_TGD_value__()
 
@@ -95,4 +81,24 @@ class GALINAVFNAVRecord:
         elif ds_flag & 0b00000100: # bit 2 set:
             return self.orbit_data.BGD_E5b_E1
         else:
-            raise ValueError("Unable to determine TGD value based on Data_sources flag: {0}".format(self.orbit_data.Data_sources))
\ No newline at end of file
+            raise ValueError("Unable to determine TGD value based on Data_sources flag: {0}".format(self.orbit_data.Data_sources))
+
+    @staticmethod
+    def derive_columns(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Computes TGD of many records at once, same as __get_correct_TGD_value__ does for a single record.
+
+        :param columns: Dict[str, np.ndarray]. Decoded values of the data lines by field name
+        :return: Dict with TGD column
+        """
+        ds_flag = np.nan_to_num(columns["Data_sources"]).astype(np.int64)
+        tgd = np.select(
+            [(ds_flag & 0b00000001) != 0, (ds_flag & 0b00000010) != 0, (ds_flag & 0b00000100) != 0],
+            [columns["BGD_E5b_E1"], columns["BGD_E5a_E1"], columns["BGD_E5b_E1"]],
+            np.nan
+        )
+        invalid = (ds_flag & 0b00000111) == 0
+        if invalid.any():
+            raise ValueError("Unable to determine TGD value based on Data_sources flag: {0}".format(
+                columns["Data_sources"][invalid][0]))
+        return {"TGD": tgd}
@@ -1,8 +1,7 @@
-import io
-from datetime import datetime
-
 import numpy as np
 
+from nmbu.rinex.common.nav_decoder import read_data_lines, read_epoch_line
+
 
 class IONBDGIMNavRecordData:
     def __init__(self):
@@ -37,24 +36,9 @@ class IONBDGIMNavRecord:
         self.message_line = IONBDGIMNavRecordData()
 
     def read_epoch_line(self, line: str):
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=self.delimiter,
-                              dtype=self.epoch_line_format,
-                              autostrip=True
-                              )
-        self.timestamp = datetime(
-            epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-        ).isoformat()
-        self.Alpha1 = epoch["Alpha1"] * 1
-        self.Alpha2 = epoch["Alpha2"] * 1
-        self.Alpha3 = epoch["Alpha3"] * 1
+        self.timestamp, (self.Alpha1, self.Alpha2, self.Alpha3) = read_epoch_line(line)
 
     def read_lines(self, lines: [str]):
-        whole_block = "".join(lines)
-        result = np.genfromtxt(io.BytesIO(whole_block.encode("ascii")),
-                               delimiter=(19,) * len(self.message_line.__dict__),
-                               dtype=np.dtype([(param, np.float64) for param in self.message_line.__dict__.keys()]),
-                               autostrip=True
-                               )
-        for p in self.message_line.__dict__.keys():
-            self.message_line.__dict__[p] = result[p] * 1  # convert to float
+        values = read_data_lines(lines, len(lines), indent=0)[0]
+        for p, value in zip(list(self.message_line.__dict__.keys()), values.tolist()):
+            self.message_line.__dict__[p] = value
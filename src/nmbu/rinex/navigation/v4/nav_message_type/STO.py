@@ -1,8 +1,7 @@
-import io
-from datetime import datetime
-
 import numpy as np
 
+from nmbu.rinex.common.nav_decoder import read_data_lines, read_epoch_line_text
+
 
 class STONavRecordData:
     def __init__(self):
@@ -34,24 +33,9 @@ class STONavRecord:
         self.message_line = STONavRecordData()
 
     def read_epoch_line(self, line: str):
-        epoch = np.genfromtxt(io.BytesIO(line.encode("ascii")),
-                              delimiter=self.delimiter,
-                              dtype=self.epoch_line_format,
-                              autostrip=True
-                              )
-        self.timestamp = datetime(
-            epoch["year"], epoch["month"], epoch["day"], epoch["hour"], epoch["min"], epoch["sec"]
-        ).isoformat()
-        self.time_offset = str(np.char.decode(epoch["time_offset"]))
-        self.sbas_id = str(np.char.decode(epoch["SBAS_ID"]))
-        self.utc_id = str(np.char.decode(epoch["UTC_ID"]))
+        self.timestamp, (self.time_offset, self.sbas_id, self.utc_id) = read_epoch_line_text(line)
 
     def read_lines(self, lines: [str]):
-        whole_block = "".join(lines)
-        result = np.genfromtxt(io.BytesIO(whole_block.encode("ascii")),
-                               delimiter=(19,) * len(self.message_line.__dict__),
-                               dtype=np.dtype([(param, np.float64) for param in self.message_line.__dict__.keys()]),
-                               autostrip=True
-                               )
-        for p in self.message_line.__dict__.keys():
-            self.message_line.__dict__[p] = result[p] * 1  # convert to float
+        values = read_data_lines(lines, len(lines), indent=0)[0]
+        for p, value in zip(list(self.message_line.__dict__.keys()), values.tolist()):
+            self.message_line.__dict__[p] = value
@@ -1,28 +1,16 @@
 #  Copyright: (c) 2023, Liudmila Sherstnyakova
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from typing import Dict, IO
+from datetime import datetime
+from typing import Dict, IO, List, Optional, Set
 
-import numpy as np
-
-from nmbu.rinex.common import normalize_data_string
-from nmbu.rinex.navigation.v4.nav_message_type.BDS_CNAV1 import BDSCNAV1Record
-from nmbu.rinex.navigation.v4.nav_message_type.BDS_CNAV2 import BDSCNAV2Record
-from nmbu.rinex.navigation.v4.nav_message_type.BDS_CNAV3 import BDSCNAV3Record
-from nmbu.rinex.navigation.v4.nav_message_type.BDS_D1_D2 import BDSD1D2Record
+from nmbu.rinex.common.epoch_index import EpochIndex, iter_range_lines
+from nmbu.rinex.common.nav_decoder import epoch_line_in_period, epoch_period_keys
+from nmbu.rinex.common.nav_table import NavSatellitesView, NavTable, NavTableBuilder
 from nmbu.rinex.navigation.v4.nav_message_type.EOP import EOPNavRecord
-from nmbu.rinex.navigation.v4.nav_message_type.GAL_INAV_FNAV import GALINAVFNAVRecord
-from nmbu.rinex.navigation.v4.nav_message_type.GLO_FDMA import GLOFDMARecord
-from nmbu.rinex.navigation.v4.nav_message_type.GPS_CNAV import GPSCNAVRecord
-from nmbu.rinex.navigation.v4.nav_message_type.GPS_CNAV2 import GPSCNAV2Record
-from nmbu.rinex.navigation.v4.nav_message_type.GPS_LNAV import GPSLNAVRecord
 from nmbu.rinex.navigation.v4.nav_message_type.ION_Klobuchar import IONKlobNavRecord
-from nmbu.rinex.navigation.v4.nav_message_type.IRN_LNAV import IRNLNAVRecord
-from nmbu.rinex.navigation.v4.nav_message_type.QZS_CNAV import QZSCNAVRecord
-from nmbu.rinex.navigation.v4.nav_message_type.QZS_CNAV2 import QZSCNAV2Record
-from nmbu.rinex.navigation.v4.nav_message_type.QZS_LNAV import QZSLNAVRecord
-from nmbu.rinex.navigation.v4.nav_message_type.SBAS import SBASNavRecord
 from nmbu.rinex.navigation.v4.nav_message_type.STO import STONavRecord
+from nmbu.rinex.navigation.v4.registry import SATELLITES, NavRecordSpec, find_nav_record
 
 
 class NavigationV4:
@@ -51,6 +39,14 @@ class NavigationV4:
     - STO. See nmbu.rinex.navigation.v4.nav_message_type.STO.STONavRecord
     - EOP. See nmbu.rinex.navigation.v4.nav_message_type.EOP.EOPNavRecord
     - ION_KLOBUCHAR. See nmbu.rinex.navigation.v4.nav_message_type.ION_Klobuchar.IONKlobNavRecord
+    - ION_NEQUICK. See nmbu.rinex.navigation.v4.nav_message_type.ION_Nequick.IONNeqNavRecord
+    - ION_BDGIM. See nmbu.rinex.navigation.v4.nav_message_type.ION_BDGIM.IONBDGIMNavRecord
+
+    Record types are registered in navigation.v4.registry.
+
+    Records are stored in one table per message type, see common.nav_table.NavTable.
+    satellites and corrections are read-only views over these tables,
+    which build the data object of a record on access.
 
 
     Examples
@@ -59,23 +55,39 @@ class NavigationV4:
     >>> nav.satellites['C01']['2022-01-01T01:00:00'].clock_bias
     >>> nav.satellites['C01']['2022-01-01T01:00:00'].AODC
     >>> nav.corrections['STO']['C01']['2022-01-01T01:00:00'].A0
+    >>> nav.tables['BDS_D1_D2'].records['AODC']  # AODC of all BDS D1/D2 ephemerides
 
     """
     def __init__(self):
-        self.satellites: Dict[str, Dict[str, np.void]] = {}
-        self.corrections: Dict[str, Dict[str, Dict[str, np.void]]] = {
-            STONavRecord.nav_message_type: {},
-            IONKlobNavRecord.nav_message_type: {},
-            EOPNavRecord.nav_message_type: {},
+        self.tables: Dict[str, NavTable] = {}
+
+    @property
+    def satellites(self) -> NavSatellitesView:
+        return NavSatellitesView([table for table in self.tables.values() if table.target == SATELLITES])
+
+    @property
+    def corrections(self) -> Dict[str, NavSatellitesView]:
+        targets = [STONavRecord.nav_message_type, IONKlobNavRecord.nav_message_type, EOPNavRecord.nav_message_type]
+        targets += [table.target for table in self.tables.values() if table.target not in targets + [SATELLITES]]
+        return {
+            target: NavSatellitesView([table for table in self.tables.values() if table.target == target])
+            for target in targets
         }
 
 
-def __read_start_line(line: str) -> (object, bool, int):
+def __read_start_line(
+        line: str,
+        sv_filter: Optional[Set[str]] = None,
+        gnss_filter: Optional[Set[str]] = None
+) -> (Optional[NavRecordSpec], str, bool):
     """
-    Reads start line of a navigation block to decide block type and size
+    Reads start line of a navigation block to decide block type and size.
+    Block type is looked up in the record registry, see navigation.v4.registry.
 
     :param line: string in format '> EPH C11 D1'
-    :return: tuple with nav block of correct type, valid block flag and size of the given block
+    :param sv_filter: satellite filter, e.g. {'G05', 'E11'}. Blocks of other satellites are marked as not valid
+    :param gnss_filter: GNSS filter, e.g. {'G', 'E'}. Blocks of other GNSS are marked as not valid
+    :return: tuple with record spec (None if the record type is not registered), satellite name and valid block flag
     """
     # > EPH C11 D1
     record_type = line[2:5]
@@ -83,199 +95,83 @@ def __read_start_line(line: str) -> (object, bool, int):
     sv = line[6:9].strip()
     nav_message_type = line[10:14].strip()
 
-    if record_type == "EPH":
-        if gnss == 'G':
-            if nav_message_type == GPSLNAVRecord.nav_message_type:
-                current_block = GPSLNAVRecord(sv)
-                should_read_block = True
-                block_size = GPSLNAVRecord.block_size
-            elif nav_message_type == GPSCNAVRecord.nav_message_type:
-                current_block = GPSCNAVRecord(sv)
-                should_read_block = True
-                block_size = GPSCNAVRecord.block_size
-            elif nav_message_type == GPSCNAV2Record.nav_message_type:
-                current_block = GPSCNAV2Record(sv)
-                should_read_block = True
-                block_size = GPSCNAV2Record.block_size
-            else:
-                raise ValueError()
-
-        elif gnss == 'E':
-            if nav_message_type in GALINAVFNAVRecord.nav_message_type:
-                current_block = GALINAVFNAVRecord(sv)
-                should_read_block = True
-                block_size = GALINAVFNAVRecord.block_size
-            else:
-                raise ValueError()
-
-        elif gnss == 'R':
-            if nav_message_type == GLOFDMARecord.nav_message_type:
-                current_block = GLOFDMARecord(sv)
-                should_read_block = True
-                block_size = GLOFDMARecord.block_size
-            else:
-                raise ValueError()
-
-        elif gnss == "J":
-            if nav_message_type == QZSCNAVRecord.nav_message_type:
-                current_block = QZSCNAVRecord(sv)
-                should_read_block = True
-                block_size = QZSCNAVRecord.block_size
-            elif nav_message_type == QZSCNAV2Record.nav_message_type:
-                current_block = QZSCNAV2Record(sv)
-                should_read_block = True
-                block_size = QZSCNAV2Record.block_size
-            elif nav_message_type == QZSLNAVRecord.nav_message_type:
-                current_block = QZSLNAVRecord(sv)
-                should_read_block = True
-                block_size = QZSLNAVRecord.block_size
-            else:
-                raise ValueError()
-
-        elif gnss == "C":
-            if nav_message_type == BDSCNAV1Record.nav_message_type:
-                current_block = BDSCNAV1Record(sv)
-                should_read_block = True
-                block_size = BDSCNAV1Record.block_size
-            elif nav_message_type == BDSCNAV2Record.nav_message_type:
-                current_block = BDSCNAV2Record(sv)
-                should_read_block = True
-                block_size = BDSCNAV2Record.block_size
-            elif nav_message_type == BDSCNAV3Record.nav_message_type:
-                current_block = BDSCNAV3Record(sv)
-                should_read_block = True
-                block_size = BDSCNAV3Record.block_size
-            elif nav_message_type in BDSD1D2Record.nav_message_type:
-                current_block = BDSD1D2Record(sv)
-                should_read_block = True
-                block_size = BDSD1D2Record.block_size
-            else:
-                raise ValueError()
-
-        elif gnss == "S":
-            if nav_message_type == SBASNavRecord.nav_message_type:
-                current_block = SBASNavRecord(sv)
-                should_read_block = True
-                block_size = SBASNavRecord.block_size
-            else:
-                raise ValueError()
-
-        elif gnss == "I":
-            if nav_message_type == IRNLNAVRecord.nav_message_type:
-                current_block = IRNLNAVRecord(sv)
-                should_read_block = True
-                block_size = IRNLNAVRecord.block_size
-            else:
-                raise ValueError()
-
-        else:
-            raise ValueError()
-
-    elif record_type == "STO":
-        current_block = STONavRecord(sv)
-        should_read_block = True
-        block_size = STONavRecord.block_size
-    elif record_type == "EOP":
-        current_block = EOPNavRecord(sv)
-        should_read_block = True
-        block_size = EOPNavRecord.block_size
-    elif record_type == "ION":
-        # FIXME decide how to differentiate between different types of ION corrections
-        current_block = IONKlobNavRecord(sv)
-        should_read_block = True
-        block_size = IONKlobNavRecord.block_size
-
-    else:
-        raise ValueError("Unknown record type {r:s}".format(r=record_type))
-
-    return current_block, should_read_block, block_size
+    spec = find_nav_record(record_type, gnss, nav_message_type)
+    should_read_block = spec is not None and (sv_filter is None or sv in sv_filter) and \
+        (gnss_filter is None or gnss in gnss_filter)
+    return spec, sv, should_read_block
 
 
 def read_navigation_blocks_v4(
         file: IO,
-        verbose: bool = False
+        verbose: bool = False,
+        sv: Optional[List[str]] = None,
+        start_epoch: Optional[datetime] = None,
+        end_epoch: Optional[datetime] = None,
+        gnss: Optional[List[str]] = None,
+        epoch_index: Optional[EpochIndex] = None
 ) -> NavigationV4:
     """
         Parses input file and reads all navigation blocks one by one.
+        Record types are resolved through the record registry, see navigation.v4.registry.
+        Records of unknown type are skipped up to the next record start line.
+        Lines of all records are collected first and decoded in one batch per record type,
+        see common.nav_table.NavTableBuilder.
+        Blocks that do not match the satellite, GNSS or epoch time filter are skipped without parsing.
+        For STO/EOP/ION records the satellite and GNSS are the ones given in the record start line.
 
         ValueError is raised if any error occurs.
 
         :param file: file iterator. Supposed to start at 'END OF HEADER' line
         :param verbose: boolean flag to control debug output to console
+        :param sv: satellite filter, e.g. ['G05', 'E11']. None to read all satellites
+        :param start_epoch: epoch time filter, start of the period.
+            If used alone, only blocks of exactly this epoch are read
+        :param end_epoch: epoch time filter, end of the period (inclusive)
+        :param gnss: GNSS filter, e.g. ['G', 'E']. None to read all GNSS
+        :param epoch_index: index of the navigation records, see common.epoch_index.build_navigation_index.
+            Used together with the epoch time filter to read only the records of the selected epochs
         :return: NavigationV4 object containing read data
         """
     result = NavigationV4()
+    builders: Dict[str, NavTableBuilder] = {}
+    sv = None if sv is None else set(sv)
+    gnss = None if gnss is None else set(gnss)
+    period = epoch_period_keys(start_epoch, end_epoch)
+    if epoch_index is not None and start_epoch is not None:
+        file = iter_range_lines(file, epoch_index.byte_ranges(start_epoch, end_epoch))
+    skip_lines = False  # set for records of unknown type, their lines are skipped up to the next record
     for line in file:
         if line[0] == '>':
-            current_block, valid_block, block_size = __read_start_line(line)
+            spec, record_sv, valid_block = __read_start_line(line, sv, gnss)
+            skip_lines = spec is None
+            if spec is None:
+                if verbose:
+                    print("Skipped block of unknown type:", line.rstrip())
+                continue
+            if not valid_block:
+                if verbose:
+                    print("Skipped block {name:s} due to SV or GNSS limitation".format(name=line[2:9]))
+                for _ in range(spec.block_size + 1):  # epoch line and orbit lines
+                    next(file, None)
+                continue
+            epoch_line = next(file)
+            if not epoch_line_in_period(epoch_line, period):
+                if verbose:
+                    print("Skipped block {name:s} due to epoch limitation".format(name=line[2:9]))
+                for _ in range(spec.block_size):
+                    next(file, None)
+                continue
             if verbose:
-                print("Working with block", current_block)
-            current_block.read_epoch_line(next(file))
-            block_lines = [normalize_data_string(next(file)) for _ in range(block_size)]
-            if valid_block:
-                current_block.read_lines(block_lines)
-
-                if current_block.nav_message_type not in ('STO', 'EOP', 'ION'):
-                    if current_block.sv not in result.satellites:
-                        result.satellites[current_block.sv] = {current_block.timestamp: current_block.orbit_data}
-                    else:
-                        result.satellites[current_block.sv][current_block.timestamp] = current_block.orbit_data
-
-                    result.satellites[current_block.sv][current_block.timestamp].timestamp = current_block.timestamp
-
-                    if current_block.gnss_symbol in ('G', 'C', 'E', 'J', 'I'):
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].clock_bias = current_block.clock_bias
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].clock_drift = current_block.clock_drift
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].clock_drift_rate = current_block.clock_drift_rate
-                    elif current_block.gnss_symbol == 'R':
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].relative_frequency_bias = current_block.relative_frequency_bias
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].msg_frame_time = current_block.msg_frame_time
-                    elif current_block.gnss_symbol == 'S':
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].relative_frequency_bias = current_block.relative_frequency_bias
-                        result.satellites[current_block.sv][
-                            current_block.timestamp].msg_transmission_time = current_block.msg_transmission_time
-                else:
-                    # STO/ION/EOP
-                    if current_block.sv not in result.corrections[current_block.nav_message_type]:
-                        result.corrections[current_block.nav_message_type][current_block.sv] = \
-                            {current_block.timestamp: current_block.message_line}
-                    else:
-                        result.corrections[current_block.nav_message_type][
-                            current_block.sv][current_block.timestamp] = current_block.message_line
-
-                    result.corrections[current_block.nav_message_type][
-                        current_block.sv][current_block.timestamp].timestamp = current_block.timestamp
-
-                    if current_block.nav_message_type == 'STO':
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].time_offset = current_block.time_offset
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].sbas_id = current_block.sbas_id
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].utc_id = current_block.utc_id
-                    elif current_block.nav_message_type == 'ION':
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].Alpha0 = current_block.Alpha0
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].Alpha1 = current_block.Alpha1
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].Alpha2 = current_block.Alpha2
-                    else:  # EOP
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].xp = current_block.xp
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].dxp_dt = current_block.dxp_dt
-                        result.corrections[current_block.nav_message_type][current_block.sv][
-                            current_block.timestamp].dxp_dt2 = current_block.dxp_dt2
-
-        else:
+                print("Working with block", spec, record_sv)
+            block_lines = [next(file) for _ in range(spec.block_size)]
+            if spec.name not in builders:
+                builders[spec.name] = NavTableBuilder(
+                    spec.name, spec.target, spec.record_class, spec.data_class, spec.epoch_attributes)
+            builders[spec.name].add_block(record_sv, epoch_line, block_lines)
+
+        elif not skip_lines:
             raise ValueError("Navigation file seems to be invalid. Stopped reading at line\n", line)
         # end of for loop
 
+    result.tables = {name: builder.build() for name, builder in builders.items()}
     return result
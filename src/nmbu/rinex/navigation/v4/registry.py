@@ -0,0 +1,124 @@
+#  Copyright: (c) 2023, Liudmila Sherstnyakova
+#  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from nmbu.rinex.common.nav_table import SATELLITES
+from nmbu.rinex.navigation.v4.nav_message_type.BDS_CNAV1 import BDSCNAV1Record
+from nmbu.rinex.navigation.v4.nav_message_type.BDS_CNAV2 import BDSCNAV2Record
+from nmbu.rinex.navigation.v4.nav_message_type.BDS_CNAV3 import BDSCNAV3Record
+from nmbu.rinex.navigation.v4.nav_message_type.BDS_D1_D2 import BDSD1D2Record
+from nmbu.rinex.navigation.v4.nav_message_type.EOP import EOPNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.GAL_INAV_FNAV import GALINAVFNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.GLO_FDMA import GLOFDMARecord
+from nmbu.rinex.navigation.v4.nav_message_type.GPS_CNAV import GPSCNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.GPS_CNAV2 import GPSCNAV2Record
+from nmbu.rinex.navigation.v4.nav_message_type.GPS_LNAV import GPSLNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.ION_BDGIM import IONBDGIMNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.ION_Klobuchar import IONKlobNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.ION_Nequick import IONNeqNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.IRN_LNAV import IRNLNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.QZS_CNAV import QZSCNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.QZS_CNAV2 import QZSCNAV2Record
+from nmbu.rinex.navigation.v4.nav_message_type.QZS_LNAV import QZSLNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.SBAS import SBASNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.STO import STONavRecord
+
+__CLOCK = ("clock_bias", "clock_drift", "clock_drift_rate")
+
+
+class NavRecordSpec:
+    """
+    Describes how a navigation record of RINEX 4 is read and where it is stored.
+
+    - record_type: str. Record type from the record start line, e.g. 'EPH' or 'ION'
+    - record_class: class that reads the epoch line and the data lines of the record, e.g. GPSLNAVRecord.
+      Field layout of the record is defined by this class
+    - block_size: int. Amount of data lines after the epoch line
+    - name: str. Name of the table in NavigationV4.tables, equal to the module of the record class, e.g. 'GPS_LNAV'
+    - data_class: class of the stored data objects, e.g. GPSLNAVRecordOrbitData
+    - target: str. 'satellites' for ephemeris records, otherwise the key in NavigationV4.corrections
+    - epoch_attributes: Tuple[str]. Values from the epoch line that are copied to the stored data object
+    """
+    def __init__(self, record_type: str, record_class, target: str, epoch_attributes: Tuple[str, ...]):
+        self.record_type: str = record_type
+        self.record_class = record_class
+        self.block_size: int = record_class.block_size
+        self.name: str = record_class.__module__.rsplit('.', 1)[-1]
+        example = record_class("")
+        self.data_class = type(example.orbit_data if target == SATELLITES else example.message_line)
+        self.target: str = target
+        self.epoch_attributes: Tuple[str, ...] = epoch_attributes
+
+    def __repr__(self):
+        return "{r:s} {c:s} ({n:d} lines) -> {t:s}".format(
+            r=self.record_type, c=self.record_class.__name__, n=self.block_size, t=self.target)
+
+
+__REGISTRY: Dict[Tuple[str, Optional[str], Optional[str]], NavRecordSpec] = {}
+
+
+def register_nav_record(
+        spec: NavRecordSpec,
+        gnss: Optional[str] = None,
+        nav_message_types: Iterable[Optional[str]] = (None,)
+) -> None:
+    """
+    Registers a navigation record type.
+    Already registered keys are replaced, so the reading of a record type can be changed without editing the reader.
+
+    :param spec: NavRecordSpec. Description of the record type
+    :param gnss: str. GNSS symbol from the record start line, e.g. 'G'. None to match any GNSS
+    :param nav_message_types: Iterable of str. Message types from the record start line, e.g. ['D1', 'D2'].
+        None to match any message type of the GNSS
+    """
+    for nav_message_type in nav_message_types:
+        __REGISTRY[(spec.record_type, gnss, nav_message_type)] = spec
+
+
+def find_nav_record(record_type: str, gnss: str, nav_message_type: str) -> Optional[NavRecordSpec]:
+    """
+    Finds the registered record type for the given record start line fields.
+    Exact registrations are preferred over registrations for any message type or any GNSS.
+
+    :return: NavRecordSpec or None if the record type is not registered
+    """
+    return __REGISTRY.get((record_type, gnss, nav_message_type)) \
+        or __REGISTRY.get((record_type, gnss, None)) \
+        or __REGISTRY.get((record_type, None, None))
+
+
+register_nav_record(NavRecordSpec("EPH", GPSLNAVRecord, SATELLITES, __CLOCK), 'G', ['LNAV'])
+register_nav_record(NavRecordSpec("EPH", GPSCNAVRecord, SATELLITES, __CLOCK), 'G', ['CNAV'])
+register_nav_record(NavRecordSpec("EPH", GPSCNAV2Record, SATELLITES, __CLOCK), 'G', ['CNV2'])
+register_nav_record(NavRecordSpec("EPH", GALINAVFNAVRecord, SATELLITES, __CLOCK), 'E', ['INAV', 'FNAV'])
+register_nav_record(NavRecordSpec("EPH", GLOFDMARecord, SATELLITES,
+                                  ("clock_bias", "relative_frequency_bias", "msg_frame_time")), 'R', ['FDMA'])
+register_nav_record(NavRecordSpec("EPH", QZSLNAVRecord, SATELLITES, __CLOCK), 'J', ['LNAV'])
+register_nav_record(NavRecordSpec("EPH", QZSCNAVRecord, SATELLITES, __CLOCK), 'J', ['CNAV'])
+register_nav_record(NavRecordSpec("EPH", QZSCNAV2Record, SATELLITES, __CLOCK), 'J', ['CNV2'])
+register_nav_record(NavRecordSpec("EPH", BDSD1D2Record, SATELLITES, __CLOCK), 'C', ['D1', 'D2'])
+register_nav_record(NavRecordSpec("EPH", BDSCNAV1Record, SATELLITES, __CLOCK), 'C', ['CNV1'])
+register_nav_record(NavRecordSpec("EPH", BDSCNAV2Record, SATELLITES, __CLOCK), 'C', ['CNV2'])
+register_nav_record(NavRecordSpec("EPH", BDSCNAV3Record, SATELLITES, __CLOCK), 'C', ['CNV3'])
+register_nav_record(NavRecordSpec("EPH", SBASNavRecord, SATELLITES,
+                                  ("clock_bias", "relative_frequency_bias", "msg_transmission_time")), 'S', ['SBAS'])
+register_nav_record(NavRecordSpec("EPH", IRNLNAVRecord, SATELLITES, __CLOCK), 'I', ['LNAV'])
+
+register_nav_record(NavRecordSpec("STO", STONavRecord, STONavRecord.nav_message_type,
+                                  ("time_offset", "sbas_id", "utc_id")))
+register_nav_record(NavRecordSpec("EOP", EOPNavRecord, EOPNavRecord.nav_message_type,
+                                  ("xp", "dxp_dt", "dxp_dt2")))
+# ION records are dispatched by message type, so every model is read with its own layout:
+# Klobuchar model is broadcast in GPS/QZSS LNAV and CNAV/CNAV-2 (CNVX), NavIC LNAV and BDS D1/D2 messages,
+# NeQuick G in Galileo I/NAV and F/NAV messages (IFNV) and BDGIM in BDS CNAV messages (CNVX).
+# ION records of other message types are skipped
+__KLOBUCHAR = NavRecordSpec("ION", IONKlobNavRecord, IONKlobNavRecord.nav_message_type, ("Alpha0", "Alpha1", "Alpha2"))
+register_nav_record(__KLOBUCHAR, 'G', ['LNAV', 'CNVX'])
+register_nav_record(__KLOBUCHAR, 'J', ['LNAV', 'CNVX'])
+register_nav_record(__KLOBUCHAR, 'I', ['LNAV'])
+register_nav_record(__KLOBUCHAR, 'C', ['D1D2'])
+register_nav_record(NavRecordSpec("ION", IONNeqNavRecord, IONNeqNavRecord.nav_message_type,
+                                  ("ai0", "ai1", "ai2")), 'E', ['IFNV'])
+register_nav_record(NavRecordSpec("ION", IONBDGIMNavRecord, IONBDGIMNavRecord.nav_message_type,
+                                  ("Alpha1", "Alpha2", "Alpha3")), 'C', ['CNVX'])
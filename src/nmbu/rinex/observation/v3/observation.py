@@ -1,23 +1,27 @@
 #  Copyright: (c) 2023, Liudmila Sherstnyakova
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-import io
-import re
+import os
 from datetime import datetime
-from itertools import groupby
-from typing import Dict, IO, List, Optional, Union
+from typing import Dict, IO, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 
 from nmbu.rinex import common
+from nmbu.rinex.common.epoch_index import EpochIndex, find_data_offset
+from nmbu.rinex.common.observation_bulk import read_observation_buffer, read_observation_stream
+from nmbu.rinex.common.observation_decoder import LineBuckets, ObservationDecoder, build_decoders
+from nmbu.rinex.common.observation_parallel import read_observation_file_parallel
+from nmbu.rinex.common.observation_store import ObservationStore, ObservationStoreBuilder
 from nmbu.rinex.observation.v3.header import ObservationHeaderV3
 
-__single_observation_v3_format = np.dtype([('value', np.float64), ('lli', np.int32), ('ssi', np.int32)])
 
-
-class ObservationV3:
+class ObservationV3(ObservationStore):
     """
-    Class that holds blocks of observation data grouped by satellite name.
+    Class that holds observation data in columnar form.
+    Observations of every GNSS are stored as dense (n_epochs, n_sv, n_obs_types) arrays,
+    see common.observation_store.ObservationStore.
+    Blocks of observation data grouped by satellite name are available through the `satellites` view.
 
     Examples
     --------
@@ -25,26 +29,15 @@ class ObservationV3:
     >>> obs.satellites['C01']['2022-01-01T01:00:00']['C2I']['value']
     >>> obs.satellites['C01']['2022-01-01T01:00:00']['C2I']['ssi']
     >>> obs.satellites['C01']['2022-01-01T01:00:00']['C2I']['lli']
+    >>> obs.systems['C'].values  # values for all epochs, BDS satellites and obs types
     """
-    def __init__(self):
-        # {
-        #  sv: {
-        #           t0: (c1c,l1c,...)
-        #           t1: (c1c,l1c,...)
-        #           t5: (c1c,l1c,...)
-        #      }
-        # }
-        self.satellites: Dict[str, Dict[str, np.void]] = {}
-
-    def __str__(self):
-        return str(self.satellites)
 
 
 def __read_epoch_line(
         line: str,
         start_epoch: Optional[datetime],
         end_epoch: Optional[datetime]
-) -> (str, bool, int):
+) -> (np.datetime64, bool, int):
     """
     Methods that reads start line for each observation record block.
     Epoch time filter is applied to decide if current block should be read.
@@ -58,9 +51,9 @@ def __read_epoch_line(
     :param end_epoch: datetime.
         Optional. Epoch time filter. Specifies start of the period that should be included in the result.
         When used, must be a date after the start_epoch date.
-    :return: Tuple(str, bool, int).
+    :return: Tuple(np.datetime64, bool, int).
         Returns three params:
-        * block name as ISO8601 formatted timestamp
+        * epoch of the block with nanosecond resolution, including the fraction of seconds
         * True/False if current block is valid or should be skipped due to filter
         * block size - amount of lines with observations in current block
     """
@@ -70,7 +63,8 @@ def __read_epoch_line(
     hour = common.str2int(line[13:15], "Invalid hour value in epoch line")
     minute = common.str2int(line[16:18], "Invalid minute value in epoch line")
     full_seconds = common.str2float(line[19:29], "Invalid seconds value in epoch line")
-    current_timestamp = datetime(year, month, day, hour, minute, int(full_seconds))
+    current_epoch = np.datetime64(datetime(year, month, day, hour, minute), 'ns') + \
+        np.timedelta64(round(full_seconds * 1e9), 'ns')
 
     epoch_flag = common.str2int(line[31:32], "Invalid value for epoch flag")
     block_size = common.str2int(line[32:35], "Invalid value for block size")  # number of satellites in current epoch
@@ -79,87 +73,102 @@ def __read_epoch_line(
 
     if start_epoch is not None:
         if end_epoch is None:
-            should_read_block = current_timestamp == start_epoch
+            should_read_block = current_epoch == np.datetime64(start_epoch, 'ns')
         else:
-            should_read_block = start_epoch <= current_timestamp <= end_epoch
+            should_read_block = np.datetime64(start_epoch, 'ns') <= current_epoch <= np.datetime64(end_epoch, 'ns')
+
+    return current_epoch, epoch_flag == 0 and should_read_block, block_size
+
+
+def __iter_valid_blocks(
+        file: IO,
+        start_epoch: Optional[datetime],
+        end_epoch: Optional[datetime],
+        verbose: bool = False,
+        sv: Optional[List[str]] = None
+) -> Iterator[Tuple[np.datetime64, LineBuckets]]:
+    """
+    Iterates through the Rinex file block by block.
+    Skips all blocks that should not be included, based on epoch flag and time filter.
+    Lines of every block are distributed into per-GNSS buckets in a single pass,
+    lines of satellites that do not match the satellite filter are dropped.
+
+    ValueError is raised if a block contains fewer lines than declared in its epoch line.
+
+    :return: Iterator of tuples (epoch of the block, lines of the block grouped by GNSS).
+        The same LineBuckets object is reused for all blocks, so it is valid only until the next block is read
+    """
+    sv = None if sv is None else set(sv)
+    buckets = LineBuckets()
+    for line in file:
+        if line.startswith('>'):
+            current_epoch, valid_block, block_size = __read_epoch_line(line, start_epoch, end_epoch)
+            if verbose:
+                print("Working with block " + common.datetime64_to_str(current_epoch)[0])
+            if valid_block:
+                buckets.clear()
+                for position in range(block_size):
+                    block_line = next(file, '>')  # '>' marks the end of file
+                    if block_line.startswith('>'):
+                        raise ValueError("Block {name:s} has invalid size.".format(
+                            name=common.datetime64_to_str(current_epoch)[0]))
+                    if sv is None or block_line[:3] in sv:
+                        buckets.add(block_line, position)
+                yield current_epoch, buckets
+            else:
+                # skip N lines of block
+                for _ in range(block_size):
+                    next(file, None)
 
-    return current_timestamp.isoformat(), epoch_flag == 0 and should_read_block, block_size
+        # end of for loop
 
 
 def __read_single_observation_block(
-        lines: List[str],
-        block_name: str,
-        observations: ObservationV3,
-        header: ObservationHeaderV3,
-        gnss: Optional[List[str]],
-        obs_types: Union[str, List[str], None],
+        buckets: LineBuckets,
+        epoch: np.datetime64,
+        epoch_index: int,
+        observations: ObservationStoreBuilder,
+        decoders: Dict[str, ObservationDecoder],
         verbose: bool = False
 ) -> None:
     """
     Reads all lines that constitute a complete observation record block.
 
-    :param lines: List[str].
-        Required. List of lines that make up the block.
-        Method will run a groupby operation on the list, so the list must be sorted alphabetically.
-    :param block_name: str.
-        Required. Name of the current block. Typically a timestamp string in ISO8601 format.
-    :param observations: ObservationV3.
-        Required. Object that will be updated with observations from the given block.
-    :param header: ObservationHeaderV3.
-        Required. Header object with data read from the RINEX header
-    :param gnss: List[str].
-        Optional. GNSS filter. Specifies GNSS types (e.g. 'G' or 'E') that will be included into the result.
-        All other GNSS will be ignored.
-    :param obs_types: str or List[str].
-        Optional. Observation types filter.
-        If a single string is provided, it is treated as regex and used to filter obs types for all satellites.
-        If a list of strings is provided, then only that list is used to filter obs types.
-        If a GNSS does not have any obs types from that list, then that GNSS is not included in the result.
+    :param buckets: LineBuckets.
+        Required. Lines that make up the block, grouped by GNSS.
+    :param epoch: np.datetime64.
+        Required. Epoch of the current block. Used in debug output only.
+    :param epoch_index: int.
+        Required. Position of the current block on the epoch axis.
+    :param observations: ObservationStoreBuilder.
+        Required. Builder that will be updated with observations from the given block.
+    :param decoders: Dict[str, ObservationDecoder].
+        Required. Column plan as created by common.observation_decoder.build_decoders.
+        Lines of GNSS without a decoder are skipped, only selected obs types are decoded.
     :param verbose: bool.
         Optional. Flag to control debug output from the script.
         Set to True if debug output should be printed to console.
     :return: Nothing
     """
-    for system, obs_lines in groupby(lines, lambda x: x[0]):
-
-        if gnss is not None and system not in gnss:
-            # skip nav_message_type that are not in the requested limitation
+    for system, lines, positions, count in buckets.items():
+        decoder = decoders.get(system)
+        if decoder is None:
             if verbose:
-                print("[{block:s}] Skipped nav_message_type {g:s} due to GNSS limitation".format(block=block_name, g=system))
+                print("[{block:s}] Skipped GNSS {g:s} due to GNSS or OBS TYPES limitation".format(
+                    block=common.datetime64_to_str(epoch)[0], g=system))
             continue
 
-        lines_in_group = list(obs_lines)
-        sv_names = [name[:3] for name in lines_in_group]
-        if obs_types is not None:
-            if isinstance(obs_types, str):
-                rule = re.compile(obs_types)
-                list_of_obs_types = list(filter(rule.match, header.obs_types[system]))
-            else:
-                list_of_obs_types = list(set(obs_types) & set(header.obs_types[system]))
-        else:
-            list_of_obs_types = header.obs_types[system]
-        if len(list_of_obs_types) == 0:
-            if verbose:
-                print("[{block:s}] Skipped nav_message_type {g:s} due to OBS TYPES limitation".format(block=block_name, g=system))
-            continue
-        amount_of_obs_types = len(header.obs_types[system])
-        complete_group = "".join(lines_in_group)
-        result = np.genfromtxt(io.BytesIO(complete_group.encode("ascii")),
-                               delimiter=(3,) + (14, 1, 1) * amount_of_obs_types,
-                               dtype=[('SV', 'S8')] + [(name, __single_observation_v3_format) for name in header.obs_types[system]]
-                               )
-        if verbose:
-            print("For GNSS '{gnss:s}' only following obs types are included: {types:s}".format(
-                gnss=system,
-                types=str(list_of_obs_types)))
-        result = result[list_of_obs_types]  # reduce result to only the selection of obs types
-        for i in range(len(sv_names)):
-            if sv_names[i] not in observations.satellites.keys():
-                observations.satellites[sv_names[i]] = {block_name: np.nan}
-            if result.ndim == 0:
-                observations.satellites[sv_names[i]][block_name] = result
-            else:
-                observations.satellites[sv_names[i]][block_name] = result[i]
+        sv, values, lli, ssi = decoder.decode_lines(lines, count)
+        observations.add_rows(
+            gnss=system,
+            obs_types=decoder.selected_obs_types,
+            epoch_index=epoch_index,
+            sv=sv,
+            values=values,
+            lli=lli,
+            ssi=ssi,
+            order=positions
+        )
 
 
 def read_observation_blocks_v3(
@@ -169,12 +178,24 @@ def read_observation_blocks_v3(
         end_epoch: Optional[datetime],
         gnss: Optional[List[str]],
         obs_types: Union[str, List[str], None],
-        verbose: bool = False
+        verbose: bool = False,
+        bulk: bool = True,
+        epoch_index: Optional[EpochIndex] = None,
+        workers: int = 1,
+        sv: Optional[List[str]] = None
 ) -> ObservationV3:
     """
-    Iterates through the Rinex file to read all observation records.
+    Reads all observation records from the Rinex file.
     Skips all blocks that should not be included, based on epoch flag and time filter
 
+    By default the rest of the file is read into memory at once and all records are decoded in bulk,
+    see common.observation_bulk.read_observation_buffer.
+    With bulk=False the file is iterated line by line and records are decoded block by block.
+    If an epoch index of the file is provided together with the epoch time filter,
+    only the part of the file that contains the requested epochs is read.
+    With workers > 1 the data section is split at epoch lines and decoded in a pool of processes,
+    see common.observation_parallel.read_observation_file_parallel.
+
     :param file: IO.
         File iterator that reads file line by line.
         Position of this iterator is expected to be on the 'END OF HEADER' line
@@ -198,26 +219,92 @@ def read_observation_blocks_v3(
     :param verbose: bool.
         Optional. Flag to control debug output from the script.
         Set to True if debug output should be printed to console.
+    :param bulk: bool.
+        Optional. Flag to control reading mode.
+        Set to False to read the file block by block instead of reading the whole file at once.
+    :param epoch_index: EpochIndex.
+        Optional. Epoch index of the file, see common.epoch_index.build_epoch_index.
+        Used only in bulk mode together with the epoch time filter.
+    :param workers: int.
+        Optional. Maximal amount of processes used to decode the file in bulk mode.
+        Small files are always decoded in the current process.
+    :param sv: List[str].
+        Optional. Satellite filter. Specifies satellites (e.g. 'G05' or 'E11') that will be included into the result.
+        Lines of all other satellites are dropped before they are decoded.
     :return: ObservationV3.
         Holder class that contains observation record data. See observation.v3.observation.ObservationV3
     """
-    result = ObservationV3()
-    for line in file:
-        if line.startswith('>'):
-            current_block, valid_block, block_size = __read_epoch_line(line, start_epoch, end_epoch)
-            if verbose:
-                print("Working with block " + current_block)
-            if valid_block:
-                block_lines = [next(file) for _ in range(block_size)]
-                if any(block_line.startswith('>') for block_line in block_lines):
-                    raise ValueError("Block {name:s} has invalid size.".format(name=current_block))
-                block_lines.sort()
-                __read_single_observation_block(block_lines, current_block, result, header, gnss, obs_types, verbose)
+    builder = ObservationStoreBuilder()
+    decoders = build_decoders(header.obs_types, gnss, obs_types, verbose)
+    if bulk:
+        file_path = getattr(file, "name", None)
+        if workers > 1 and isinstance(file_path, (str, os.PathLike)):
+            if epoch_index is not None and start_epoch is not None:
+                begin, end = epoch_index.byte_range(start_epoch, end_epoch)
             else:
-                # skip N lines of block
-                for _ in range(block_size):
-                    next(file)
+                begin, end = find_data_offset(file_path), os.path.getsize(file_path)
+            read_observation_file_parallel(file_path, begin, end, decoders, builder,
+                                           start_epoch, end_epoch, workers, verbose, sv=sv)
+            return builder.build(ObservationV3())
 
-        # end of for loop
+        if epoch_index is not None and start_epoch is not None:
+            begin, end = epoch_index.byte_range(start_epoch, end_epoch)
+            binary_file = getattr(file, "buffer", file)  # offsets in the index are byte offsets
+            binary_file.seek(begin)
+            data = binary_file.read(end - begin)
+            if isinstance(data, str):
+                data = data.encode("latin-1")
+            read_observation_buffer(data, decoders, builder, start_epoch, end_epoch, sv, verbose)
+        else:
+            read_observation_stream(file, decoders, builder, start_epoch, end_epoch, sv, verbose)
+        return builder.build(ObservationV3())
+
+    for current_epoch, buckets in __iter_valid_blocks(file, start_epoch, end_epoch, verbose, sv):
+        epoch_index = builder.add_epoch(current_epoch)
+        __read_single_observation_block(buckets, current_epoch, epoch_index, builder, decoders, verbose)
+
+    return builder.build(ObservationV3())
+
+
+def iter_observation_blocks_v3(
+        file: IO,
+        header: ObservationHeaderV3,
+        start_epoch: Optional[datetime],
+        end_epoch: Optional[datetime],
+        gnss: Optional[List[str]],
+        obs_types: Union[str, List[str], None],
+        verbose: bool = False,
+        sv: Optional[List[str]] = None
+) -> Iterator[ObservationV3]:
+    """
+    Iterates through the Rinex file and yields observation records one epoch at a time.
+    Only the current block is kept in memory, so files of any size can be processed.
+    Skips all blocks that should not be included, based on epoch flag and time filter.
 
-    return result
+    :param file: IO.
+        File iterator that reads file line by line.
+        Position of this iterator is expected to be on the 'END OF HEADER' line
+    :param header: ObservationHeaderV3.
+        observation.v3.header.ObservationHeaderV3 object that is filled with data from header
+    :param start_epoch: datetime.
+        Optional. Epoch time filter. See read_observation_blocks_v3
+    :param end_epoch: datetime.
+        Optional. Epoch time filter. See read_observation_blocks_v3
+    :param gnss: List[str].
+        Optional. GNSS filter. See read_observation_blocks_v3
+    :param obs_types: str or List[str].
+        Optional. Observation types filter. See read_observation_blocks_v3
+    :param verbose: bool.
+        Optional. Flag to control debug output from the script.
+        Set to True if debug output should be printed to console.
+    :param sv: List[str].
+        Optional. Satellite filter. See read_observation_blocks_v3
+    :return: Iterator of ObservationV3.
+        Every item contains data of a single epoch, i.e. the epoch axis of all arrays has length 1
+    """
+    decoders = build_decoders(header.obs_types, gnss, obs_types, verbose)
+    for current_epoch, buckets in __iter_valid_blocks(file, start_epoch, end_epoch, verbose, sv):
+        builder = ObservationStoreBuilder()
+        epoch_index = builder.add_epoch(current_epoch)
+        __read_single_observation_block(buckets, current_epoch, epoch_index, builder, decoders, verbose)
+        yield builder.build(ObservationV3())
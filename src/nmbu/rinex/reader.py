@@ -2,18 +2,22 @@
 #  GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import io
-from typing import Optional, List, Union
+import os
+from typing import IO, Iterator, Optional, List, Union
 
 from nmbu.rinex import common
+from nmbu.rinex.common.compression import detect_compression, open_rinex_text
+from nmbu.rinex.common.epoch_index import EpochIndex, build_epoch_index, build_navigation_index
 from nmbu.rinex.common.rinex_data import RinexData
+from nmbu.rinex.common.sidecar_index import SidecarIndex, file_content_hash, load_sidecar_index, save_sidecar_index
 from nmbu.rinex.navigation.v3.header import read_navigation_header_v3
 from nmbu.rinex.navigation.v3.navigation import read_navigation_blocks_v3
 from nmbu.rinex.navigation.v4.header import read_navigation_header_v4
 from nmbu.rinex.navigation.v4.navigation import read_navigation_blocks_v4
 from nmbu.rinex.observation.v3.header import *
-from nmbu.rinex.observation.v3.observation import read_observation_blocks_v3
+from nmbu.rinex.observation.v3.observation import ObservationV3, iter_observation_blocks_v3, read_observation_blocks_v3
 from nmbu.rinex.observation.v4.header import *
-from nmbu.rinex.observation.v4.observation import read_observation_blocks_v4
+from nmbu.rinex.observation.v4.observation import ObservationV4, iter_observation_blocks_v4, read_observation_blocks_v4
 
 
 def __read_first_line(line: str, verbose: bool = False) -> (float, str, str):
@@ -51,6 +55,43 @@ def __read_first_line(line: str, verbose: bool = False) -> (float, str, str):
     return version, file_type, gnss
 
 
+def __read_header(file: IO, version: float, file_type: str, system: str):
+    """
+    Reads the header with the parser that matches the version and the file type.
+
+    :param file: IO.
+        File iterator. Supposed to start at line number 2, as the first line is read by __read_first_line
+    :return: one of ObservationHeaderV3, NavigationHeaderV3, ObservationHeaderV4, NavigationHeaderV4
+    """
+    if version in (3.04, 3.05):
+        if file_type == "O":
+            return read_observation_header_v3(file, version, file_type, system)
+        return read_navigation_header_v3(file, version, file_type, system)
+    elif version in (4.0,):
+        if file_type == "O":
+            return read_observation_header_v4(file, version, file_type, system)
+        return read_navigation_header_v4(file, version, file_type, system)
+    raise ValueError("Unknown RINEX version. Expected 3.04|3.05|4.00, but got {v:.2f}".format(v=version))
+
+
+def __read_time_period(start_epoch: Optional[str], end_epoch: Optional[str]):
+    """
+    Converts epoch time filter to datetime values and validates it.
+
+    :return: Tuple of (start_epoch, end_epoch) as datetime or None
+    """
+    if start_epoch is not None:
+        start_epoch = str2date(start_epoch)
+    if end_epoch is not None:
+        end_epoch = str2date(end_epoch)
+        if start_epoch is None:
+            raise ValueError("Time period limitation with open start and closed end is not supported.")
+    if (start_epoch is None and end_epoch is not None) or \
+            (start_epoch is not None and end_epoch is not None and start_epoch > end_epoch):
+        raise ValueError("Invalid time period: start should be earlier than end.")
+    return start_epoch, end_epoch
+
+
 def read_rinex_file(
         rinex_file_path: str,
         *,  # all params after this point must be specified with name
@@ -58,7 +99,11 @@ def read_rinex_file(
         end_epoch: Optional[str] = None, # 2022-01-01T00:00:00
         gnss: Optional[List[str]] = None, # ['G','E',...]
         obs_types: Union[str, List[str], None] = None, # "L1L" / ".1X" / "C.." | ["C1X", "D2Y"]
-        verbose: bool = False
+        sv: Optional[List[str]] = None, # ['G05','E11',...]
+        verbose: bool = False,
+        epoch_index: Optional[EpochIndex] = None,
+        sidecar_index: bool = False,
+        workers: int = 1
 ) -> RinexData:
     """
     Reads the specified RINEX file
@@ -88,6 +133,13 @@ def read_rinex_file(
     >>> result
     Type: O (ver. 3.05). Contains 7 satellites
 
+    Filtering using satellite list. Works for both observation and navigation files,
+    as well as epoch time and GNSS filters
+
+    >>> result = reader.read_rinex_file(rinex_file_path='path/to/rinex/file', sv=['G05','E11'])
+    >>> result
+    Type: O (ver. 3.05). Contains 2 satellites
+
     Filtering using obs types regex
     Use '.' as wildcard for any part of the obs type acronym.
     Use '[]' as a list of accepted symbols.
@@ -111,6 +163,35 @@ def read_rinex_file(
     >>> result = reader.read_rinex_file(rinex_file_path='path/to/rinex/file',
     ... start_epoch="2022-09-29T11:00:00", end_epoch="2022-09-29T11:00:40")
 
+    To query many time periods from the same observation file, build its epoch index once.
+    Only the part of the file with the requested epochs is then read.
+
+    >>> from nmbu.rinex.common.epoch_index import build_epoch_index
+    >>> index = build_epoch_index('path/to/rinex/file')
+    >>> result = reader.read_rinex_file(rinex_file_path='path/to/rinex/file',
+    ... start_epoch="2022-09-29T11:00:00", end_epoch="2022-09-29T11:00:40", epoch_index=index)
+
+    The index and the header can also be stored in a sidecar file next to the RINEX file,
+    so that later reads skip the header and the epoch scan of the file.
+    For navigation files, only the records of the requested epochs are then read.
+    The sidecar file is validated against the file and rebuilt if the file has changed.
+    The file is considered unchanged if its size and modification time match the sidecar file,
+    the content hash is calculated only if the modification time differs.
+    Use common.sidecar_index.load_sidecar_index with verify_content=True to always verify the content.
+
+    >>> result = reader.read_rinex_file(rinex_file_path='path/to/rinex/file',
+    ... start_epoch="2022-09-29T11:00:00", end_epoch="2022-09-29T11:00:40", sidecar_index=True)
+
+    Large observation files can be decoded in several processes
+
+    >>> result = reader.read_rinex_file(rinex_file_path='path/to/rinex/file', workers=4)
+
+    Files compressed with gzip, bzip2, xz, zip or Unix compress (.Z) are detected by their leading bytes
+    and decompressed on the fly, without writing or holding the whole decompressed file.
+    All other options, including the epoch index, work the same way. Parallel decoding requires an uncompressed file.
+
+    >>> result = reader.read_rinex_file(rinex_file_path='path/to/rinex/file.22o.gz')
+
     Parsing the result object
     -------------------------
 
@@ -160,50 +241,180 @@ def read_rinex_file(
         If a single string is provided, it is treated as regex and used to filter obs types for all satellites.
         If a list of strings is provided, then only that list is used to filter obs types.
         If a GNSS does not have any obs types from that list, then that GNSS is not included in the result.
+    :param sv: list of str
+        Optional. Satellite filter. Specifies satellites (e.g. 'G05' or 'E11') that will be included into the result.
+        All other satellites are skipped before their records are decoded.
+        Can be combined with all other filters.
     :param verbose: bool.
         Optional. Flag to control debug output from the script.
         Set to True if debug output should be printed to console.
+    :param epoch_index: EpochIndex.
+        Optional. Epoch index of the observation file, see common.epoch_index.build_epoch_index.
+        Used together with the epoch time filter to read only the requested part of the file.
+    :param sidecar_index: bool.
+        Optional. Set to True to use the sidecar index file of the RINEX file, see build_sidecar_index.
+        The sidecar index is created (or rebuilt, if the file has changed) when needed.
+        A file with unchanged size and modification time is not hashed again, see the example above.
+    :param workers: int.
+        Optional. Maximal amount of processes used to decode an observation file.
+        Large files are split at epoch boundaries and decoded in parallel, small files are always read serially.
     :return: RinexData.
         Holder class that contains header and data. See common.rinex_data.RinexData
     """
-    file = io.open(file=rinex_file_path, mode='r')
+    sidecar = None
+    if sidecar_index:
+        sidecar = load_sidecar_index(rinex_file_path)
+        if sidecar is None:
+            if verbose:
+                print("Building sidecar index...")
+            sidecar = build_sidecar_index(rinex_file_path, verbose)
+        if epoch_index is None and sidecar.file_type == "O":
+            epoch_index = sidecar.epoch_index
+
+    file = open_rinex_text(rinex_file_path)
     version, file_type, system = __read_first_line(file.readline(), verbose)
 
     if file.closed:
         raise IOError("File %s is already closed" % rinex_file_path)
 
-    if start_epoch is not None:
-        start_epoch = str2date(start_epoch)
-    if end_epoch is not None:
-        end_epoch = str2date(end_epoch)
-        if start_epoch is None:
-            raise ValueError("Time period limitation with open start and closed end is not supported.")
-    if (start_epoch is None and end_epoch is not None) or \
-            (start_epoch is not None and end_epoch is not None and start_epoch > end_epoch):
-        raise ValueError("Invalid time period: start should be earlier than end.")
+    start_epoch, end_epoch = __read_time_period(start_epoch, end_epoch)
+    if epoch_index is not None:
+        if file_type != "O":
+            raise ValueError("Epoch index is supported only for observation files.")
+        # size of a compressed file is not known before it is decompressed
+        if detect_compression(rinex_file_path) is None and epoch_index.file_size != os.path.getsize(rinex_file_path):
+            raise ValueError("Epoch index does not match file %s" % rinex_file_path)
+
+    nav_index = None
+    if sidecar is None:
+        header = __read_header(file, version, file_type, system)
+    else:
+        # header is decoded from the text stored in the sidecar index, the file is read only from the data section
+        header = __read_header(io.StringIO(sidecar.header_text, newline=None), version, file_type, system)
+        file.seek(sidecar.epoch_index.data_offset)
+        if file_type == "N":
+            nav_index = sidecar.epoch_index
 
     if version in (3.04, 3.05):
         if file_type == "O":
-            header = read_observation_header_v3(file, version, file_type, system)
-            observations = read_observation_blocks_v3(file, header, start_epoch, end_epoch, gnss, obs_types, verbose)
+            observations = read_observation_blocks_v3(file, header, start_epoch, end_epoch, gnss, obs_types, verbose,
+                                                      epoch_index=epoch_index, workers=workers, sv=sv)
             result = RinexData(header, observations)
         elif file_type == "N":
-            header = read_navigation_header_v3(file, version, file_type, system)
-            nav_data = read_navigation_blocks_v3(file, version, verbose)
+            nav_data = read_navigation_blocks_v3(file, version, verbose, sv, start_epoch, end_epoch, gnss,
+                                                 epoch_index=nav_index)
             result = RinexData(header, nav_data)
 
     elif version in (4.0,):
         if file_type == "O":
-            header = read_observation_header_v4(file, version, file_type, system)
-            observations = read_observation_blocks_v4(file, header, start_epoch, end_epoch, gnss, obs_types, verbose)
+            observations = read_observation_blocks_v4(file, header, start_epoch, end_epoch, gnss, obs_types, verbose,
+                                                      epoch_index=epoch_index, workers=workers, sv=sv)
             result = RinexData(header, observations)
         elif file_type == "N":
-            header = read_navigation_header_v4(file, version, file_type, system)
-            nav_data = read_navigation_blocks_v4(file, verbose)
+            nav_data = read_navigation_blocks_v4(file, verbose, sv, start_epoch, end_epoch, gnss, epoch_index=nav_index)
             result = RinexData(header, nav_data)
 
-    else:
-        raise ValueError("Unknown RINEX version. Expected 3.04|3.05|4.00, but got {v:.2f}".format(v=version))
-
     file.close()
     return result
+
+
+def build_sidecar_index(rinex_file_path: str, verbose: bool = False) -> SidecarIndex:
+    """
+    Builds the sidecar index of the given RINEX file and writes it next to the file.
+    Any existing sidecar index is replaced, so this method can be used to rebuild the index explicitly.
+    If the sidecar file cannot be written (e.g. read-only directory), the index is only returned.
+
+    Examples
+    --------
+
+    >>> from nmbu.rinex import reader
+    >>> index = reader.build_sidecar_index('path/to/rinex/file')
+    >>> index.epoch_index.epochs  # all epochs of the file
+
+    :param rinex_file_path: str.
+        Required. Path to the RINEX file
+    :param verbose: bool.
+        Optional. Flag to control debug output from the script.
+        Set to True if debug output should be printed to console.
+    :return: SidecarIndex.
+        See common.sidecar_index.SidecarIndex
+    """
+    stat = os.stat(rinex_file_path)
+    with open_rinex_text(rinex_file_path) as file:
+        version, file_type, system = __read_first_line(file.readline(), verbose)
+        header_lines = []
+        for line in file:
+            header_lines.append(line)
+            if line[60:].startswith(END_OF_HEADER_LABEL):
+                break
+    header_text = "".join(header_lines)
+    __read_header(io.StringIO(header_text), version, file_type, system)  # only valid headers are stored
+
+    if file_type == "O":
+        epoch_index = build_epoch_index(rinex_file_path)
+    else:
+        epoch_index = build_navigation_index(rinex_file_path, version)
+    index = SidecarIndex(stat.st_size, stat.st_mtime_ns, file_content_hash(rinex_file_path),
+                         version, file_type, system, header_text, epoch_index)
+    try:
+        save_sidecar_index(rinex_file_path, index)
+    except OSError as exc:
+        if verbose:
+            print("Sidecar index could not be written:", exc)
+    return index
+
+
+def iter_observation_epochs(
+        rinex_file_path: str,
+        *,  # all params after this point must be specified with name
+        start_epoch: Optional[str] = None,
+        end_epoch: Optional[str] = None,
+        gnss: Optional[List[str]] = None,
+        obs_types: Union[str, List[str], None] = None,
+        sv: Optional[List[str]] = None,
+        verbose: bool = False
+) -> Iterator[Union[ObservationV3, ObservationV4]]:
+    """
+    Reads the specified RINEX observation file one epoch at a time.
+
+    Unlike read_rinex_file, only the current epoch is kept in memory,
+    so memory usage does not depend on the size of the file.
+    Every yielded item has the same structure as RinexData.data of read_rinex_file,
+    but contains a single epoch.
+    The file is closed when the iteration is finished or the iterator is closed.
+
+    Examples
+    --------
+    >>> from nmbu.rinex import reader
+
+    >>> for epoch in reader.iter_observation_epochs('path/to/rinex/file', gnss=['G'], obs_types=['C1C']):
+    ...     gps = epoch.systems['G']
+    ...     print(epoch.epochs[0], gps.sv, gps.values[0, :, 0])
+
+    :param rinex_file_path: str.
+        Required. Path to the RINEX observation file
+    :param start_epoch: str
+        Optional. Epoch time filter. See read_rinex_file
+    :param end_epoch: str
+        Optional. Epoch time filter. See read_rinex_file
+    :param gnss: list of str
+        Optional. GNSS filter. See read_rinex_file
+    :param obs_types: str, list of str
+        Optional. Observation types filter. See read_rinex_file
+    :param sv: list of str
+        Optional. Satellite filter. See read_rinex_file
+    :param verbose: bool.
+        Optional. Flag to control debug output from the script.
+        Set to True if debug output should be printed to console.
+    :return: Iterator of ObservationV3 or ObservationV4 with data of a single epoch
+    """
+    start_epoch, end_epoch = __read_time_period(start_epoch, end_epoch)
+    with open_rinex_text(rinex_file_path) as file:
+        version, file_type, system = __read_first_line(file.readline(), verbose)
+        if file_type != "O":
+            raise ValueError("Only observation files can be read epoch by epoch.")
+        header = __read_header(file, version, file_type, system)
+        if version in (3.04, 3.05):
+            yield from iter_observation_blocks_v3(file, header, start_epoch, end_epoch, gnss, obs_types, verbose, sv)
+        else:
+            yield from iter_observation_blocks_v4(file, header, start_epoch, end_epoch, gnss, obs_types, verbose, sv)
@@ -0,0 +1,160 @@
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.compression import DecompressedStream, detect_compression, open_rinex_binary, open_rinex_text
+from nmbu.rinex.common.epoch_index import build_epoch_index
+from tests import resources_path
+
+__COMPRESSIONS = ["gzip", "bz2", "xz", "zip", "lzw"]
+
+
+def __lzw_compress(data, max_bits=16):
+    """
+    Unix compress (.Z) encoder in block mode, that clears the table when it is full.
+    """
+    dictionary = {bytes((code,)): code for code in range(256)}
+    free, max_max_code, word, codes = 257, 1 << max_bits, b"", []
+    for byte in data:
+        candidate = word + bytes((byte,))
+        if candidate in dictionary:
+            word = candidate
+            continue
+        codes.append(dictionary[word])
+        if free < max_max_code:
+            dictionary[candidate] = free
+            free += 1
+        else:
+            codes.append(256)
+            dictionary = {bytes((code,)): code for code in range(256)}
+            free = 257
+        word = bytes((byte,))
+    if word:
+        codes.append(dictionary[word])
+
+    # codes are packed in groups of 8, a group is padded when the code width changes
+    output = bytearray(b"\x1f\x9d" + bytes((0x80 | max_bits,)))
+    n_bits, max_code, free, group = 9, 511, 257, []
+
+    def flush(pad):
+        value = sum(code << (position * n_bits) for position, code in enumerate(group))
+        output.extend(value.to_bytes(n_bits if pad and group else (len(group) * n_bits + 7) // 8, 'little'))
+        group.clear()
+
+    for number, code in enumerate(codes):
+        if free > max_code:
+            flush(True)
+            n_bits += 1
+            max_code = max_max_code if n_bits == max_bits else (1 << n_bits) - 1
+        group.append(code)
+        if code == 256:
+            flush(True)
+            n_bits, max_code, free = 9, 511, 256
+            continue
+        if len(group) == 8:
+            flush(True)
+        if number > 0 and free < max_max_code:
+            free += 1
+    flush(False)
+    return bytes(output)
+
+
+def __compress(tmp_path, file_name, compression):
+    data = (resources_path / file_name).read_bytes()
+    path = tmp_path / (file_name + ".compressed")  # detection does not depend on the extension
+    if compression == "gzip":
+        path.write_bytes(gzip.compress(data))
+    elif compression == "bz2":
+        path.write_bytes(bz2.compress(data))
+    elif compression == "xz":
+        path.write_bytes(lzma.compress(data))
+    elif compression == "zip":
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(file_name, data)
+    else:
+        path.write_bytes(__lzw_compress(data))
+    return path
+
+
+@pytest.mark.parametrize("compression", __COMPRESSIONS)
+def test_open_rinex_binary(tmp_path, compression):
+    path = __compress(tmp_path, "observation_v3.22o", compression)
+    expected = (resources_path / "observation_v3.22o").read_bytes()
+    assert detect_compression(path) == compression
+    with open_rinex_binary(path) as file:
+        assert file.read() == expected
+        file.seek(100)
+        assert file.read(50) == expected[100:150]
+        file.seek(1000)
+        assert file.tell() == 1000
+        assert file.read(10) == expected[1000:1010]
+    with open_rinex_text(path) as file:
+        assert file.readline() == expected.decode("ascii").splitlines(keepends=True)[0]
+
+
+@pytest.mark.parametrize("max_bits", [9, 12, 16])
+def test_decompress_lzw(tmp_path, max_bits):
+    # long enough to fill the table several times with 9 bit codes
+    data = (resources_path / "observation_v3_high_rate.22o").read_bytes() + bytes(range(256)) * 40
+    path = tmp_path / "file.Z"
+    path.write_bytes(__lzw_compress(data, max_bits))
+    with open_rinex_binary(path) as file:
+        assert file.read() == data
+
+
+def test_decompress_lzw__invalid_data(tmp_path):
+    path = tmp_path / "file.Z"
+    path.write_bytes(b"\x1f\x9d\x90\xff\xff")
+    with pytest.raises(ValueError) as e_info:
+        with open_rinex_binary(path) as file:
+            file.read()
+    assert str(e_info.value) == "Invalid first code of compressed (.Z) data"
+
+
+def test_decompressed_stream(tmp_path):
+    path = __compress(tmp_path, "navigation_v3.22p", "gzip")
+    expected = (resources_path / "navigation_v3.22p").read_bytes()
+    stream = DecompressedStream(path, "gzip")
+    assert stream.seek(0, io.SEEK_END) == len(expected)
+    assert stream.seek(-10, io.SEEK_END) == len(expected) - 10
+    assert stream.read(100) == expected[-10:]
+    assert not hasattr(stream, "name")  # compressed files are never read by path in parallel
+    stream.close()
+
+
+@pytest.mark.parametrize("compression", __COMPRESSIONS)
+@pytest.mark.parametrize("file_name", ["observation_v3.22o", "observation_v4.22o"])
+def test_read_compressed_obs(tmp_path, compression, file_name):
+    path = __compress(tmp_path, file_name, compression)
+    expected = reader.read_rinex_file(resources_path / file_name)
+    for bulk_options in ({}, {"workers": 4}, {"sidecar_index": True}):
+        result = reader.read_rinex_file(path, **bulk_options)
+        np.testing.assert_array_equal(result.data.epochs, expected.data.epochs)
+        for system, observations in expected.data.systems.items():
+            np.testing.assert_array_equal(result.data.systems[system].values, observations.values)
+
+    index = build_epoch_index(path)
+    assert index.file_size == (resources_path / file_name).stat().st_size
+    expected = reader.read_rinex_file(resources_path / file_name, start_epoch="2022-09-29T11:00:10",
+                                      end_epoch="2022-09-29T11:00:20")
+    result = reader.read_rinex_file(path, start_epoch="2022-09-29T11:00:10", end_epoch="2022-09-29T11:00:20",
+                                    epoch_index=index)
+    np.testing.assert_array_equal(result.data.epochs, expected.data.epochs)
+    epochs = [epoch.epochs[0] for epoch in reader.iter_observation_epochs(path)]
+    np.testing.assert_array_equal(epochs, reader.read_rinex_file(resources_path / file_name).data.epochs)
+
+
+@pytest.mark.parametrize("compression", __COMPRESSIONS)
+@pytest.mark.parametrize("file_name", ["navigation_v3.22p", "navigation_v4.22p"])
+def test_read_compressed_nav(tmp_path, compression, file_name):
+    path = __compress(tmp_path, file_name, compression)
+    expected = reader.read_rinex_file(resources_path / file_name)
+    result = reader.read_rinex_file(path)
+    assert result.header.version == expected.header.version
+    assert set(result.data.satellites.keys()) == set(expected.data.satellites.keys())
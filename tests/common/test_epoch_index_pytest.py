@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.epoch_index import build_epoch_index
+from tests import resources_path
+
+
+@pytest.mark.parametrize("file_name", ["observation_v3.22o", "observation_v4.22o"])
+def test_build_epoch_index(file_name):
+    index = build_epoch_index(resources_path / file_name)
+    content = (resources_path / file_name).read_bytes()
+    assert index.file_size == len(content)
+    assert content[:index.data_offset].rstrip().endswith(b"END OF HEADER")
+    assert len(index.epochs) == content.count(b"\n>")
+    assert all(content[offset:offset + 1] == b">" for offset in index.offsets)
+    assert index.epochs[0] == np.datetime64("2022-09-29T11:00:00")
+    assert np.all(index.flags == 0)
+    assert index.sizes[0] == int(content[index.offsets[0] + 32:index.offsets[0] + 35])
+
+
+def test_epoch_index_byte_range():
+    index = build_epoch_index(resources_path / "observation_v3.22o")
+    begin, end = index.byte_range(datetime(2022, 9, 29, 11, 0, 10), None)
+    assert (begin, end) == (index.offsets[1], index.offsets[2])
+    begin, end = index.byte_range(datetime(2022, 9, 29, 11, 0, 10), datetime(2022, 9, 30, 23, 0, 0))
+    assert (begin, end) == (index.offsets[1], index.file_size)
+    begin, end = index.byte_range(datetime(2022, 9, 29, 11, 0, 5), None)
+    assert begin == end
+
+
+@pytest.mark.parametrize("start_epoch,end_epoch", [
+    ("2022-09-29T11:00:10", None),
+    ("2022-09-29T11:00:10", "2022-09-29T11:00:20"),
+    ("2022-09-29T11:00:20", "2022-09-30T04:59:50"),
+    ("2022-09-29T11:00:05", None),
+])
+def test_read_obs_with_epoch_index(start_epoch, end_epoch):
+    path = resources_path / "observation_v4.22o"
+    index = build_epoch_index(path)
+    expected = reader.read_rinex_file(path, start_epoch=start_epoch, end_epoch=end_epoch)
+    result = reader.read_rinex_file(path, start_epoch=start_epoch, end_epoch=end_epoch, epoch_index=index)
+    np.testing.assert_array_equal(result.data.epochs, expected.data.epochs)
+    assert result.data.systems.keys() == expected.data.systems.keys()
+    for system, observations in result.data.systems.items():
+        np.testing.assert_array_equal(observations.values, expected.data.systems[system].values)
+        np.testing.assert_array_equal(observations.present, expected.data.systems[system].present)
+
+
+def test_read_obs_with_epoch_index_of_other_file():
+    index = build_epoch_index(resources_path / "observation_v3.22o")
+    with pytest.raises(ValueError):
+        reader.read_rinex_file(resources_path / "observation_v4.22o", start_epoch="2022-09-29T11:00:10",
+                               epoch_index=index)
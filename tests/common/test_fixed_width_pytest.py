@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+
+from nmbu.rinex.common.fixed_width import decode_decimal_fields, decode_digit_fields, decode_exponent_fields, \
+    lines_to_char_matrix
+from nmbu.rinex.common.observation_decoder import LineBuckets, ObservationDecoder, build_decoders
+
+
+def test_lines_to_char_matrix():
+    matrix = lines_to_char_matrix(["ab\n", "abcdef\n"], 4)
+    assert matrix.shape == (2, 4)
+    assert matrix.tobytes() == b"ab  abcd"
+
+
+def test_decode_decimal_fields():
+    fields = ["  23121980.800", "     -4094.798", "              ", "         0.001", "  -1.5        ", "12"]
+    result = decode_decimal_fields(lines_to_char_matrix(fields, 14))
+    assert result[0] == 23121980.8
+    assert result[1] == -4094.798
+    assert math.isnan(result[2])
+    assert result[3] == 0.001
+    assert result[4] == -1.5
+    assert result[5] == 12.0
+
+
+def test_decode_decimal_fields__malformed():
+    fields = ["1.2.3", "12a34.5", "1-2", "1.5e3", "- 1.5", "1 2", "--1", ".", "+1.5", "  -.5 "]
+    result = decode_decimal_fields(lines_to_char_matrix(fields, 8))
+    assert np.isnan(result[:8]).all()
+    assert result[8:].tolist() == [1.5, -0.5]
+
+
+def test_decode_digit_fields():
+    result = decode_digit_fields(np.frombuffer(b" 07x", dtype=np.uint8))
+    assert result.tolist() == [-1, 0, 7, -1]
+
+
+def test_decode_exponent_fields():
+    fields = ["-3.808789188042E-04", " 3.252606517457D-19", "-1.088640000000e+08", "                   ",
+              " 0.000000000000E+00", "   not a number    "]
+    assert all(len(field) == 19 for field in fields)
+    chars = lines_to_char_matrix(["".join(fields)], 19 * len(fields)).reshape(1, len(fields), 19)
+    result = decode_exponent_fields(chars)
+    assert result.shape == (1, 6)
+    assert result[0, :3].tolist() == [-3.808789188042E-04, 3.252606517457E-19, -1.088640000000e+08]
+    assert math.isnan(result[0, 3])
+    assert result[0, 4] == 0.0
+    assert math.isnan(result[0, 5])
+
+
+def test_observation_decoder():
+    decoder = ObservationDecoder(['C1C', 'L1C', 'D1C'])
+    sv, values, lli, ssi = decoder.decode_lines([
+        "R13  23121980.800   123470115.81316      4018.388\n",
+        "R03  19364887.640 7                           \n",
+    ])
+    assert sv.tolist() == ['R13', 'R03']
+    assert values[0].tolist() == [23121980.8, 123470115.813, 4018.388]
+    assert lli[0].tolist() == [-1, 1, -1]
+    assert ssi[0].tolist() == [-1, 6, -1]
+    assert values[1, 0] == 19364887.64
+    assert np.isnan(values[1, 1:]).all()
+    assert ssi[1].tolist() == [7, -1, -1]
+
+
+def test_observation_decoder__selected_obs_types():
+    decoder = ObservationDecoder(['C1C', 'L1C', 'D1C', 'S1C'], ['S1C', 'C1C'])
+    assert decoder.selected_obs_types == ['C1C', 'S1C']
+    sv, values, lli, ssi = decoder.decode_lines([
+        "R13  23121980.800   123470115.81316      4018.388        46.000\n",
+    ])
+    assert values.tolist() == [[23121980.8, 46.0]]
+    assert lli.tolist() == [[-1, -1]]
+
+
+def test_build_decoders():
+    decoders = build_decoders({'G': ['C1C', 'L1C'], 'E': ['C1X', 'L1X'], 'R': ['D1C']}, ['G', 'E'], "C..")
+    assert sorted(decoders.keys()) == ['E', 'G']
+    assert decoders['G'].selected_obs_types == ['C1C']
+    assert decoders['G'].width == 19  # only the first column is decoded
+    assert decoders['E'].selected_obs_types == ['C1X']
+
+
+def test_line_buckets():
+    buckets = LineBuckets()
+    for position, line in enumerate(["R13 1", "G03 2", "R03 3"]):
+        buckets.add(line, position)
+    assert [(system, lines[:count], positions.tolist()) for system, lines, positions, count in buckets.items()] == \
+        [('R', ["R13 1", "R03 3"], [0, 2]), ('G', ["G03 2"], [1])]
+
+    # buffers are reused, GNSS that are not present in the next block are not returned
+    buckets.clear()
+    buckets.add("G04 4", 0)
+    assert [(system, lines[:count], positions.tolist()) for system, lines, positions, count in buckets.items()] == \
+        [('G', ["G04 4"], [0])]
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from nmbu.rinex.common.nav_decoder import epoch_line_in_period, epoch_line_key, epoch_period_keys, read_data_lines, \
+    read_epoch_line, read_epoch_lines, read_epoch_line_text
+
+
+def test_read_epoch_lines():
+    epochs, values = read_epoch_lines([
+        "G01 2022 09 29 09 59 44-1.393973361701E-04 3.623767952377D-12 0.000000000000E+00\n",
+        "    2022 09 30 23 00 00 2.421438694000e-08\n",
+    ])
+    assert epochs.tolist() == np.array(['2022-09-29T09:59:44', '2022-09-30T23:00:00'], dtype='datetime64[ns]').tolist()
+    assert values[0].tolist() == [-1.393973361701E-04, 3.623767952377E-12, 0.0]
+    assert values[1, 0] == 2.421438694000e-08
+    assert np.isnan(values[1, 1:]).all()
+
+
+def test_read_epoch_line():
+    timestamp, values = read_epoch_line("R19 2022 09 29 10 45 00 1.005828380585E-05 0.000000000000E+00 3.852000000000E+04")
+    assert timestamp == '2022-09-29T10:45:00'
+    assert values == [1.005828380585E-05, 0.0, 3.852000000000E+04]
+
+
+def test_read_epoch_line_text():
+    timestamp, values = read_epoch_line_text("    2022 09 24 19 50 24 GPUT                                  UTC(USNO)")
+    assert timestamp == '2022-09-24T19:50:24'
+    assert values == ['GPUT', '', 'UTC(USNO)']
+
+
+@pytest.mark.parametrize("line", [
+    "G01 2022 13 29 09 59 44-1.393973361701E-04",
+    "G01 2022 02 30 09 59 44-1.393973361701E-04",
+    "G01 2022 09 29 09 5",
+])
+def test_read_epoch_lines__invalid(line):
+    with pytest.raises(ValueError):
+        read_epoch_lines([line])
+
+
+def test_read_data_lines():
+    lines = [
+        "     5.500000000000E+01 1.612500000000E+01 4.391254341941E-09 1.650293527635E+00\n",
+        "     3.817800000000E+05\n",
+        "    -5.500000000000D+01\n",
+        "     3.817800000000D+05 4.000000000000D+00\n",
+    ]
+    values = read_data_lines(lines, block_size=2)
+    assert values.shape == (2, 8)
+    assert values[0, :5].tolist() == [55.0, 16.125, 4.391254341941E-09, 1.650293527635, 381780.0]
+    assert values[1, [0, 4, 5]].tolist() == [-55.0, 381780.0, 4.0]
+    assert np.isnan(values[0, 5:]).all()
+
+    normalized = read_data_lines([line[4:] for line in lines[:2]], block_size=2, indent=0)
+    assert np.array_equal(normalized, values[:1], equal_nan=True)
+
+
+def test_epoch_period_keys():
+    line = "G01 2022 09 29  9 59 44 2.758218906820e-04-6.366462912410e-12 0.000000000000e+00"
+    assert epoch_line_key(line) == "2022009029009059044"
+    assert epoch_period_keys(None, None) is None
+    assert epoch_line_in_period(line, None)
+    assert epoch_line_in_period(line, epoch_period_keys(datetime(2022, 9, 29, 9, 59, 44), None))
+    assert epoch_line_in_period(line, epoch_period_keys(datetime(2022, 9, 29, 9, 59, 43, 1),
+                                                        datetime(2022, 9, 29, 9, 59, 44, 999)))
+    assert not epoch_line_in_period(line, epoch_period_keys(datetime(2022, 9, 29, 9, 59, 44, 1), None))
+    assert not epoch_line_in_period(line, epoch_period_keys(datetime(2022, 9, 29, 10), datetime(2022, 9, 30)))
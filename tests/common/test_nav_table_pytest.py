@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.nav_table import SATELLITES, NavSatellitesView, NavTableBuilder
+from nmbu.rinex.navigation.v3.nav_message_type.GPS import GPSNavRecord, GPSNavRecordOrbitData
+from nmbu.rinex.navigation.v4.nav_message_type.STO import STONavRecord, STONavRecordData
+from tests import resources_path
+
+
+__GPS_LINES = [
+    "     5.500000000000E+01 1.612500000000E+01 4.391254341941E-09 1.650293527635E+00\n",
+    "     7.506459951401E-07 4.497775575146E-03 8.512288331985E-06 5.153542041779E+03\n",
+    "     3.888000000000E+05-1.247972249985E-07 1.397849200567E+00-1.862645149231E-09\n",
+    "     9.751815851645E-01 2.221875000000E+02 1.064872642026E+00-7.908186550570E-09\n",
+    "     5.371652322309E-10 1.000000000000E+00 2.229000000000E+03 0.000000000000E+00\n",
+    "     4.000000000000E+00 0.000000000000E+00 1.862645149231E-09 5.500000000000E+01\n",
+    "     3.817800000000E+05 4.000000000000E+00\n",
+]
+
+
+def __gps_builder():
+    builder = NavTableBuilder('GPS', SATELLITES, GPSNavRecord, GPSNavRecordOrbitData,
+                              ('clock_bias', 'clock_drift', 'clock_drift_rate'))
+    for sv, epoch, iode in [('G05', '2022 09 29 12 00 00', '3'), ('G01', '2022 09 29 12 00 00', '2'),
+                            ('G05', '2022 09 29 10 00 00', '1'), ('G05', '2022 09 29 12 00 00', '4')]:
+        epoch_line = sv + " " + epoch + "-1.393973361701E-04 3.623767952377D-12 0.000000000000E+00\n"
+        builder.add_block(sv, epoch_line, [__GPS_LINES[0].replace("5.5", iode + ".5", 1)] + __GPS_LINES[1:])
+    return builder
+
+
+def test_builder_creates_structured_table():
+    table = __gps_builder().build()
+    assert table.name == 'GPS'
+    assert len(table) == 4
+    assert table.fields == list(GPSNavRecordOrbitData().__dict__.keys())
+    assert table.records.dtype.names[:5] == ('sv', 'epoch', 'clock_bias', 'clock_drift', 'clock_drift_rate')
+    assert table.records['IODE'].tolist() == [35.0, 25.0, 15.0, 45.0]
+    assert table.records['clock_drift'].tolist() == [3.623767952377E-12] * 4
+    assert list(table.sv_rows_by_name()) == ['G05', 'G01']
+    assert table.sv_rows('G05').tolist() == [2, 0, 3]
+    assert table.sv_rows('G02').tolist() == []
+
+    row = table.row(2)
+    assert isinstance(row, GPSNavRecordOrbitData)
+    assert row.timestamp == '2022-09-29T10:00:00'
+    assert row.clock_bias == -1.393973361701E-04
+    assert row.Crs == 1.612500000000E+01
+    assert row.fit_interval == 4.0
+
+
+def test_satellites_view():
+    view = NavSatellitesView([__gps_builder().build()])
+    assert view.keys() == {'G05', 'G01'}
+    assert 'G05' in view and 'G02' not in view
+    assert list(view['G05']) == ['2022-09-29T10:00:00', '2022-09-29T12:00:00']
+    assert view['G05']['2022-09-29T12:00:00'].IODE == 45.0  # last read record wins
+    with pytest.raises(KeyError):
+        view['G02']
+    with pytest.raises(KeyError):
+        view['G01']['2022-09-29T10:00:00']
+    with pytest.raises(KeyError):
+        view['G01']['not a timestamp']
+
+
+def test_empty_table_and_text_epoch_values():
+    builder = NavTableBuilder('STO', 'STO', STONavRecord, STONavRecordData, ('time_offset', 'sbas_id', 'utc_id'))
+    assert len(builder.build()) == 0
+    assert NavSatellitesView([builder.build()]) == {}
+
+    builder.add_block('G', "    2022 09 24 19 50 24 GPUT                                  UTC(USNO)\n",
+                      ["    -1.088640000000e+08 2.793967723846e-09 1.243449787580e-14 0.000000000000e+00\n"])
+    table = builder.build()
+    assert table.records['time_offset'].tolist() == ['GPUT']
+    assert table.records['utc_id'].tolist() == ['UTC(USNO)']
+    assert table.row(0).sbas_id == ''
+    assert table.row(0).A0 == 2.793967723846e-09
+
+
+def test_navigation_tables():
+    rinex = reader.read_rinex_file(str(resources_path/"navigation_v4.22p"))
+    tables = rinex.data.tables
+    assert tables.keys() == {'GPS_LNAV', 'BDS_D1_D2', 'GAL_INAV_FNAV', 'STO', 'ION_Klobuchar', 'EOP'}
+    assert tables['GAL_INAV_FNAV'].target == SATELLITES
+    assert tables['ION_Klobuchar'].target == 'ION'
+
+    gal = tables['GAL_INAV_FNAV']
+    assert 'TGD' in gal.fields
+    assert gal.records['sv'].tolist() == ['E09']
+    assert gal.records['epoch'][0] == np.datetime64('2022-09-29T09:20:00')
+    assert gal.records['TGD'][0] == rinex.data.satellites['E09']['2022-09-29T09:20:00'].TGD
@@ -0,0 +1,83 @@
+import io
+
+import numpy as np
+import pytest
+
+from nmbu.rinex.common.fixed_width import lines_to_char_matrix
+from nmbu.rinex.common.observation_bulk import EPOCH_LINE_WIDTH, decode_epoch_lines, read_observation_buffer, \
+    read_observation_stream
+from nmbu.rinex.common.observation_decoder import build_decoders
+from nmbu.rinex.common.observation_store import ObservationStore, ObservationStoreBuilder
+
+__DECODERS = build_decoders({'G': ['C1C', 'L1C']}, None, None)
+__DATA = (
+    "> 2022 09 29 11 00  0.0000000  0  2\n"
+    "G03  22051345.480   115879747.04607\n"
+    "G04  22051345.481   115879747.04616\n"
+    "> 2022 09 29 11 00 10.0000000  4  1\n"
+    "                                                            COMMENT\n"
+    "> 2022 09 29 11 00 20.0000000  0  1\n"
+    "G04  22051345.482\n"
+)
+
+
+def test_decode_epoch_lines():
+    chars = lines_to_char_matrix(["> 2022 09 29 11 00 10.0000000  0 25", "> 2023 01 02 03 04 59.9999999  4  1"],
+                                 EPOCH_LINE_WIDTH)
+    epochs, flags, sizes = decode_epoch_lines(chars)
+    np.testing.assert_array_equal(epochs, np.array(['2022-09-29T11:00:10', '2023-01-02T03:04:59.9999999'],
+                                                   dtype='datetime64[ns]'))
+    np.testing.assert_array_equal(flags, [0, 4])
+    np.testing.assert_array_equal(sizes, [25, 1])
+
+    with pytest.raises(ValueError) as e_info:
+        decode_epoch_lines(lines_to_char_matrix(["> 2022 xx 29 11 00 10.0000000  0 25"], EPOCH_LINE_WIDTH))
+    assert str(e_info.value) == "Invalid month value in epoch line: > 2022 xx 29 11 00 10.0000000  0 25"
+
+
+def test_read_observation_buffer():
+    builder = ObservationStoreBuilder()
+    read_observation_buffer(__DATA.encode("ascii"), __DECODERS, builder, None, None)
+    result = builder.build(ObservationStore())
+    np.testing.assert_array_equal(result.epochs,
+                                  np.array(['2022-09-29T11:00:00', '2022-09-29T11:00:20'], dtype='datetime64[s]'))
+    gps = result.systems['G']
+    np.testing.assert_array_equal(gps.sv, ['G03', 'G04'])
+    np.testing.assert_array_equal(gps.present, [[True, True], [False, True]])
+    assert gps.values[1, 1, 0] == 22051345.482
+    assert np.isnan(gps.values[1, 1, 1])
+    np.testing.assert_array_equal(gps.ssi[0, :, 1], [7, 6])
+
+
+def test_read_observation_buffer__invalid_block_size():
+    builder = ObservationStoreBuilder()
+    with pytest.raises(ValueError) as e_info:
+        read_observation_buffer(__DATA.replace("0  2\n", "0  3\n").encode("ascii"), __DECODERS, builder,
+                                None, None)
+    assert str(e_info.value) == "Block 2022-09-29T11:00:00 has invalid size."
+
+
+def test_read_observation_buffer__selected_obs_types():
+    builder = ObservationStoreBuilder()
+    decoders = build_decoders({'G': ['C1C', 'L1C'], 'E': ['C1X']}, ['G'], ['L1C'])
+    read_observation_buffer(__DATA.encode("ascii"), decoders, builder, None, None)
+    result = builder.build(ObservationStore())
+    assert list(result.systems.keys()) == ['G']
+    gps = result.systems['G']
+    assert gps.obs_types == ['L1C']
+    assert gps.values[0, :, 0].tolist() == [115879747.046, 115879747.046]
+    assert np.isnan(gps.values[1, 1, 0])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 20, 70, 1000])
+def test_read_observation_stream(chunk_size):
+    expected = ObservationStoreBuilder()
+    read_observation_buffer(__DATA.encode("ascii"), __DECODERS, expected, None, None)
+    expected = expected.build(ObservationStore())
+
+    builder = ObservationStoreBuilder()
+    read_observation_stream(io.StringIO(__DATA), __DECODERS, builder, None, None, chunk_size=chunk_size)
+    result = builder.build(ObservationStore())
+    np.testing.assert_array_equal(result.epochs, expected.epochs)
+    np.testing.assert_array_equal(result.systems['G'].values, expected.systems['G'].values)
+    np.testing.assert_array_equal(result.systems['G'].ssi, expected.systems['G'].ssi)
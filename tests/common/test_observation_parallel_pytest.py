@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.epoch_index import build_epoch_index, find_data_offset
+from nmbu.rinex.common.observation_decoder import build_decoders
+from nmbu.rinex.common.observation_parallel import read_observation_file_parallel, split_at_epochs
+from nmbu.rinex.common.observation_store import ObservationStore, ObservationStoreBuilder
+from tests import resources_path
+
+
+def test_split_at_epochs():
+    path = resources_path / "observation_v3.22o"
+    index = build_epoch_index(path)
+    boundaries = split_at_epochs(path, index.data_offset, index.file_size, 3)
+    assert boundaries[0] == index.data_offset
+    assert boundaries[-1] == index.file_size
+    assert all(boundary in index.offsets for boundary in boundaries[1:-1])
+    assert boundaries == sorted(set(boundaries))
+
+    # range with a single epoch can not be split
+    assert split_at_epochs(path, index.offsets[-1], index.file_size, 4) == [index.offsets[-1], index.file_size]
+
+
+def test_read_observation_file_parallel():
+    path = resources_path / "observation_v4.22o"
+    expected = reader.read_rinex_file(path, obs_types="[CL]..")
+
+    builder = ObservationStoreBuilder()
+    decoders = build_decoders(expected.header.obs_types, None, "[CL]..")
+    read_observation_file_parallel(path, find_data_offset(path), os.path.getsize(path), decoders,
+                                   builder, None, None, workers=3, min_bytes_per_worker=1)
+    result = builder.build(ObservationStore())
+    np.testing.assert_array_equal(result.epochs, expected.data.epochs)
+    assert result.systems.keys() == expected.data.systems.keys()
+    for system, observations in result.systems.items():
+        np.testing.assert_array_equal(observations.sv, expected.data.systems[system].sv)
+        np.testing.assert_array_equal(observations.values, expected.data.systems[system].values)
+        np.testing.assert_array_equal(observations.lli, expected.data.systems[system].lli)
+        np.testing.assert_array_equal(observations.present, expected.data.systems[system].present)
+
+
+def test_read_obs_with_workers__small_file():
+    path = resources_path / "observation_v3.22o"
+    expected = reader.read_rinex_file(path, start_epoch="2022-09-29T11:00:10", end_epoch="2022-09-29T11:00:20")
+    result = reader.read_rinex_file(path, start_epoch="2022-09-29T11:00:10", end_epoch="2022-09-29T11:00:20",
+                                    workers=4)
+    np.testing.assert_array_equal(result.data.epochs, expected.data.epochs)
+    for system, observations in result.data.systems.items():
+        np.testing.assert_array_equal(observations.values, expected.data.systems[system].values)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.observation_store import ObservationStore, ObservationStoreBuilder
+from nmbu.rinex.observation.v3.header import read_observation_header_v3
+from nmbu.rinex.observation.v3.observation import read_observation_blocks_v3
+from tests import resources_path
+
+
+def test_builder_creates_dense_arrays():
+    builder = ObservationStoreBuilder()
+    t0 = builder.add_epoch("2022-09-29T11:00:00")
+    t1 = builder.add_epoch("2022-09-29T11:00:10")
+    builder.add_rows('G', ['C1C', 'L1C'], t0, np.array(['G05', 'G01']),
+                     np.array([[1.0, 2.0], [3.0, np.nan]]),
+                     np.array([[-1, 1], [-1, -1]]),
+                     np.array([[5, 6], [-1, -1]]))
+    builder.add_rows('G', ['C1C', 'L1C'], t1, np.array(['G01']),
+                     np.array([[7.0, 8.0]]), np.array([[-1, -1]]), np.array([[-1, 9]]))
+    store = builder.build(ObservationStore())
+
+    gps = store.systems['G']
+    assert list(gps.sv) == ['G01', 'G05']
+    assert gps.values.shape == (2, 2, 2)
+    assert gps.present.tolist() == [[True, True], [True, False]]
+    assert gps.values[0, 1, 0] == 1.0
+    assert np.isnan(gps.values[1, 1]).all()
+    assert gps.ssi[1, 0, 1] == 9
+
+    assert store.satellites.keys() == {'G01', 'G05'}
+    assert store.satellites['G05'].keys() == {'2022-09-29T11:00:00'}
+    assert store.satellites['G01']['2022-09-29T11:00:10']['L1C']['value'] == 8.0
+    assert store.satellites['G05']['2022-09-29T11:00:00']['L1C']['lli'] == 1
+    assert 'G02' not in store.satellites
+    with pytest.raises(KeyError):
+        store.satellites['G05']['2022-09-29T11:00:10']
+
+
+def test_view_matches_dense_arrays():
+    result = reader.read_rinex_file(rinex_file_path=resources_path / "observation_v3.22o")
+    galileo = result.data.systems['E']
+    assert galileo.obs_types == ['C1X', 'L1X', 'D1X', 'C5X', 'L5X', 'D5X']
+    assert galileo.values.shape == (len(result.data.epochs), len(galileo.sv), 6)
+    e03 = list(galileo.sv).index('E03')
+    record = result.data.satellites['E03']['2022-09-29T11:00:00']
+    assert [record[name]['value'] for name in galileo.obs_types] == list(galileo.values[0, e03])
+    assert record['L1X']['ssi'] == galileo.ssi[0, e03, 1] == 7
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_receiver_order(bulk):
+    with (resources_path / "observation_v3.22o").open() as f:
+        next(f)  # simulate reading first line
+        header = read_observation_header_v3(file=f, version=3.05, file_type='O', gnss='M')
+        result = read_observation_blocks_v3(f, header, None, None, None, None, bulk=bulk, sv=["C12", "R13", "G04"])
+    assert result.receiver_order(0) == ["R13", "C12", "G04"]
+    assert result.systems['R'].order[0].tolist() == [0]
+    assert result.systems['C'].order[0].tolist() == [7]  # position in the block, including dropped lines
+
+
+def test_observation_store_builder_merge():
+    first = ObservationStoreBuilder()
+    first.add_epochs(np.array(['2022-09-29T11:00:00'], dtype='datetime64[s]'))
+    first.add_rows('G', ['C1C'], 0, np.array(['G01']), np.array([[1.0]]), np.array([[1]]), np.array([[5]]))
+    second = ObservationStoreBuilder()
+    second.add_epochs(np.array(['2022-09-29T11:00:10', '2022-09-29T11:00:20'], dtype='datetime64[s]'))
+    second.add_rows('G', ['C1C'], np.array([1, 0]), np.array(['G02', 'G01']),
+                    np.array([[2.0], [3.0]]), np.array([[-1], [-1]]), np.array([[-1], [-1]]))
+    first.merge(second)
+    result = first.build(ObservationStore())
+    assert len(result.epochs) == 3
+    np.testing.assert_array_equal(result.systems['G'].sv, ['G01', 'G02'])
+    np.testing.assert_array_equal(result.systems['G'].values[:, :, 0], [[1.0, np.nan], [3.0, np.nan], [np.nan, 2.0]])
@@ -1,3 +1,6 @@
+import numpy as np
+import pytest
+
 from nmbu.rinex import reader
 from nmbu.rinex.navigation.v3.nav_message_type.GAL import GALNavRecordOrbitData as GALNavRecordOrbitDataV3
 from nmbu.rinex.navigation.v4.nav_message_type.GAL_INAV_FNAV import GALNavRecordOrbitData as GALNavRecordOrbitDataV4
@@ -49,3 +52,54 @@ def test_find_closest_correction_match():
     assert g_sto.A1 == 1.243449787580e-14
     assert g_sto.A2 == 0.000000000000e+00
     assert g_sto.timestamp == "2022-09-24T19:50:24"
+
+
+def test_find_closest_match__latest_and_max_age():
+    rinex_nav_v3 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v3.22p")
+    assert rinex_nav_v3.find_closest_match(sv="E05", timestamp="2022-09-29T09:49:59").timestamp == "2022-09-29T09:50:00"
+    assert rinex_nav_v3.find_closest_match(sv="E05", timestamp="2022-09-29T09:49:59", latest=True) is None
+    assert rinex_nav_v3.find_closest_match(sv="E05", timestamp="2022-09-29T11:50:00", latest=True).omega == 1.470263377777
+    assert rinex_nav_v3.find_closest_match(sv="E05", timestamp="2022-09-29T11:50:00", max_age=7200) is not None
+    assert rinex_nav_v3.find_closest_match(sv="E05", timestamp="2022-09-29T11:50:01", max_age=7200) is None
+
+    rinex_nav_v4 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v4.22p")
+    g_sto = rinex_nav_v4.find_closest_correction_match(correction_type='STO', sv='G04', timestamp="2022-09-29T10:00:00",
+                                                       latest=True, max_age=86400)
+    assert g_sto is None
+    c05_ion = rinex_nav_v4.find_closest_correction_match(correction_type='ION', sv='C05',
+                                                         timestamp="2022-09-29T09:40:30", latest=True)
+    assert c05_ion.timestamp == "2022-09-29T09:40:27"
+
+
+def test_find_closest_match_rows_and_records():
+    rinex_nav_v4 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v4.22p")
+    sv = ['E09', 'E06', 'E09', 'E09']
+    timestamps = ['2022-09-29T10:00:00', '2022-09-29T10:00:00', '2022-09-29T09:19:59', '2022-09-29T12:00:00']
+    rows = rinex_nav_v4.find_closest_match_rows('GAL_INAV_FNAV', sv, timestamps)
+    assert rows.tolist() == [0, -1, 0, 0]
+    rows = rinex_nav_v4.find_closest_match_rows('GAL_INAV_FNAV', sv, timestamps, latest=True, max_age=7200)
+    assert rows.tolist() == [0, -1, -1, -1]
+
+    records = rinex_nav_v4.find_closest_match_records('GAL_INAV_FNAV', sv, np.array(timestamps, dtype='datetime64[s]'))
+    assert records['SV_health'][0] == rinex_nav_v4.find_closest_match(sv="E09", timestamp="2022-09-29T10:00:00").SV_health
+    assert np.isnat(records['epoch'][1]) and np.isnan(records['SV_health'][1]) and records['sv'][1] == ''
+    assert records['sv'].tolist() == ['E09', '', 'E09', 'E09']
+
+    with pytest.raises(ValueError):
+        rinex_nav_v4.find_closest_match_rows('GAL_INAV_FNAV', ['E09'], timestamps)
+
+
+def test_find_valid_ephemeris_rows_and_records():
+    rinex_nav_v4 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v4.22p")
+    sv = ['G01', 'G01', 'G01', 'G05']
+    timestamps = ['2022-09-29T09:39:59', '2022-09-29T09:40:00', '2022-09-29T12:00:00', '2022-09-29T10:00:00']
+    rows = rinex_nav_v4.find_valid_ephemeris_rows('GPS_LNAV', sv, timestamps)
+    assert rows.tolist() == [-1, 0, -1, -1]
+
+    timestamps = np.array(['2022-09-29T11:59:44', '2022-09-29T11:59:45'], dtype='datetime64[s]')
+    records = rinex_nav_v4.find_valid_ephemeris_records('GPS_LNAV', ['G01', 'G01'], timestamps)
+    assert records['sv'].tolist() == ['G01', '']
+    assert records['Toe'][0] == 381584 and np.isnan(records['Toe'][1])
+
+    with pytest.raises(ValueError):
+        rinex_nav_v4.find_valid_ephemeris_rows('GPS_LNAV', ['G01'], timestamps)
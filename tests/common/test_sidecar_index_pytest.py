@@ -0,0 +1,115 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.sidecar_index import invalidate_sidecar_index, load_sidecar_index, sidecar_path
+from tests import resources_path
+
+
+def __copy_resource(tmp_path, file_name):
+    path = tmp_path / file_name
+    shutil.copyfile(resources_path / file_name, path)
+    return path
+
+
+@pytest.mark.parametrize("file_name", ["observation_v3.22o", "observation_v4.22o"])
+def test_read_obs_with_sidecar_index(tmp_path, file_name):
+    path = __copy_resource(tmp_path, file_name)
+    expected = reader.read_rinex_file(path, start_epoch="2022-09-29T11:00:10", end_epoch="2022-09-29T11:00:20")
+
+    for _ in range(2):  # first read creates the sidecar, second read uses it
+        result = reader.read_rinex_file(path, start_epoch="2022-09-29T11:00:10", end_epoch="2022-09-29T11:00:20",
+                                        sidecar_index=True)
+        assert os.path.exists(sidecar_path(path))
+        assert result.header.obs_types == expected.header.obs_types
+        np.testing.assert_array_equal(result.data.epochs, expected.data.epochs)
+        for system, observations in result.data.systems.items():
+            np.testing.assert_array_equal(observations.values, expected.data.systems[system].values)
+
+
+@pytest.mark.parametrize("file_name", ["navigation_v3.22p", "navigation_v3.04.22p", "navigation_v4.22p"])
+def test_read_nav_with_sidecar_index(tmp_path, file_name):
+    path = __copy_resource(tmp_path, file_name)
+    index = reader.build_sidecar_index(path)
+    expected = reader.read_rinex_file(path)
+    assert set(index.epoch_index.sv_names) >= set(expected.data.satellites.keys())
+    result = reader.read_rinex_file(path, sidecar_index=True)
+    assert result.header.version == expected.header.version
+    assert result.data.satellites.keys() == expected.data.satellites.keys()
+    for sv, blocks in result.data.satellites.items():
+        assert blocks.keys() == expected.data.satellites[sv].keys()
+
+
+def test_sidecar_index_validation(tmp_path):
+    path = __copy_resource(tmp_path, "observation_v3.22o")
+    index = reader.build_sidecar_index(path)
+    assert index.epoch_index.satellites(0)[:3] == ['R13', 'G03', 'R03']
+    assert load_sidecar_index(path) is not None
+    assert load_sidecar_index(path, verify_content=True) is not None
+
+    # same content with new modification time is still valid
+    os.utime(path, ns=(index.mtime_ns + 10 ** 9, index.mtime_ns + 10 ** 9))
+    assert load_sidecar_index(path) is not None
+    assert load_sidecar_index(path).mtime_ns == index.mtime_ns + 10 ** 9
+
+    # changed content with unchanged size and modification time is detected only by content verification
+    content = path.read_bytes()
+    path.write_bytes(content.replace(b"25790898.320", b"25790898.321"))
+    os.utime(path, ns=(index.mtime_ns + 10 ** 9, index.mtime_ns + 10 ** 9))
+    assert load_sidecar_index(path) is not None
+    assert load_sidecar_index(path, verify_content=True) is None
+
+    # changed size
+    path.write_bytes(content + b"\n")
+    assert load_sidecar_index(path) is None
+
+    invalidate_sidecar_index(path)
+    assert not os.path.exists(sidecar_path(path))
+    assert load_sidecar_index(path) is None
+    invalidate_sidecar_index(path)  # no error if there is nothing to invalidate
+
+
+@pytest.mark.parametrize("file_name,start_epoch,end_epoch", [
+    ("navigation_v3.22p", "2022-09-29T10:00:00", None),
+    ("navigation_v3.22p", "2022-09-29T09:00:00", "2022-09-29T11:00:00"),
+    ("navigation_v4.22p", "2022-09-29T09:30:00", "2022-09-29T10:00:00"),
+    ("navigation_v4.22p", "2022-09-29T09:00:00", None),
+])
+def test_read_nav_with_sidecar_index__epoch_filter(tmp_path, file_name, start_epoch, end_epoch):
+    path = __copy_resource(tmp_path, file_name)
+    index = reader.build_sidecar_index(path)
+    expected = reader.read_rinex_file(path, start_epoch=start_epoch, end_epoch=end_epoch)
+    result = reader.read_rinex_file(path, start_epoch=start_epoch, end_epoch=end_epoch, sidecar_index=True)
+    assert result.data.tables.keys() == expected.data.tables.keys()
+    for name, table in result.data.tables.items():
+        for field in table.records.dtype.names:
+            np.testing.assert_array_equal(table.records[field], expected.data.tables[name].records[field])
+
+    # only the records of the selected epochs are read
+    ranges = index.epoch_index.byte_ranges(reader.str2date(start_epoch),
+                                           None if end_epoch is None else reader.str2date(end_epoch))
+    selected = sum(end - begin for begin, end in ranges)
+    assert selected < index.epoch_index.file_size - index.epoch_index.data_offset
+
+
+def test_sidecar_index_is_not_unpickled(tmp_path):
+    path = __copy_resource(tmp_path, "observation_v3.22o")
+    marker = tmp_path / "executed"
+
+    class Payload:
+        def __reduce__(self):
+            return open, (str(marker), 'w')
+
+    with open(sidecar_path(path), 'wb') as file:
+        pickle.dump(Payload(), file)
+    assert load_sidecar_index(path) is None
+    assert not marker.exists()
+
+    reader.build_sidecar_index(path)
+    with np.load(sidecar_path(path), allow_pickle=False) as archive:
+        assert int(archive["file_size"]) == os.path.getsize(path)
+    assert load_sidecar_index(path).header_text.rstrip().endswith("END OF HEADER")
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex.common.time_index import NOT_FOUND, NS_PER_SECOND, TimeIndex, mapping_time_index, time_to_ns
+
+
+@pytest.mark.parametrize("time, latest, max_age, expected", [
+    (0, False, None, 0),
+    (15, False, None, 0),  # equally close, the earlier one wins
+    (16, False, None, 1),
+    (16, True, None, 0),
+    (30, True, None, 1),
+    (100, True, None, 2),
+    (100, True, 40, 2),
+    (100, True, 39, NOT_FOUND),
+    (-1, True, None, NOT_FOUND),
+    (-1, False, None, 0),
+    (-1, False, 0.5, NOT_FOUND),
+])
+def test_find(time, latest, max_age, expected):
+    index = TimeIndex(np.array([0, 30, 60], dtype=np.int64) * NS_PER_SECOND, lambda position: position)
+    assert index.find(time * NS_PER_SECOND, latest, max_age) == expected
+
+
+def test_empty_index():
+    index = mapping_time_index({"NO_TIME": object()})
+    assert len(index) == 0
+    assert index.find(time_to_ns('2022-09-29T10:00:00')) == NOT_FOUND
+
+
+def test_mapping_time_index():
+    index = mapping_time_index({'2022-09-29T12:00:00': 'b', '2022-09-29T10:00:00': 'a', 'NO_TIME': 'c'})
+    assert len(index) == 2
+    assert index.record(index.find(time_to_ns('2022-09-29T10:59:59'))) == 'a'
+    assert index.record(index.find(time_to_ns('2022-09-29T11:00:01'))) == 'b'
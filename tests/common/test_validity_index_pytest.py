@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex.common.nav_table import SATELLITES, NavTable
+from nmbu.rinex.common.time_index import NOT_FOUND, NS_PER_SECOND
+from nmbu.rinex.common.validity_index import ValidityIndex, nav_validity_index, validity_intervals
+
+__DTYPE = np.dtype([('sv', 'U3'), ('epoch', 'datetime64[ns]'), ('IODE', 'f8'), ('Toe', 'f8'), ('SV_health', 'f8'),
+                    ('IODC', 'f8'), ('t_tm', 'f8'), ('fit_interval', 'f8')])
+__DAY = np.datetime64('2022-09-29T00:00:00', 'ns')  # Thursday, 345600 seconds of week
+
+
+def __records(rows):
+    return np.array([(sv, __DAY + np.timedelta64(int(hour * 3600), 's'), iode, 345600 + hour * 3600, health,
+                      iodc, t_tm, fit) for sv, hour, iode, health, iodc, t_tm, fit in rows], dtype=__DTYPE)
+
+
+def __ns(hour):
+    return int((__DAY + np.timedelta64(int(hour * 3600), 's')).astype(np.int64))
+
+
+def test_validity_intervals():
+    records = __records([
+        ('G01', 10, 5, 0, 5, 345600 + 9 * 3600, 4),  # transmitted at 9:00, valid up to 12:00
+        ('G01', 10, 5, 0, 5, 9.99999999e+08, 0),  # unknown transmission time, 4 hours fit interval
+        ('J01', 10, 5, 1, 261, 345600 + 9 * 3600, 0),  # QZSS 2 hours fit interval, unhealthy
+        ('G01', 10, 5, 0, 6, 345600 + 9 * 3600, 6),  # issue of data cutover, 6 hours fit interval
+    ])
+    start, end, healthy, consistent = validity_intervals(records)
+    assert start.tolist() == [__ns(9), __ns(8), __ns(9), __ns(9)]
+    assert end.tolist() == [__ns(12), __ns(12), __ns(11), __ns(13)]
+    assert healthy.tolist() == [True, True, False, True]
+    assert consistent.tolist() == [True, True, True, False]
+
+
+def test_validity_intervals_without_toe():
+    records = np.array([('R01', __DAY)], dtype=[('sv', 'U3'), ('epoch', 'datetime64[ns]')])
+    start, end, healthy, consistent = validity_intervals(records)
+    assert (end - start).tolist() == [3600 * NS_PER_SECOND]
+    assert healthy.tolist() == [True] and consistent.tolist() == [True]
+
+
+@pytest.mark.parametrize("hour, expected", [
+    (7.9, NOT_FOUND),
+    (8, 0),
+    (9.5, 0),
+    (10, 1),  # the later transmitted record replaces the earlier one
+    (12.5, 1),
+    (13.5, 1),  # the third record is unhealthy, the second record is still valid
+    (14.5, NOT_FOUND),
+    (15.5, 3),
+])
+def test_nav_validity_index(hour, expected):
+    records = __records([
+        ('G01', 10, 5, 0, 5, 345600 + 8 * 3600, 4),
+        ('G01', 12, 6, 0, 6, 345600 + 10 * 3600, 4),
+        ('G01', 14, 7, 1, 7, 345600 + 12 * 3600, 4),
+        ('G01', 16, 8, 0, 8, 345600 + 15 * 3600, 4),
+        ('G02', 10, 5, 0, 5, 345600 + 8 * 3600, 4),
+    ])
+    table = NavTable('GPS', SATELLITES, None, (), records)
+    index = nav_validity_index(table, 'G01')
+    assert index.find_all(np.array([__ns(hour)]))[0] == expected
+
+
+def test_nav_validity_index_merges_and_ignores_health():
+    records = __records([
+        ('G01', 10, 5, 1, 5, 345600 + 8 * 3600, 4),
+        ('G01', 12, 6, 1, 6, 345600 + 8.5 * 3600, 4),
+    ])
+    table = NavTable('GPS', SATELLITES, None, (), records)
+    assert len(nav_validity_index(table, 'G01')) == 0
+    index = nav_validity_index(table, 'G01', healthy=False)
+    assert index.starts.tolist() == [__ns(8), __ns(8.5)]
+    assert index.ends.tolist() == [__ns(8.5) - 1, __ns(14)]
+    assert index.rows.tolist() == [0, 1]
+
+
+def test_empty_validity_index():
+    index = ValidityIndex(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.intp))
+    assert index.find_all(np.array([0, 1], dtype=np.int64)).tolist() == [NOT_FOUND, NOT_FOUND]
+
+
+def test_nav_validity_index__many_overlapping_records():
+    generator = np.random.default_rng(7)
+    count = 20000  # a dense (bounds x records) matrix would need gigabytes
+    hours = np.sort(generator.uniform(0, 48, count))
+    transmissions = hours - generator.uniform(0, 2, count)
+    records = __records([('G01', hour, 1, 0, 1, 345600 + transmission * 3600, 4)
+                         for hour, transmission in zip(hours, transmissions)])
+    table = NavTable('GPS', SATELLITES, None, (), records)
+    index = nav_validity_index(table, 'G01')
+    assert np.all(index.starts[1:] > index.ends[:-1])
+
+    start, end, _, _ = validity_intervals(records)
+    epochs = records['epoch'].astype(np.int64)
+    times = generator.integers(__ns(-1), __ns(51), 500)
+    for time, row in zip(times, index.find_all(times)):
+        active = np.flatnonzero((start <= time) & (end >= time))
+        if len(active) == 0:
+            assert row == NOT_FOUND
+        else:
+            assert row == active[np.lexsort((epochs[active], start[active]))[-1]]
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.navigation.earth_orientation import ARCSECOND, EarthOrientationTable, earth_rotation_angle, \
+    eci_to_ecef, ecef_to_eci, terrestrial_to_celestial
+from tests import resources_path
+
+__TIMES = np.array(['2022-09-29T12:00:00', '2022-09-30T00:00:00', 'NaT'], dtype='datetime64[ns]')
+
+
+def __table():
+    return EarthOrientationTable(
+        np.array(['2022-09-29T12:00:00', '2022-09-29T00:00:00'], dtype='datetime64[ns]'),
+        [[0.25, 0.0, 0.0], [0.2, 0.001, 0.0002]],
+        [[0.35, 0.0, 0.0], [0.3, 0.0, 0.0]],
+        [[-0.02, 0.0, 0.0], [-0.01, -0.0005, 0.0]])
+
+
+def test_evaluate():
+    table = __table()
+    assert len(table) == 2
+    eop = table.evaluate(np.array(['2022-09-29T06:00:00', '2022-09-28T00:00:00'], dtype='datetime64[s]'))
+    assert eop.xp[0] == pytest.approx((0.2 + 0.001 * 0.25 + 0.5 * 0.0002 * 0.0625) * ARCSECOND)
+    assert eop.yp[0] == pytest.approx(0.3 * ARCSECOND)
+    assert eop.ut1_utc[0] == pytest.approx(-0.01 - 0.0005 * 0.25)
+    assert np.isnan(eop.xp[1]) and np.isnan(eop.ut1_utc[1])  # before the first record
+    eop = table.evaluate(__TIMES)
+    assert eop.ut1_utc[:2].tolist() == [-0.02, -0.02]
+    assert np.isnan(eop.ut1_utc[2])
+    assert np.isnan(table.evaluate(__TIMES, max_age=3600).ut1_utc[1])
+    assert table.evaluate(np.array(['2022-09-28T23:00:00'], dtype='datetime64[s]'), latest=False).yp[0] == \
+        pytest.approx(0.3 * ARCSECOND)
+
+
+def test_earth_rotation_angle():
+    angle = earth_rotation_angle(np.array(['2000-01-01T12:00:00', '2000-01-02T12:00:00'], dtype='datetime64[ns]'))
+    assert angle[0] == pytest.approx(2 * np.pi * 0.7790572732640)
+    assert np.mod(angle[1] - angle[0], 2 * np.pi) == pytest.approx(2 * np.pi * 0.00273781191135448)
+
+
+def test_rotation_without_polar_motion():
+    table = EarthOrientationTable(np.array(['2022-09-29T00:00:00'], dtype='datetime64[ns]'),
+                                  [[0.0, 0.0, 0.0]], [[0.0, 0.0, 0.0]], [[0.0, 0.0, 0.0]])
+    eop = table.evaluate(__TIMES[:1])
+    angle = earth_rotation_angle(__TIMES[:1])[0]
+    matrix = terrestrial_to_celestial(__TIMES[:1], eop)[0]
+    expected = np.array([[np.cos(angle), -np.sin(angle), 0.0], [np.sin(angle), np.cos(angle), 0.0], [0.0, 0.0, 1.0]])
+    assert matrix == pytest.approx(expected, abs=1e-9)  # TIO locator s' is about 5e-11 rad
+    celestial = np.array([[[0.0, 1.0, 0.0], [-1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]])
+    assert terrestrial_to_celestial(__TIMES[:1], eop, celestial)[0] == pytest.approx(celestial[0] @ expected)
+
+
+def test_ecef_to_eci_round_trip_and_velocity():
+    table = __table()
+    times = __TIMES + np.timedelta64(60, 's')  # away from the switch of the records
+    eop = table.evaluate(times)
+    positions = np.array([[26000e3, 1e6, 1e5], [-1e7, 2e7, 5e6], [1.0, 2.0, 3.0]])
+    velocities = np.array([[100.0, 3000.0, -200.0], [-2500.0, -1000.0, 700.0], [0.0, 0.0, 0.0]])
+    eci, eci_velocities = ecef_to_eci(positions, times, eop, velocities)
+    assert np.isnan(eci[2]).all() and np.isnan(eci_velocities[2]).all()
+    assert np.linalg.norm(eci[:2], axis=-1) == pytest.approx(np.linalg.norm(positions[:2], axis=-1))
+    ecef, ecef_velocities = eci_to_ecef(eci, times, eop, eci_velocities)
+    assert ecef[:2] == pytest.approx(positions[:2], abs=1e-6)
+    assert ecef_velocities[:2] == pytest.approx(velocities[:2], abs=1e-9)
+
+    # velocity in the celestial frame is the derivative of the rotated positions
+    step = np.timedelta64(1, 's')
+    after = ecef_to_eci(positions + velocities, times + step, table.evaluate(times + step))
+    before = ecef_to_eci(positions - velocities, times - step, table.evaluate(times - step))
+    assert ((after - before) / 2.0)[:2] == pytest.approx(eci_velocities[:2], abs=1e-3)
+
+
+def test_rinex_earth_orientation():
+    rinex_nav_v4 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v4.22p")
+    table = rinex_nav_v4.earth_orientation()
+    assert len(table) == 1 and len(rinex_nav_v4.earth_orientation('G')) == 0
+    times = np.array(['2022-09-29T09:40:42'], dtype='datetime64[ns]')
+    eop = table.evaluate(times)
+    assert eop.xp[0] == pytest.approx(2.421438694000e-08 * ARCSECOND)
+    assert eop.yp[0] == pytest.approx(1.515520000000e+05 * ARCSECOND)
+    assert eop.ut1_utc[0] == 2.490368000000e+06
+    positions = np.array([[26000e3, 1e6, 1e5]])
+    assert rinex_nav_v4.eci_to_ecef(rinex_nav_v4.ecef_to_eci(positions, times), times) == pytest.approx(positions)
+
+    rinex_nav_v3 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v3.22p")
+    with pytest.raises(ValueError):
+        rinex_nav_v3.earth_orientation()
@@ -0,0 +1,191 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.navigation.ionosphere import BDS_B1C, BDS_B1I, GPS_L1, bdgim_broadcast_delay, bdgim_broadcast_tec, \
+    bdgim_non_broadcast_coefficients, bds_klobuchar_delay, klobuchar_delay, read_bdgim_table, tec_delay
+from tests import resources_path
+
+ALPHA = np.array([3.82e-8, 1.49e-8, -1.79e-7, 0.0])
+BETA = np.array([1.43e5, 0.0, -3.28e5, 1.13e5])
+
+
+def test_klobuchar_delay__reference_example():
+    # receiver at 40N 100W, satellite at azimuth 210 and elevation 20 degrees, 20:45 GPS time
+    time = np.datetime64('2022-01-01T20:45:00')
+    delay = klobuchar_delay(ALPHA, BETA, np.deg2rad(40), np.deg2rad(-100), np.deg2rad(210), np.deg2rad(20), time)
+    assert delay == pytest.approx(23.784, abs=1e-3)
+
+
+def test_klobuchar_delay__night_and_frequency():
+    times = np.array(['2022-01-01T00:00:00', '2022-01-01T20:45:00'], dtype='datetime64[ns]')
+    delay = klobuchar_delay(ALPHA, BETA, 0.0, 0.0, 0.0, np.pi / 2, times)
+    # at night only the constant 5 ns remain, scaled by the slant factor at zenith
+    assert delay[0] == pytest.approx(5e-9 * 299792458.0 * (1.0 + 16.0 * 0.03 ** 3))
+
+    l2 = klobuchar_delay(ALPHA, BETA, 0.0, 0.0, 0.0, np.pi / 2, times, frequency=1227.60e6)
+    assert l2 == pytest.approx(delay * (GPS_L1 / 1227.60e6) ** 2)
+
+
+def test_klobuchar_delay__broadcasting_and_missing_coefficients():
+    alpha = np.array([ALPHA, np.full(4, np.nan)])
+    beta = np.array([BETA, np.full(4, np.nan)])
+    times = np.array(['2022-01-01T20:45:00'] * 2, dtype='datetime64[ns]')
+    elevation = np.deg2rad([[20.0], [40.0], [60.0]])
+    delay = klobuchar_delay(alpha, beta, np.deg2rad(40), np.deg2rad(-100), np.deg2rad(210), elevation, times)
+    assert delay.shape == (3, 2)
+    assert np.isnan(delay[:, 1]).all()
+    assert delay[0, 0] == pytest.approx(23.784, abs=1e-3)
+    assert delay[0, 0] > delay[1, 0] > delay[2, 0]
+
+
+def test_bds_klobuchar_delay():
+    times = np.array(['2022-01-01T00:00:00', '2022-01-01T06:00:00'], dtype='datetime64[ns]')
+    delay = bds_klobuchar_delay(ALPHA, BETA, np.deg2rad(40), np.deg2rad(116), 0.0, np.pi / 2, times)
+    # 14:00 local time at the pierce point is the peak of the day
+    assert delay[1] == pytest.approx((5e-9 + np.polyval(ALPHA[::-1], 40.0 / 180.0)) * 299792458.0, rel=1e-3)
+    assert delay[0] < delay[1]
+    assert bds_klobuchar_delay(ALPHA, BETA, 0.0, 0.0, 0.0, np.pi / 2, times, frequency=BDS_B1I / 2) == \
+        pytest.approx(4 * bds_klobuchar_delay(ALPHA, BETA, 0.0, 0.0, 0.0, np.pi / 2, times))
+
+
+def test_klobuchar_coefficients__v4():
+    rinex = reader.read_rinex_file(str(resources_path/"navigation_v4.22p"))
+    times = np.array(['2022-09-29T09:00:00', '2022-09-29T10:00:00'], dtype='datetime64[ns]')
+    alpha, beta = rinex.klobuchar_coefficients('C', times)
+    assert alpha.shape == (2, 4)
+    assert np.isnan(alpha[0]).all()
+    # the latest of the C05 and C06 records
+    records = rinex.data.tables['ION_Klobuchar'].records
+    latest_record = records[np.argmax(records['epoch'])]
+    assert alpha[1, 0] == latest_record['Alpha0']
+    assert beta[1, 3] == latest_record['Beta3']
+
+    delay = rinex.klobuchar_delay('C', times, np.deg2rad(60), np.deg2rad(10), 0.0, np.pi / 4)
+    assert np.isnan(delay[0]) and delay[1] > 0
+    with pytest.raises(ValueError):
+        rinex.klobuchar_coefficients('E', times)
+
+
+def test_klobuchar_coefficients__v3():
+    rinex = reader.read_rinex_file(str(resources_path/"header_v3.22p"))
+    corrections = rinex.header.corrections['ION']
+    times = np.array(['2022-09-29T00:30:00', '2022-09-29T23:30:00'], dtype='datetime64[ns]')
+    alpha, beta = rinex.klobuchar_coefficients('G', times)
+    assert alpha[0, 0] == alpha[1, 0] == corrections['G']['NO_TIME'].Alpha0
+    assert beta[1, 3] == corrections['G']['NO_TIME'].Beta3
+
+    bds_name = [name for name in corrections if name[0] == 'C'][0]
+    bds_marks = sorted(corrections[bds_name])
+    alpha, _ = rinex.klobuchar_coefficients(bds_name, times)
+    assert alpha[0, 1] == corrections[bds_name][bds_marks[0]].Alpha1
+
+    # sets of all BDS satellites are merged, the set of the hour or the latest one before it is used
+    alpha, beta = rinex.klobuchar_coefficients('C', ['2022-09-29T00:30:00', '2022-09-29T03:10:00',
+                                                     '2022-09-29T10:00:00', '2022-09-29T23:30:00'])
+    assert alpha[:, 0].tolist() == [corrections['C13']['A'].Alpha0, corrections['C5']['D'].Alpha0,
+                                    corrections['C26']['E'].Alpha0, corrections['C8']['X'].Alpha0]
+    assert beta[3, 2] == corrections['C8']['X'].Beta2
+    # satellites without own coefficients use the coefficients of their GNSS
+    alpha, _ = rinex.klobuchar_coefficients('G01', times)
+    assert alpha[0, 0] == corrections['G']['NO_TIME'].Alpha0
+    assert np.isfinite(rinex.klobuchar_delay('G', times, 1.0, 0.2, 0.0, 0.5)).all()
+
+
+def test_bdgim_broadcast_tec():
+    times = np.array(['2022-01-01T00:00:00', '2022-01-01T12:00:00'], dtype='datetime64[ns]')
+    alpha = np.zeros(9)
+    alpha[0] = 10.0
+    # only the constant term: vertical TEC is Alpha1 everywhere
+    assert bdgim_broadcast_tec(alpha, np.deg2rad(40), np.deg2rad(116), 0.0, np.pi / 2, times, a0=0.0) == \
+        pytest.approx([10.0, 10.0])
+    assert bdgim_broadcast_tec(alpha, np.deg2rad(40), np.deg2rad(116), 0.0, np.pi / 2, times, a0=5.0) == \
+        pytest.approx([15.0, 15.0])
+    slant = bdgim_broadcast_tec(alpha, np.deg2rad(40), np.deg2rad(116), 0.0, np.deg2rad(10), times, a0=0.0)
+    assert (slant > 20.0).all()
+
+    # sun-fixed terms change with the time of day, negative vertical TEC is cut at zero
+    alpha[2] = 5.0
+    tec = bdgim_broadcast_tec(alpha, 0.0, 0.0, 0.0, np.pi / 2, times, a0=0.0)
+    assert tec[0] != pytest.approx(tec[1])
+    assert bdgim_broadcast_tec(-alpha, 0.0, 0.0, 0.0, np.pi / 2, times, a0=0.0) == pytest.approx([0.0, 0.0])
+    assert np.isnan(bdgim_broadcast_tec(np.full(9, np.nan), 0.0, 0.0, 0.0, np.pi / 2, times, a0=0.0)).all()
+    with pytest.raises(ValueError):
+        bdgim_broadcast_tec(alpha, 0.0, 0.0, 0.0, np.pi / 2, times)
+
+    delay = bdgim_broadcast_delay(alpha, 0.0, 0.0, 0.0, np.pi / 2, times, a0=0.0)
+    assert delay == pytest.approx(40.3e16 * tec / BDS_B1C ** 2)
+    assert tec_delay(1.0, GPS_L1) == pytest.approx(0.1624, abs=1e-4)
+
+
+def test_bdgim_non_broadcast(tmp_path):
+    # constant Beta1 and Beta13 = cos(2 pi t / 4 days), all other coefficients 0
+    constant, periodic = np.zeros(35), np.zeros(35)
+    constant[1] = 1.0
+    periodic[0], periodic[13] = 4.0, 2.0
+    path = tmp_path / "bdgim.txt"
+    path.write_text("# period, a1..a17, b1..b17\n" + "\n".join(" ".join(str(v) for v in row)
+                                                               for row in (constant, periodic)) + "\n")
+    table = read_bdgim_table(str(path))
+    assert table[0].tolist() == [0.0, 4.0]
+    assert table[1].shape == table[2].shape == (2, 17)
+
+    # MJD 59580 is a multiple of the period
+    times = np.array(['2022-01-01T00:00:00', '2022-01-02T00:00:00'], dtype='datetime64[ns]')
+    beta = bdgim_non_broadcast_coefficients(table, times)
+    assert beta[:, 0] == pytest.approx([1.0, 1.0])
+    assert beta[:, 12] == pytest.approx([2.0, 0.0], abs=1e-9)
+    assert (beta[:, 1:12] == 0.0).all()
+
+    # at the geomagnetic pole the zonal harmonics of degree n are sqrt(2n + 1), the others vanish
+    alpha = np.zeros(9)
+    alpha[0] = 10.0
+    pole = np.deg2rad(80.27), np.deg2rad(-72.58)
+    tec = bdgim_broadcast_tec(alpha, *pole, 0.0, np.pi / 2, times, table)
+    assert tec == pytest.approx([10.0 + np.sqrt(7.0) + 2.0 * np.sqrt(11.0), 10.0 + np.sqrt(7.0)])
+    assert bdgim_broadcast_tec(alpha, *pole, 0.0, np.pi / 2, times, table, a0=1.0) == pytest.approx([11.0, 11.0])
+    assert bdgim_broadcast_delay(alpha, *pole, 0.0, np.pi / 2, times, table) == pytest.approx(tec_delay(tec, BDS_B1C))
+
+    path.write_text("0.0 1.0 2.0\n")
+    with pytest.raises(ValueError):
+        read_bdgim_table(str(path))
+
+
+def test_ion_model_coefficients__v4(tmp_path):
+    content = (resources_path/"navigation_v4.22p").read_text()
+    records = (
+        "> ION E01 IFNV\n"
+        "    2022 09 29 09 40 00 6.250000000000e+01 7.031250000000e-01 1.000000000000e-02\n"
+        "     0.000000000000e+00\n"
+        "> ION C19 CNVX\n"
+        "    2022 09 29 09 00 00 1.000000000000e+01 2.000000000000e+00 3.000000000000e+00\n"
+        "     4.000000000000e+00 5.000000000000e+00 6.000000000000e+00 7.000000000000e+00\n"
+        "     8.000000000000e+00 9.000000000000e+00\n"
+    )
+    path = tmp_path / "navigation_v4_ion.22p"
+    path.write_text(content.replace("> EPH G01 LNAV\n", records + "> EPH G01 LNAV\n"))
+    rinex = reader.read_rinex_file(str(path))
+    times = np.array(['2022-09-29T09:00:00', '2022-09-29T10:00:00'], dtype='datetime64[ns]')
+
+    ai = rinex.nequick_coefficients('E', times)
+    assert ai.shape == (2, 3)
+    assert np.isnan(ai[0]).all()
+    assert ai[1] == pytest.approx([62.5, 0.703125, 0.01])
+
+    alpha = rinex.bdgim_coefficients('C19', times)
+    assert alpha[0] == pytest.approx(np.arange(1.0, 10.0) * [10, 1, 1, 1, 1, 1, 1, 1, 1])
+    assert np.isfinite(rinex.bdgim_broadcast_delay('C', times, 0.5, 2.0, 0.0, 0.7, a0=0.0)).all()
+    with pytest.raises(ValueError):
+        rinex.bdgim_broadcast_delay('C', times, 0.5, 2.0, 0.0, 0.7)
+    # Klobuchar records are read apart from the other models
+    assert set(rinex.data.tables['ION_Klobuchar'].records['sv']) == {'C05', 'C06'}
+    with pytest.raises(ValueError):
+        rinex.bdgim_coefficients('G', times)
+
+
+def test_nequick_coefficients__v3():
+    rinex = reader.read_rinex_file(str(resources_path/"header_v3.22p"))
+    ai = rinex.nequick_coefficients('E', np.array(['2022-09-29T10:00:00'], dtype='datetime64[ns]'))
+    assert ai[0] == pytest.approx([-2.0489E-08, 1.4901E-08, -1.1921E-07])
+    with pytest.raises(ValueError):
+        rinex.bdgim_coefficients('C', np.array(['2022-09-29T10:00:00'], dtype='datetime64[ns]'))
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.navigation.keplerian import is_bds_geo, keplerian_states, seconds_of_week, solve_kepler, wrap_week
+from tests import resources_path
+
+
+def __states(file_name: str, table: str, sv: str, seconds):
+    rinex = reader.read_rinex_file(str(resources_path/file_name))
+    records = rinex.data.tables[table].records
+    record = records[records['sv'] == sv][:1]
+    times = record['epoch'][0] + np.array(seconds) * np.timedelta64(1, 'ms')
+    return record, keplerian_states(np.repeat(record, len(times)), times)
+
+
+@pytest.mark.parametrize("file_name, table, sv, radius", [
+    ("navigation_v4.22p", 'GPS_LNAV', 'G01', 26600e3),
+    ("navigation_v4.22p", 'GAL_INAV_FNAV', 'E09', 29600e3),
+    ("navigation_v4.22p", 'BDS_D1_D2', 'C05', 42164e3),  # GEO
+    ("navigation_v3.22p", 'BDS', 'C11', 27900e3),
+    ("navigation_v3.22p", 'GPS', 'G03', 26600e3),
+])
+def test_keplerian_states(file_name, table, sv, radius):
+    record, states = __states(file_name, table, sv, [0, 599500, 600000, 600500])
+    assert states.position.shape == (4, 3)
+    assert np.linalg.norm(states.position, axis=1) == pytest.approx(radius, rel=0.01)
+    # velocity is the derivative of position
+    finite_difference = states.position[3] - states.position[1]
+    assert states.velocity[2] == pytest.approx(finite_difference, abs=1e-3)
+    # clock polynomial starts at the epoch of the record
+    assert states.clock_bias[0] - states.relativistic[0] == pytest.approx(record['clock_bias'][0], abs=1e-15)
+    assert abs(states.relativistic[2]) < 1e-7
+    assert (states.clock_bias[3] - states.clock_bias[1]) == pytest.approx(states.clock_drift[2], abs=1e-15)
+
+
+def test_bds_geo_velocity_is_small():
+    _, states = __states("navigation_v4.22p", 'BDS_D1_D2', 'C05', [0, 3600000])
+    assert np.all(np.linalg.norm(states.velocity, axis=1) < 300)
+
+
+def test_missing_records_and_unsupported_gnss():
+    rinex = reader.read_rinex_file(str(resources_path/"navigation_v4.22p"))
+    records = rinex.find_closest_match_records('GPS_LNAV', ['G01', 'G02'], ['2022-09-29T10:00:00'] * 2)
+    states = keplerian_states(records, np.array(['2022-09-29T10:00:00'] * 2, dtype='datetime64[ns]'))
+    assert np.isfinite(states.position[0]).all()
+    assert np.isnan(states.position[1]).all() and np.isnan(states.clock_bias[1])
+
+    rinex = reader.read_rinex_file(str(resources_path/"navigation_v3.22p"))
+    glonass = rinex.data.tables['GLOv3_05'].records
+    with pytest.raises(ValueError):
+        keplerian_states(glonass, glonass['epoch'])
+
+
+def test_helpers():
+    assert is_bds_geo(['C01', 'C05', 'C06', 'C59', 'C63', 'G01', '']).tolist() == \
+           [True, True, False, True, True, False, False]
+    assert seconds_of_week(np.array(['2022-09-25T00:00:00', '2022-09-29T10:00:00'], dtype='datetime64[ns]')).tolist() == \
+           [0.0, 381600.0]
+    assert wrap_week(np.array([604700.0, -604700.0, 10.0])).tolist() == [-100.0, 100.0, 10.0]
+    mean_anomaly = np.linspace(-np.pi, np.pi, 101)
+    eccentricity = np.full(101, 0.02)
+    eccentric_anomaly = solve_kepler(mean_anomaly, eccentricity)
+    assert eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly) == pytest.approx(mean_anomaly, abs=1e-13)
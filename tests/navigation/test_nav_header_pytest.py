@@ -20,6 +20,10 @@ def test_read_navigation_header_v3():
         assert result.corrections['ION']['C8']['X'].Beta0 == 1.5155E+05
         assert result.corrections['ION']['E']['NO_TIME'].ai0 == -2.0489E-08
         assert result.corrections['ION']['G']['NO_TIME'].Alpha0 == 2.0489E-08
+        assert result.corrections['STO'].keys() == {'GPUT', 'GLGP'}
+        assert result.corrections['STO']['GPUT']['2022-09-24T19:50:24'].A1 == 1.243449788E-14
+        assert result.corrections['STO']['GLGP']['2022-09-29T00:00:00'].A0 == 4.5634806156E-08
+        assert result.leap_seconds.current == 18
         assert len(result.other) == 3
 
 
@@ -81,6 +81,31 @@ def test_read_navigation_blocks_v305__valid():
         assert result.satellites["E05"]['2022-09-29T09:50:00'].TGD == result.satellites["E05"]['2022-09-29T09:50:00'].BGD_E5b_E1
 
 
+def test_read_navigation_blocks_v3__sv_filter():
+    with (resources_path/"navigation_v3.22p").open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v3(file=f, version=3.05, file_type='N', gnss='M')
+        result = read_navigation_blocks_v3(file=f, version=3.05, sv=['R19', 'E05', 'G01'])
+        assert result.satellites.keys() == {'E05', 'R19'}
+        assert result.satellites["R19"].keys() == {'2022-09-29T10:45:00'}
+
+
+@pytest.mark.parametrize("start_epoch, end_epoch, gnss, expected_sv", [
+    (datetime(2022, 9, 29, 10), None, None, {'C11'}),
+    (datetime(2022, 9, 29, 10, 0, 0, 500), None, None, set()),
+    (datetime(2022, 9, 29, 9, 59, 59, 500), datetime(2022, 9, 29, 10, 45), None, {'C11', 'R19'}),
+    (None, None, ['E', 'G'], {'E05', 'G03'}),
+    (datetime(2022, 9, 29, 9), datetime(2022, 9, 29, 11), ['R', 'G'], {'R19'}),
+])
+def test_read_navigation_blocks_v3__epoch_and_gnss_filter(start_epoch, end_epoch, gnss, expected_sv):
+    with (resources_path/"navigation_v3.22p").open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v3(file=f, version=3.05, file_type='N', gnss='M')
+        result = read_navigation_blocks_v3(file=f, version=3.05, start_epoch=start_epoch, end_epoch=end_epoch,
+                                           gnss=gnss)
+        assert result.satellites.keys() == expected_sv
+
+
 def test_read_navigation_blocks_v3__invalid():
     with pytest.raises(ValueError) as e_info:
         with (resources_path/"navigation_v3_invalid.22p").open() as f:
@@ -10,6 +10,11 @@ from nmbu.rinex.navigation.v4.nav_message_type.BDS_D1_D2 import BDSD1D2Record
 from nmbu.rinex.navigation.v4.nav_message_type.GPS_CNAV import GPSCNAVRecord
 from nmbu.rinex.navigation.v4.nav_message_type.GPS_CNAV2 import GPSCNAV2Record
 from nmbu.rinex.navigation.v4.nav_message_type.GPS_LNAV import GPSLNAVRecord
+from nmbu.rinex.navigation.v4.nav_message_type.EOP import EOPNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.ION_BDGIM import IONBDGIMNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.ION_Klobuchar import IONKlobNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.ION_Nequick import IONNeqNavRecord
+from nmbu.rinex.navigation.v4.nav_message_type.STO import STONavRecord
 from nmbu.rinex.navigation.v4.navigation import read_navigation_blocks_v4, __read_start_line
 from tests import resources_path
 
@@ -29,9 +34,11 @@ timestamp = datetime(2022, 9, 29, 9, 50, 0).isoformat()
      ]
 )
 def test_read_epoch_line(sv, navtype, expected_record_type):
-    record, valid, size = __read_start_line("> EPH {sv:s} {navtype:s}".format(sv=sv, navtype=navtype))
+    spec, record_sv, valid = __read_start_line("> EPH {sv:s} {navtype:s}".format(sv=sv, navtype=navtype))
+    assert valid and record_sv == sv
+    record = spec.record_class(record_sv)
     assert isinstance(record, expected_record_type)
-    assert record.block_size == expected_record_type.block_size
+    assert spec.block_size == expected_record_type.block_size
 
     record.read_epoch_line(sv + " 2022 09 29 09 50 00 2.758218906820e-04-6.366462912410e-12 0.000000000000e+00")
     assert record.timestamp == timestamp
@@ -40,6 +47,32 @@ def test_read_epoch_line(sv, navtype, expected_record_type):
     assert record.clock_drift_rate == 0.000000000000E+00
 
 
+@pytest.mark.parametrize("line, expected_record_type",
+    [
+        ("> ION G01 LNAV", IONKlobNavRecord),
+        ("> ION C06 D1D2", IONKlobNavRecord),
+        ("> ION E01 IFNV", IONNeqNavRecord),
+        ("> ION C19 CNVX", IONBDGIMNavRecord),
+        ("> ION J01 CNVX", IONKlobNavRecord),
+        ("> STO G   LNAV", STONavRecord),
+        ("> EOP J01 CNVX", EOPNavRecord),
+     ]
+)
+def test_read_start_line__corrections(line, expected_record_type):
+    spec, record_sv, valid = __read_start_line(line)
+    assert spec.record_class is expected_record_type
+    assert spec.target == expected_record_type.nav_message_type
+
+
+def test_read_start_line__unknown_type():
+    spec, record_sv, valid = __read_start_line("> EPH G01 XNAV")
+    assert spec is None and not valid
+    spec, record_sv, valid = __read_start_line("> XYZ G01 LNAV")
+    assert spec is None and not valid
+    spec, record_sv, valid = __read_start_line("> ION E01 LNAV")
+    assert spec is None and not valid
+
+
 def test_read_navigation_blocks_v4__valid():
     with (resources_path/"navigation_v4.22p").open() as f:
         first_line = next(f)  # simulate reading first line
@@ -60,6 +93,78 @@ def test_read_navigation_blocks_v4__valid():
         assert result.corrections['EOP']['J01'].keys() == {'2022-09-29T09:40:42'}
 
 
+def test_read_navigation_blocks_v4__sv_filter():
+    with (resources_path/"navigation_v4.22p").open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v4(file=f, version=4.00, file_type='N', gnss='M')
+        result = read_navigation_blocks_v4(file=f, sv=['C05', 'E09'])
+        assert result.satellites.keys() == {'C05', 'E09'}
+        assert result.corrections['STO'] == {}
+        assert result.corrections['ION'].keys() == {'C05'}
+        assert result.corrections['EOP'] == {}
+
+
+def test_read_navigation_blocks_v4__epoch_filter():
+    with (resources_path/"navigation_v4.22p").open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v4(file=f, version=4.00, file_type='N', gnss='M')
+        result = read_navigation_blocks_v4(file=f, start_epoch=datetime(2022, 9, 29, 9, 20),
+                                           end_epoch=datetime(2022, 9, 29, 9, 50))
+        assert result.satellites.keys() == {'E09'}
+        assert result.corrections['STO'] == {}
+        assert result.corrections['ION'].keys() == {'C06', 'C05'}
+        assert result.corrections['EOP'].keys() == {'J01'}
+
+
+def test_read_navigation_blocks_v4__gnss_filter():
+    with (resources_path/"navigation_v4.22p").open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v4(file=f, version=4.00, file_type='N', gnss='M')
+        result = read_navigation_blocks_v4(file=f, gnss=['C', 'G'], start_epoch=datetime(2022, 9, 24, 19, 50, 24))
+        assert result.satellites == {}
+        assert result.corrections['STO'].keys() == {'G'}
+        assert result.corrections['ION'] == {}
+        assert result.corrections['EOP'] == {}
+
+
+def test_read_navigation_blocks_v4__unknown_type(tmp_path):
+    content = (resources_path/"navigation_v4.22p").read_text()
+    unknown_record = (
+        "> EPH G07 XNAV\n"
+        "G07 2022 09 29 10 00 00 2.758218906820e-04-6.366462912410e-12 0.000000000000e+00\n"
+        "     1.000000000000e+00 2.000000000000e+00 3.000000000000e+00 4.000000000000e+00\n"
+    )
+    path = tmp_path / "navigation_v4_unknown.22p"
+    path.write_text(content.replace("> EPH G01 LNAV\n", unknown_record + "> EPH G01 LNAV\n"))
+    with path.open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v4(file=f, version=4.00, file_type='N', gnss='M')
+        result = read_navigation_blocks_v4(file=f)
+    assert result.satellites.keys() == {'G01', 'C05', 'E09'}
+    assert result.corrections['EOP'].keys() == {'J01'}
+
+
+def test_read_navigation_blocks_v4__ion_models(tmp_path):
+    content = (resources_path/"navigation_v4.22p").read_text()
+    nequick_record = (
+        "> ION E01 IFNV\n"
+        "    2022 09 29 09 40 00 6.250000000000e+01 7.031250000000e-01 1.000000000000e-02\n"
+        "     0.000000000000e+00\n"
+    )
+    path = tmp_path / "navigation_v4_nequick.22p"
+    path.write_text(content.replace("> EPH G01 LNAV\n", nequick_record + "> EPH G01 LNAV\n"))
+    with path.open() as f:
+        next(f)  # simulate reading first line
+        read_navigation_header_v4(file=f, version=4.00, file_type='N', gnss='M')
+        result = read_navigation_blocks_v4(file=f)
+    assert result.corrections['ION'].keys() == {'C06', 'C05', 'E01'}
+    nequick = result.corrections['ION']['E01']['2022-09-29T09:40:00']
+    assert nequick.ai0 == 62.5
+    assert nequick.ai1 == 0.703125
+    assert nequick.dist_flag == 0.0
+    assert result.corrections['ION']['C06']['2022-09-29T09:40:42'].Alpha0 == 2.421438694000e-08
+
+
 def test_read_navigation_blocks_v4__invalid():
     with pytest.raises(ValueError) as e_info:
         with (resources_path/"navigation_v4_invalid.22p").open() as f:
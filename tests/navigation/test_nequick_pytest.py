@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex.navigation.nequick import F2_SHAPE, FM3_SHAPE, MODIP_SHAPE, NeQuickG, effective_ionisation, \
+    electron_density, nequick_modip, profile_parameters, read_nequick_maps
+
+# maps with constant foF2 = 8 MHz and M(3000)F2 = 3, modip equal to the latitude
+F2 = np.zeros((12,) + F2_SHAPE)
+F2[:, :, 0, 0] = 8.0
+FM3 = np.zeros((12,) + FM3_SHAPE)
+FM3[:, :, 0, 0] = 3.0
+MODIP = np.repeat(np.clip(-95.0 + 5.0 * np.arange(39), -90.0, 90.0)[:, None], 39, axis=1)
+
+RECEIVER = np.array([np.deg2rad(40.0), 0.0, 0.0])
+TIME = np.datetime64('2022-06-01T12:00:00', 'ns')
+AI = np.array([80.0, 0.0, 0.0])
+
+
+def test_nequick_modip():
+    assert nequick_modip(MODIP, [10.0, 33.3, -90.0, 90.0], [5.0, 179.0, -180.0, 0.0]) == \
+        pytest.approx([10.0, 33.3, -90.0, 90.0])
+    # longitude wraps around
+    assert nequick_modip(MODIP, 12.5, 185.0) == pytest.approx(nequick_modip(MODIP, 12.5, -175.0))
+
+
+def test_effective_ionisation():
+    assert effective_ionisation([[0.0, 0.0, 0.0], [80.0, 1.0, 0.01], [500.0, 0.0, 0.0]], [20.0, 20.0, 0.0]) == \
+        pytest.approx([63.7, 104.0, 400.0])
+
+
+def test_electron_density__peak():
+    profile = profile_parameters(40.0, 40.0, 0.0, 12.0, 6, 80.0, F2[5, 0, :, 0], FM3[5, 0, :, 0], 0.0, 1.0)
+    assert profile.foF2 == pytest.approx(8.0)
+    assert profile.NmF2 == pytest.approx(0.124 * 64.0)
+    assert 200.0 < profile.hmF2 < 400.0
+    heights = np.array([50.0, profile.hmF2, 1000.0])
+    density = electron_density(profile, heights)
+    # E and F1 layers vanish at the F2 peak
+    assert density[1] == pytest.approx(profile.NmF2 * 1e11)
+    assert density[0] < density[2] < density[1]
+
+
+def test_electron_density__chapman_layer():
+    profile = profile_parameters(40.0, 40.0, 0.0, 12.0, 6, 80.0, F2[5, 0, :, 0], FM3[5, 0, :, 0], 0.0, 1.0)
+    step = 0.01
+    below = electron_density(profile, [100.0 - 2 * step, 100.0 - step])
+    above = electron_density(profile, [100.0, 100.0 + step])
+    # value and slope of the Chapman layer match the bottomside at 100 km
+    assert below[1] == pytest.approx(above[0], rel=1e-3)
+    slope_below, slope_above = (below[1] - below[0]) / step, (above[1] - above[0]) / step
+    assert slope_below > 0.0
+    assert slope_below == pytest.approx(slope_above, rel=0.1)
+
+
+def test_stec():
+    model = NeQuickG(F2, FM3, MODIP)
+    vertical = model.stec(AI, RECEIVER, [RECEIVER[0], RECEIVER[1], 20000e3], TIME)
+    satellites = np.array([[np.deg2rad(40.0), 0.0, 20000e3], [np.deg2rad(10.0), np.deg2rad(30.0), 20000e3],
+                           [np.nan, 0.0, 20000e3]])
+    tec = model.stec(AI, RECEIVER, satellites, TIME)
+    assert tec.shape == (3,)
+    assert tec[0] == pytest.approx(vertical)
+    assert 10.0 < vertical < 100.0
+    assert tec[1] > tec[0]
+    assert np.isnan(tec[2])
+
+    # batches match single rays and a much finer integration
+    assert tec[1] == pytest.approx(model.stec(AI, RECEIVER, satellites[1], TIME))
+    fine = NeQuickG(F2, FM3, MODIP, intervals=(200, 20, 20), order=10)
+    assert tec[:2] == pytest.approx(fine.stec(AI, RECEIVER, satellites[:2], TIME), rel=1e-3)
+    assert model.delay(AI, RECEIVER, satellites[:2], TIME) == pytest.approx(40.3e16 * tec[:2] / 1575.42e6 ** 2)
+
+
+def test_stec__cache():
+    model = NeQuickG(F2, FM3, MODIP, chunk_size=2)
+    times = np.array([TIME, TIME, TIME + np.timedelta64(3600, 's'), np.datetime64('NaT')])
+    tec = model.stec(AI, RECEIVER, [np.deg2rad(30.0), 0.0, 20000e3], times)
+    assert len(model) == 2  # one entry for every (month, UT) pair
+    assert tec[0] == tec[1] and tec[0] != tec[2]
+    assert np.isnan(tec[3])
+    assert model.stec(AI, RECEIVER, [np.deg2rad(30.0), 0.0, 20000e3], times[:3]) == pytest.approx(tec[:3])
+    model.clear()
+    assert len(model) == 0
+
+
+def test_read_nequick_maps(tmp_path):
+    for month in range(1, 13):
+        values = np.concatenate([F2[month - 1].ravel() + month, FM3[month - 1].ravel()])
+        (tmp_path / "ccir{m:d}.asc".format(m=month + 10)).write_text(
+            "\n".join(" ".join("{v:.8E}".format(v=value) for value in values[i:i + 4])
+                      for i in range(0, len(values), 4)))
+    (tmp_path / "modipNeQG_wrapped.asc").write_text(" ".join(str(value) for value in MODIP.ravel()))
+    f2, fm3, modip = read_nequick_maps(str(tmp_path))
+    assert f2.shape == (12,) + F2_SHAPE and fm3.shape == (12,) + FM3_SHAPE and modip.shape == MODIP_SHAPE
+    assert f2[2, 0, 0, 0] == 11.0
+    assert (modip == MODIP).all()
+
+    (tmp_path / "modipNeQG_wrapped.asc").write_text("1.0 2.0")
+    with pytest.raises(ValueError):
+        read_nequick_maps(str(tmp_path))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.common.nav_table import SATELLITES, NavTableBuilder
+from nmbu.rinex.navigation.state_vector import StateVectorPropagator, rk4
+from nmbu.rinex.navigation.v3.nav_message_type.SBAS import SBASNavRecord, SBASNavRecordOrbitData
+from tests import resources_path
+
+
+def test_rk4__icd_example():
+    # example of GLONASS ICD: state at tb = 11700 s is propagated to 12300 s
+    state = np.array([[7003.008789, -12206.626953, 21280.765625, 0.7835417, 2.8042530, 1.3525150]]) * 1000
+    acceleration = np.array([[0.0, 1.7e-9, -5.41e-9]]) * 1000
+    result = rk4(state, acceleration, np.array([600.0]), 10) / 1000
+    assert result[0, :3] == pytest.approx([7523.174819, -10506.961965, 21999.239413], abs=1e-3)
+    assert result[0, 3:] == pytest.approx([0.950126007, 2.855687825, 1.040679862], abs=1e-5)
+
+
+def test_propagate__glonass():
+    rinex = reader.read_rinex_file(str(resources_path/"navigation_v3.22p"))
+    records = rinex.data.tables['GLOv3_05'].records
+    epoch = records['epoch'][0]
+    propagator = StateVectorPropagator()
+
+    states = propagator.propagate(records, records['epoch'])
+    assert states.position[0] == pytest.approx(
+        [records['SV_pos_X'][0] * 1000, records['SV_pos_Y'][0] * 1000, records['SV_pos_Z'][0] * 1000])
+    assert states.clock_bias[0] == records['clock_bias'][0]
+    assert len(propagator) == 1
+
+    # epoch by epoch propagation continues from the last state and matches a single long integration
+    for second in range(1, 301):
+        states = propagator.propagate(records, np.array([epoch + np.timedelta64(second, 's')]))
+    direct = StateVectorPropagator().propagate(records, np.array([epoch + np.timedelta64(300, 's')]))
+    assert states.position[0] == pytest.approx(direct.position[0], abs=1e-3)
+    assert states.velocity[0] == pytest.approx(direct.velocity[0], abs=1e-6)
+    assert np.linalg.norm(states.position[0]) == pytest.approx(25510e3, rel=0.01)
+    assert states.clock_bias[0] == pytest.approx(records['clock_bias'][0] + 300 * records['relative_frequency_bias'][0])
+
+    propagator.clear()
+    assert len(propagator) == 0
+
+
+def test_propagate__sbas_and_missing_records():
+    builder = NavTableBuilder('SBAS', SATELLITES, SBASNavRecord, SBASNavRecordOrbitData,
+                              ('clock_bias', 'relative_frequency_bias', 'msg_transmission_time'))
+    builder.add_block('S27', "S27 2022 09 29 10 00 00 1.000000000000E-06 1.000000000000E-12 0.000000000000E+00\n", [
+        "     4.200000000000E+04 1.000000000000E-03 1.000000000000E-06 0.000000000000E+00\n",
+        "     1.000000000000E+03 0.000000000000E+00 0.000000000000E+00 0.000000000000E+00\n",
+        "     0.000000000000E+00 0.000000000000E+00 0.000000000000E+00 0.000000000000E+00\n",
+    ])
+    records = np.concatenate([builder.build().records, np.zeros(1, dtype=builder.build().records.dtype)])
+    records['epoch'][1] = np.datetime64('NaT')
+    times = np.array(['2022-09-29T10:01:40', '2022-09-29T10:01:40'], dtype='datetime64[ns]')
+    states = StateVectorPropagator().propagate(records, times)
+    assert states.position[0] == pytest.approx([42000e3 + 100 + 0.5 * 1e-3 * 1e4, 1000e3, 0.0])
+    assert states.velocity[0] == pytest.approx([1.0 + 0.1, 0.0, 0.0])
+    assert states.clock_bias[0] == pytest.approx(1e-6 + 1e-10)
+    assert np.isnan(states.position[1]).all() and np.isnan(states.clock_bias[1])
+
+
+def test_propagate__unsupported_gnss():
+    rinex = reader.read_rinex_file(str(resources_path/"navigation_v3.22p"))
+    with pytest.raises(ValueError):
+        StateVectorPropagator().propagate(rinex.data.tables['GPS'].records, rinex.data.tables['GPS'].records['epoch'])
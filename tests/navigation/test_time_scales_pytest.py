@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from nmbu.rinex import reader
+from nmbu.rinex.navigation.time_scales import LeapSeconds, TimeScaleCorrections, read_leap_seconds
+from tests import resources_path
+
+__TIMES = np.array(['2022-09-29T10:00:00', 'NaT'], dtype='datetime64[ns]')
+
+
+def test_read_leap_seconds():
+    leap = read_leap_seconds("    18    19  2185     7GPS                                 LEAP SECONDS")
+    assert leap.current == 18 and leap.future == 19
+    # leap second is inserted at midnight UTC, i.e. 18 seconds after midnight GPS
+    assert leap.change == np.datetime64('2021-11-28T00:00:18', 'ns')
+    assert leap.at(np.array(['2021-11-28T00:00:00', '2021-11-28T00:00:17', '2021-11-28T00:00:18'],
+                            dtype='datetime64[s]')).tolist() == [18, 18, 19]
+    assert read_leap_seconds("     4                                                      LEAP SECONDS").current == 4
+    assert LeapSeconds(4, system='BDS').current == 18
+    with pytest.raises(ValueError):
+        read_leap_seconds("                                                            LEAP SECONDS")
+
+
+def test_leap_seconds__change_at_midnight_utc():
+    # BDT - UTC is 4 seconds before the change, BDT is 14 seconds behind GPS
+    leap = read_leap_seconds("     4     5   829     6BDS                                 LEAP SECONDS")
+    midnight = np.datetime64('2006-01-01', 'ns') + np.timedelta64(829 * 7 + 7, 'D')  # end of day 6 in BDT
+    assert leap.change == midnight + np.timedelta64(14 + 4, 's')
+    times = leap.change + np.array([-1, 0], dtype='timedelta64[s]')
+    assert leap.at(times).tolist() == [18, 19]
+
+    # the last GPS seconds before the leap second are still converted with the current leap seconds
+    corrections = TimeScaleCorrections(['GPUT'], np.array(['NaT'], dtype='datetime64[ns]'), [[0.0, 0.0, 0.0]],
+                                       read_leap_seconds("    18    19  2185     7GPS              LEAP SECONDS"))
+    utc = corrections.convert(np.array(['2021-11-28T00:00:17', '2021-11-28T00:00:18'], dtype='datetime64[ns]'),
+                              'GPS', 'UTC')
+    assert utc.tolist() == np.array(['2021-11-27T23:59:59', '2021-11-27T23:59:59'], dtype='datetime64[ns]').tolist()
+
+
+def test_offset_and_conversion():
+    corrections = TimeScaleCorrections(
+        ['GPUT', 'GPUT', 'GAGP', 'GLUT'],
+        np.array(['2022-09-29T00:00:00', '2022-09-29T12:00:00', '2022-09-29T00:00:00', 'NaT'], dtype='datetime64[ns]'),
+        [[1e-9, 1e-13, 0.0], [2e-9, 0.0, 0.0], [-3e-9, 0.0, 1e-18], [5e-8, 0.0, 0.0]],
+        LeapSeconds(18))
+    assert corrections.codes == ['GAGP', 'GLUT', 'GPUT']
+    assert corrections.offset(__TIMES, 'GPUT')[0] == pytest.approx(1e-9 + 1e-13 * 36000)
+    assert corrections.offset(np.array(['2022-09-29T13:00:00'], dtype='datetime64[s]'), 'GPUT')[0] == 2e-9
+    assert corrections.offset(__TIMES, 'GPUT', latest=False)[0] == 2e-9  # the closest set
+    assert np.isnan(corrections.offset(__TIMES, 'GPUT')[1])
+    assert corrections.offset(__TIMES, 'GLUT')[0] == 5e-8  # sets without reference time are always used
+    assert np.isnan(corrections.offset(np.array(['2022-09-28T00:00:00'], dtype='datetime64[s]'), 'GPUT')[0])
+
+    gps_utc = 18 + 1e-9 + 1e-13 * 36000
+    assert corrections.difference(__TIMES, 'GPS', 'UTC')[0] == pytest.approx(gps_utc, abs=1e-15)
+    assert corrections.difference(__TIMES, 'UTC', 'GPS')[0] == pytest.approx(-gps_utc, abs=1e-15)
+    gal_utc = 18 + (-3e-9 + 1e-18 * 36000 ** 2) + 1e-9 + 1e-13 * 36000  # through GPS
+    assert corrections.difference(__TIMES, 'GAL', 'UTC')[0] == pytest.approx(gal_utc, abs=1e-15)
+    assert corrections.difference(__TIMES, 'GLO', 'GPS')[0] == pytest.approx(-gps_utc + 5e-8, abs=1e-15)
+
+    utc = corrections.convert(__TIMES, 'GPS', 'UTC')
+    assert utc[0] == np.datetime64('2022-09-29T09:59:41.999999995', 'ns')
+    assert np.isnat(utc[1])
+    assert corrections.convert(__TIMES, 'GPS', 'GPS')[0] == __TIMES[0]
+
+    with pytest.raises(ValueError):
+        corrections.convert(__TIMES, 'BDS', 'GPS')
+    with pytest.raises(ValueError):
+        corrections.convert(__TIMES, 'TAI', 'GPS')
+    with pytest.raises(ValueError):
+        TimeScaleCorrections(['GPUT'], __TIMES[:1], [[0.0, 0.0, 0.0]]).convert(__TIMES, 'GPS', 'UTC')
+
+
+def test_rinex_time_scale_corrections():
+    rinex_nav_v4 = reader.read_rinex_file(rinex_file_path=resources_path / "navigation_v4.22p")
+    assert rinex_nav_v4.header.leap_seconds.current == 18
+    assert rinex_nav_v4.time_scale_corrections().codes == ['GPUT']
+    expected = 2.793967723846e-09 + 1.243449787580e-14 * 396576  # reference time 2022-09-24T19:50:24
+    assert rinex_nav_v4.time_scale_corrections().offset(__TIMES, 'GPUT')[0] == pytest.approx(expected, abs=1e-18)
+    utc = rinex_nav_v4.convert_time_scale(__TIMES, 'GPS', 'UTC')
+    assert utc[0] == np.datetime64('2022-09-29T09:59:41.999999992', 'ns')
+    assert rinex_nav_v4.convert_time_scale(utc, 'UTC', 'GPS')[0] == __TIMES[0]
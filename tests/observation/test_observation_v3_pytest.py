@@ -1,4 +1,11 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
 from nmbu.rinex import reader
+from nmbu.rinex.observation.v3.header import read_observation_header_v3
+from nmbu.rinex.observation.v3.observation import read_observation_blocks_v3
 from tests import resources_path
 
 
@@ -56,6 +63,24 @@ def test_read_obs_v3__obs_types_filter():
     assert {k[0] for k in result.data.satellites.keys()} == {'C', 'E'}  # Only E and C defines .5. types
 
 
+def test_read_obs_v3__sv_filter():
+    result = reader.read_rinex_file(
+        rinex_file_path=resources_path / "observation_v3.22o",
+        sv=["G03", "R04", "C11"]
+    )
+    assert set(result.data.satellites.keys()) == {"G03", "R04", "C11"}
+
+    # combined with GNSS and obs types filters
+    result = reader.read_rinex_file(
+        rinex_file_path=resources_path / "observation_v3.22o",
+        sv=["G03", "R04", "C11"],
+        gnss=["R", "C"],
+        obs_types="C.."
+    )
+    assert set(result.data.satellites.keys()) == {"R04", "C11"}
+    assert result.data.systems["C"].obs_types == ["C2I", "C5P", "C7I"]
+
+
 def test_read_obs_v3__time_filter():
     # using only single start time filter
     result = reader.read_rinex_file(
@@ -82,4 +107,79 @@ def test_read_obs_v3__single_sv():
     )
     assert len(result.data.satellites) == 1
     assert result.data.satellites["C12"]["2022-09-29T11:00:00"]["C2I"]["value"] == 23486627.58
-    assert result.data.satellites["C12"]["2022-09-29T11:00:00"]["D7I"]["value"] == -1501.578
\ No newline at end of file
+    assert result.data.satellites["C12"]["2022-09-29T11:00:00"]["D7I"]["value"] == -1501.578
+
+
+@pytest.mark.parametrize("start_epoch,end_epoch,gnss,obs_types,sv", [
+    (None, None, None, None, None),
+    (None, None, ["R", "C"], ".1.", None),
+    (datetime(2022, 9, 29, 11, 0, 10), None, None, ["C1C", "L2I"], None),
+    (datetime(2022, 9, 29, 11, 0, 10), datetime(2022, 9, 29, 11, 0, 20), ["E"], None, None),
+    (None, None, None, None, ["G03", "R04", "E05"]),
+])
+def test_read_obs_v3__bulk_matches_block_by_block(start_epoch, end_epoch, gnss, obs_types, sv):
+    results = []
+    for bulk in (True, False):
+        with (resources_path / "observation_v3.22o").open() as f:
+            next(f)  # simulate reading first line
+            header = read_observation_header_v3(file=f, version=3.05, file_type='O', gnss='M')
+            results.append(read_observation_blocks_v3(f, header, start_epoch, end_epoch, gnss, obs_types,
+                                                      bulk=bulk, sv=sv))
+    bulk_result, block_result = results
+    np.testing.assert_array_equal(bulk_result.epochs, block_result.epochs)
+    assert bulk_result.systems.keys() == block_result.systems.keys()
+    for system, observations in bulk_result.systems.items():
+        assert observations.obs_types == block_result.systems[system].obs_types
+        np.testing.assert_array_equal(observations.sv, block_result.systems[system].sv)
+        np.testing.assert_array_equal(observations.values, block_result.systems[system].values)
+        np.testing.assert_array_equal(observations.lli, block_result.systems[system].lli)
+        np.testing.assert_array_equal(observations.ssi, block_result.systems[system].ssi)
+        np.testing.assert_array_equal(observations.present, block_result.systems[system].present)
+        np.testing.assert_array_equal(observations.order, block_result.systems[system].order)
+
+
+def test_iter_obs_v3__matches_read():
+    path = resources_path / "observation_v3.22o"
+    expected = reader.read_rinex_file(path, gnss=["G", "E"], obs_types="C..")
+    epochs = list(reader.iter_observation_epochs(path, gnss=["G", "E"], obs_types="C.."))
+    np.testing.assert_array_equal(np.concatenate([epoch.epochs for epoch in epochs]), expected.data.epochs)
+    for position, epoch in enumerate(epochs):
+        assert epoch.systems.keys() == {'G', 'E'}
+        for system, observations in epoch.systems.items():
+            assert observations.values.shape[0] == 1
+            expected_system = expected.data.systems[system]
+            assert observations.obs_types == expected_system.obs_types
+            columns = np.searchsorted(expected_system.sv, observations.sv)
+            np.testing.assert_array_equal(observations.values[0], expected_system.values[position, columns])
+            np.testing.assert_array_equal(observations.ssi[0], expected_system.ssi[position, columns])
+            assert np.count_nonzero(expected_system.present[position]) == len(observations.sv)
+
+
+def test_iter_obs_v3__time_filter():
+    epochs = list(reader.iter_observation_epochs(resources_path / "observation_v3.22o",
+                                                 start_epoch="2022-09-29T11:00:10", end_epoch="2022-09-29T11:00:20"))
+    assert [epoch.epoch_keys[0] for epoch in epochs] == ["2022-09-29T11:00:10", "2022-09-29T11:00:20"]
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_read_obs_v3__high_rate(bulk):
+    with (resources_path / "observation_v3_high_rate.22o").open() as f:
+        next(f)  # simulate reading first line
+        header = read_observation_header_v3(file=f, version=3.05, file_type='O', gnss='M')
+        result = read_observation_blocks_v3(f, header, None, None, None, None, bulk=bulk)
+    np.testing.assert_array_equal(result.epochs, np.array(['2022-09-29T11:00:00', '2022-09-29T11:00:00.1',
+                                                           '2022-09-29T11:00:00.2', '2022-09-29T11:00:00.9999999'],
+                                                          dtype='datetime64[ns]'))
+    assert result.epoch_keys == ['2022-09-29T11:00:00', '2022-09-29T11:00:00.1',
+                                 '2022-09-29T11:00:00.2', '2022-09-29T11:00:00.9999999']
+    assert result.satellites["C12"]["2022-09-29T11:00:00.1"]["C2I"]["value"] == 23486628.580
+    assert result.satellites["C12"][np.datetime64("2022-09-29T11:00:00.9999999")]["C2I"]["value"] == 23486630.580
+
+
+def test_read_obs_v3__high_rate_time_filter():
+    result = reader.read_rinex_file(rinex_file_path=resources_path / "observation_v3_high_rate.22o",
+                                    start_epoch="2022-09-29T11:00:00.1", end_epoch="2022-09-29T11:00:00.5")
+    assert result.data.epoch_keys == ['2022-09-29T11:00:00.1', '2022-09-29T11:00:00.2']
+    result = reader.read_rinex_file(rinex_file_path=resources_path / "observation_v3_high_rate.22o",
+                                    start_epoch="2022-09-29T11:00:00.2")
+    assert result.data.epoch_keys == ['2022-09-29T11:00:00.2']
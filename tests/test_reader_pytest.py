@@ -1,6 +1,7 @@
 import pytest
 
 from nmbu.rinex import reader
+from tests import resources_path
 
 
 # tests for reader.__read_first_line
@@ -61,3 +62,8 @@ def test_read_first_line_wrong_gnss():
 
 # tests for reader.read_rinex_file
 
+
+
+def test_iter_observation_epochs__navigation_file():
+    with pytest.raises(ValueError):
+        next(reader.iter_observation_epochs(resources_path / "navigation_v3.22p"))